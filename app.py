@@ -313,6 +313,13 @@ with app.app_context():
         logging.info("✅ Tenant-aware SQLAlchemy infrastructure initialized")
     except Exception as e:
         logging.warning(f"⚠️ Could not initialize tenant SQLAlchemy: {e}")
+    
+    # Drop cached risk heat map / pulse / goals when a user's holdings or preferences change
+    try:
+        from services.risk_engine import register_risk_cache_invalidation
+        register_risk_cache_invalidation()
+    except Exception as e:
+        logging.warning(f"⚠️ Could not register risk cache invalidation: {e}")
 
 # Initialize multi-tenant middleware
 from middleware.tenant_middleware import init_tenant_middleware
@@ -456,7 +463,7 @@ def readiness_check():
     try:
         from caching.redis_cache import get_cache
         cache = get_cache()
-        checks['redis'] = cache.is_available()
+        checks['redis'] = cache.ping()
     except Exception as e:
         checks['redis_error'] = str(e)
     
@@ -0,0 +1,62 @@
+"""
+Tag-based cache invalidation helpers
+Cached keys are recorded in per-tag Redis sets (e.g. every key for one user or one symbol),
+so invalidation deletes exactly the tagged keys instead of scanning the keyspace with KEYS
+"""
+
+from typing import Iterable, List
+
+TAG_PREFIX = 'cache_tag:'
+# Registry of every live tag set, used by the periodic prune task
+TAG_REGISTRY = 'cache_tags'
+# Tag sets outlive their longest member; stale members are pruned by cleanup_expired_cache
+TAG_TTL = 86400
+
+# Delete every member of each tag set, then the tag set itself, atomically.
+# Members are deleted in chunks to stay under Lua's unpack() stack limit.
+# Assumes a single Redis node (or one primary): the script deletes keys it reads from the tag
+# sets rather than keys declared in KEYS[], which Redis Cluster rejects across hash slots.
+INVALIDATE_TAGS_LUA = """
+local deleted = 0
+for _, tag in ipairs(KEYS) do
+    local members = redis.call('SMEMBERS', tag)
+    for i = 1, #members, 1000 do
+        deleted = deleted + redis.call('DEL', unpack(members, i, math.min(i + 999, #members)))
+    end
+    redis.call('DEL', tag)
+    redis.call('SREM', ARGV[1], tag)
+end
+return deleted
+"""
+
+
+def tag_key(tag: str) -> str:
+    """Redis key of the set holding every cache key carrying `tag`"""
+    return f"{TAG_PREFIX}{tag}"
+
+
+def user_tag(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def symbol_tag(symbol: str) -> str:
+    return f"symbol:{symbol.upper()}"
+
+
+def tag_ttl(expiry: int) -> int:
+    return max(int(expiry), TAG_TTL)
+
+
+def add_tags(pipe, key: str, tags: Iterable[str], expiry: int):
+    """Queue the commands recording `key` under each tag on a (sync or async) pipeline"""
+    for tag in tags:
+        tkey = tag_key(tag)
+        pipe.sadd(tkey, key)
+        pipe.expire(tkey, tag_ttl(expiry))
+        pipe.sadd(TAG_REGISTRY, tkey)
+
+
+def path_tags(path: str, max_depth: int = 4) -> List[str]:
+    """Tags for an API path: one per leading path prefix ('/api/market', '/api/market/quote', ...)"""
+    parts = [p for p in path.split('/') if p]
+    return [f"path:/{'/'.join(parts[:i])}" for i in range(1, min(len(parts), max_depth) + 1)]
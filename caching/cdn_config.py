@@ -16,6 +16,8 @@ import redis.asyncio as redis
 import aiofiles
 from pathlib import Path
 
+from caching.cache_tags import INVALIDATE_TAGS_LUA, TAG_REGISTRY, add_tags, path_tags, tag_key
+
 logger = logging.getLogger(__name__)
 
 class CDNConfig:
@@ -219,24 +221,33 @@ class APIResponseCache:
         
         try:
             cache_key = self._generate_cache_key(request)
-            await self.redis_client.setex(cache_key, cache_duration, response_content)
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                pipe.setex(cache_key, cache_duration, response_content)
+                # Tag by path prefix so invalidate_path can find the hashed keys
+                add_tags(pipe, cache_key, path_tags(request.url.path), cache_duration)
+                await pipe.execute()
             return True
         except Exception as e:
             logger.error(f"Failed to cache response: {e}")
             return False
     
-    async def invalidate_pattern(self, pattern: str) -> int:
-        """Invalidate cached responses matching pattern"""
+    async def invalidate_path(self, path_prefix: str) -> int:
+        """
+        Invalidate cached responses for a path and everything below it
+        e.g. '/api/market/quote/RELIANCE' or '/api/market' (up to 4 path segments deep)
+        """
         if not self.redis_client:
             return 0
         
         try:
-            keys = await self.redis_client.keys(f"api_cache:*{pattern}*")
-            if keys:
-                return await self.redis_client.delete(*keys)
-            return 0
+            tags = path_tags(path_prefix)
+            if not tags:
+                return 0
+            return await self.redis_client.eval(
+                INVALIDATE_TAGS_LUA, 1, tag_key(tags[-1]), TAG_REGISTRY
+            )
         except Exception as e:
-            logger.error(f"Failed to invalidate cache pattern {pattern}: {e}")
+            logger.error(f"Failed to invalidate cached path {path_prefix}: {e}")
             return 0
 
 class CompressionHandler:
@@ -380,22 +391,25 @@ class CDNMetrics:
             
             info = await self.redis_client.info()
             
-            # Count cache keys by type
-            api_keys = await self.redis_client.keys("api_cache:*")
-            asset_keys = await self.redis_client.keys("asset_cache:*")
-            
             return {
                 "redis_memory_used": info.get("used_memory_human", "unknown"),
                 "redis_hits": info.get("keyspace_hits", 0),
                 "redis_misses": info.get("keyspace_misses", 0),
-                "api_cache_keys": len(api_keys) if api_keys else 0,
-                "asset_cache_keys": len(asset_keys) if asset_keys else 0,
+                "api_cache_keys": await self._count_keys("api_cache:*"),
+                "asset_cache_keys": await self._count_keys("asset_cache:*"),
                 "hit_ratio": self._calculate_hit_ratio(info.get("keyspace_hits", 0), info.get("keyspace_misses", 0))
             }
         except Exception as e:
             logger.error(f"Failed to get cache stats: {e}")
             return {"error": str(e)}
     
+    async def _count_keys(self, pattern: str, batch_size: int = 1000) -> int:
+        """Count keys matching a pattern with incremental SCAN (never a blocking KEYS)"""
+        count = 0
+        async for _ in self.redis_client.scan_iter(match=pattern, count=batch_size):
+            count += 1
+        return count
+    
     def _calculate_hit_ratio(self, hits: int, misses: int) -> float:
         """Calculate cache hit ratio"""
         total = hits + misses
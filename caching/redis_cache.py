@@ -6,9 +6,14 @@ import redis
 import json
 import logging
 import os
+import time
 import socket
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable
+
+from caching.cache_tags import (
+    INVALIDATE_TAGS_LUA, TAG_REGISTRY, add_tags, symbol_tag, tag_key, user_tag
+)
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +24,9 @@ class RedisCache:
         """Initialize Redis connection with fallback handling"""
         self.redis_url = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
         self.client = None
+        self._invalidate_script = None
+        # After a connection error, skip Redis until this monotonic time instead of pinging per call
+        self._down_until = 0.0
         self._connect()
     
     def _connect(self):
@@ -42,6 +50,7 @@ class RedisCache:
             )
             
             self.client = redis.Redis(connection_pool=pool)
+            self._invalidate_script = self.client.register_script(INVALIDATE_TAGS_LUA)
             # Test connection
             self.client.ping()
             logger.info("✅ Redis cache connected successfully")
@@ -50,15 +59,25 @@ class RedisCache:
             self.client = None
     
     def is_available(self) -> bool:
-        """Check if Redis is available"""
+        """Check if Redis is usable without a round trip (connection errors open a short backoff)"""
+        return self.client is not None and time.monotonic() >= self._down_until
+    
+    def ping(self) -> bool:
+        """Check Redis connectivity with a PING (health checks only)"""
         if not self.client:
             return False
         try:
             self.client.ping()
+            self._down_until = 0.0
             return True
-        except:
+        except Exception:
+            self._mark_down()
             return False
     
+    def _mark_down(self, backoff: float = 5.0):
+        """Stop using Redis for a few seconds after a connection failure"""
+        self._down_until = time.monotonic() + backoff
+    
     def get(self, key: str) -> Optional[Any]:
         """Get value from cache with JSON deserialization"""
         if not self.is_available():
@@ -75,12 +94,23 @@ class RedisCache:
             except (json.JSONDecodeError, TypeError):
                 return value
                 
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logger.warning(f"Cache get error for key {key}: {e}")
+            self._mark_down()
+            return None
         except Exception as e:
             logger.warning(f"Cache get error for key {key}: {e}")
             return None
     
-    def set(self, key: str, value: Any, expiry: int = 300) -> bool:
-        """Set value in cache with JSON serialization and expiry"""
+    def set(self, key: str, value: Any, expiry: int = 300, tags: Iterable[str] = None) -> bool:
+        """
+        Set value in cache with JSON serialization and expiry
+        Args:
+            key: Cache key
+            value: Value to store (JSON-serialized unless already a string)
+            expiry: TTL in seconds
+            tags: Invalidation tags (see invalidate_tags), e.g. user_tag(user_id)
+        """
         if not self.is_available():
             return False
         
@@ -89,13 +119,59 @@ class RedisCache:
             if not isinstance(value, str):
                 value = json.dumps(value, default=str)
             
-            self.client.setex(key, expiry, value)
+            if tags:
+                pipe = self.client.pipeline(transaction=True)
+                pipe.setex(key, expiry, value)
+                add_tags(pipe, key, tags, expiry)
+                pipe.execute()
+            else:
+                self.client.setex(key, expiry, value)
             return True
             
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logger.warning(f"Cache set error for key {key}: {e}")
+            self._mark_down()
+            return False
         except Exception as e:
             logger.warning(f"Cache set error for key {key}: {e}")
             return False
     
+    def get_many(self, keys: list) -> list:
+        """Get several values in one round trip (None for missing keys)"""
+        if not keys or not self.is_available():
+            return [None] * len(keys)
+        
+        try:
+            values = self.client.mget(keys)
+        except Exception as e:
+            logger.warning(f"Cache get_many error: {e}")
+            return [None] * len(keys)
+        
+        results = []
+        for value in values:
+            try:
+                results.append(json.loads(value) if value is not None else None)
+            except (json.JSONDecodeError, TypeError):
+                results.append(value)
+        return results
+    
+    def set_many(self, mapping: Dict[str, Any], expiry: int = 300) -> bool:
+        """Set several values with the same expiry in one pipelined round trip"""
+        if not mapping or not self.is_available():
+            return False
+        
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, value in mapping.items():
+                if not isinstance(value, str):
+                    value = json.dumps(value, default=str)
+                pipe.setex(key, expiry, value)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.warning(f"Cache set_many error: {e}")
+            return False
+    
     def delete(self, key: str) -> bool:
         """Delete key from cache"""
         if not self.is_available():
@@ -114,7 +190,7 @@ class RedisCache:
     
     def set_market_data(self, symbol: str, data: Dict, expiry: int = 180) -> bool:
         """Cache market data for a symbol (3 minutes default)"""
-        return self.set(f'stock_price:{symbol}', data, expiry)
+        return self.set(f'stock_price:{symbol}', data, expiry, tags=[symbol_tag(symbol)])
     
     def get_market_indices(self) -> Optional[Dict]:
         """Get cached market indices data"""
@@ -130,7 +206,7 @@ class RedisCache:
     
     def set_user_portfolio(self, user_id: int, data: Dict, expiry: int = 900) -> bool:
         """Cache user portfolio data (15 minutes default)"""
-        return self.set(f'user_portfolio:{user_id}', data, expiry)
+        return self.set(f'user_portfolio:{user_id}', data, expiry, tags=[user_tag(user_id)])
     
     def get_broker_data(self, broker_account_id: int) -> Optional[Dict]:
         """Get cached broker account data"""
@@ -140,33 +216,67 @@ class RedisCache:
         """Cache broker account data (10 minutes default)"""
         return self.set(f'broker_data:{broker_account_id}', data, expiry)
     
+    def invalidate_tags(self, *tags: str) -> int:
+        """
+        Delete every key cached under any of the given tags
+        Cost is O(tagged keys); the keyspace is never scanned.
+        Returns:
+            Number of keys deleted
+        """
+        if not self.is_available() or not tags:
+            return 0
+        
+        try:
+            return int(self._invalidate_script(keys=[tag_key(t) for t in tags], args=[TAG_REGISTRY]))
+        except Exception as e:
+            logger.warning(f"Error invalidating cache tags {tags}: {e}")
+            return 0
+    
     def invalidate_user_cache(self, user_id: int) -> bool:
         """Invalidate all cache entries for a user"""
         if not self.is_available():
             return False
         
         try:
-            # Get all keys matching user patterns
-            patterns = [
-                f'user_portfolio:{user_id}',
-                f'user_watchlist:{user_id}',
-                f'user_analysis:{user_id}*'
-            ]
-            
-            for pattern in patterns:
-                keys = self.client.keys(pattern)
-                if keys:
-                    self.client.delete(*keys)
-            
+            # Fixed per-user keys are deleted directly; anything else is reached through the user tag
+            self.client.delete(f'user_portfolio:{user_id}', f'user_watchlist:{user_id}')
+            self.invalidate_tags(user_tag(user_id))
             return True
             
         except Exception as e:
             logger.warning(f"Error invalidating user cache: {e}")
             return False
     
+    def prune_tags(self, batch_size: int = 500) -> int:
+        """
+        Drop tag-set members whose keys have expired, and tag sets left empty
+        Walks only the tag registry (SSCAN) and the tagged keys, never the whole keyspace.
+        Returns:
+            Number of stale members removed
+        """
+        if not self.is_available():
+            return 0
+        
+        removed = 0
+        for tkey in self.client.sscan_iter(TAG_REGISTRY, count=batch_size):
+            members = list(self.client.sscan_iter(tkey, count=batch_size))
+            if not members:
+                self.client.srem(TAG_REGISTRY, tkey)
+                continue
+            for start in range(0, len(members), batch_size):
+                chunk = members[start:start + batch_size]
+                pipe = self.client.pipeline(transaction=False)
+                for member in chunk:
+                    pipe.exists(member)
+                stale = [m for m, alive in zip(chunk, pipe.execute()) if not alive]
+                if stale:
+                    self.client.srem(tkey, *stale)
+                    removed += len(stale)
+        return removed
+    
     def get_cache_stats(self) -> Dict:
         """Get Redis cache statistics"""
-        if not self.is_available():
+        if not self.ping():
             return {'status': 'unavailable'}
         
         try:
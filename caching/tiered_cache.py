@@ -0,0 +1,280 @@
+"""
+Two-tier cache for hot read paths
+Per-worker in-process LRU (L1) in front of Redis (L2), with single-flight loading
+and stale-while-revalidate for namespaces that tolerate slightly old data
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from caching.redis_cache import cache as redis_cache
+
+logger = logging.getLogger(__name__)
+
+L1_MAX_ENTRIES = int(os.environ.get('CACHE_L1_MAX_ENTRIES', '2048'))
+# L1 never holds a value longer than this, so workers converge on Redis quickly after a write
+L1_MAX_TTL = float(os.environ.get('CACHE_L1_MAX_TTL', '5'))
+
+# Seconds a value may be served past its expiry while one caller refreshes it (key prefix -> window)
+STALE_WINDOWS = {
+    'stock_price': 120,
+    'market_indices': 300,
+    'market_indices_full': 300
+}
+
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='cache-refresh')
+
+
+def _namespace(key: str) -> str:
+    return key.split(':', 1)[0]
+
+
+class TieredCache:
+    """
+    L1 (bounded in-process LRU) + L2 (Redis) read-through cache
+    Values are stored in Redis exactly as RedisCache.set stores them, so plain
+    cache.get readers of the same keys keep working.
+    """
+
+    def __init__(self, l2=redis_cache, l1_max_entries: int = L1_MAX_ENTRIES,
+                 l1_max_ttl: float = L1_MAX_TTL, stale_windows: Dict[str, int] = None):
+        self.l2 = l2
+        self.l1_max_entries = l1_max_entries
+        self.l1_max_ttl = l1_max_ttl
+        self.stale_windows = STALE_WINDOWS if stale_windows is None else stale_windows
+        self._l1: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, fresh_until, stale_until)
+        self._l1_lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+        self._inflight_lock = threading.Lock()
+        self._stats = defaultdict(lambda: defaultdict(float))
+
+    # ---- L1 ----
+
+    def _l1_get(self, key: str):
+        with self._l1_lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() > entry[2]:
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key)
+            return entry
+
+    def _l1_set(self, key: str, value: Any, fresh_for: float, stale_for: float):
+        now = time.monotonic()
+        fresh_for = min(fresh_for, self.l1_max_ttl)
+        entry = (value, now + fresh_for, now + fresh_for + min(stale_for, self.l1_max_ttl))
+        with self._l1_lock:
+            self._l1[key] = entry
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+
+    # ---- L2 ----
+
+    def _l2_get(self, key: str, stale_window: int):
+        """GET + PTTL in one round trip; returns (value, fresh_seconds_left) or None"""
+        if not self.l2.is_available():
+            return None
+        try:
+            pipe = self.l2.client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.pttl(key)
+            raw, pttl = pipe.execute()
+        except Exception as e:
+            logger.warning(f"Tiered cache L2 read error for key {key}: {e}")
+            self.l2._mark_down()
+            return None
+        if raw is None:
+            return None
+        try:
+            value = json.loads(raw)
+        except (json.JSONDecodeError, TypeError):
+            value = raw
+        ttl_left = (pttl / 1000.0) if pttl and pttl > 0 else 0.0
+        return value, ttl_left - stale_window
+
+    def _l2_set(self, key: str, value: Any, expiry: int, stale_window: int):
+        self.l2.set(key, value, expiry + stale_window)
+
+    def _l2_try_lock(self, key: str, ttl: int) -> Optional[str]:
+        """Cross-worker refresh lock; returns a token if acquired (or if Redis is unavailable)"""
+        token = uuid.uuid4().hex
+        if not self.l2.is_available():
+            return token
+        try:
+            if self.l2.client.set(f"lock:{key}", token, nx=True, ex=ttl):
+                return token
+            return None
+        except Exception:
+            return token
+
+    def _l2_unlock(self, key: str, token: str):
+        if not self.l2.is_available():
+            return
+        try:
+            lock_key = f"lock:{key}"
+            if self.l2.client.get(lock_key) == token:
+                self.l2.client.delete(lock_key)
+        except Exception:
+            pass
+
+    # ---- public API ----
+
+    def get_or_compute(self, key: str, loader: Callable[[], Any], expiry: int = 300,
+                       stale_window: int = None, cache_none: bool = False) -> Any:
+        """
+        Get a value from L1, then Redis, computing it at most once per key on a miss
+        Args:
+            key: Cache key ('<namespace>:...' - the namespace selects the stale window)
+            loader: Function producing the value on a miss
+            expiry: Seconds the value is fresh
+            stale_window: Seconds a stale value may still be served while it is refreshed
+                          (defaults to the namespace's entry in STALE_WINDOWS, else 0)
+            cache_none: Whether a None/empty result from the loader is cached
+        Returns:
+            The cached or freshly computed value
+        """
+        ns = _namespace(key)
+        stats = self._stats[ns]
+        if stale_window is None:
+            stale_window = self.stale_windows.get(ns, 0)
+
+        entry = self._l1_get(key)
+        if entry is not None:
+            value, fresh_until, _ = entry
+            if time.monotonic() <= fresh_until:
+                stats['l1_hits'] += 1
+                return value
+
+        found = self._l2_get(key, stale_window)
+        if found is not None:
+            value, fresh_left = found
+            if fresh_left > 0:
+                stats['l2_hits'] += 1
+                self._l1_set(key, value, fresh_left, stale_window)
+                return value
+            if stale_window:
+                stats['stale_served'] += 1
+                self._l1_set(key, value, 0, stale_window + fresh_left)
+                self._refresh_async(key, loader, expiry, stale_window, cache_none)
+                return value
+        elif entry is not None and stale_window:
+            # Redis unavailable but this worker still holds a recent value
+            stats['stale_served'] += 1
+            self._refresh_async(key, loader, expiry, stale_window, cache_none)
+            return entry[0]
+
+        stats['misses'] += 1
+        return self._load(key, loader, expiry, stale_window, cache_none)
+
+    def invalidate(self, key: str):
+        """Drop a key from this worker's L1 and from Redis"""
+        with self._l1_lock:
+            self._l1.pop(key, None)
+        self.l2.delete(key)
+
+    def clear_local(self):
+        """Drop every L1 entry in this worker"""
+        with self._l1_lock:
+            self._l1.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-namespace hit/miss counters and mean load latency for this worker"""
+        namespaces = {}
+        for ns, counters in list(self._stats.items()):
+            loads = counters.get('loads', 0)
+            lookups = sum(counters.get(k, 0) for k in ('l1_hits', 'l2_hits', 'stale_served', 'misses'))
+            namespaces[ns] = {
+                'l1_hits': int(counters.get('l1_hits', 0)),
+                'l2_hits': int(counters.get('l2_hits', 0)),
+                'stale_served': int(counters.get('stale_served', 0)),
+                'misses': int(counters.get('misses', 0)),
+                'coalesced': int(counters.get('coalesced', 0)),
+                'load_errors': int(counters.get('load_errors', 0)),
+                'hit_rate': round(1 - counters.get('misses', 0) / lookups, 4) if lookups else 0.0,
+                'avg_load_ms': round(counters.get('load_ms', 0) / loads, 2) if loads else 0.0
+            }
+        return {'l1_entries': len(self._l1), 'l1_max_entries': self.l1_max_entries, 'namespaces': namespaces}
+
+    # ---- loading ----
+
+    def _load(self, key: str, loader: Callable[[], Any], expiry: int, stale_window: int, cache_none: bool) -> Any:
+        """Single-flight load within this worker: one caller runs the loader, the rest wait for it"""
+        with self._inflight_lock:
+            waiter = self._inflight.get(key)
+            if waiter is None:
+                self._inflight[key] = threading.Event()
+
+        if waiter is not None:
+            self._stats[_namespace(key)]['coalesced'] += 1
+            waiter.wait(timeout=30)
+            entry = self._l1_get(key)
+            if entry is not None:
+                return entry[0]
+            # Leader failed or produced nothing cacheable - compute directly
+            return loader()
+
+        try:
+            return self._compute(key, loader, expiry, stale_window, cache_none)
+        finally:
+            with self._inflight_lock:
+                done = self._inflight.pop(key)
+            done.set()
+
+    def _compute(self, key: str, loader: Callable[[], Any], expiry: int, stale_window: int, cache_none: bool) -> Any:
+        stats = self._stats[_namespace(key)]
+        started = time.perf_counter()
+        try:
+            value = loader()
+        except Exception:
+            stats['load_errors'] += 1
+            raise
+        finally:
+            stats['loads'] += 1
+            stats['load_ms'] += (time.perf_counter() - started) * 1000
+
+        if value or cache_none:
+            self._l1_set(key, value, expiry, stale_window)
+            self._l2_set(key, value, expiry, stale_window)
+        return value
+
+    def _refresh_async(self, key: str, loader: Callable[[], Any], expiry: int, stale_window: int, cache_none: bool):
+        """Refresh a stale key in the background; one refresher per key across all workers"""
+        with self._inflight_lock:
+            if key in self._inflight:
+                return
+            self._inflight[key] = threading.Event()
+
+        def refresh():
+            token = self._l2_try_lock(key, ttl=max(5, min(expiry, 30)))
+            try:
+                if token is not None:
+                    self._compute(key, loader, expiry, stale_window, cache_none)
+            except Exception as e:
+                logger.warning(f"Background refresh failed for key {key}: {e}")
+            finally:
+                if token is not None:
+                    self._l2_unlock(key, token)
+                with self._inflight_lock:
+                    done = self._inflight.pop(key)
+                done.set()
+
+        import contextvars
+        ctx = contextvars.copy_context()
+        _refresh_executor.submit(ctx.run, refresh)
+
+
+tiered_cache = TieredCache()
+
+
+def get_tiered_cache() -> TieredCache:
+    """Get the global tiered cache instance"""
+    return tiered_cache
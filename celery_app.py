@@ -66,6 +66,15 @@ def make_celery(app_name=__name__):
                 'task': 'tasks.market_data_tasks.update_market_indices', 
                 'schedule': crontab(minute='*/2'),  # Every 2 minutes
             },
+            'ingest-intraday-bars': {
+                'task': 'tasks.market_data_tasks.backfill_bar_store',
+                'schedule': crontab(minute='*/5', hour='3-10', day_of_week='mon-fri'),  # NSE session (UTC)
+                'kwargs': {'tail_only': True},
+            },
+            'backfill-bar-store': {
+                'task': 'tasks.market_data_tasks.backfill_bar_store',
+                'schedule': crontab(minute=30, hour=11),  # After NSE close (17:00 IST)
+            },
         },
     )
     
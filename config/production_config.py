@@ -191,10 +191,37 @@ class ProductionConfig:
             except Exception as e:
                 return {'status': 'unhealthy', 'error': str(e)}
         
+        # Broker sync backlog (queue depth and lag from the last scheduler tick)
+        def get_broker_sync_metrics():
+            try:
+                from services.broker_sync_scheduler import get_broker_sync_scheduler
+                return get_broker_sync_scheduler().get_metrics() or {'status': 'no data'}
+            except Exception as e:
+                return {'status': 'unavailable', 'error': str(e)}
+        
+        # LLM gateway: calls, tokens, latency and cache hit rate per provider
+        def get_llm_gateway_metrics():
+            try:
+                from services.llm_gateway import get_llm_gateway
+                return get_llm_gateway().get_stats()
+            except Exception as e:
+                return {'status': 'unavailable', 'error': str(e)}
+        
+        # Shared yfinance history cache: series held, hits, cold and tail fetches
+        def get_price_history_metrics():
+            try:
+                from services.price_history import get_price_history
+                return get_price_history().get_stats()
+            except Exception as e:
+                return {'status': 'unavailable', 'error': str(e)}
+        
         return {
             'system_stats': get_system_stats,
             'database_health': check_database_health,
-            'redis_health': check_redis_health
+            'redis_health': check_redis_health,
+            'broker_sync': get_broker_sync_metrics,
+            'llm_gateway': get_llm_gateway_metrics,
+            'price_history': get_price_history_metrics
         }
 
 # Application startup validation
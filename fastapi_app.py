@@ -4,7 +4,11 @@ Handles async operations, advanced caching, and input validation
 """
 
 import os
+import json
+import hashlib
+import functools
 import logging
+import math
 import asyncio
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Union
@@ -15,6 +19,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.security import HTTPBearer
 from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel, validator, EmailStr
 import redis.asyncio as redis
 import asyncpg
@@ -24,6 +29,8 @@ from sqlalchemy.orm import sessionmaker
 from cryptography.fernet import Fernet
 import httpx
 
+from services.rate_limiter import RedisRateLimiter
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -162,16 +169,18 @@ class CacheConfig:
     def __init__(self):
         self.redis_url = os.environ.get("REDIS_URL", "redis://localhost:6379")
         self.redis_pool = None
+        self.redis_client = None
     
     async def get_redis(self) -> redis.Redis:
-        """Get Redis connection with connection pooling"""
-        if not self.redis_pool:
+        """Get the shared Redis client (one connection pool for the process)"""
+        if not self.redis_client:
             self.redis_pool = redis.ConnectionPool.from_url(
                 self.redis_url,
                 max_connections=50,
                 retry_on_timeout=True
             )
-        return redis.Redis(connection_pool=self.redis_pool)
+            self.redis_client = redis.Redis(connection_pool=self.redis_pool)
+        return self.redis_client
 
 # Global configuration instances
 security_config = SecurityConfig()
@@ -281,34 +290,131 @@ app.add_middleware(
 
 app.add_middleware(GZipMiddleware, minimum_size=1000)
 
-# Cache decorator
+# Response cache
+API_CACHE_PREFIX = "api_cache:v2"
+API_CACHE_STATS_KEY = "api_cache:stats"
+
+
+def _cache_key_material(value):
+    """Only plain values take part in the cache key (sessions, requests etc. are skipped)"""
+    return isinstance(value, (str, int, float, bool)) or value is None
+
+
+async def _build_cache_key(request: Request, kwargs: dict) -> str:
+    """
+    Stable cache key, identical across worker processes
+
+    Derived from method + path, the sorted query string, the JSON body with sorted keys
+    (raw bytes for non-JSON bodies) and any plain-valued endpoint arguments such as the user id.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.url.path}".encode())
+    digest.update(b"\0")
+    digest.update("&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items())).encode())
+    digest.update(b"\0")
+    if request.method in ("POST", "PUT", "PATCH"):
+        body = await request.body()
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode()
+        except ValueError:
+            pass
+        digest.update(body)
+    digest.update(b"\0")
+    params = sorted((k, v) for k, v in kwargs.items() if _cache_key_material(v))
+    digest.update(json.dumps(params, separators=(",", ":")).encode())
+    return f"{API_CACHE_PREFIX}:{digest.hexdigest()}"
+
+
+def _encode_result(result) -> Optional[tuple]:
+    """(body bytes, media type) for a cacheable endpoint result, or None"""
+    if isinstance(result, Response):
+        if result.status_code != 200 or not hasattr(result, "body"):
+            return None
+        return bytes(result.body), result.media_type or "application/json"
+    # Same rendering JSONResponse uses, so hits are byte-identical to misses
+    body = json.dumps(
+        jsonable_encoder(result), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+    return body, "application/json"
+
+
+def _cached_response(body: bytes, media_type: str, etag: str, request: Request,
+                     expire_seconds: int, cache_status: str) -> Response:
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={expire_seconds}",
+        "X-Cache": cache_status
+    }
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
 def cache_response(expire_seconds: int = 300):
-    """Cache decorator for API responses"""
+    """
+    Cache decorator for API responses
+
+    Stores the encoded response bytes with their media type and ETag in Redis; hits are served
+    as-is without re-parsing JSON, and a matching If-None-Match gets a 304. Per-route request and
+    miss counters are kept in Redis (see get_cache_stats). The endpoint must take `request: Request`.
+    """
     def decorator(func):
+        @functools.wraps(func)
         async def wrapper(*args, **kwargs):
             request = kwargs.get('request')
-            if request:
-                cache_key = f"api_cache:{request.url.path}:{hash(str(kwargs))}"
+            if request is None:
+                return await func(*args, **kwargs)
+            
+            route = getattr(request.scope.get('route'), 'path', request.url.path)
+            try:
+                cache_key = await _build_cache_key(request, kwargs)
                 redis_client = await cache_config.get_redis()
-                
-                # Try to get from cache
-                cached = await redis_client.get(cache_key)
-                if cached:
-                    return JSONResponse(content=eval(cached))
-                
-                # Execute function and cache result
-                result = await func(*args, **kwargs)
-                if isinstance(result, JSONResponse):
-                    await redis_client.setex(
-                        cache_key, 
-                        expire_seconds, 
-                        str(result.body.decode())
-                    )
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.get(cache_key)
+                pipe.hincrby(API_CACHE_STATS_KEY, f"{route}|requests", 1)
+                cached, _ = await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Response cache unavailable for {route}: {e}")
+                return await func(*args, **kwargs)
+            
+            if cached:
+                etag, media_type, body = cached.split(b"\n", 2)
+                return _cached_response(body, media_type.decode(), etag.decode(), request, expire_seconds, "HIT")
+            
+            result = await func(*args, **kwargs)
+            encoded = _encode_result(result)
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.hincrby(API_CACHE_STATS_KEY, f"{route}|misses", 1)
+                if encoded is not None:
+                    body, media_type = encoded
+                    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+                    pipe.setex(cache_key, expire_seconds, b"\n".join([etag.encode(), media_type.encode(), body]))
+                await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Response cache store failed for {route}: {e}")
+            
+            if encoded is None:
                 return result
-            return await func(*args, **kwargs)
+            return _cached_response(body, media_type, etag, request, expire_seconds, "MISS")
         return wrapper
     return decorator
 
+
+async def get_cache_stats() -> Dict[str, Dict[str, float]]:
+    """Per-route response cache counters and hit ratios, aggregated across workers"""
+    redis_client = await cache_config.get_redis()
+    raw = await redis_client.hgetall(API_CACHE_STATS_KEY)
+    
+    stats: Dict[str, Dict[str, float]] = {}
+    for field, value in raw.items():
+        route, _, counter = field.decode().rpartition("|")
+        stats.setdefault(route, {"requests": 0, "misses": 0})[counter] = int(value)
+    for counters in stats.values():
+        counters["hits"] = max(counters["requests"] - counters["misses"], 0)
+        counters["hit_ratio"] = round(counters["hits"] / counters["requests"], 4) if counters["requests"] else 0.0
+    return stats
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -339,42 +445,40 @@ async def health_check():
             }
         )
 
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Response cache hit ratios per route"""
+    try:
+        return {"routes": await get_cache_stats(), "timestamp": datetime.utcnow().isoformat()}
+    except Exception as e:
+        logger.error(f"Cache stats failed: {e}")
+        return JSONResponse(status_code=503, content={"error": str(e)})
+
+# Rate limiting: first matching prefix wins (prefetch: tokens leased in-process for hot clients)
+# A limiter admits at most burst + limit - 1 requests in any window (see RedisRateLimiter)
+RATE_LIMITS = [
+    ("/api/trading/", RedisRateLimiter("api:trading", 91, 60, burst=10)),  # 100 trades per minute, 10 at once
+    ("/api/market/", RedisRateLimiter("api:market", 1000, 60, prefetch=20)),  # 1000 market data requests per minute
+    ("/api/", RedisRateLimiter("api:general", 300, 60, prefetch=5)),  # 300 general API requests per minute
+]
+
 # Rate limiting middleware
 @app.middleware("http")
 async def rate_limiting_middleware(request: Request, call_next):
     """Rate limiting middleware"""
     client_ip = request.client.host
-    redis_client = await cache_config.get_redis()
-    
-    # Define rate limits per endpoint type
-    rate_limits = {
-        "/api/trading/": {"limit": 100, "window": 60},  # 100 trades per minute
-        "/api/market/": {"limit": 1000, "window": 60},  # 1000 market data requests per minute
-        "/api/": {"limit": 300, "window": 60},  # 300 general API requests per minute
-    }
     
-    # Find applicable rate limit
-    rate_limit = None
-    for pattern, limit_config in rate_limits.items():
-        if request.url.path.startswith(pattern):
-            rate_limit = limit_config
-            break
-    
-    if rate_limit:
-        key = f"rate_limit:{client_ip}:{request.url.path.split('/')[1]}"
-        current_requests = await redis_client.get(key)
-        
-        if current_requests and int(current_requests) >= rate_limit["limit"]:
+    limiter = next((rl for pattern, rl in RATE_LIMITS if request.url.path.startswith(pattern)), None)
+    if limiter:
+        redis_client = await cache_config.get_redis()
+        result = await limiter.check_async(client_ip, redis_client)
+        if not result.allowed:
+            retry_after = math.ceil(result.retry_after)
             return JSONResponse(
                 status_code=429,
-                content={"error": "Rate limit exceeded", "retry_after": rate_limit["window"]}
+                content={"error": "Rate limit exceeded", "retry_after": retry_after},
+                headers={"Retry-After": str(retry_after)}
             )
-        
-        # Increment counter
-        pipe = redis_client.pipeline()
-        pipe.incr(key)
-        pipe.expire(key, rate_limit["window"])
-        await pipe.execute()
     
     response = await call_next(request)
     return response
@@ -9,16 +9,114 @@ from aiohttp import web, WSMsgType
 import logging
 import json
 import time
+import math
 import redis
-from typing import Dict, List, Optional
+from redis import asyncio as redis_async
+from typing import Any, Dict, List, Optional
 import os
 from datetime import datetime, timedelta, timezone
 import random
 
+from services.rate_limiter import RedisRateLimiter
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Upstream connection pool (per upstream instance)
+LB_POOL_SIZE = int(os.environ.get('LB_POOL_SIZE', '100'))
+LB_KEEPALIVE_TIMEOUT = float(os.environ.get('LB_KEEPALIVE_TIMEOUT', '60'))
+LB_UPSTREAM_TIMEOUT = float(os.environ.get('LB_UPSTREAM_TIMEOUT', '30'))
+LB_CONNECT_TIMEOUT = float(os.environ.get('LB_CONNECT_TIMEOUT', '3'))
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Latency tracking: time constant of the peak-EWMA and the latency assumed before any sample
+LB_EWMA_DECAY_SECONDS = float(os.environ.get('LB_EWMA_DECAY_SECONDS', '10'))
+LB_EWMA_INITIAL = 0.05
+LB_METRICS_INTERVAL = int(os.environ.get('LB_METRICS_INTERVAL', '10'))
+
+# Passive outlier ejection
+LB_EJECT_CONSECUTIVE_FAILURES = int(os.environ.get('LB_EJECT_CONSECUTIVE_FAILURES', '5'))
+LB_EJECT_BASE_SECONDS = float(os.environ.get('LB_EJECT_BASE_SECONDS', '30'))
+LB_EJECT_MAX_SECONDS = 300.0
+
+# Hop-by-hop headers are never forwarded
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade', 'host'
+}
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization'
+}
+
+
+class UpstreamStats:
+    """
+    Load and latency state for one upstream instance
+    Latency is a peak-sensitive, time-decayed EWMA: a slow response raises it immediately,
+    fast responses bring it down over LB_EWMA_DECAY_SECONDS.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.ewma = LB_EWMA_INITIAL
+        self.last_sample = time.monotonic()
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    def score(self) -> float:
+        """Expected wait for a new request: latency scaled by requests already in flight"""
+        return self.ewma * (self.outstanding + 1)
+
+    def is_ejected(self, now: float) -> bool:
+        return now < self.ejected_until
+
+    def record(self, latency: float, success: bool):
+        now = time.monotonic()
+        weight = math.exp(-max(now - self.last_sample, 0.0) / LB_EWMA_DECAY_SECONDS)
+        self.ewma = latency if latency > self.ewma else self.ewma * weight + latency * (1 - weight)
+        self.last_sample = now
+        self.requests += 1
+
+        if success:
+            self.consecutive_failures = 0
+            if not self.is_ejected(now):
+                self.ejections = 0
+            return
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= LB_EJECT_CONSECUTIVE_FAILURES and not self.is_ejected(now):
+            self.ejections += 1
+            duration = min(LB_EJECT_BASE_SECONDS * self.ejections, LB_EJECT_MAX_SECONDS)
+            self.ejected_until = now + duration
+            self.consecutive_failures = 0
+            logger.warning(f"⚠️  Ejecting upstream {self.url} for {duration:.0f}s after repeated failures")
+
+    def decay_idle(self, reference: float):
+        """Pull an idle upstream's latency toward `reference` so it is tried again"""
+        now = time.monotonic()
+        if self.outstanding == 0 and now - self.last_sample > LB_EWMA_DECAY_SECONDS:
+            weight = math.exp(-(now - self.last_sample) / LB_EWMA_DECAY_SECONDS)
+            self.ewma = self.ewma * weight + reference * (1 - weight)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            'outstanding': self.outstanding,
+            'ewma_latency_ms': round(self.ewma * 1000, 2),
+            'requests': self.requests,
+            'failures': self.failures,
+            'ejected': self.is_ejected(now),
+            'ejected_for_seconds': round(max(self.ejected_until - now, 0.0), 1)
+        }
+
 class LoadBalancer:
     """
     Production load balancer with intelligent traffic distribution
@@ -29,37 +127,49 @@ class LoadBalancer:
             'flask_app': {
                 'instances': ['http://localhost:5000'],
                 'health_endpoint': '/health',
-                'current_index': 0,
                 'healthy_instances': []
             },
             'trading_engine': {
                 'instances': ['http://localhost:8000'],
                 'health_endpoint': '/docs',
-                'current_index': 0,
                 'healthy_instances': []
             }
         }
         
         self.websocket_targets = ['ws://localhost:8001']
-        self.redis_client = redis.Redis.from_url(
-            os.environ.get('REDIS_URL', 'redis://localhost:6379'),
-            decode_responses=True
-        )
+        redis_url = os.environ.get('REDIS_URL', 'redis://localhost:6379')
+        self.redis_client = redis.Redis.from_url(redis_url, decode_responses=True)
+        # Non-blocking client for per-request work on the event loop
+        self.async_redis = redis_async.Redis.from_url(redis_url, decode_responses=True)
         
-        # Rate limiting
+        # Rate limiting (prefetch: tokens leased in-process for hot clients)
         self.rate_limits = {
-            'api_calls': {'limit': 1000, 'window': 60},  # 1000 requests per minute
-            'trading_orders': {'limit': 100, 'window': 60},  # 100 orders per minute
-            'market_data': {'limit': 10000, 'window': 60}  # 10k market data requests per minute
+            'api_calls': {'limit': 1000, 'window': 60, 'prefetch': 10},  # 1000 requests per minute
+            'trading_orders': {'limit': 100, 'window': 60, 'prefetch': 0},  # 100 orders per minute
+            'market_data': {'limit': 10000, 'window': 60, 'prefetch': 50}  # 10k market data requests per minute
+        }
+        self.rate_limiters = {
+            name: RedisRateLimiter(f"lb:{name}", config['limit'], config['window'], config['prefetch'])
+            for name, config in self.rate_limits.items()
         }
         
+        # Per-instance load/latency state and connection pools
+        self.upstreams: Dict[str, UpstreamStats] = {}
+        for service in self.services.values():
+            for instance_url in service['instances']:
+                self.upstreams[instance_url] = UpstreamStats(instance_url)
+        for target_url in self.websocket_targets:
+            self.upstreams[target_url] = UpstreamStats(target_url)
+        self.sessions: Dict[str, aiohttp.ClientSession] = {}
+        
         # Load balancing metrics
         self.metrics = {
             'total_requests': 0,
             'successful_requests': 0,
             'failed_requests': 0,
             'average_response_time': 0,
-            'service_health': {}
+            'service_health': {},
+            'upstreams': {}
         }
     
     async def start_load_balancer(self):
@@ -103,16 +213,46 @@ class LoadBalancer:
         logger.info("📊 Metrics: http://localhost:9000/lb/metrics")
         logger.info("🏥 Health: http://localhost:9000/lb/health")
     
+    def get_session(self, instance_url: str) -> aiohttp.ClientSession:
+        """Persistent keep-alive connection pool for one upstream instance"""
+        session = self.sessions.get(instance_url)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=LB_POOL_SIZE,
+                keepalive_timeout=LB_KEEPALIVE_TIMEOUT,
+                enable_cleanup_closed=True
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(
+                    total=None, connect=LB_CONNECT_TIMEOUT, sock_read=LB_UPSTREAM_TIMEOUT
+                ),
+                # Bodies are relayed as-is; Content-Encoding stays the client's concern
+                auto_decompress=False,
+                cookie_jar=aiohttp.DummyCookieJar()
+            )
+            self.sessions[instance_url] = session
+        return session
+    
+    async def close(self):
+        """Close all upstream connection pools"""
+        for session in self.sessions.values():
+            await session.close()
+        self.sessions.clear()
+        await self.async_redis.close()
+    
     async def health_check_loop(self):
         """Continuously check service health"""
         while True:
             try:
                 for service_name, service in self.services.items():
-                    healthy_instances = []
-                    
-                    for instance_url in service['instances']:
-                        if await self.check_instance_health(instance_url, service['health_endpoint']):
-                            healthy_instances.append(instance_url)
+                    results = await asyncio.gather(*[
+                        self.check_instance_health(instance_url, service['health_endpoint'])
+                        for instance_url in service['instances']
+                    ])
+                    healthy_instances = [
+                        instance_url for instance_url, healthy in zip(service['instances'], results) if healthy
+                    ]
                     
                     service['healthy_instances'] = healthy_instances
                     self.metrics['service_health'][service_name] = {
@@ -139,16 +279,20 @@ class LoadBalancer:
     async def check_instance_health(self, instance_url: str, health_endpoint: str) -> bool:
         """Check if a service instance is healthy"""
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
-                async with session.get(f"{instance_url}{health_endpoint}") as response:
-                    return response.status == 200
-        except:
+            async with self.get_session(instance_url).get(
+                f"{instance_url}{health_endpoint}", timeout=aiohttp.ClientTimeout(total=5)
+            ) as response:
+                return response.status == 200
+        except Exception:
             return False
     
     async def metrics_collection_loop(self):
         """Collect and update performance metrics"""
         while True:
             try:
+                # Re-rank idle upstreams and publish per-upstream state
+                self.refresh_upstream_stats()
+                
                 # Update Redis-based metrics
                 current_time = datetime.now(timezone.utc)
                 
@@ -172,17 +316,30 @@ class LoadBalancer:
                     hour_ago.timestamp()
                 )
                 
-                await asyncio.sleep(60)  # Update every minute
+                await asyncio.sleep(LB_METRICS_INTERVAL)
                 
             except Exception as e:
                 logger.error(f"Metrics collection error: {e}")
                 await asyncio.sleep(60)
     
+    def refresh_upstream_stats(self):
+        """
+        Decay idle upstreams' latency toward the fleet median and snapshot every upstream
+        Without the decay an instance that was once slow would never receive a request again
+        and its EWMA would never be corrected.
+        """
+        now = time.monotonic()
+        live = sorted(u.ewma for u in self.upstreams.values() if not u.is_ejected(now))
+        if live:
+            median = live[len(live) // 2]
+            for upstream in self.upstreams.values():
+                upstream.decay_idle(median)
+        self.metrics['upstreams'] = {url: u.snapshot() for url, u in self.upstreams.items()}
+    
     @web.middleware
     async def rate_limiting_middleware(self, request, handler):
         """Rate limiting middleware"""
         client_ip = request.remote
-        current_time = time.time()
         
         # Determine rate limit type based on path
         if '/api/trading/' in request.path:
@@ -193,30 +350,18 @@ class LoadBalancer:
             limit_key = 'api_calls'
         
         rate_limit = self.rate_limits[limit_key]
-        
-        # Check rate limit in Redis
-        redis_key = f"rate_limit:{limit_key}:{client_ip}"
-        current_count = self.redis_client.get(redis_key)
-        
-        if current_count is None:
-            # First request in window
-            self.redis_client.setex(redis_key, rate_limit['window'], 1)
-        else:
-            current_count = int(current_count)
-            if current_count >= rate_limit['limit']:
-                # Rate limit exceeded
-                return web.json_response(
-                    {
-                        'error': 'Rate limit exceeded',
-                        'limit': rate_limit['limit'],
-                        'window': rate_limit['window'],
-                        'retry_after': rate_limit['window']
-                    },
-                    status=429
-                )
-            else:
-                # Increment counter
-                self.redis_client.incr(redis_key)
+        result = await self.rate_limiters[limit_key].check_async(client_ip, self.async_redis)
+        if not result.allowed:
+            return web.json_response(
+                {
+                    'error': 'Rate limit exceeded',
+                    'limit': rate_limit['limit'],
+                    'window': rate_limit['window'],
+                    'retry_after': math.ceil(result.retry_after)
+                },
+                status=429,
+                headers={'Retry-After': str(math.ceil(result.retry_after))}
+            )
         
         return await handler(request)
     
@@ -225,9 +370,9 @@ class LoadBalancer:
         """CORS middleware"""
         response = await handler(request)
         
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+        # Streamed (proxied) responses already carry them; their headers are sent
+        if not response.prepared:
+            response.headers.update(CORS_HEADERS)
         
         return response
     
@@ -279,28 +424,38 @@ class LoadBalancer:
                 (1 - alpha) * self.metrics['average_response_time']
             )
     
-    def get_next_instance(self, service_name: str) -> Optional[str]:
-        """Get next healthy instance using round-robin"""
+    def get_next_instance(self, service_name: str, exclude: Optional[str] = None) -> Optional[str]:
+        """Get the least-loaded healthy instance of a service"""
         service = self.services.get(service_name)
         if not service or not service['healthy_instances']:
             return None
         
-        # Round-robin selection
-        healthy_instances = service['healthy_instances']
-        instance = healthy_instances[service['current_index'] % len(healthy_instances)]
-        service['current_index'] += 1
-        
-        return instance
+        candidates = [url for url in service['healthy_instances'] if url != exclude]
+        return self.select_instance(candidates or service['healthy_instances'])
+    
+    def select_instance(self, candidates: List[str]) -> Optional[str]:
+        """
+        Power-of-two-choices over EWMA latency x outstanding requests
+        Ejected outliers are skipped unless every candidate is ejected.
+        """
+        if not candidates:
+            return None
+        now = time.monotonic()
+        available = [url for url in candidates if not self.upstreams[url].is_ejected(now)] or candidates
+        if len(available) > 2:
+            available = random.sample(available, 2)
+        return min(available, key=lambda url: self.upstreams[url].score())
     
     async def handle_api_request(self, request):
         """Handle API requests with load balancing"""
         # Determine target service
         if request.path.startswith('/api/trading/'):
-            target_instance = self.get_next_instance('trading_engine')
+            service_name = 'trading_engine'
             target_path = request.path.replace('/api/trading/', '/api/')
         else:
-            target_instance = self.get_next_instance('flask_app')
+            service_name = 'flask_app'
             target_path = request.path
+        target_instance = self.get_next_instance(service_name)
         
         if not target_instance:
             return web.json_response(
@@ -308,7 +463,7 @@ class LoadBalancer:
                 status=503
             )
         
-        return await self.proxy_request(request, target_instance, target_path)
+        return await self.proxy_request(request, target_instance, target_path, service_name)
     
     async def handle_trading_api(self, request):
         """Handle trading API requests specifically"""
@@ -323,7 +478,7 @@ class LoadBalancer:
         # Remove /api/trading prefix and add /api prefix
         target_path = '/api/' + request.match_info['path']
         
-        return await self.proxy_request(request, target_instance, target_path)
+        return await self.proxy_request(request, target_instance, target_path, 'trading_engine')
     
     async def handle_web_request(self, request):
         """Handle web requests (HTML pages)"""
@@ -336,49 +491,76 @@ class LoadBalancer:
                 content_type='text/html'
             )
         
-        return await self.proxy_request(request, target_instance, request.path)
+        return await self.proxy_request(request, target_instance, request.path, 'flask_app')
     
-    async def proxy_request(self, request, target_instance: str, target_path: str):
-        """Proxy request to target instance"""
-        try:
-            target_url = f"{target_instance}{target_path}"
-            
-            # Prepare headers (remove host header to avoid conflicts)
-            headers = dict(request.headers)
-            headers.pop('Host', None)
-            
-            # Get request body
-            body = None
-            if request.method in ['POST', 'PUT', 'PATCH']:
-                body = await request.read()
-            
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
-                async with session.request(
+    async def proxy_request(self, request, target_instance: str, target_path: str,
+                            service_name: Optional[str] = None):
+        """
+        Proxy request to target instance
+        Request and response bodies are streamed through the instance's pooled connection. An
+        idempotent request without a body that fails to connect is retried once on another instance.
+        """
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+        has_body = request.body_exists and request.method not in ('GET', 'HEAD', 'OPTIONS')
+        
+        attempts = 1 if has_body or service_name is None else 2
+        for attempt in range(attempts):
+            upstream = self.upstreams.setdefault(target_instance, UpstreamStats(target_instance))
+            upstream.outstanding += 1
+            start_time = time.monotonic()
+            response = None
+            try:
+                async with self.get_session(target_instance).request(
                     method=request.method,
-                    url=target_url,
+                    url=f"{target_instance}{target_path}",
                     headers=headers,
                     params=request.query,
-                    data=body
-                ) as response:
-                    
-                    # Read response
-                    response_body = await response.read()
+                    data=request.content if has_body else None,
+                    allow_redirects=False
+                ) as upstream_response:
+                    response = web.StreamResponse(status=upstream_response.status)
+                    for name, value in upstream_response.headers.items():
+                        if name.lower() not in HOP_BY_HOP_HEADERS:
+                            response.headers.add(name, value)
+                    # Headers are sent on prepare, so CORS headers must be set here
+                    response.headers.update(CORS_HEADERS)
+                    await response.prepare(request)
                     
-                    # Create response
-                    result = web.Response(
-                        body=response_body,
-                        status=int(response.status),
-                        headers=response.headers
-                    )
+                    async for chunk in upstream_response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                        await response.write(chunk)
+                    await response.write_eof()
                     
-                    return result
+                    upstream.record(time.monotonic() - start_time, upstream_response.status < 500)
+                    return response
                     
-        except Exception as e:
-            logger.error(f"Proxy request failed: {e}")
-            return web.json_response(
-                {'error': 'Request failed', 'details': str(e)},
-                status=502
-            )
+            except (aiohttp.ClientConnectorError, aiohttp.ServerDisconnectedError) as e:
+                upstream.record(time.monotonic() - start_time, False)
+                if response is None and attempt + 1 < attempts:
+                    retry_instance = self.get_next_instance(service_name, exclude=target_instance)
+                    if retry_instance and retry_instance != target_instance:
+                        logger.warning(f"Upstream {target_instance} unreachable ({e}), retrying on {retry_instance}")
+                        target_instance = retry_instance
+                        continue
+                return self.proxy_error(response, e)
+            except ConnectionResetError:
+                # The client went away mid-response; not the upstream's fault
+                return response
+            except Exception as e:
+                upstream.record(time.monotonic() - start_time, False)
+                return self.proxy_error(response, e)
+            finally:
+                upstream.outstanding -= 1
+    
+    @staticmethod
+    def proxy_error(response, error):
+        """502 for a failed proxy request (or the already-started response, which is cut short)"""
+        logger.error(f"Proxy request failed: {error}")
+        if response is not None and response.prepared:
+            return response
+        return web.json_response(
+            {'error': 'Request failed', 'details': str(error)},
+            status=502
+        )
     
     async def handle_websocket(self, request):
         """Handle WebSocket connections with load balancing"""
@@ -387,42 +569,46 @@ class LoadBalancer:
         
         # Connect to backend WebSocket
         backend_ws = None
+        target_url = self.select_instance(self.websocket_targets)
+        upstream = self.upstreams[target_url]
+        upstream.outstanding += 1
         try:
-            # Simple round-robin for WebSocket targets
-            target_url = random.choice(self.websocket_targets)
+            start_time = time.monotonic()
+            backend_ws = await self.get_session(target_url).ws_connect(target_url)
+            upstream.record(time.monotonic() - start_time, True)
             
-            async with aiohttp.ClientSession() as session:
-                backend_ws = await session.ws_connect(target_url)
-                
-                # Create bidirectional proxy
-                async def forward_to_backend():
-                    async for msg in ws:
-                        if msg.type == WSMsgType.TEXT:
-                            await backend_ws.send_str(msg.data)
-                        elif msg.type == WSMsgType.BINARY:
-                            await backend_ws.send_bytes(msg.data)
-                        elif msg.type == WSMsgType.ERROR:
-                            break
-                
-                async def forward_to_client():
-                    async for msg in backend_ws:
-                        if msg.type == WSMsgType.TEXT:
-                            await ws.send_str(msg.data)
-                        elif msg.type == WSMsgType.BINARY:
-                            await ws.send_bytes(msg.data)
-                        elif msg.type == WSMsgType.ERROR:
-                            break
-                
-                # Run both directions concurrently
-                await asyncio.gather(
-                    forward_to_backend(),
-                    forward_to_client(),
-                    return_exceptions=True
-                )
+            # Create bidirectional proxy
+            async def forward_to_backend():
+                async for msg in ws:
+                    if msg.type == WSMsgType.TEXT:
+                        await backend_ws.send_str(msg.data)
+                    elif msg.type == WSMsgType.BINARY:
+                        await backend_ws.send_bytes(msg.data)
+                    elif msg.type == WSMsgType.ERROR:
+                        break
+            
+            async def forward_to_client():
+                async for msg in backend_ws:
+                    if msg.type == WSMsgType.TEXT:
+                        await ws.send_str(msg.data)
+                    elif msg.type == WSMsgType.BINARY:
+                        await ws.send_bytes(msg.data)
+                    elif msg.type == WSMsgType.ERROR:
+                        break
+            
+            # Run both directions concurrently
+            await asyncio.gather(
+                forward_to_backend(),
+                forward_to_client(),
+                return_exceptions=True
+            )
                 
         except Exception as e:
+            if backend_ws is None:
+                upstream.record(time.monotonic() - start_time, False)
             logger.error(f"WebSocket proxy error: {e}")
         finally:
+            upstream.outstanding -= 1
             if backend_ws:
                 await backend_ws.close()
             if not ws.closed:
@@ -458,7 +644,9 @@ class LoadBalancer:
                 'uptime': time.time(),
                 'version': '1.0.0',
                 'features': [
-                    'Round-robin load balancing',
+                    'Least-loaded (EWMA latency) load balancing',
+                    'Pooled upstream connections',
+                    'Passive outlier ejection',
                     'Health checking',
                     'Rate limiting',
                     'WebSocket proxying',
@@ -474,6 +662,7 @@ class LoadBalancer:
                 'total_instances': len(service['instances']),
                 'healthy_instances': len(service['healthy_instances']),
                 'instances': service['instances'],
+                'upstreams': {url: self.upstreams[url].snapshot() for url in service['instances']},
                 'health_ratio': (
                     len(service['healthy_instances']) / len(service['instances'])
                     if service['instances'] else 0
@@ -489,14 +678,19 @@ async def start_load_balancer():
     """Start the production load balancer"""
     await load_balancer.start_load_balancer()
 
-if __name__ == "__main__":
+async def run_load_balancer():
+    """Start the load balancer and keep its event loop (and connection pools) alive"""
+    await start_load_balancer()
     try:
-        asyncio.run(start_load_balancer())
-        
-        # Keep running
         while True:
-            time.sleep(60)
+            await asyncio.sleep(60)
             logger.info("💓 Load balancer heartbeat")
+    finally:
+        await load_balancer.close()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run_load_balancer())
             
     except KeyboardInterrupt:
         logger.info("🛑 Load balancer shutting down...")
@@ -0,0 +1,126 @@
+"""
+Add compact vector columns and indexes for RAG similarity search
+Revision: 0004
+Revises: 0003
+Create Date: 2026-10-16
+
+- embedding_f32: L2-normalized float32 copy of the JSON embedding (always added, used by the NumPy fallback)
+- embedding_vec: pgvector column kept in sync by trigger, with an HNSW cosine index (only when the
+  vector extension is available)
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import Inspector
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+VECTOR_TABLES = ['portfolio_document_chunks', 'portfolio_knowledge_base', 'portfolio_asset_embeddings']
+EMBEDDING_DIMENSIONS = 1536
+
+
+def _backfill_f32(connection, table_name):
+    """Populate embedding_f32 from the JSON embedding in batches"""
+    import json
+    import numpy as np
+
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.text(
+            f"SELECT id, embedding FROM {table_name} "
+            f"WHERE id > :last_id AND embedding IS NOT NULL AND embedding_f32 IS NULL "
+            f"ORDER BY id LIMIT 500"
+        ), {'last_id': last_id}).fetchall()
+        if not rows:
+            return
+        for row_id, embedding in rows:
+            if isinstance(embedding, str):
+                embedding = json.loads(embedding)
+            vector = np.asarray(embedding, dtype=np.float32)
+            norm = float(np.linalg.norm(vector))
+            if norm > 0:
+                connection.execute(
+                    sa.text(f"UPDATE {table_name} SET embedding_f32 = :blob WHERE id = :id"),
+                    {'blob': (vector / norm).tobytes(), 'id': row_id}
+                )
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    """Add embedding_f32 everywhere and pgvector columns/indexes where supported"""
+
+    connection = op.get_bind()
+    inspector = Inspector.from_engine(connection)
+
+    tables = [t for t in VECTOR_TABLES if inspector.has_table(t)]
+    for table_name in tables:
+        columns = [col['name'] for col in inspector.get_columns(table_name)]
+        if 'embedding_f32' not in columns:
+            op.add_column(table_name, sa.Column('embedding_f32', sa.LargeBinary(), nullable=True))
+        _backfill_f32(connection, table_name)
+
+    if connection.dialect.name != 'postgresql':
+        print("Not PostgreSQL, skipping pgvector columns")
+        return
+
+    try:
+        with connection.begin_nested():
+            op.execute('CREATE EXTENSION IF NOT EXISTS vector')
+    except Exception as e:
+        print(f"pgvector extension unavailable, similarity search will use the float32 fallback: {e}")
+        return
+
+    for table_name in tables:
+        columns = [col['name'] for col in inspector.get_columns(table_name)]
+        if 'embedding_vec' not in columns:
+            op.execute(f'ALTER TABLE {table_name} ADD COLUMN embedding_vec vector({EMBEDDING_DIMENSIONS})')
+
+        # Keep the vector column in sync with the JSON column the application writes
+        op.execute(f"""
+            CREATE OR REPLACE FUNCTION {table_name}_embedding_vec_sync() RETURNS trigger AS $$
+            BEGIN
+                IF NEW.embedding IS NULL THEN
+                    NEW.embedding_vec := NULL;
+                ELSE
+                    NEW.embedding_vec := (NEW.embedding::text)::vector;
+                END IF;
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        op.execute(f'DROP TRIGGER IF EXISTS {table_name}_embedding_vec_sync ON {table_name}')
+        op.execute(f"""
+            CREATE TRIGGER {table_name}_embedding_vec_sync
+            BEFORE INSERT OR UPDATE OF embedding ON {table_name}
+            FOR EACH ROW EXECUTE FUNCTION {table_name}_embedding_vec_sync()
+        """)
+        op.execute(f"""
+            UPDATE {table_name} SET embedding_vec = (embedding::text)::vector
+            WHERE embedding IS NOT NULL AND embedding_vec IS NULL
+        """)
+        op.execute(
+            f'CREATE INDEX IF NOT EXISTS ix_{table_name}_embedding_vec ON {table_name} '
+            f'USING hnsw (embedding_vec vector_cosine_ops)'
+        )
+        print(f"Added pgvector column and HNSW index on {table_name}")
+
+
+def downgrade():
+    """Remove vector columns, triggers and indexes"""
+
+    connection = op.get_bind()
+    inspector = Inspector.from_engine(connection)
+
+    for table_name in VECTOR_TABLES:
+        if not inspector.has_table(table_name):
+            continue
+        columns = [col['name'] for col in inspector.get_columns(table_name)]
+        if 'embedding_vec' in columns:
+            op.execute(f'DROP INDEX IF EXISTS ix_{table_name}_embedding_vec')
+            op.execute(f'DROP TRIGGER IF EXISTS {table_name}_embedding_vec_sync ON {table_name}')
+            op.execute(f'DROP FUNCTION IF EXISTS {table_name}_embedding_vec_sync()')
+            op.drop_column(table_name, 'embedding_vec')
+        if 'embedding_f32' in columns:
+            op.drop_column(table_name, 'embedding_f32')
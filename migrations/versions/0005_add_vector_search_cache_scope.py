@@ -0,0 +1,44 @@
+"""
+Add scope and data signature to vector_search_cache for semantic query-result caching
+Revision: 0005
+Revises: 0004
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import Inspector
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add scope/data_signature columns and the lookup index"""
+    
+    connection = op.get_bind()
+    inspector = Inspector.from_engine(connection)
+    
+    if not inspector.has_table('vector_search_cache'):
+        print("Table 'vector_search_cache' does not exist, skipping")
+        return
+    
+    columns = [col['name'] for col in inspector.get_columns('vector_search_cache')]
+    if 'scope' not in columns:
+        op.add_column('vector_search_cache', sa.Column('scope', sa.String(100), nullable=True))
+    if 'data_signature' not in columns:
+        op.add_column('vector_search_cache', sa.Column('data_signature', sa.String(64), nullable=True))
+    
+    op.execute(
+        'CREATE INDEX IF NOT EXISTS ix_vector_search_cache_user_scope '
+        'ON vector_search_cache (user_id, scope, data_signature)'
+    )
+
+
+def downgrade():
+    """Remove scope/data_signature columns"""
+    
+    op.execute('DROP INDEX IF EXISTS ix_vector_search_cache_user_scope')
+    op.drop_column('vector_search_cache', 'data_signature')
+    op.drop_column('vector_search_cache', 'scope')
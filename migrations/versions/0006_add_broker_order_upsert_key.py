@@ -0,0 +1,46 @@
+"""
+Add unique (broker_account_id, broker_order_id) index used as the broker order upsert target
+Revision: 0006
+Revises: 0005
+Create Date: 2026-10-16
+"""
+from alembic import op
+from sqlalchemy import Inspector
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Remove duplicate broker orders, then add the unique index"""
+
+    connection = op.get_bind()
+    inspector = Inspector.from_engine(connection)
+
+    if not inspector.has_table('broker_orders'):
+        print("Table 'broker_orders' does not exist, skipping")
+        return
+
+    # Keep the most recent row for each broker order
+    op.execute("""
+        DELETE FROM broker_orders
+        WHERE broker_order_id IS NOT NULL
+          AND id NOT IN (
+            SELECT MAX(id) FROM broker_orders
+            WHERE broker_order_id IS NOT NULL
+            GROUP BY broker_account_id, broker_order_id
+          )
+    """)
+
+    op.execute(
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_broker_orders_account_order '
+        'ON broker_orders (broker_account_id, broker_order_id)'
+    )
+
+
+def downgrade():
+    """Remove the unique index"""
+
+    op.execute('DROP INDEX IF EXISTS uq_broker_orders_account_order')
@@ -0,0 +1,35 @@
+"""
+Add float32 query embedding to vector_search_cache for near-duplicate lookups
+Revision: 0007
+Revises: 0006
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import Inspector
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add the query_embedding_f32 column"""
+    
+    connection = op.get_bind()
+    inspector = Inspector.from_engine(connection)
+    
+    if not inspector.has_table('vector_search_cache'):
+        print("Table 'vector_search_cache' does not exist, skipping")
+        return
+    
+    columns = [col['name'] for col in inspector.get_columns('vector_search_cache')]
+    if 'query_embedding_f32' not in columns:
+        op.add_column('vector_search_cache', sa.Column('query_embedding_f32', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    """Remove the query_embedding_f32 column"""
+    
+    op.drop_column('vector_search_cache', 'query_embedding_f32')
@@ -2667,6 +2667,37 @@ class ResearchCache(db.Model):
             return cache
         return None
     
+    @classmethod
+    def get_valid_caches(cls, cache_keys, tenant_id='live'):
+        """Get valid cached results for many keys in one query, as {cache_key: cache}"""
+        if not cache_keys:
+            return {}
+        
+        now = datetime.utcnow()
+        caches = cls.query.filter(
+            cls.cache_key.in_(cache_keys),
+            cls.tenant_id == tenant_id,
+            cls.is_valid == True,
+            cls.expires_at > now
+        ).all()
+        return {cache.cache_key: cache for cache in caches}
+    
+    @classmethod
+    def record_hits(cls, cache_keys, tenant_id='live'):
+        """
+        Count cache hits in one UPDATE on its own connection and transaction, so the
+        caller's session (and any work pending on it) is neither flushed nor committed
+        """
+        if not cache_keys:
+            return
+        
+        with db.engine.begin() as connection:
+            connection.execute(
+                cls.__table__.update()
+                .where(cls.cache_key.in_(list(cache_keys)), cls.tenant_id == tenant_id)
+                .values(hit_count=db.func.coalesce(cls.hit_count, 0) + 1, last_hit_at=datetime.utcnow())
+            )
+    
     def __repr__(self):
         return f'<ResearchCache {self.symbol} Score:{self.overall_score} Hits:{self.hit_count}>'
 
@@ -265,6 +265,10 @@ class BrokerPosition(db.Model):
 class BrokerOrder(db.Model):
     """Orders placed through broker accounts"""
     __tablename__ = 'broker_orders'
+    __table_args__ = (
+        # Conflict target for the bulk order upsert during broker sync
+        db.Index('uq_broker_orders_account_order', 'broker_account_id', 'broker_order_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     tenant_id = db.Column(db.String(255), db.ForeignKey('tenants.id'), nullable=True, default='live', index=True)
@@ -6,7 +6,7 @@ Stores embeddings and document chunks for intelligent search and analysis
 from app import db
 from datetime import datetime
 from sqlalchemy.dialects.postgresql import ARRAY
-from sqlalchemy import Text
+from sqlalchemy import Text, event
 
 
 class PortfolioDocumentChunk(db.Model):
@@ -33,6 +33,7 @@ class PortfolioDocumentChunk(db.Model):
     # Embedding (stored as JSON array for compatibility)
     # Using 1536 dimensions for OpenAI ada-002 embeddings
     embedding = db.Column(db.JSON, nullable=True)  # [0.123, -0.456, ...] 1536 floats
+    embedding_f32 = db.Column(db.LargeBinary, nullable=True)  # L2-normalized float32 copy for search
     
     # Metadata for filtering (renamed to avoid SQLAlchemy reserved word)
     document_metadata = db.Column(db.JSON, nullable=True)  # Flexible storage for additional data
@@ -78,6 +79,7 @@ class PortfolioKnowledgeBase(db.Model):
     
     # For RAG retrieval
     embedding = db.Column(db.JSON, nullable=True)  # Title + content embedding
+    embedding_f32 = db.Column(db.LargeBinary, nullable=True)  # L2-normalized float32 copy for search
     
     # Categorization
     category = db.Column(db.String(100), nullable=True, index=True)  # holdings, trades, analysis, research
@@ -181,6 +183,7 @@ class PortfolioAssetEmbedding(db.Model):
     
     # Vector embedding (1536 dimensions for OpenAI ada-002)
     embedding = db.Column(db.JSON, nullable=True)  # [0.123, -0.456, ...] 1536 floats
+    embedding_f32 = db.Column(db.LargeBinary, nullable=True)  # L2-normalized float32 copy for search
     
     # Metadata (flexible storage for asset-specific details)
     asset_metadata = db.Column(db.JSON, nullable=True)  # sector, industry, risk_level, maturity_date, etc.
@@ -217,6 +220,9 @@ class VectorSearchCache(db.Model):
     query_text = db.Column(Text, nullable=False)
     query_hash = db.Column(db.String(64), nullable=False, index=True)  # For quick lookup
     query_embedding = db.Column(db.JSON, nullable=True)
+    query_embedding_f32 = db.Column(db.LargeBinary, nullable=True)  # L2-normalized float32 query vector
+    scope = db.Column(db.String(100), nullable=True)  # Searched table + filters + top_k
+    data_signature = db.Column(db.String(64), nullable=True)  # Row count/id sum/max(updated_at) of searched rows when cached
     
     # Results
     result_chunk_ids = db.Column(ARRAY(db.Integer), nullable=True)
@@ -231,8 +237,35 @@ class VectorSearchCache(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     expires_at = db.Column(db.DateTime, nullable=False, index=True)  # Cache expiry
     
+    __table_args__ = (
+        db.Index('ix_vector_search_cache_user_scope', 'user_id', 'scope', 'data_signature'),
+    )
+    
     # Relationships
     user = db.relationship('User', backref='search_cache')
     
     def __repr__(self):
         return f'<SearchCache {self.id}: {self.query_text[:50]}>'
+
+
+def embedding_to_f32(embedding):
+    """L2-normalized float32 bytes for an embedding list (None if empty)"""
+    import numpy as np
+    if not embedding:
+        return None
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return (vector / norm).tobytes() if norm > 0 else None
+
+
+def _sync_embedding_f32(mapper, connection, target):
+    """Keep embedding_f32 in step with the JSON embedding on every write"""
+    from sqlalchemy import inspect
+    state = inspect(target)
+    if state.pending or state.attrs.embedding.history.has_changes():
+        target.embedding_f32 = embedding_to_f32(target.embedding)
+
+
+for _model in (PortfolioDocumentChunk, PortfolioKnowledgeBase, PortfolioAssetEmbedding):
+    event.listen(_model, 'before_insert', _sync_embedding_f32)
+    event.listen(_model, 'before_update', _sync_embedding_f32)
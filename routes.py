@@ -1229,20 +1229,16 @@ def dashboard():
 def api_realtime_indices():
     """API endpoint for real-time NSE indices data with caching"""
     try:
-        from caching.redis_cache import get_cache
-        cache = get_cache()
+        from caching.tiered_cache import get_tiered_cache
+        computed = []
         
-        if cache.is_available():
-            cached_data = cache.get_market_indices()
-            if cached_data:
-                cached_data['cached'] = True
-                return jsonify(cached_data)
+        def load():
+            computed.append(True)
+            return get_live_market_data()
         
-        data = get_live_market_data()
-        
-        if cache.is_available():
-            cache.set_market_indices(data, expiry=60)
-        data['cached'] = False
+        # L1/Redis with single-flight refresh; stale indices are served while one worker refetches
+        data = dict(get_tiered_cache().get_or_compute('market_indices', load, expiry=60))
+        data['cached'] = not computed
         return jsonify(data)
     except Exception as e:
         return jsonify({
@@ -1255,22 +1251,16 @@ def api_realtime_indices():
 def api_realtime_stock(symbol):
     """API endpoint for real-time stock data with caching"""
     try:
-        from caching.redis_cache import get_cache
-        cache = get_cache()
-        
+        from caching.tiered_cache import get_tiered_cache
         symbol_upper = symbol.upper()
+        computed = []
         
-        if cache.is_available():
-            cached_data = cache.get_market_data(symbol_upper)
-            if cached_data:
-                cached_data['cached'] = True
-                return jsonify(cached_data)
+        def load():
+            computed.append(True)
+            return get_stock_quote(symbol_upper)
         
-        data = get_stock_quote(symbol_upper)
-        
-        if cache.is_available():
-            cache.set_market_data(symbol_upper, data, expiry=60)
-        data['cached'] = False
+        data = dict(get_tiered_cache().get_or_compute(f'stock_price:{symbol_upper}', load, expiry=60))
+        data['cached'] = not computed
         return jsonify(data)
     except Exception as e:
         return jsonify({
@@ -2408,7 +2398,6 @@ def delete_equity_holding(holding_id):
 def refresh_equity_prices():
     """Refresh current market prices for all manual equity holdings"""
     from models import ManualEquityHolding
-    from services.nse_realtime_service import get_stock_quote
 
     holdings = ManualEquityHolding.query.filter_by(
         user_id=current_user.id,
@@ -2417,10 +2406,22 @@ def refresh_equity_prices():
 
     updated = 0
     total = len(holdings)
+    try:
+        from services.nse_service import FALLBACK_DATA_SOURCE
+        columns = nse_service.get_batch_quotes([h.symbol for h in holdings if h.symbol])['columns']
+        # Skip made-up last-resort prices; those holdings keep their previous price
+        prices = {
+            symbol: price
+            for symbol, price, source in zip(columns['symbol'], columns['current_price'], columns['data_source'])
+            if source != FALLBACK_DATA_SOURCE
+        }
+    except Exception as e:
+        logger.error(f"Batch quote fetch failed while refreshing prices: {e}")
+        prices = {}
+
     for holding in holdings:
         try:
-            data = get_stock_quote(holding.symbol)
-            price = data.get('price') or data.get('current_price') or data.get('lastPrice')
+            price = prices.get((holding.symbol or '').upper())
             if price and float(price) > 0:
                 holding.current_price = float(price)
                 holding.calculate_totals()
@@ -4030,29 +4031,19 @@ def api_get_stock(symbol):
 def api_market_indices():
     """Get market indices with caching"""
     try:
-        from caching.redis_cache import get_cache
-        cache = get_cache()
+        from caching.tiered_cache import get_tiered_cache
+        computed = []
         
-        cache_key = 'market_indices_full'
-        if cache.is_available():
-            cached_data = cache.get(cache_key)
-            if cached_data:
-                return jsonify({
-                    'success': True,
-                    'data': cached_data,
-                    'last_updated': datetime.now(timezone.utc).isoformat(),
-                    'cached': True
-                })
-        
-        indices = market_data_service.get_market_indices()
+        def load():
+            computed.append(True)
+            return market_data_service.get_market_indices()
         
-        if cache.is_available():
-            cache.set(cache_key, indices, expiry=120)
+        indices = get_tiered_cache().get_or_compute('market_indices_full', load, expiry=120)
         return jsonify({
             'success': True,
             'data': indices,
             'last_updated': datetime.now(timezone.utc).isoformat(),
-            'cached': False
+            'cached': not computed
         })
     except Exception as e:
         logging.error(f"API error for market indices: {str(e)}")
@@ -6271,36 +6262,14 @@ def api_tradingview_history():
         to_timestamp = int(request.args.get('to', '0'))
         
         from services.tradingview_service import tradingview_service
+        from services.bar_store import to_udf
         bars, no_data = tradingview_service.get_bars(symbol, resolution, from_timestamp, to_timestamp)
         
         if no_data:
             return jsonify({'s': 'no_data'})
         
-        # Convert bars to TradingView format
-        times = []
-        opens = []
-        highs = []
-        lows = []
-        closes = []
-        volumes = []
-        
-        for bar in bars:
-            times.append(int(bar['time'] / 1000))  # Convert back to seconds
-            opens.append(bar['open'])
-            highs.append(bar['high'])
-            lows.append(bar['low'])
-            closes.append(bar['close'])
-            volumes.append(bar['volume'])
-        
-        return jsonify({
-            's': 'ok',
-            't': times,
-            'o': opens,
-            'h': highs,
-            'l': lows,
-            'c': closes,
-            'v': volumes
-        })
+        # Columnar arrays straight from the bar store into the UDF response
+        return jsonify(to_udf(bars))
         
     except Exception as e:
         logging.error(f"TradingView history error: {e}")
@@ -11,6 +11,7 @@ from models_broker import (
     ProductType, OrderType
 )
 from services.broker_service import BrokerService, BrokerAPIError
+from services.broker_client_pool import get_broker_client_pool
 from datetime import datetime
 import logging
 
@@ -294,6 +295,7 @@ def api_disconnect_broker(account_id):
         broker_account.connection_status = 'disconnected'
         
         db.session.commit()
+        get_broker_client_pool().invalidate(account_id)
         
         logger.info(f"User {current_user.id} disconnected broker {broker_account.broker_name} (ID: {account_id})")
         
@@ -369,6 +371,7 @@ def api_remove_broker_account(account_id):
         # Delete account and all related data (cascade delete)
         db.session.delete(broker_account)
         db.session.commit()
+        get_broker_client_pool().invalidate(account_id)
         
         return jsonify({
             'success': True,
@@ -1,13 +1,13 @@
 import logging
 import re
 import uuid
-from collections import defaultdict
 from datetime import datetime, timezone
 from functools import wraps
 from flask import Blueprint, request, jsonify, render_template
 from flask_login import login_required, current_user
 
 from app import db
+from services.rate_limiter import RedisRateLimiter
 
 logger = logging.getLogger(__name__)
 
@@ -17,22 +17,16 @@ SYMBOL_RE = re.compile(r'^[A-Z0-9&._-]{1,20}$')
 MAX_QUERY_LENGTH = 2000
 RATE_LIMIT_MAX = 10
 RATE_LIMIT_WINDOW = 3600
+RATE_LIMIT_BURST = 3
 
-_rate_counters: dict = defaultdict(list)
+# Sustained rate lowered by the burst so no hour ever admits more than RATE_LIMIT_MAX
+_workflow_rate_limiter = RedisRateLimiter(
+    'workflow', RATE_LIMIT_MAX - RATE_LIMIT_BURST + 1, RATE_LIMIT_WINDOW, burst=RATE_LIMIT_BURST
+)
 
 
 def _check_rate_limit(user_id: int) -> bool:
-    now = datetime.now(timezone.utc).timestamp()
-    window_start = now - RATE_LIMIT_WINDOW
-    _rate_counters[user_id] = [t for t in _rate_counters[user_id] if t > window_start]
-    if len(_rate_counters[user_id]) >= RATE_LIMIT_MAX:
-        return False
-    _rate_counters[user_id].append(now)
-    if len(_rate_counters) > 1000:
-        stale = [uid for uid, ts in _rate_counters.items() if not ts or ts[-1] < window_start]
-        for uid in stale:
-            del _rate_counters[uid]
-    return True
+    return _workflow_rate_limiter.check(str(user_id)).allowed
 
 
 def rate_limited(f):
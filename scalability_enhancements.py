@@ -13,6 +13,8 @@ import json
 import redis
 from dataclasses import dataclass
 
+from caching.cache_tags import INVALIDATE_TAGS_LUA, TAG_REGISTRY, add_tags, tag_key
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -122,11 +124,13 @@ class CacheOptimizer:
         except Exception as e:
             logger.error(f"❌ Cache initialization failed: {e}")
     
-    async def get_with_fallback(self, key: str, fetch_function, cache_type: str = 'default') -> Any:
-        """Get data with automatic fallback and caching"""
+    async def get_with_fallback(self, key: str, fetch_function, cache_type: str = 'default',
+                                tags: List[str] = None) -> Any:
+        """Get data with automatic fallback and caching (tags allow targeted invalidation)"""
+        strategy = self.cache_strategies.get(cache_type, {'ttl': 300, 'layer': 'L1'})
+        cache_key = f"{strategy['layer']}:{key}"
         try:
-            # Try L1 cache first (Redis)
-            cached_data = await self.redis_client.get(f"L1:{key}")
+            cached_data = await self.redis_client.get(cache_key)
             if cached_data:
                 return json.loads(cached_data)
             
@@ -134,12 +138,10 @@ class CacheOptimizer:
             fresh_data = await fetch_function()
             
             # Cache with appropriate TTL
-            strategy = self.cache_strategies.get(cache_type, {'ttl': 300, 'layer': 'L1'})
-            await self.redis_client.setex(
-                f"{strategy['layer']}:{key}",
-                strategy['ttl'],
-                json.dumps(fresh_data)
-            )
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                pipe.setex(cache_key, strategy['ttl'], json.dumps(fresh_data))
+                add_tags(pipe, cache_key, tags or [], strategy['ttl'])
+                await pipe.execute()
             
             return fresh_data
             
@@ -147,14 +149,17 @@ class CacheOptimizer:
             logger.error(f"Cache fallback error for {key}: {e}")
             return await fetch_function()
     
-    async def invalidate_pattern(self, pattern: str):
-        """Invalidate cache keys matching pattern"""
+    async def invalidate_tags(self, *tags: str) -> int:
+        """Invalidate every cached key carrying any of the tags (e.g. user_tag(id), symbol_tag(sym))"""
+        if not tags:
+            return 0
         try:
-            keys = await self.redis_client.keys(pattern)
-            if keys:
-                await self.redis_client.delete(*keys)
+            return await self.redis_client.eval(
+                INVALIDATE_TAGS_LUA, len(tags), *[tag_key(t) for t in tags], TAG_REGISTRY
+            )
         except Exception as e:
             logger.error(f"Cache invalidation error: {e}")
+            return 0
 
 class WebSocketScaler:
     """Advanced WebSocket connection management for high concurrency"""
@@ -14,6 +14,8 @@ from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Tuple, Any
 import logging
 
+from services.price_history import get_price_history
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -69,9 +71,8 @@ class AgenticAICoordinator:
     def _learn_from_market_data(self, symbol: str) -> Dict[str, Any]:
         """Learn from current market data and patterns"""
         try:
-            stock = yf.Ticker(symbol)
-            data = stock.history(period="1y")
-            info = stock.info
+            data = get_price_history().get_history(symbol, period="1y")
+            info = yf.Ticker(symbol).info
             
             if data.empty:
                 return {"error": "No market data available"}
@@ -98,8 +99,7 @@ class AgenticAICoordinator:
     def _learn_from_historical_patterns(self, symbol: str) -> Dict[str, Any]:
         """Analyze historical patterns to learn long-term behaviors"""
         try:
-            stock = yf.Ticker(symbol)
-            data = stock.history(period="2y")
+            data = get_price_history().get_history(symbol, period="2y")
             
             if len(data) < 50:
                 return {"pattern_confidence": "low", "learnings": []}
@@ -484,8 +484,7 @@ class TradingAgent:
         """Analyze stock and provide trading recommendation"""
         try:
             # Fetch stock data
-            stock = yf.Ticker(symbol)
-            data = stock.history(period=period)
+            data = get_price_history().get_history(symbol, period=period)
             
             if data.empty:
                 return {"error": "No data available for symbol"}
@@ -764,8 +763,7 @@ class SentimentAgent:
         """Analyze overall market sentiment indicators"""
         try:
             # Get stock data for sentiment analysis
-            stock = yf.Ticker(symbol)
-            data = stock.history(period="1mo")
+            data = get_price_history().get_history(symbol, period="1mo")
             
             if data.empty:
                 return {"overall_sentiment": "NEUTRAL"}
@@ -7,6 +7,8 @@ from datetime import datetime
 
 import anthropic
 
+from services.llm_gateway import get_llm_gateway
+
 logger = logging.getLogger(__name__)
 
 
@@ -51,6 +53,20 @@ class AnthropicService:
         if tool_choice:
             kwargs["tool_choice"] = tool_choice
 
+        # Identical requests share one call and a cached response
+        return get_llm_gateway().call(
+            "anthropic",
+            model,
+            {"system": system, "messages": messages, "tools": tools, "tool_choice": tool_choice},
+            lambda: self._create_with_retry(kwargs),
+            namespace="chat",
+            params={"max_tokens": max_tokens, "temperature": temperature},
+            encode=lambda message: message.model_dump(mode="json"),
+            decode=anthropic.types.Message.model_validate,
+            usage=lambda message: (message.usage.input_tokens, message.usage.output_tokens),
+        )
+
+    def _create_with_retry(self, kwargs: Dict[str, Any]) -> anthropic.types.Message:
         last_exc: Optional[Exception] = None
         for attempt in range(1, self.MAX_RETRIES + 1):
             try:
@@ -0,0 +1,274 @@
+"""
+OHLCV Bar Store
+Persistent per-symbol, per-resolution bar files (fixed-width NumPy records, memory-mapped on read)
+with timestamp range queries, resolution roll-up and an incremental yfinance backfill
+"""
+
+import os
+import fcntl
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BAR_STORE_DIR = os.environ.get('BAR_STORE_DIR', os.path.join('data', 'bars'))
+
+# One record per bar: epoch seconds (UTC) + OHLCV, 48 bytes, little-endian
+BAR_DTYPE = np.dtype([
+    ('t', '<i8'),
+    ('o', '<f8'),
+    ('h', '<f8'),
+    ('l', '<f8'),
+    ('c', '<f8'),
+    ('v', '<f8')
+])
+
+# Resolutions persisted on disk, with the yfinance interval and longest period it serves
+STORED_RESOLUTIONS = {
+    '1': ('1m', '7d'),
+    '15': ('15m', '60d'),
+    '60': ('60m', '730d'),
+    '1D': ('1d', 'max')
+}
+
+# Served resolutions that are rolled up on read from a finer stored one
+ROLLUP_SOURCES = {
+    '5': '1',
+    '30': '15',
+    '1W': '1D',
+    '1M': '1D'
+}
+
+IST_OFFSET = 19800  # +05:30
+SESSION_OPEN_UTC = 3 * 3600 + 45 * 60  # 09:15 IST
+
+INDEX_TICKERS = {
+    'NIFTY50': '^NSEI',
+    'BANKNIFTY': '^NSEBANK',
+    'NIFTYNEXT50': '^NSMIDCP',
+    'NIFTYIT': '^CNXIT',
+    'NIFTYPHARMA': '^CNXPHARMA'
+}
+
+EMPTY_BARS = np.empty(0, dtype=BAR_DTYPE)
+
+
+def yfinance_ticker(symbol: str) -> str:
+    """Map an NSE stock or index symbol to its yfinance ticker"""
+    symbol = symbol.upper()
+    return INDEX_TICKERS.get(symbol, f"{symbol}.NS")
+
+
+def _bucket_starts(t: np.ndarray, resolution: str) -> np.ndarray:
+    """Start timestamp of the roll-up bucket each bar falls into (intraday buckets align to 09:15 IST)"""
+    if resolution == '1D':
+        return ((t + IST_OFFSET) // 86400) * 86400 - IST_OFFSET
+    if resolution == '1W':
+        # Weeks start Monday; epoch day 0 was a Thursday
+        days = (t + IST_OFFSET) // 86400
+        return (days - (days + 3) % 7) * 86400 - IST_OFFSET
+    if resolution == '1M':
+        months = (t + IST_OFFSET).astype('datetime64[s]').astype('datetime64[M]')
+        return months.astype('datetime64[s]').astype(np.int64) - IST_OFFSET
+    width = int(resolution) * 60
+    return t - ((t - SESSION_OPEN_UTC) % width)
+
+
+def rollup(bars: np.ndarray, resolution: str) -> np.ndarray:
+    """
+    Aggregate time-sorted bars into a coarser resolution
+    Args:
+        bars: Structured array of BAR_DTYPE
+        resolution: Target resolution ('5', '15', '30', '60', '1D', '1W', '1M')
+    Returns:
+        Structured array of BAR_DTYPE, one record per bucket
+    """
+    if len(bars) == 0:
+        return EMPTY_BARS
+    buckets = _bucket_starts(bars['t'], resolution)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(bars)] - 1
+
+    out = np.empty(len(starts), dtype=BAR_DTYPE)
+    out['t'] = buckets[starts]
+    out['o'] = bars['o'][starts]
+    out['h'] = np.maximum.reduceat(bars['h'], starts)
+    out['l'] = np.minimum.reduceat(bars['l'], starts)
+    out['c'] = bars['c'][ends]
+    out['v'] = np.add.reduceat(bars['v'], starts)
+    return out
+
+
+def frame_to_bars(frame) -> np.ndarray:
+    """Convert a yfinance OHLCV DataFrame into BAR_DTYPE records"""
+    if frame is None or frame.empty:
+        return EMPTY_BARS
+    columns = {str(c).lower(): c for c in frame.columns}
+    bars = np.empty(len(frame), dtype=BAR_DTYPE)
+    bars['t'] = np.asarray([int(ts.timestamp()) for ts in frame.index], dtype=np.int64)
+    for field, name in (('o', 'open'), ('h', 'high'), ('l', 'low'), ('c', 'close')):
+        bars[field] = frame[columns[name]].to_numpy(dtype=float)
+    bars['v'] = frame[columns['volume']].to_numpy(dtype=float) if 'volume' in columns else 0.0
+    bars = bars[~np.isnan(bars['c'])]
+    order = np.argsort(bars['t'], kind='stable')
+    return bars[order]
+
+
+def _backfill_start(last_ts: int, period: str) -> str:
+    """
+    yfinance start date for topping up a stored series: the last stored bar's IST session
+    (re-fetched so a still-forming bar is revised), no further back than the interval serves
+    """
+    start = datetime.fromtimestamp(last_ts + IST_OFFSET, timezone.utc).date()
+    if period.endswith('d'):
+        # Intraday history is only served for the trailing `period` days
+        earliest = (datetime.now(timezone.utc) + timedelta(seconds=IST_OFFSET)).date() - timedelta(days=int(period[:-1]) - 1)
+        start = max(start, earliest)
+    return start.isoformat()
+
+
+def to_udf(bars: np.ndarray) -> Dict[str, Any]:
+    """Serialize bars into the TradingView UDF history response (columnar)"""
+    if len(bars) == 0:
+        return {'s': 'no_data'}
+    return {
+        's': 'ok',
+        't': bars['t'].tolist(),
+        'o': bars['o'].round(2).tolist(),
+        'h': bars['h'].round(2).tolist(),
+        'l': bars['l'].round(2).tolist(),
+        'c': bars['c'].round(2).tolist(),
+        'v': bars['v'].astype(np.int64).tolist()
+    }
+
+
+class BarStore:
+    """
+    Append-only bar files, one per (symbol, stored resolution)
+    Files only ever grow: readers memory-map them, and shrinking a mapped file under a
+    reader makes its next access past the new end of file fault (SIGBUS).
+    """
+
+    def __init__(self, root: str = BAR_STORE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, symbol: str, resolution: str) -> str:
+        return os.path.join(self.root, resolution, f"{symbol.upper()}.bars")
+
+    def _load(self, symbol: str, resolution: str) -> np.ndarray:
+        """Memory-map the whole series read-only (no copy)"""
+        path = self._path(symbol, resolution)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return EMPTY_BARS
+        count = size // BAR_DTYPE.itemsize
+        if count == 0:
+            return EMPTY_BARS
+        return np.memmap(path, dtype=BAR_DTYPE, mode='r', shape=(count,))
+
+    def last_timestamp(self, symbol: str, resolution: str) -> Optional[int]:
+        bars = self._load(symbol, resolution)
+        return int(bars['t'][-1]) if len(bars) else None
+
+    def get_bars(self, symbol: str, resolution: str, from_ts: int, to_ts: int) -> np.ndarray:
+        """
+        Get bars with from_ts <= t <= to_ts
+        Stored resolutions return a memory-mapped slice; others are rolled up from their source.
+        """
+        source = ROLLUP_SOURCES.get(resolution)
+        if source:
+            # Widen to whole buckets so the first bar isn't partial
+            widened = int(_bucket_starts(np.array([from_ts], dtype=np.int64), resolution)[0])
+            bars = rollup(self.get_bars(symbol, source, widened, to_ts), resolution)
+            return bars[bars['t'] >= widened]
+        if resolution not in STORED_RESOLUTIONS:
+            raise ValueError(f"Unsupported resolution: {resolution}")
+
+        bars = self._load(symbol, resolution)
+        if len(bars) == 0:
+            return EMPTY_BARS
+        t = bars['t']
+        start = np.searchsorted(t, from_ts, side='left')
+        end = np.searchsorted(t, to_ts, side='right')
+        return bars[start:end]
+
+    def append(self, symbol: str, resolution: str, bars: np.ndarray) -> int:
+        """
+        Append time-sorted bars to a stored series
+        Bars older than the last stored bar are ignored; a bar with the same timestamp
+        overwrites the last record in place, so a still-forming bar is revised rather than
+        duplicated without ever truncating the file.
+        Returns:
+            Number of records written
+        """
+        if resolution not in STORED_RESOLUTIONS:
+            raise ValueError(f"Unsupported resolution: {resolution}")
+        if len(bars) == 0:
+            return 0
+
+        path = self._path(symbol, resolution)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Not append mode: a revised last bar is written over the last record
+        with self._lock, os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), 'r+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0, os.SEEK_END)
+                count = f.tell() // BAR_DTYPE.itemsize
+                offset = count * BAR_DTYPE.itemsize
+                if count:
+                    f.seek((count - 1) * BAR_DTYPE.itemsize)
+                    last_t = int(np.frombuffer(f.read(BAR_DTYPE.itemsize), dtype=BAR_DTYPE)['t'][0])
+                    bars = bars[bars['t'] >= last_t]
+                    if len(bars) == 0:
+                        return 0
+                    if bars['t'][0] == last_t:
+                        offset -= BAR_DTYPE.itemsize
+                f.seek(offset)
+                f.write(np.ascontiguousarray(bars, dtype=BAR_DTYPE).tobytes())
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return len(bars)
+
+    def backfill(self, symbol: str, resolutions: List[str] = None, tail_only: bool = False) -> Dict[str, int]:
+        """
+        Fetch bars from yfinance for each stored resolution and append what is new
+        Args:
+            symbol: NSE stock or index symbol
+            resolutions: Stored resolutions to fill (default: all)
+            tail_only: For a series with nothing stored yet, fetch only a short recent window
+                (for periodic intraday ingest); stored series always resume from their last bar
+        Returns:
+            Dictionary of resolution -> records written
+        """
+        import yfinance as yf
+
+        ticker = yf.Ticker(yfinance_ticker(symbol))
+        written = {}
+        for resolution in resolutions or STORED_RESOLUTIONS:
+            interval, period = STORED_RESOLUTIONS[resolution]
+            last_ts = self.last_timestamp(symbol, resolution)
+            if last_ts is not None:
+                # Resume from the last stored bar however long ago that was, so outages leave no gaps
+                window = {'start': _backfill_start(last_ts, period)}
+            elif tail_only:
+                window = {'period': '5d' if resolution != '1' else '1d'}
+            else:
+                window = {'period': period}
+            try:
+                bars = frame_to_bars(ticker.history(interval=interval, **window))
+                written[resolution] = self.append(symbol, resolution, bars)
+            except Exception as e:
+                logger.warning(f"Bar backfill failed for {symbol} {resolution}: {e}")
+                written[resolution] = 0
+        return written
+
+
+bar_store = BarStore()
@@ -0,0 +1,209 @@
+"""
+Broker Client Pool
+Per-process pool of connected broker clients keyed by broker account id, so order placement
+and sync reuse an established SDK session instead of decrypting credentials and logging in again
+"""
+
+import os
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+BROKER_POOL_MAX_SIZE = int(os.environ.get('BROKER_POOL_MAX_SIZE', '500'))
+# Sessions unused for this long are dropped
+BROKER_POOL_IDLE_TTL = float(os.environ.get('BROKER_POOL_IDLE_TTL', '900'))
+# A session idle for longer than this is health-checked before it is handed out
+BROKER_POOL_HEALTH_INTERVAL = float(os.environ.get('BROKER_POOL_HEALTH_INTERVAL', '120'))
+# Hard cap on a session's age regardless of activity
+BROKER_SESSION_MAX_AGE = float(os.environ.get('BROKER_SESSION_MAX_AGE', str(8 * 3600)))
+
+IST = timezone(timedelta(hours=5, minutes=30))
+# Daily time (IST) at which each broker invalidates access tokens / sessions
+SESSION_ROLLOVER_IST = {
+    'zerodha': (6, 0),
+    'upstox': (3, 30),
+}
+DEFAULT_SESSION_ROLLOVER_IST = (0, 0)
+
+
+def _last_rollover(broker_type: str, now: datetime) -> float:
+    """Epoch seconds of the broker's most recent daily session rollover"""
+    hour, minute = SESSION_ROLLOVER_IST.get(broker_type, DEFAULT_SESSION_ROLLOVER_IST)
+    current_ist = now.astimezone(IST)
+    rollover = current_ist.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if rollover > current_ist:
+        rollover -= timedelta(days=1)
+    return rollover.timestamp()
+
+
+def credential_fingerprint(broker_account) -> str:
+    """Changes whenever the account's stored (encrypted) credentials change; no decryption needed"""
+    parts = [
+        broker_account.broker_type, broker_account.api_key, broker_account.access_token,
+        broker_account.api_secret, broker_account.last_token_refresh
+    ]
+    return hashlib.sha1('|'.join(str(p) for p in parts).encode()).hexdigest()
+
+
+class _PooledClient:
+    __slots__ = ('client', 'fingerprint', 'connected_at', 'last_used', 'last_checked', 'lock')
+
+    def __init__(self, fingerprint: str):
+        self.client = None
+        self.fingerprint = fingerprint
+        self.connected_at = 0.0
+        self.last_used = 0.0
+        self.last_checked = 0.0
+        # Serializes connect/health check for one account; other accounts are unaffected
+        self.lock = threading.Lock()
+
+
+class BrokerClientPool:
+    """
+    Bounded LRU of connected broker clients
+    A pooled session is replaced when the account's credentials change, when the broker's daily
+    token rollover has passed, when it exceeds BROKER_SESSION_MAX_AGE, or when a health check
+    (run only after BROKER_POOL_HEALTH_INTERVAL of inactivity) fails.
+    """
+
+    def __init__(self, max_size: int = BROKER_POOL_MAX_SIZE, idle_ttl: float = BROKER_POOL_IDLE_TTL,
+                 health_interval: float = BROKER_POOL_HEALTH_INTERVAL, max_age: float = BROKER_SESSION_MAX_AGE):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.health_interval = health_interval
+        self.max_age = max_age
+        self._entries: "OrderedDict[int, _PooledClient]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'connects': 0, 'connect_failures': 0, 'health_failures': 0, 'evictions': 0}
+
+    @contextmanager
+    def lease(self, broker_account):
+        """
+        Connected client for a broker account, held exclusively for the with-block
+        Callers for the same account wait for each other (SDK sessions are not shared
+        between threads); other accounts are unaffected.
+
+        Args:
+            broker_account: BrokerAccount (the client is bound to this instance for the lease)
+
+        Yields:
+            Connected BaseBrokerClient
+
+        Raises:
+            BrokerConnectionError: If the broker cannot be connected
+        """
+        from services.broker_service import BrokerConnectionError
+
+        fingerprint = credential_fingerprint(broker_account)
+        with self._lock:
+            self._evict_idle()
+            entry = self._entries.get(broker_account.id)
+            if entry is None or entry.fingerprint != fingerprint:
+                entry = _PooledClient(fingerprint)
+                self._entries[broker_account.id] = entry
+            self._entries.move_to_end(broker_account.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+        with entry.lock:
+            now = time.time()
+            client = entry.client
+            if client is not None and not self._is_valid(entry, broker_account.broker_type, now):
+                client = None
+            if client is not None and now - entry.last_used > self.health_interval:
+                if self._health_check(client, broker_account.id):
+                    entry.last_checked = now
+                else:
+                    self._count('health_failures')
+                    client = None
+
+            if client is None:
+                client = self._connect(broker_account)
+                if client is None:
+                    self.invalidate(broker_account.id)
+                    raise BrokerConnectionError("Failed to connect to broker")
+                entry.client = client
+                entry.connected_at = entry.last_checked = now
+            else:
+                self._count('hits')
+                # Keep ORM updates from the client (connection status) on the caller's session
+                client.broker_account = broker_account
+
+            entry.last_used = now
+            try:
+                yield client
+            finally:
+                entry.last_used = time.time()
+
+    def invalidate(self, account_id: int):
+        """Drop an account's session (after an API error, credential change or disconnect)"""
+        with self._lock:
+            self._entries.pop(account_id, None)
+
+    def mark_unverified(self, account_id: int):
+        """Health-check an account's session on its next lease (after a broker error that may be a lapsed session)"""
+        with self._lock:
+            entry = self._entries.get(account_id)
+            if entry is not None:
+                # Backdated rather than zeroed so idle eviction still sees it
+                entry.last_used = min(entry.last_used, time.time() - self.health_interval - 1)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size, **self._stats}
+
+    def _is_valid(self, entry: _PooledClient, broker_type: str, now: float) -> bool:
+        if now - entry.connected_at > self.max_age:
+            return False
+        return entry.connected_at >= _last_rollover(broker_type, datetime.fromtimestamp(now, timezone.utc))
+
+    @staticmethod
+    def _health_check(client, account_id: int) -> bool:
+        """A profile fetch proves the session is still accepted by the broker"""
+        try:
+            client.get_profile()
+            return True
+        except Exception as e:
+            logger.info(f"Broker session health check failed for account {account_id}: {e}")
+            return False
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _evict_idle(self):
+        """Drop sessions idle past idle_ttl (called with the pool lock held)"""
+        cutoff = time.time() - self.idle_ttl
+        for account_id in [k for k, e in self._entries.items() if e.last_used and e.last_used < cutoff]:
+            del self._entries[account_id]
+            self._stats['evictions'] += 1
+
+    def _connect(self, broker_account):
+        from services.broker_service import BrokerService
+
+        self._count('connects')
+        client = BrokerService.get_broker_client(broker_account)
+        if client.connect():
+            return client
+        self._count('connect_failures')
+        return None
+
+
+broker_client_pool = BrokerClientPool()
+
+
+def get_broker_client_pool() -> BrokerClientPool:
+    """Get the global broker client pool"""
+    return broker_client_pool
@@ -58,6 +58,7 @@ from models_broker import (
     ProductType, OrderType
 )
 from app import db
+from services.broker_client_pool import get_broker_client_pool
 
 logger = logging.getLogger(__name__)
 
@@ -65,6 +66,10 @@ class BrokerAPIError(Exception):
     """Custom exception for broker API errors"""
     pass
 
+class BrokerConnectionError(BrokerAPIError):
+    """The broker session is missing or was refused (the pooled client must reconnect)"""
+    pass
+
 class BaseBrokerClient(ABC):
     """Abstract base class for broker clients"""
     
@@ -156,7 +161,7 @@ class DhanBrokerClient(BaseBrokerClient):
     def get_holdings(self) -> List[Dict]:
         """Get Dhan holdings"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Dhan")
+            raise BrokerConnectionError("Not connected to Dhan")
         
         try:
             holdings = self._client.get_holdings()
@@ -168,7 +173,7 @@ class DhanBrokerClient(BaseBrokerClient):
     def get_positions(self) -> List[Dict]:
         """Get Dhan positions"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Dhan")
+            raise BrokerConnectionError("Not connected to Dhan")
         
         try:
             positions = self._client.get_positions()
@@ -180,7 +185,7 @@ class DhanBrokerClient(BaseBrokerClient):
     def get_orders(self) -> List[Dict]:
         """Get Dhan orders"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Dhan")
+            raise BrokerConnectionError("Not connected to Dhan")
         
         try:
             orders = self._client.get_order_list()
@@ -192,7 +197,7 @@ class DhanBrokerClient(BaseBrokerClient):
     def place_order(self, order_data: Dict) -> Dict:
         """Place order with Dhan"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Dhan")
+            raise BrokerConnectionError("Not connected to Dhan")
         
         try:
             # Convert our order format to Dhan format
@@ -206,7 +211,7 @@ class DhanBrokerClient(BaseBrokerClient):
     def cancel_order(self, order_id: str) -> Dict:
         """Cancel Dhan order"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Dhan")
+            raise BrokerConnectionError("Not connected to Dhan")
         
         try:
             result = self._client.cancel_order(order_id)
@@ -218,7 +223,7 @@ class DhanBrokerClient(BaseBrokerClient):
     def get_profile(self) -> Dict:
         """Get Dhan profile"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Dhan")
+            raise BrokerConnectionError("Not connected to Dhan")
         
         try:
             profile = self._client.get_profile()
@@ -437,7 +442,7 @@ class ZerodhaBrokerClient(BaseBrokerClient):
     def get_holdings(self) -> List[Dict]:
         """Get Zerodha holdings"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Zerodha")
+            raise BrokerConnectionError("Not connected to Zerodha")
         
         try:
             holdings = self._client.holdings()
@@ -449,7 +454,7 @@ class ZerodhaBrokerClient(BaseBrokerClient):
     def get_positions(self) -> List[Dict]:
         """Get Zerodha positions"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Zerodha")
+            raise BrokerConnectionError("Not connected to Zerodha")
         
         try:
             positions = self._client.positions()
@@ -463,7 +468,7 @@ class ZerodhaBrokerClient(BaseBrokerClient):
     def get_orders(self) -> List[Dict]:
         """Get Zerodha orders"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Zerodha")
+            raise BrokerConnectionError("Not connected to Zerodha")
         
         try:
             orders = self._client.orders()
@@ -475,7 +480,7 @@ class ZerodhaBrokerClient(BaseBrokerClient):
     def place_order(self, order_data: Dict) -> Dict:
         """Place order with Zerodha"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Zerodha")
+            raise BrokerConnectionError("Not connected to Zerodha")
         
         try:
             # Convert our order format to Zerodha format
@@ -489,7 +494,7 @@ class ZerodhaBrokerClient(BaseBrokerClient):
     def cancel_order(self, order_id: str) -> Dict:
         """Cancel Zerodha order"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Zerodha")
+            raise BrokerConnectionError("Not connected to Zerodha")
         
         try:
             result = self._client.cancel_order(variety=self._client.VARIETY_REGULAR, order_id=order_id)
@@ -501,7 +506,7 @@ class ZerodhaBrokerClient(BaseBrokerClient):
     def get_profile(self) -> Dict:
         """Get Zerodha profile"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Zerodha")
+            raise BrokerConnectionError("Not connected to Zerodha")
         
         try:
             profile = self._client.profile()
@@ -728,7 +733,7 @@ class AngelBrokerClient(BaseBrokerClient):
     def get_holdings(self) -> List[Dict]:
         """Get Angel One holdings"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Angel One")
+            raise BrokerConnectionError("Not connected to Angel One")
         
         try:
             holdings = self._client.holding()
@@ -743,7 +748,7 @@ class AngelBrokerClient(BaseBrokerClient):
     def get_positions(self) -> List[Dict]:
         """Get Angel One positions"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Angel One")
+            raise BrokerConnectionError("Not connected to Angel One")
         
         try:
             positions = self._client.position()
@@ -758,7 +763,7 @@ class AngelBrokerClient(BaseBrokerClient):
     def get_orders(self) -> List[Dict]:
         """Get Angel One orders"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Angel One")
+            raise BrokerConnectionError("Not connected to Angel One")
         
         try:
             orders = self._client.orderBook()
@@ -773,7 +778,7 @@ class AngelBrokerClient(BaseBrokerClient):
     def place_order(self, order_data: Dict) -> Dict:
         """Place order with Angel One"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Angel One")
+            raise BrokerConnectionError("Not connected to Angel One")
         
         try:
             # Convert our order format to Angel One format
@@ -795,7 +800,7 @@ class AngelBrokerClient(BaseBrokerClient):
     def cancel_order(self, order_id: str) -> Dict:
         """Cancel Angel One order"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Angel One")
+            raise BrokerConnectionError("Not connected to Angel One")
         
         try:
             result = self._client.cancelOrder(order_id, "NORMAL")
@@ -807,7 +812,7 @@ class AngelBrokerClient(BaseBrokerClient):
     def get_profile(self) -> Dict:
         """Get Angel One profile"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Angel One")
+            raise BrokerConnectionError("Not connected to Angel One")
         
         try:
             profile = self._client.getProfile(self._refresh_token)
@@ -1012,6 +1017,23 @@ class BrokerService:
         else:
             raise BrokerAPIError(f"Unsupported broker type: {broker_account.broker_type}")
     
+    @staticmethod
+    def connected_client(broker_account: BrokerAccount):
+        """Lease a connected client for the account (a with-block), reusing this process's pooled session"""
+        return get_broker_client_pool().lease(broker_account)
+    
+    @staticmethod
+    def _release_after_error(broker_account: BrokerAccount, error: Exception):
+        """
+        Drop the pooled session only when the connection or login failed; after any other
+        error (an order rejection, a failed fetch) the session is health-checked on its next
+        lease instead of paying for a new login
+        """
+        if isinstance(error, BrokerConnectionError):
+            get_broker_client_pool().invalidate(broker_account.id)
+        else:
+            get_broker_client_pool().mark_unverified(broker_account.id)
+    
     @staticmethod
     def add_broker_account(user_id: int, broker_type: BrokerType, credentials: Dict) -> BrokerAccount:
         """Add a new broker account for user"""
@@ -1078,6 +1100,325 @@ class BrokerService:
             logger.error(f"Error adding broker account: {error_msg}")
             logger.error(f"Full traceback: {traceback.format_exc()}")
             raise BrokerAPIError(f"Failed to add broker account: {error_msg}")
+    
+    @staticmethod
+    def sync_broker_data(broker_account: BrokerAccount, data_types: List[str] = None) -> Dict:
+        """Sync data from broker for given account"""
+        if data_types is None:
+            data_types = ['holdings', 'positions', 'orders', 'profile']
+        
+        results = {}
+        start_time = time.time()
+        
+        try:
+            # Broker API calls first, under the client lease; database writes follow
+            with BrokerService.connected_client(broker_account) as client:
+                fetched = BrokerService._fetch_broker_data(client, data_types)
+            
+            # Sync holdings
+            if 'holdings' in data_types:
+                holdings_data = fetched['holdings']
+                BrokerService._sync_holdings(broker_account, holdings_data)
+                results['holdings'] = len(holdings_data)
+            
+            # Sync positions
+            if 'positions' in data_types:
+                positions_data = fetched['positions']
+                BrokerService._sync_positions(broker_account, positions_data)
+                results['positions'] = len(positions_data)
+            
+            # Sync orders
+            if 'orders' in data_types:
+                orders_data = fetched['orders']
+                BrokerService._sync_orders(broker_account, orders_data)
+                results['orders'] = len(orders_data)
+            
+            # Sync profile
+            if 'profile' in data_types:
+                BrokerService._sync_profile(broker_account, fetched['profile'])
+                results['profile'] = 1
+            
+            # Update last sync time
+            broker_account.last_sync = datetime.utcnow()
+            db.session.commit()
+            
+            # Log successful sync
+            sync_duration = time.time() - start_time
+            total_records = sum(results.values())
+            
+            sync_log = BrokerSyncLog(
+                broker_account_id=broker_account.id,
+                sync_type=','.join(data_types),
+                sync_status='success',
+                records_synced=total_records,
+                sync_duration=sync_duration
+            )
+            db.session.add(sync_log)
+            db.session.commit()
+            
+            # Automatically generate embeddings for synced holdings
+            if 'holdings' in data_types:
+                try:
+                    from services.portfolio_embedding_service import PortfolioEmbeddingService
+                    embedding_service = PortfolioEmbeddingService()
+                    embedding_service.generate_embeddings_for_broker_holdings(broker_account.user_id)
+                    logger.info(f"Generated vector embeddings for synced holdings")
+                except Exception as e:
+                    logger.warning(f"Failed to generate embeddings after sync: {e}")
+            
+            logger.info(f"Successfully synced {total_records} records for {broker_account.broker_name}")
+            return results
+            
+        except Exception as e:
+            db.session.rollback()
+            BrokerService._release_after_error(broker_account, e)
+            
+            # Log failed sync
+            sync_duration = time.time() - start_time
+            sync_log = BrokerSyncLog(
+                broker_account_id=broker_account.id,
+                sync_type=','.join(data_types),
+                sync_status='error',
+                error_message=str(e),
+                sync_duration=sync_duration
+            )
+            db.session.add(sync_log)
+            db.session.commit()
+            
+            logger.error(f"Failed to sync broker data: {e}")
+            raise BrokerAPIError(f"Sync failed: {e}")
+    
+    @staticmethod
+    def _fetch_broker_data(client: BaseBrokerClient, data_types: List[str]) -> Dict[str, Any]:
+        """
+        Call the broker API for each requested data type
+        The calls stay on the calling thread: the leased SDK session is not shared between
+        threads, and clients update the account's ORM row on the caller's db.session.
+        """
+        fetchers = {
+            'holdings': client.get_holdings,
+            'positions': client.get_positions,
+            'orders': client.get_orders,
+            'profile': client.get_profile
+        }
+        return {data_type: fetch() for data_type, fetch in fetchers.items() if data_type in data_types}
+    
+    @staticmethod
+    def _reconcile(model, existing: List, incoming: List[Dict], key_fields: Tuple[str, ...],
+                   defaults: Dict[str, Any], on_change=None) -> Dict[str, int]:
+        """
+        Diff broker rows against stored rows by natural key
+        Matching rows are updated in place only where a field changed (keeping their primary key),
+        new keys are inserted and keys the broker no longer reports are deleted.
+        
+        Returns:
+            Counts of inserted, updated, deleted and unchanged rows
+        """
+        columns = set(model.__table__.c.keys())
+        stored = {}
+        counts = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+        
+        for row in existing:
+            key = tuple(getattr(row, field) for field in key_fields)
+            if key in stored:
+                # Duplicate left behind by the old delete-and-reinsert sync
+                db.session.delete(row)
+                counts['deleted'] += 1
+            else:
+                stored[key] = row
+        
+        # Last occurrence of a key wins, as it did when rows were re-inserted in order
+        latest = {}
+        for data in incoming:
+            data = {k: v for k, v in data.items() if k in columns}
+            latest[tuple(data.get(field) for field in key_fields)] = data
+        
+        now = datetime.utcnow()
+        for key, data in latest.items():
+            row = stored.pop(key, None)
+            if row is None:
+                row = model(**{**data, **defaults})
+                if on_change:
+                    on_change(row)
+                db.session.add(row)
+                counts['inserted'] += 1
+                continue
+            
+            changed = False
+            for field, value in data.items():
+                if getattr(row, field) != value:
+                    setattr(row, field, value)
+                    changed = True
+            if changed:
+                if on_change:
+                    on_change(row)
+                row.last_updated = now
+                counts['updated'] += 1
+            else:
+                counts['unchanged'] += 1
+        
+        for row in stored.values():
+            db.session.delete(row)
+            counts['deleted'] += 1
+        
+        return counts
+    
+    @staticmethod
+    def _sync_holdings(broker_account: BrokerAccount, holdings_data: List[Dict]):
+        """Reconcile holdings by (trading_symbol, exchange)"""
+        existing = BrokerHolding.query.filter_by(broker_account_id=broker_account.id).all()
+        counts = BrokerService._reconcile(
+            BrokerHolding, existing, holdings_data,
+            key_fields=('trading_symbol', 'exchange'),
+            defaults={'broker_account_id': broker_account.id},
+            on_change=lambda holding: holding.calculate_pnl()
+        )
+        logger.debug(f"Holdings sync for account {broker_account.id}: {counts}")
+    
+    @staticmethod
+    def _sync_positions(broker_account: BrokerAccount, positions_data: List[Dict]):
+        """Reconcile today's positions by (trading_symbol, exchange, product_type)"""
+        today = datetime.utcnow().date()
+        existing = BrokerPosition.query.filter_by(
+            broker_account_id=broker_account.id,
+            position_date=today
+        ).all()
+        counts = BrokerService._reconcile(
+            BrokerPosition, existing, positions_data,
+            key_fields=('trading_symbol', 'exchange', 'product_type'),
+            defaults={'broker_account_id': broker_account.id, 'position_date': today}
+        )
+        logger.debug(f"Positions sync for account {broker_account.id}: {counts}")
+    
+    @staticmethod
+    def _sync_orders(broker_account: BrokerAccount, orders_data: List[Dict]):
+        """
+        Upsert orders on (broker_account_id, broker_order_id) with INSERT ... ON CONFLICT
+        Orders are written in bulk statements grouped by the fields the broker reported,
+        so a field missing from the broker response never overwrites a stored value.
+        """
+        table = BrokerOrder.__table__
+        columns = set(table.c.keys()) - {'id', 'broker_account_id'}
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            insert = None
+        
+        now = datetime.utcnow()
+        groups: Dict[Tuple[str, ...], Dict[str, Dict]] = {}
+        for order_data in orders_data:
+            row = {k: v for k, v in order_data.items() if k in columns}
+            if not row.get('broker_order_id') or insert is None:
+                # No conflict target - plain insert, as before
+                db.session.add(BrokerOrder(broker_account_id=broker_account.id, **row))
+                continue
+            row['broker_account_id'] = broker_account.id
+            row.setdefault('tenant_id', broker_account.tenant_id)
+            row['last_updated'] = now
+            # Duplicates within one statement would conflict with themselves; last one wins
+            groups.setdefault(tuple(sorted(row)), {})[row['broker_order_id']] = row
+        
+        for fields, rows in groups.items():
+            stmt = insert(table)
+            updates = [f for f in fields if f not in ('broker_account_id', 'broker_order_id', 'tenant_id')]
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['broker_account_id', 'broker_order_id'],
+                set_={field: stmt.excluded[field] for field in updates}
+            )
+            db.session.execute(stmt, list(rows.values()))
+    
+    @staticmethod
+    def _sync_profile(broker_account: BrokerAccount, profile_data: Dict):
+        """Sync profile data to broker account"""
+        broker_account.account_name = profile_data.get('account_name', broker_account.account_name)
+        # Update other profile fields as needed
+    
+    @staticmethod
+    def place_order_via_broker(broker_account: BrokerAccount, order_data: Dict) -> BrokerOrder:
+        """Place order through broker and save to database"""
+        try:
+            # Place order with broker
+            with BrokerService.connected_client(broker_account) as client:
+                response = client.place_order(order_data)
+            
+            if response.get('status') == 'success':
+                # Create order record in database
+                order = BrokerOrder(
+                    broker_account_id=broker_account.id,
+                    broker_order_id=response.get('order_id'),
+                    correlation_id=order_data.get('correlation_id'),
+                    symbol=order_data.get('symbol'),
+                    trading_symbol=order_data.get('trading_symbol'),
+                    exchange=order_data.get('exchange'),
+                    security_id=order_data.get('security_id'),
+                    transaction_type=order_data.get('transaction_type'),
+                    order_type=order_data.get('order_type'),
+                    product_type=order_data.get('product_type'),
+                    quantity=order_data.get('quantity'),
+                    price=order_data.get('price', 0.0),
+                    trigger_price=order_data.get('trigger_price', 0.0),
+                    disclosed_quantity=order_data.get('disclosed_quantity', 0),
+                    order_status=OrderStatus.PENDING,
+                    trading_signal_id=order_data.get('trading_signal_id')
+                )
+                
+                db.session.add(order)
+                db.session.commit()
+                
+                logger.info(f"Order placed successfully: {response.get('order_id')}")
+                return order
+            else:
+                raise BrokerAPIError(f"Order placement failed: {response.get('message')}")
+                
+        except Exception as e:
+            db.session.rollback()
+            if isinstance(e, BrokerAPIError):
+                BrokerService._release_after_error(broker_account, e)
+            logger.error(f"Error placing order: {e}")
+            raise BrokerAPIError(f"Failed to place order: {e}")
+    
+    @staticmethod
+    def get_user_portfolio_summary(user_id: int) -> Dict:
+        """Get consolidated portfolio summary for user across all brokers"""
+        broker_accounts = BrokerAccount.query.filter_by(user_id=user_id, is_active=True).all()
+        
+        summary = {
+            'total_value': 0.0,
+            'total_investment': 0.0,
+            'total_pnl': 0.0,
+            'total_pnl_percentage': 0.0,
+            'holdings_count': 0,
+            'brokers_count': len(broker_accounts),
+            'broker_accounts': []
+        }
+        
+        for account in broker_accounts:
+            holdings = BrokerHolding.query.filter_by(broker_account_id=account.id).all()
+            
+            account_value = sum(h.total_value for h in holdings)
+            account_investment = sum(h.investment_value for h in holdings)
+            account_pnl = sum(h.pnl for h in holdings)
+            
+            summary['total_value'] += account_value
+            summary['total_investment'] += account_investment
+            summary['total_pnl'] += account_pnl
+            summary['holdings_count'] += len(holdings)
+            
+            summary['broker_accounts'].append({
+                'broker_name': account.broker_name,
+                'account_value': account_value,
+                'holdings_count': len(holdings),
+                'connection_status': account.connection_status.value,
+                'last_sync': account.last_sync
+            })
+        
+        if summary['total_investment'] > 0:
+            summary['total_pnl_percentage'] = (summary['total_pnl'] / summary['total_investment']) * 100
+        
+        return summary
 
 # Additional Broker Client Implementations
 class GrowwBrokerClient(BaseBrokerClient):
@@ -1400,241 +1741,6 @@ class GoodwillBrokerClient(BaseBrokerClient):
         
     def get_profile(self) -> Dict:
         return {}
-    
-    @staticmethod
-    def sync_broker_data(broker_account: BrokerAccount, data_types: List[str] = None) -> Dict:
-        """Sync data from broker for given account"""
-        if data_types is None:
-            data_types = ['holdings', 'positions', 'orders', 'profile']
-        
-        client = BrokerService.get_broker_client(broker_account)
-        if not client.connect():
-            raise BrokerAPIError("Failed to connect to broker")
-        
-        results = {}
-        start_time = time.time()
-        
-        try:
-            # Sync holdings
-            if 'holdings' in data_types:
-                holdings_data = client.get_holdings()
-                BrokerService._sync_holdings(broker_account, holdings_data)
-                results['holdings'] = len(holdings_data)
-            
-            # Sync positions
-            if 'positions' in data_types:
-                positions_data = client.get_positions()
-                BrokerService._sync_positions(broker_account, positions_data)
-                results['positions'] = len(positions_data)
-            
-            # Sync orders
-            if 'orders' in data_types:
-                orders_data = client.get_orders()
-                BrokerService._sync_orders(broker_account, orders_data)
-                results['orders'] = len(orders_data)
-            
-            # Sync profile
-            if 'profile' in data_types:
-                profile_data = client.get_profile()
-                BrokerService._sync_profile(broker_account, profile_data)
-                results['profile'] = 1
-            
-            # Update last sync time
-            broker_account.last_sync = datetime.utcnow()
-            db.session.commit()
-            
-            # Log successful sync
-            sync_duration = time.time() - start_time
-            total_records = sum(results.values())
-            
-            sync_log = BrokerSyncLog(
-                broker_account_id=broker_account.id,
-                sync_type=','.join(data_types),
-                sync_status='success',
-                records_synced=total_records,
-                sync_duration=sync_duration
-            )
-            db.session.add(sync_log)
-            db.session.commit()
-            
-            # Automatically generate embeddings for synced holdings
-            if 'holdings' in data_types:
-                try:
-                    from services.portfolio_embedding_service import PortfolioEmbeddingService
-                    embedding_service = PortfolioEmbeddingService()
-                    embedding_service.generate_embeddings_for_broker_holdings(broker_account.user_id)
-                    logger.info(f"Generated vector embeddings for synced holdings")
-                except Exception as e:
-                    logger.warning(f"Failed to generate embeddings after sync: {e}")
-            
-            logger.info(f"Successfully synced {total_records} records for {broker_account.broker_name}")
-            return results
-            
-        except Exception as e:
-            db.session.rollback()
-            
-            # Log failed sync
-            sync_duration = time.time() - start_time
-            sync_log = BrokerSyncLog(
-                broker_account_id=broker_account.id,
-                sync_type=','.join(data_types),
-                sync_status='error',
-                error_message=str(e),
-                sync_duration=sync_duration
-            )
-            db.session.add(sync_log)
-            db.session.commit()
-            
-            logger.error(f"Failed to sync broker data: {e}")
-            raise BrokerAPIError(f"Sync failed: {e}")
-    
-    @staticmethod
-    def _sync_holdings(broker_account: BrokerAccount, holdings_data: List[Dict]):
-        """Sync holdings data to database"""
-        # Clear existing holdings
-        BrokerHolding.query.filter_by(broker_account_id=broker_account.id).delete()
-        
-        # Add new holdings
-        for holding_data in holdings_data:
-            holding = BrokerHolding(
-                broker_account_id=broker_account.id,
-                **holding_data
-            )
-            holding.calculate_pnl()
-            db.session.add(holding)
-    
-    @staticmethod
-    def _sync_positions(broker_account: BrokerAccount, positions_data: List[Dict]):
-        """Sync positions data to database"""
-        # Clear existing positions for today
-        today = datetime.utcnow().date()
-        BrokerPosition.query.filter_by(
-            broker_account_id=broker_account.id,
-            position_date=today
-        ).delete()
-        
-        # Add new positions
-        for position_data in positions_data:
-            position = BrokerPosition(
-                broker_account_id=broker_account.id,
-                position_date=today,
-                **position_data
-            )
-            db.session.add(position)
-    
-    @staticmethod
-    def _sync_orders(broker_account: BrokerAccount, orders_data: List[Dict]):
-        """Sync orders data to database"""
-        for order_data in orders_data:
-            # Check if order already exists
-            existing_order = BrokerOrder.query.filter_by(
-                broker_account_id=broker_account.id,
-                broker_order_id=order_data.get('broker_order_id')
-            ).first()
-            
-            if existing_order:
-                # Update existing order
-                for key, value in order_data.items():
-                    if hasattr(existing_order, key):
-                        setattr(existing_order, key, value)
-            else:
-                # Create new order
-                order = BrokerOrder(
-                    broker_account_id=broker_account.id,
-                    **order_data
-                )
-                db.session.add(order)
-    
-    @staticmethod
-    def _sync_profile(broker_account: BrokerAccount, profile_data: Dict):
-        """Sync profile data to broker account"""
-        broker_account.account_name = profile_data.get('account_name', broker_account.account_name)
-        # Update other profile fields as needed
-    
-    @staticmethod
-    def place_order_via_broker(broker_account: BrokerAccount, order_data: Dict) -> BrokerOrder:
-        """Place order through broker and save to database"""
-        client = BrokerService.get_broker_client(broker_account)
-        if not client.connect():
-            raise BrokerAPIError("Failed to connect to broker")
-        
-        try:
-            # Place order with broker
-            response = client.place_order(order_data)
-            
-            if response.get('status') == 'success':
-                # Create order record in database
-                order = BrokerOrder(
-                    broker_account_id=broker_account.id,
-                    broker_order_id=response.get('order_id'),
-                    correlation_id=order_data.get('correlation_id'),
-                    symbol=order_data.get('symbol'),
-                    trading_symbol=order_data.get('trading_symbol'),
-                    exchange=order_data.get('exchange'),
-                    security_id=order_data.get('security_id'),
-                    transaction_type=order_data.get('transaction_type'),
-                    order_type=order_data.get('order_type'),
-                    product_type=order_data.get('product_type'),
-                    quantity=order_data.get('quantity'),
-                    price=order_data.get('price', 0.0),
-                    trigger_price=order_data.get('trigger_price', 0.0),
-                    disclosed_quantity=order_data.get('disclosed_quantity', 0),
-                    order_status=OrderStatus.PENDING,
-                    trading_signal_id=order_data.get('trading_signal_id')
-                )
-                
-                db.session.add(order)
-                db.session.commit()
-                
-                logger.info(f"Order placed successfully: {response.get('order_id')}")
-                return order
-            else:
-                raise BrokerAPIError(f"Order placement failed: {response.get('message')}")
-                
-        except Exception as e:
-            db.session.rollback()
-            logger.error(f"Error placing order: {e}")
-            raise BrokerAPIError(f"Failed to place order: {e}")
-    
-    @staticmethod
-    def get_user_portfolio_summary(user_id: int) -> Dict:
-        """Get consolidated portfolio summary for user across all brokers"""
-        broker_accounts = BrokerAccount.query.filter_by(user_id=user_id, is_active=True).all()
-        
-        summary = {
-            'total_value': 0.0,
-            'total_investment': 0.0,
-            'total_pnl': 0.0,
-            'total_pnl_percentage': 0.0,
-            'holdings_count': 0,
-            'brokers_count': len(broker_accounts),
-            'broker_accounts': []
-        }
-        
-        for account in broker_accounts:
-            holdings = BrokerHolding.query.filter_by(broker_account_id=account.id).all()
-            
-            account_value = sum(h.total_value for h in holdings)
-            account_investment = sum(h.investment_value for h in holdings)
-            account_pnl = sum(h.pnl for h in holdings)
-            
-            summary['total_value'] += account_value
-            summary['total_investment'] += account_investment
-            summary['total_pnl'] += account_pnl
-            summary['holdings_count'] += len(holdings)
-            
-            summary['broker_accounts'].append({
-                'broker_name': account.broker_name,
-                'account_value': account_value,
-                'holdings_count': len(holdings),
-                'connection_status': account.connection_status.value,
-                'last_sync': account.last_sync
-            })
-        
-        if summary['total_investment'] > 0:
-            summary['total_pnl_percentage'] = (summary['total_pnl'] / summary['total_investment']) * 100
-        
-        return summary
 
 
 # Additional Broker Client Implementations
@@ -1679,7 +1785,7 @@ class UpstoxBrokerClient(BaseBrokerClient):
     def get_holdings(self) -> List[Dict]:
         """Get Upstox holdings"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Upstox")
+            raise BrokerConnectionError("Not connected to Upstox")
         
         try:
             portfolio_api = upstox_client.PortfolioApi(self._client)
@@ -1692,7 +1798,7 @@ class UpstoxBrokerClient(BaseBrokerClient):
     def get_positions(self) -> List[Dict]:
         """Get Upstox positions"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Upstox")
+            raise BrokerConnectionError("Not connected to Upstox")
         
         try:
             portfolio_api = upstox_client.PortfolioApi(self._client)
@@ -1705,7 +1811,7 @@ class UpstoxBrokerClient(BaseBrokerClient):
     def get_orders(self) -> List[Dict]:
         """Get Upstox orders"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Upstox")
+            raise BrokerConnectionError("Not connected to Upstox")
         
         try:
             orders_api = upstox_client.OrderApi(self._client)
@@ -1718,7 +1824,7 @@ class UpstoxBrokerClient(BaseBrokerClient):
     def place_order(self, order_data: Dict) -> Dict:
         """Place order with Upstox"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Upstox")
+            raise BrokerConnectionError("Not connected to Upstox")
         
         try:
             orders_api = upstox_client.OrderApi(self._client)
@@ -1732,7 +1838,7 @@ class UpstoxBrokerClient(BaseBrokerClient):
     def cancel_order(self, order_id: str) -> Dict:
         """Cancel Upstox order"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Upstox")
+            raise BrokerConnectionError("Not connected to Upstox")
         
         try:
             orders_api = upstox_client.OrderApi(self._client)
@@ -1745,7 +1851,7 @@ class UpstoxBrokerClient(BaseBrokerClient):
     def get_profile(self) -> Dict:
         """Get Upstox profile"""
         if not self._client:
-            raise BrokerAPIError("Not connected to Upstox")
+            raise BrokerConnectionError("Not connected to Upstox")
         
         try:
             user_api = upstox_client.UserApi(self._client)
@@ -1885,7 +1991,7 @@ class FyersBrokerClient(BaseBrokerClient):
     def get_holdings(self) -> List[Dict]:
         """Get FYERS holdings"""
         if not self._client:
-            raise BrokerAPIError("Not connected to FYERS")
+            raise BrokerConnectionError("Not connected to FYERS")
         
         try:
             response = self._client.holdings()
@@ -1900,7 +2006,7 @@ class FyersBrokerClient(BaseBrokerClient):
     def get_positions(self) -> List[Dict]:
         """Get FYERS positions"""
         if not self._client:
-            raise BrokerAPIError("Not connected to FYERS")
+            raise BrokerConnectionError("Not connected to FYERS")
         
         try:
             response = self._client.positions()
@@ -1915,7 +2021,7 @@ class FyersBrokerClient(BaseBrokerClient):
     def get_orders(self) -> List[Dict]:
         """Get FYERS orders"""
         if not self._client:
-            raise BrokerAPIError("Not connected to FYERS")
+            raise BrokerConnectionError("Not connected to FYERS")
         
         try:
             response = self._client.orderbook()
@@ -1930,7 +2036,7 @@ class FyersBrokerClient(BaseBrokerClient):
     def place_order(self, order_data: Dict) -> Dict:
         """Place order with FYERS"""
         if not self._client:
-            raise BrokerAPIError("Not connected to FYERS")
+            raise BrokerConnectionError("Not connected to FYERS")
         
         try:
             fyers_order = self._convert_to_fyers_order(order_data)
@@ -1950,7 +2056,7 @@ class FyersBrokerClient(BaseBrokerClient):
     def cancel_order(self, order_id: str) -> Dict:
         """Cancel FYERS order"""
         if not self._client:
-            raise BrokerAPIError("Not connected to FYERS")
+            raise BrokerConnectionError("Not connected to FYERS")
         
         try:
             response = self._client.cancel_order({'id': order_id})
@@ -1965,7 +2071,7 @@ class FyersBrokerClient(BaseBrokerClient):
     def get_profile(self) -> Dict:
         """Get FYERS profile"""
         if not self._client:
-            raise BrokerAPIError("Not connected to FYERS")
+            raise BrokerConnectionError("Not connected to FYERS")
         
         try:
             profile_response = self._client.get_profile()
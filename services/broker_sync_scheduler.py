@@ -0,0 +1,269 @@
+"""
+Broker Sync Scheduler
+Decides which broker accounts to sync on each beat tick: accounts are grouped by broker_type,
+ordered by staleness and user activity, and dispatched only within each broker's API budget
+"""
+
+import os
+import json
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Beat interval of tasks.broker_tasks.sync_all_broker_data
+BROKER_SYNC_INTERVAL = int(os.environ.get('BROKER_SYNC_INTERVAL', '300'))
+# Minimum age of an account's last sync before it is due again (market hours / off hours)
+BROKER_SYNC_MIN_AGE = int(os.environ.get('BROKER_SYNC_MIN_AGE', '300'))
+BROKER_SYNC_MIN_AGE_OFF_HOURS = int(os.environ.get('BROKER_SYNC_MIN_AGE_OFF_HOURS', str(4 * 3600)))
+# A dispatched sync is considered in flight (and not re-queued) for at most this long
+BROKER_SYNC_INFLIGHT_TTL = int(os.environ.get('BROKER_SYNC_INFLIGHT_TTL', '900'))
+# Users who logged in within this window are synced first
+BROKER_SYNC_ACTIVE_WINDOW = int(os.environ.get('BROKER_SYNC_ACTIVE_WINDOW', str(24 * 3600)))
+ACTIVE_USER_WEIGHT = 4.0
+
+# Sustained broker API calls per second spent on background sync, per broker_type.
+# Override with BROKER_SYNC_BUDGETS='{"zerodha": 5, ...}'
+DEFAULT_BROKER_BUDGET = 2.0
+BROKER_SYNC_BUDGETS = {
+    'dhan': 10.0,
+    'zerodha': 5.0,
+    'angel_broking': 2.0,
+    'upstox': 10.0,
+    'fyers': 5.0,
+    'groww': 2.0,
+}
+BROKER_SYNC_BUDGETS.update(json.loads(os.environ.get('BROKER_SYNC_BUDGETS', '{}')))
+
+MARKET_DATA_TYPES = ['holdings', 'positions', 'orders', 'profile']
+# Positions and orders do not change outside the trading session
+OFF_HOURS_DATA_TYPES = ['holdings', 'profile']
+
+BUCKET_KEY = 'broker_sync:bucket:{}'
+INFLIGHT_KEY = 'broker_sync:inflight:{}'
+SCHEDULER_LOCK_KEY = 'broker_sync:scheduler'
+METRICS_KEY = 'broker_sync:metrics'
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+
+def is_market_session(now: Optional[datetime] = None) -> bool:
+    """NSE cash session (9:15 AM - 3:30 PM IST, Monday to Friday)"""
+    current_ist = (now or datetime.now(timezone.utc)).astimezone(IST)
+    minutes = current_ist.hour * 60 + current_ist.minute
+    return current_ist.weekday() < 5 and 9 * 60 + 15 <= minutes <= 15 * 60 + 30
+
+
+class BrokerSyncScheduler:
+    """
+    Fleet-wide broker sync planner
+    Per-broker token buckets live in Redis so the budget holds across beat ticks and workers;
+    each bucket refills at the broker's budget rate and holds at most one tick's worth of calls.
+    Dispatches within a tick are spaced with countdowns so calls reach the broker at that rate.
+    """
+
+    def __init__(self, interval: int = BROKER_SYNC_INTERVAL, budgets: Dict[str, float] = None):
+        from caching.redis_cache import get_cache
+
+        self.interval = interval
+        self.budgets = BROKER_SYNC_BUDGETS if budgets is None else budgets
+        self.cache = get_cache()
+        # Used only while Redis is unavailable
+        self._local_buckets: Dict[str, TokenBucket] = {}
+
+    def budget(self, broker_type: str) -> float:
+        return float(self.budgets.get(broker_type, DEFAULT_BROKER_BUDGET))
+
+    def run(self, dispatch, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Plan one tick and dispatch the chosen syncs
+
+        Args:
+            dispatch: Called as dispatch(account_id, data_types, countdown) for each sync
+            now: Current UTC time (defaults to now)
+
+        Returns:
+            Metrics for this tick: per-broker due/dispatched/deferred/in-flight/failed counts and lag
+        """
+        now = now or datetime.now(timezone.utc)
+        if not self._acquire_tick():
+            logger.info("Broker sync scheduler already running for this tick, skipping")
+            return {'skipped': True}
+
+        market_open = is_market_session(now)
+        data_types = MARKET_DATA_TYPES if market_open else OFF_HOURS_DATA_TYPES
+        min_age = BROKER_SYNC_MIN_AGE if market_open else BROKER_SYNC_MIN_AGE_OFF_HOURS
+        # One call per data type plus the connect() check
+        cost = len(data_types) + 1
+
+        brokers: Dict[str, Dict[str, Any]] = {}
+        for broker_type, accounts in self._due_accounts(now, min_age).items():
+            rate = self.budget(broker_type)
+            tokens = self._take_tokens(broker_type, rate, want=cost * len(accounts))
+            stats = {'due': len(accounts), 'dispatched': 0, 'in_flight': 0, 'deferred': 0,
+                     'failed': 0, 'budget_per_sec': rate}
+            lags = [lag for _, lag, _ in accounts]
+            stats['max_lag_seconds'] = round(max(lags), 1)
+            stats['avg_lag_seconds'] = round(sum(lags) / len(lags), 1)
+
+            spent = 0
+            for account_id, _, _ in accounts:
+                if spent + cost > tokens:
+                    stats['deferred'] += 1
+                    continue
+                if not self._mark_inflight(account_id):
+                    stats['in_flight'] += 1
+                    continue
+                try:
+                    dispatch(account_id, data_types, spent / rate)
+                except Exception as e:
+                    # Not queued: free the account for the next tick and leave its tokens unspent
+                    logger.error(f"Broker sync dispatch failed for account {account_id}: {e}")
+                    self.release(account_id)
+                    stats['failed'] += 1
+                    continue
+                spent += cost
+                stats['dispatched'] += 1
+
+            # Return tokens not spent (in-flight skips, failed dispatches and rounding) to the bucket
+            if tokens - spent > 0:
+                self._refund_tokens(broker_type, tokens - spent)
+            brokers[broker_type] = stats
+
+        metrics = {
+            'timestamp': now.isoformat(),
+            'market_open': market_open,
+            'data_types': data_types,
+            'queue_depth': sum(b['deferred'] for b in brokers.values()),
+            'dispatched': sum(b['dispatched'] for b in brokers.values()),
+            'failed': sum(b['failed'] for b in brokers.values()),
+            'max_lag_seconds': max((b['max_lag_seconds'] for b in brokers.values()), default=0.0),
+            'brokers': brokers
+        }
+        self.cache.set(METRICS_KEY, metrics, expiry=max(self.interval * 3, 900))
+        logger.info(
+            f"Broker sync tick: dispatched {metrics['dispatched']}, deferred {metrics['queue_depth']}, "
+            f"max lag {metrics['max_lag_seconds']}s"
+        )
+        return metrics
+
+    def release(self, account_id: int):
+        """Mark an account's sync as finished so the next tick may schedule it again"""
+        self.cache.delete(INFLIGHT_KEY.format(account_id))
+
+    def get_metrics(self) -> Optional[Dict[str, Any]]:
+        """Metrics from the most recent tick"""
+        return self.cache.get(METRICS_KEY)
+
+    # ---- planning ----
+
+    def _due_accounts(self, now: datetime, min_age: int) -> Dict[str, List[Tuple[int, float, float]]]:
+        """
+        Connected accounts whose last sync is older than min_age, grouped by broker_type
+        Each group is sorted by priority: (account id, lag seconds, priority), highest first.
+        Never-synced accounts count as one full day stale.
+        """
+        from app import db
+        from models import User
+        from models_broker import BrokerAccount
+
+        naive_now = now.astimezone(timezone.utc).replace(tzinfo=None)
+        cutoff = naive_now - timedelta(seconds=min_age)
+        active_since = naive_now - timedelta(seconds=BROKER_SYNC_ACTIVE_WINDOW)
+
+        rows = db.session.query(
+            BrokerAccount.id, BrokerAccount.broker_type, BrokerAccount.last_sync, User.last_login
+        ).join(User, User.id == BrokerAccount.user_id).filter(
+            BrokerAccount.connection_status == 'connected',
+            BrokerAccount.is_active.is_(True),
+            db.or_(BrokerAccount.last_sync.is_(None), BrokerAccount.last_sync < cutoff)
+        ).all()
+
+        groups: Dict[str, List[Tuple[int, float, float]]] = {}
+        for account_id, broker_type, last_sync, last_login in rows:
+            lag = (naive_now - last_sync).total_seconds() if last_sync else 86400.0
+            weight = ACTIVE_USER_WEIGHT if last_login and last_login >= active_since else 1.0
+            groups.setdefault(broker_type, []).append((account_id, lag, lag * weight))
+
+        for accounts in groups.values():
+            accounts.sort(key=lambda account: account[2], reverse=True)
+        return groups
+
+    # ---- Redis state ----
+
+    def _acquire_tick(self) -> bool:
+        """One planner per tick across all beat/worker processes"""
+        if not self.cache.is_available():
+            return True
+        try:
+            return bool(self.cache.client.set(SCHEDULER_LOCK_KEY, '1', nx=True, ex=max(self.interval - 5, 1)))
+        except Exception as e:
+            logger.warning(f"Broker sync scheduler lock failed: {e}")
+            self.cache._mark_down()
+            return True
+
+    def _mark_inflight(self, account_id: int) -> bool:
+        """Claim an account for this dispatch; False if a previous sync is still running"""
+        if not self.cache.is_available():
+            return True
+        try:
+            return bool(self.cache.client.set(
+                INFLIGHT_KEY.format(account_id), str(time.time()), nx=True, ex=BROKER_SYNC_INFLIGHT_TTL
+            ))
+        except Exception as e:
+            logger.warning(f"Broker sync in-flight check failed: {e}")
+            self.cache._mark_down()
+            return True
+
+    def _take_tokens(self, broker_type: str, rate: float, want: float) -> float:
+        """Take up to `want` tokens from the broker's bucket; returns the number taken"""
+        capacity = rate * self.interval
+        if not self.cache.is_available():
+            return self._take_local(broker_type, rate, capacity, want)
+
+        key = BUCKET_KEY.format(broker_type)
+        try:
+            state = self.cache.client.hgetall(key)
+            now = time.time()
+            tokens = float(state['tokens']) if state else capacity
+            updated = float(state['updated']) if state else now
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            taken = min(tokens, float(want))
+            self.cache.client.hset(key, mapping={'tokens': tokens - taken, 'updated': now})
+            self.cache.client.expire(key, self.interval * 10)
+            return taken
+        except Exception as e:
+            logger.warning(f"Broker sync budget read failed for {broker_type}: {e}")
+            self.cache._mark_down()
+            return self._take_local(broker_type, rate, capacity, want)
+
+    def _refund_tokens(self, broker_type: str, tokens: float):
+        """Return unspent tokens to the Redis bucket (the local fallback simply keeps them spent)"""
+        if not self.cache.is_available():
+            return
+        try:
+            self.cache.client.hincrbyfloat(BUCKET_KEY.format(broker_type), 'tokens', tokens)
+        except Exception as e:
+            logger.warning(f"Broker sync budget refund failed for {broker_type}: {e}")
+
+    def _take_local(self, broker_type: str, rate: float, capacity: float, want: float) -> float:
+        bucket = self._local_buckets.get(broker_type)
+        if bucket is None:
+            bucket = self._local_buckets[broker_type] = TokenBucket(rate, capacity)
+        taken = min(bucket.available, float(want))
+        return taken if taken > 0 and bucket.try_acquire(taken) else 0.0
+
+
+_broker_sync_scheduler = None
+
+
+def get_broker_sync_scheduler() -> BrokerSyncScheduler:
+    """Get or create the broker sync scheduler"""
+    global _broker_sync_scheduler
+    if _broker_sync_scheduler is None:
+        _broker_sync_scheduler = BrokerSyncScheduler()
+    return _broker_sync_scheduler
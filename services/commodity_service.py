@@ -14,10 +14,11 @@ API Integration:
 import requests
 import logging
 import os
-import yfinance as yf
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List
 
+from services.price_history import PRICE_HISTORY_QUOTE_MAX_AGE, get_price_history
+
 logger = logging.getLogger(__name__)
 
 
@@ -394,8 +395,8 @@ class CommodityService:
             return None
         
         try:
-            ticker = yf.Ticker(yf_symbol)
-            history = ticker.history(period="5d")
+            prices = get_price_history()
+            history = prices.get_history(yf_symbol, period="5d", max_age=PRICE_HISTORY_QUOTE_MAX_AGE)
             
             if history.empty:
                 logger.warning(f"No yfinance data for commodity {symbol}")
@@ -409,8 +410,7 @@ class CommodityService:
             previous_close_usd = float(history.iloc[-2]['Close']) if len(history) >= 2 else current_price_usd
             
             # Get USDINR rate for conversion to Indian prices
-            usdinr = yf.Ticker("INR=X")
-            usdinr_history = usdinr.history(period="1d")
+            usdinr_history = prices.get_history("INR=X", period="1d", max_age=PRICE_HISTORY_QUOTE_MAX_AGE)
             usdinr_rate = float(usdinr_history.iloc[-1]['Close']) if not usdinr_history.empty else 83.0
             
             # Convert to INR and adjust units based on commodity
@@ -11,6 +11,19 @@ from sqlalchemy import func
 
 logger = logging.getLogger(__name__)
 
+# Summary rows in display order: (aggregate key, label, risk level, chart color)
+ASSET_CLASSES = [
+    ('equities', 'Equities', 'High', '#4CAF50'),
+    ('mutual_funds', 'Mutual Funds', 'Medium-High', '#2196F3'),
+    ('fixed_deposits', 'Fixed Deposits', 'Low', '#9C27B0'),
+    ('real_estate', 'Real Estate', 'Medium', '#FF9800'),
+    ('commodities', 'Gold & Commodities', 'Medium', '#FFD700'),
+    ('crypto', 'Cryptocurrency', 'Very High', '#FF5722'),
+    ('fno', 'F&O Positions', 'Very High', '#E91E63'),
+    ('insurance', 'Insurance', 'Protection', '#607D8B'),
+    ('broker', 'Broker Equities', 'High', '#4CAF50')
+]
+
 class ComprehensivePortfolioService:
     """Service for comprehensive portfolio analytics across all asset classes"""
     
@@ -18,15 +31,92 @@ class ComprehensivePortfolioService:
         self.user_id = user_id
         self.openai_api_key = os.environ.get('OPENAI_API_KEY')
     
-    def get_complete_portfolio_summary(self) -> Dict[str, Any]:
-        """Get complete portfolio summary across all asset classes"""
+    def _asset_class_totals(self) -> Dict[str, Dict[str, float]]:
+        """
+        Per-asset-class count, investment and current value in one UNION ALL aggregate query
+        Returns:
+            Dictionary of ASSET_CLASSES key -> {'count', 'investment', 'current_value', 'extra'}
+        """
         from models import (
             ManualEquityHolding, ManualMutualFundHolding, ManualFixedDepositHolding,
             ManualRealEstateHolding, ManualCommodityHolding, ManualCryptocurrencyHolding,
             ManualFuturesOptionsHolding, ManualInsuranceHolding
         )
         from app import db
+        from sqlalchemy import literal, union_all, select
+        
+        def aggregate(key, model, investment, value, extra=None, where=()):
+            return select(
+                literal(key).label('asset_key'),
+                func.count().label('count'),
+                func.coalesce(func.sum(investment), 0.0).label('investment'),
+                func.coalesce(func.sum(func.coalesce(value, 0.0)), 0.0).label('current_value'),
+                func.coalesce(func.sum(extra if extra is not None else literal(0.0)), 0.0).label('extra')
+            ).select_from(model).where(model.user_id == self.user_id, *where)
+        
+        premiums = func.coalesce(ManualInsuranceHolding.total_premiums_paid, 0.0)
+        selects = [
+            aggregate('equities', ManualEquityHolding,
+                      ManualEquityHolding.total_investment, ManualEquityHolding.current_value),
+            aggregate('mutual_funds', ManualMutualFundHolding,
+                      ManualMutualFundHolding.total_investment, ManualMutualFundHolding.current_value),
+            aggregate('fixed_deposits', ManualFixedDepositHolding,
+                      ManualFixedDepositHolding.principal_amount, ManualFixedDepositHolding.current_value),
+            aggregate('real_estate', ManualRealEstateHolding,
+                      ManualRealEstateHolding.total_investment, ManualRealEstateHolding.current_market_value),
+            aggregate('commodities', ManualCommodityHolding,
+                      ManualCommodityHolding.total_investment, ManualCommodityHolding.current_market_value),
+            aggregate('crypto', ManualCryptocurrencyHolding,
+                      ManualCryptocurrencyHolding.total_investment, ManualCryptocurrencyHolding.current_market_value),
+            aggregate('fno', ManualFuturesOptionsHolding,
+                      ManualFuturesOptionsHolding.total_investment, ManualFuturesOptionsHolding.current_value,
+                      where=[ManualFuturesOptionsHolding.position_status == 'Open']),
+            # Insurance: premiums paid count as both investment and value; extra carries coverage
+            aggregate('insurance', ManualInsuranceHolding, premiums, premiums, ManualInsuranceHolding.sum_assured,
+                      where=[ManualInsuranceHolding.policy_status == 'Active'])
+        ]
+        
+        try:
+            from models_broker import BrokerHolding, BrokerAccount
+            # Same quantity rule as before: available quantity, else total quantity
+            quantity = func.coalesce(func.nullif(BrokerHolding.available_quantity, 0), BrokerHolding.total_quantity, 0)
+            selects.append(
+                select(
+                    literal('broker').label('asset_key'),
+                    func.count().label('count'),
+                    func.coalesce(func.sum(func.coalesce(BrokerHolding.avg_cost_price, 0.0) * quantity), 0.0).label('investment'),
+                    func.coalesce(func.sum(func.coalesce(BrokerHolding.current_price, 0.0) * quantity), 0.0).label('current_value'),
+                    literal(0.0).label('extra')
+                ).select_from(BrokerHolding)
+                .join(BrokerAccount, BrokerAccount.id == BrokerHolding.broker_account_id)
+                .where(BrokerAccount.user_id == self.user_id, BrokerAccount.is_active.is_(True))
+            )
+        except Exception as e:
+            logger.warning(f"Could not load broker holdings for portfolio summary: {e}")
+        
+        rows = db.session.execute(union_all(*selects)).mappings().all()
+        return {
+            row['asset_key']: {
+                'count': int(row['count']),
+                'investment': float(row['investment']),
+                'current_value': float(row['current_value']),
+                'extra': float(row['extra'])
+            }
+            for row in rows
+        }
+    
+    def _broker_names(self) -> List[str]:
+        """Display names of the user's active broker accounts"""
+        from models_broker import BrokerAccount
+        from app import db
         
+        rows = db.session.query(BrokerAccount.broker_name, BrokerAccount.broker_type).filter_by(
+            user_id=self.user_id, is_active=True
+        ).all()
+        return list({name or broker_type for name, broker_type in rows})
+    
+    def get_complete_portfolio_summary(self) -> Dict[str, Any]:
+        """Get complete portfolio summary across all asset classes"""
         summary = {
             'total_investment': 0,
             'total_current_value': 0,
@@ -37,172 +127,49 @@ class ComprehensivePortfolioService:
             'asset_distribution': []
         }
         
-        # 1. Equities
-        equities = ManualEquityHolding.query.filter_by(user_id=self.user_id).all()
-        eq_investment = sum(h.total_investment for h in equities)
-        eq_value = sum(h.current_value or 0 for h in equities)
-        if equities:
-            summary['asset_classes'].append({
-                'name': 'Equities',
-                'count': len(equities),
-                'investment': eq_investment,
-                'current_value': eq_value,
-                'pnl': eq_value - eq_investment,
-                'pnl_percentage': ((eq_value - eq_investment) / eq_investment * 100) if eq_investment > 0 else 0,
-                'risk_level': 'High',
-                'color': '#4CAF50'
-            })
-        
-        # 2. Mutual Funds
-        mfs = ManualMutualFundHolding.query.filter_by(user_id=self.user_id).all()
-        mf_investment = sum(h.total_investment for h in mfs)
-        mf_value = sum(h.current_value or 0 for h in mfs)
-        if mfs:
-            summary['asset_classes'].append({
-                'name': 'Mutual Funds',
-                'count': len(mfs),
-                'investment': mf_investment,
-                'current_value': mf_value,
-                'pnl': mf_value - mf_investment,
-                'pnl_percentage': ((mf_value - mf_investment) / mf_investment * 100) if mf_investment > 0 else 0,
-                'risk_level': 'Medium-High',
-                'color': '#2196F3'
-            })
-        
-        # 3. Fixed Deposits
-        fds = ManualFixedDepositHolding.query.filter_by(user_id=self.user_id).all()
-        fd_investment = sum(f.principal_amount for f in fds)
-        fd_value = sum(f.current_value or 0 for f in fds)
-        if fds:
-            summary['asset_classes'].append({
-                'name': 'Fixed Deposits',
-                'count': len(fds),
-                'investment': fd_investment,
-                'current_value': fd_value,
-                'pnl': fd_value - fd_investment,
-                'pnl_percentage': ((fd_value - fd_investment) / fd_investment * 100) if fd_investment > 0 else 0,
-                'risk_level': 'Low',
-                'color': '#9C27B0'
-            })
-        
-        # 4. Real Estate
-        properties = ManualRealEstateHolding.query.filter_by(user_id=self.user_id).all()
-        re_investment = sum(p.total_investment for p in properties)
-        re_value = sum(p.current_market_value or 0 for p in properties)
-        if properties:
-            summary['asset_classes'].append({
-                'name': 'Real Estate',
-                'count': len(properties),
-                'investment': re_investment,
-                'current_value': re_value,
-                'pnl': re_value - re_investment,
-                'pnl_percentage': ((re_value - re_investment) / re_investment * 100) if re_investment > 0 else 0,
-                'risk_level': 'Medium',
-                'color': '#FF9800'
-            })
-        
-        # 5. Gold & Commodities
-        commodities = ManualCommodityHolding.query.filter_by(user_id=self.user_id).all()
-        gold_investment = sum(c.total_investment for c in commodities)
-        gold_value = sum(c.current_market_value or 0 for c in commodities)
-        if commodities:
-            summary['asset_classes'].append({
-                'name': 'Gold & Commodities',
-                'count': len(commodities),
-                'investment': gold_investment,
-                'current_value': gold_value,
-                'pnl': gold_value - gold_investment,
-                'pnl_percentage': ((gold_value - gold_investment) / gold_investment * 100) if gold_investment > 0 else 0,
-                'risk_level': 'Medium',
-                'color': '#FFD700'
-            })
-        
-        # 6. Cryptocurrency
-        cryptos = ManualCryptocurrencyHolding.query.filter_by(user_id=self.user_id).all()
-        crypto_investment = sum(c.total_investment for c in cryptos)
-        crypto_value = sum(c.current_market_value or 0 for c in cryptos)
-        if cryptos:
-            summary['asset_classes'].append({
-                'name': 'Cryptocurrency',
-                'count': len(cryptos),
-                'investment': crypto_investment,
-                'current_value': crypto_value,
-                'pnl': crypto_value - crypto_investment,
-                'pnl_percentage': ((crypto_value - crypto_investment) / crypto_investment * 100) if crypto_investment > 0 else 0,
-                'risk_level': 'Very High',
-                'color': '#FF5722'
-            })
+        totals = self._asset_class_totals()
         
-        # 7. F&O Positions
-        fnos = ManualFuturesOptionsHolding.query.filter_by(user_id=self.user_id, position_status='Open').all()
-        fno_investment = sum(f.total_investment for f in fnos)
-        fno_value = sum(f.current_value or 0 for f in fnos)
-        if fnos:
-            summary['asset_classes'].append({
-                'name': 'F&O Positions',
-                'count': len(fnos),
-                'investment': fno_investment,
-                'current_value': fno_value,
-                'pnl': fno_value - fno_investment,
-                'pnl_percentage': ((fno_value - fno_investment) / fno_investment * 100) if fno_investment > 0 else 0,
-                'risk_level': 'Very High',
-                'color': '#E91E63'
-            })
+        for key, name, risk_level, color in ASSET_CLASSES:
+            row = totals.get(key)
+            if not row or not row['count']:
+                continue
+            investment, value = row['investment'], row['current_value']
+            
+            if key == 'insurance':
+                summary['asset_classes'].append({
+                    'name': name,
+                    'count': row['count'],
+                    'investment': investment,
+                    'current_value': investment,  # Premiums don't appreciate
+                    'pnl': 0,
+                    'pnl_percentage': 0,
+                    'coverage': row['extra'],
+                    'risk_level': risk_level,
+                    'color': color
+                })
+                continue
+            
+            asset_class = {
+                'name': name,
+                'count': row['count'],
+                'investment': investment,
+                'current_value': value,
+                'pnl': value - investment,
+                'pnl_percentage': ((value - investment) / investment * 100) if investment > 0 else 0,
+                'risk_level': risk_level,
+                'color': color
+            }
+            if key == 'broker':
+                # Broker-synced holdings (Dhan, Zerodha, Angel, etc.)
+                if investment <= 0 and value <= 0:
+                    continue
+                try:
+                    asset_class['name'] = f"{name} ({', '.join(self._broker_names())})"
+                except Exception as e:
+                    logger.warning(f"Could not load broker names for portfolio summary: {e}")
+                asset_class['broker_synced'] = True
+            summary['asset_classes'].append(asset_class)
         
-        # 8. Insurance (track premiums paid)
-        insurance_policies = ManualInsuranceHolding.query.filter_by(user_id=self.user_id, policy_status='Active').all()
-        insurance_paid = sum(p.total_premiums_paid for p in insurance_policies)
-        insurance_coverage = sum(p.sum_assured for p in insurance_policies)
-        if insurance_policies:
-            summary['asset_classes'].append({
-                'name': 'Insurance',
-                'count': len(insurance_policies),
-                'investment': insurance_paid,
-                'current_value': insurance_paid,  # Premiums don't appreciate
-                'pnl': 0,
-                'pnl_percentage': 0,
-                'coverage': insurance_coverage,
-                'risk_level': 'Protection',
-                'color': '#607D8B'
-            })
-
-        # 9. Broker-synced holdings (Dhan, Zerodha, Angel, etc.)
-        try:
-            from models_broker import BrokerHolding, BrokerAccount
-            broker_accounts = BrokerAccount.query.filter_by(
-                user_id=self.user_id, is_active=True
-            ).all()
-            broker_account_ids = [a.id for a in broker_accounts]
-            if broker_account_ids:
-                broker_holdings = BrokerHolding.query.filter(
-                    BrokerHolding.broker_account_id.in_(broker_account_ids)
-                ).all()
-                if broker_holdings:
-                    bh_investment = sum(
-                        (h.avg_cost_price or 0) * (h.available_quantity or h.total_quantity or 0)
-                        for h in broker_holdings
-                    )
-                    bh_value = sum(
-                        (h.current_price or 0) * (h.available_quantity or h.total_quantity or 0)
-                        for h in broker_holdings
-                    )
-                    if bh_investment > 0 or bh_value > 0:
-                        broker_names = list({a.broker_name or a.broker_type for a in broker_accounts})
-                        label = f"Broker Equities ({', '.join(broker_names)})"
-                        summary['asset_classes'].append({
-                            'name': label,
-                            'count': len(broker_holdings),
-                            'investment': bh_investment,
-                            'current_value': bh_value,
-                            'pnl': bh_value - bh_investment,
-                            'pnl_percentage': ((bh_value - bh_investment) / bh_investment * 100) if bh_investment > 0 else 0,
-                            'risk_level': 'High',
-                            'color': '#4CAF50',
-                            'broker_synced': True
-                        })
-        except Exception as e:
-            logger.warning(f"Could not load broker holdings for portfolio summary: {e}")
-
         # Calculate totals
         summary['total_investment'] = sum(ac['investment'] for ac in summary['asset_classes'])
         summary['total_current_value'] = sum(ac['current_value'] for ac in summary['asset_classes'])
@@ -14,10 +14,11 @@ API Integration:
 import requests
 import logging
 import os
-import yfinance as yf
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List
 
+from services.price_history import PRICE_HISTORY_QUOTE_MAX_AGE, get_price_history
+
 logger = logging.getLogger(__name__)
 
 
@@ -394,8 +395,7 @@ class CurrencyService:
         yf_symbol = f"{symbol}=X"
         
         try:
-            ticker = yf.Ticker(yf_symbol)
-            history = ticker.history(period="5d")
+            history = get_price_history().get_history(yf_symbol, period="5d", max_age=PRICE_HISTORY_QUOTE_MAX_AGE)
             
             if history.empty:
                 logger.warning(f"No yfinance data for currency {symbol}")
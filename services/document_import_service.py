@@ -4,14 +4,24 @@ Intelligently parse and extract holdings data from PDFs, Excel files, and broker
 """
 
 import os
+import heapq
 import logging
 import pandas as pd
 import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Tuple
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Chunks per embeddings API call during PDF import
+IMPORT_EMBEDDING_BATCH_SIZE = int(os.environ.get('IMPORT_EMBEDDING_BATCH_SIZE', '64'))
+# Embedding batches in flight at once per import
+IMPORT_EMBEDDING_CONCURRENCY = int(os.environ.get('IMPORT_EMBEDDING_CONCURRENCY', '4'))
+
 class DocumentImportService:
     """
     Service to import holdings from various document formats using RAG + LLM
@@ -83,9 +93,9 @@ class DocumentImportService:
         Import holdings from PDF statement using RAG + LLM for intelligent parsing
         
         This uses a multi-stage RAG approach:
-        1. Extract text from PDF (using PyPDF2 or pdfplumber)
-        2. Chunk text into semantic sections
-        3. Use vector embeddings to find relevant data sections
+        1. Extract text from PDF page by page (PyPDF2)
+        2. Chunk text on page and paragraph boundaries
+        3. Embed chunks in batches and keep the sections most similar to the query
         4. Use LLM to extract structured data from relevant sections
         
         Args:
@@ -98,24 +108,11 @@ class DocumentImportService:
             Dict with import results
         """
         try:
-            # Step 1: Extract text from PDF
-            pdf_text = self._extract_pdf_text(file_path)
-            
-            # Step 2: Create semantic chunks
-            chunks = self._chunk_pdf_text(pdf_text)
-            
-            # Step 3: Generate embeddings for chunks (RAG component)
-            chunk_embeddings = self._generate_embeddings(chunks)
-            
-            # Step 4: Create query embeddings for relevant data
-            query_embeddings = self._generate_query_embeddings(asset_class, statement_type)
-            
-            # Step 5: Retrieve most relevant chunks using vector similarity
-            relevant_chunks = self._retrieve_relevant_chunks(
-                chunk_embeddings, 
-                query_embeddings,
-                chunks
-            )
+            # Steps 1-5: stream pages -> paragraph chunks -> batched embeddings -> running top-k.
+            # Only the best chunks and the batches in flight are held in memory.
+            query_embedding = self._generate_query_embeddings(asset_class, statement_type)
+            chunks = self._iter_chunks(self._iter_pdf_pages(file_path))
+            relevant_chunks = self._stream_relevant_chunks(chunks, query_embedding)
             
             # Step 6: Use LLM to extract structured data from relevant chunks
             extracted_data = self._extract_holdings_with_llm(
@@ -295,90 +292,143 @@ Example:
         except:
             return None
     
-    def _extract_pdf_text(self, file_path: str) -> str:
-        """Extract text from PDF file"""
+    def _iter_pdf_pages(self, file_path: str) -> Iterator[str]:
+        """Yield the text of each PDF page, extracting pages lazily"""
         try:
             import PyPDF2
-            text = ""
             with open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
                 for page in pdf_reader.pages:
-                    text += page.extract_text()
-            return text
+                    yield page.extract_text() or ""
         except Exception as e:
             logger.error(f"Error extracting PDF text: {str(e)}")
-            return ""
     
-    def _chunk_pdf_text(self, text: str, chunk_size: int = 1000) -> List[str]:
-        """Split PDF text into semantic chunks"""
-        # Simple chunking by character count with overlap
-        chunks = []
-        overlap = 200
+    def _iter_chunks(self, pages: Iterable[str], chunk_size: int = 1000) -> Iterator[str]:
+        """
+        Pack paragraphs into chunks of at most chunk_size characters
+        Chunks break on paragraph (blank line) and page boundaries; a paragraph longer than
+        chunk_size is split on lines, and a single over-long line by characters.
+        """
+        parts: List[str] = []
+        size = 0
         
-        for i in range(0, len(text), chunk_size - overlap):
-            chunk = text[i:i + chunk_size]
-            if chunk.strip():
-                chunks.append(chunk)
+        for page in pages:
+            for paragraph in page.split("\n\n"):
+                paragraph = paragraph.strip()
+                if not paragraph:
+                    continue
+                for piece in self._split_paragraph(paragraph, chunk_size):
+                    if parts and size + len(piece) + 2 > chunk_size:
+                        yield "\n\n".join(parts)
+                        parts, size = [], 0
+                    parts.append(piece)
+                    size += len(piece) + 2
         
-        return chunks
+        if parts:
+            yield "\n\n".join(parts)
     
-    def _generate_embeddings(self, chunks: List[str]) -> List[List[float]]:
-        """Generate embeddings for text chunks using OpenAI"""
-        try:
-            import openai
-            openai.api_key = self.openai_api_key
-            
-            embeddings = []
+    @staticmethod
+    def _split_paragraph(paragraph: str, chunk_size: int) -> Iterator[str]:
+        if len(paragraph) <= chunk_size:
+            yield paragraph
+            return
+        
+        piece = ""
+        for line in paragraph.splitlines():
+            while len(line) > chunk_size:
+                if piece:
+                    yield piece
+                    piece = ""
+                yield line[:chunk_size]
+                line = line[chunk_size:]
+            if piece and len(piece) + len(line) + 1 > chunk_size:
+                yield piece
+                piece = ""
+            piece = f"{piece}\n{line}" if piece else line
+        if piece.strip():
+            yield piece
+    
+    def _iter_embedding_batches(self, chunks: Iterable[str]) -> Iterator[Tuple[List[str], List[Optional[List[float]]]]]:
+        """
+        Embed chunks in batches with bounded concurrency, yielding (batch, embeddings) in order
+        At most IMPORT_EMBEDDING_CONCURRENCY batches are in flight, so a long statement never
+        holds more than that many batches of text and vectors at once.
+        """
+        from services.vector_service import get_vector_service
+        vector_service = get_vector_service()
+        
+        def batches():
+            batch = []
             for chunk in chunks:
-                response = openai.Embedding.create(
-                    model="text-embedding-ada-002",
-                    input=chunk
-                )
-                embeddings.append(response['data'][0]['embedding'])
-            
-            return embeddings
-        except Exception as e:
-            logger.error(f"Error generating embeddings: {str(e)}")
-            return []
+                batch.append(chunk)
+                if len(batch) >= IMPORT_EMBEDDING_BATCH_SIZE:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=IMPORT_EMBEDDING_CONCURRENCY,
+                                thread_name_prefix='import-embed') as executor:
+            for batch in batches():
+                pending.append((batch, executor.submit(vector_service.generate_embeddings_batch, batch)))
+                if len(pending) >= IMPORT_EMBEDDING_CONCURRENCY:
+                    done, future = pending.popleft()
+                    yield done, future.result()
+            while pending:
+                done, future = pending.popleft()
+                yield done, future.result()
     
     def _generate_query_embeddings(self, asset_class: str, statement_type: str) -> List[float]:
         """Generate query embedding for finding relevant sections"""
-        query = f"Extract {asset_class} holdings data from {statement_type} statement including quantities, prices, and dates"
+        from services.vector_service import get_vector_service
         
-        try:
-            import openai
-            openai.api_key = self.openai_api_key
-            
-            response = openai.Embedding.create(
-                model="text-embedding-ada-002",
-                input=query
-            )
-            return response['data'][0]['embedding']
-        except:
-            return []
+        query = f"Extract {asset_class} holdings data from {statement_type} statement including quantities, prices, and dates"
+        return get_vector_service().generate_embedding(query) or []
     
-    def _retrieve_relevant_chunks(self, chunk_embeddings: List[List[float]], 
-                                 query_embedding: List[float],
-                                 chunks: List[str], top_k: int = 5) -> List[str]:
-        """Retrieve most relevant chunks using cosine similarity"""
-        import numpy as np
+    @staticmethod
+    def _similarities(embeddings: List[Optional[List[float]]], query_embedding: List[float]) -> np.ndarray:
+        """Cosine similarity of each embedding to the query in one matrix product (-inf where missing)"""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query))
+        scores = np.full(len(embeddings), -np.inf, dtype=np.float32)
+        present = [i for i, emb in enumerate(embeddings) if emb]
+        if not present or query_norm == 0:
+            return scores
         
-        if not chunk_embeddings or not query_embedding:
-            return chunks[:top_k]  # Fallback to first chunks
+        matrix = np.asarray([embeddings[i] for i in present], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * query_norm
+        scores[present] = (matrix @ query) / np.where(norms > 0, norms, 1.0)
+        return scores
+    
+    def _stream_relevant_chunks(self, chunks: Iterable[str], query_embedding: List[float],
+                                top_k: int = 5) -> List[str]:
+        """
+        Most query-relevant chunks of a chunk stream, keeping only a running top-k
+        Falls back to the first chunks if no query embedding or chunk embeddings are available.
+        """
+        if not query_embedding:
+            return [chunk for _, chunk in zip(range(top_k), chunks)]
         
-        # Calculate cosine similarity
-        similarities = []
-        for chunk_emb in chunk_embeddings:
-            similarity = np.dot(chunk_emb, query_embedding) / (
-                np.linalg.norm(chunk_emb) * np.linalg.norm(query_embedding)
-            )
-            similarities.append(similarity)
+        best: List[Tuple[float, int, str]] = []  # min-heap of (score, -position, chunk)
+        first: List[str] = []
+        position = 0
         
-        # Get top K chunks
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
-        relevant_chunks = [chunks[i] for i in top_indices]
+        for batch, embeddings in self._iter_embedding_batches(chunks):
+            if len(first) < top_k:
+                first.extend(batch[:top_k - len(first)])
+            scores = self._similarities(embeddings, query_embedding)
+            for i in np.flatnonzero(np.isfinite(scores)):
+                item = (float(scores[i]), -(position + int(i)), batch[i])
+                if len(best) < top_k:
+                    heapq.heappush(best, item)
+                elif item > best[0]:
+                    heapq.heapreplace(best, item)
+            position += len(batch)
         
-        return relevant_chunks
+        if not best:
+            return first
+        return [chunk for _, _, chunk in sorted(best, reverse=True)]
     
     def _extract_holdings_with_llm(self, relevant_chunks: List[str],
                                   asset_class: str, statement_type: str) -> List[Dict]:
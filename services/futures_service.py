@@ -14,10 +14,11 @@ Analysis Platforms:
 import requests
 import logging
 import os
-import yfinance as yf
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List
 
+from services.price_history import PRICE_HISTORY_QUOTE_MAX_AGE, get_price_history
+
 logger = logging.getLogger(__name__)
 
 
@@ -361,8 +362,7 @@ class FuturesService:
         yf_symbol = yf_symbol_map.get(symbol.upper(), f"{symbol}.NS")
         
         try:
-            ticker = yf.Ticker(yf_symbol)
-            history = ticker.history(period="5d")
+            history = get_price_history().get_history(yf_symbol, period="5d", max_age=PRICE_HISTORY_QUOTE_MAX_AGE)
             
             if history.empty:
                 logger.warning(f"No yfinance data for futures {symbol}")
@@ -0,0 +1,399 @@
+"""
+Incremental Technical Indicator Engine
+Keeps per-symbol rolling state for Wilder RSI, EMA, true ATR and SuperTrend
+so each new bar is an O(1) update instead of recomputing the whole history
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PARAMS = {
+    'rsi_period': 14,
+    'ema_short': 9,
+    'ema_long': 20,
+    'supertrend_period': 10,
+    'supertrend_multiplier': 3
+}
+
+# How long a symbol's state is served before pulling new bars from the data source
+REFRESH_SECONDS = {'1m': 30, '5m': 60, '15m': 120, '1h': 300, '1d': 3600}
+# History window used to warm up a symbol the first time it is requested
+WARMUP_PERIOD = {'1m': '1d', '5m': '5d', '15m': '10d', '1h': '10d', '1d': '6mo'}
+MAX_TRACKED_SERIES = 2000
+
+
+@dataclass
+class IndicatorState:
+    """Rolling indicator state for one (symbol, interval, params) series"""
+    rsi_period: int
+    ema_short_span: int
+    ema_long_span: int
+    atr_period: int
+    multiplier: float
+
+    bars: int = 0
+    last_ts: Optional[float] = None
+    close: Optional[float] = None
+
+    # Wilder RSI: seed gains/losses are summed until rsi_period deltas are seen
+    avg_gain: float = 0.0
+    avg_loss: float = 0.0
+    rsi: Optional[float] = None
+
+    ema_short: Optional[float] = None
+    ema_long: Optional[float] = None
+
+    # Wilder ATR over true range
+    tr_sum: float = 0.0
+    atr: Optional[float] = None
+
+    # SuperTrend final bands and direction (1 = up, -1 = down)
+    upper_band: Optional[float] = None
+    lower_band: Optional[float] = None
+    direction: int = 1
+    supertrend: Optional[float] = None
+
+    # State before the last bar, so a revised (still forming) bar replaces it instead of double counting
+    previous: Optional['IndicatorState'] = field(default=None, repr=False)
+
+    def apply(self, ts: float, high: float, low: float, close: float) -> None:
+        """Advance the state by one bar in O(1)"""
+        if self.last_ts is not None and ts == self.last_ts and self.previous is not None:
+            self._restore(self.previous)
+        elif self.last_ts is not None and ts < self.last_ts:
+            return
+
+        self.previous = replace(self, previous=None)
+        prev_close = self.close
+        self.bars += 1
+
+        # EMA (adjust=False, seeded with first close - matches pandas ewm)
+        alpha_s = 2.0 / (self.ema_short_span + 1)
+        alpha_l = 2.0 / (self.ema_long_span + 1)
+        self.ema_short = close if self.ema_short is None else self.ema_short + alpha_s * (close - self.ema_short)
+        self.ema_long = close if self.ema_long is None else self.ema_long + alpha_l * (close - self.ema_long)
+
+        if prev_close is not None:
+            delta = close - prev_close
+            gain, loss = max(delta, 0.0), max(-delta, 0.0)
+            deltas = self.bars - 1
+            n = self.rsi_period
+            if deltas < n:
+                self.avg_gain += gain
+                self.avg_loss += loss
+            elif deltas == n:
+                self.avg_gain = (self.avg_gain + gain) / n
+                self.avg_loss = (self.avg_loss + loss) / n
+            else:
+                self.avg_gain = (self.avg_gain * (n - 1) + gain) / n
+                self.avg_loss = (self.avg_loss * (n - 1) + loss) / n
+            if deltas >= n:
+                self.rsi = _rsi(self.avg_gain, self.avg_loss)
+
+            true_range = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        else:
+            true_range = high - low
+
+        p = self.atr_period
+        if self.bars < p:
+            self.tr_sum += true_range
+        elif self.bars == p:
+            self.atr = (self.tr_sum + true_range) / p
+        else:
+            self.atr = (self.atr * (p - 1) + true_range) / p
+
+        if self.atr is not None:
+            self._update_supertrend(high, low, close, prev_close)
+
+        self.close = close
+        self.last_ts = ts
+
+    def _update_supertrend(self, high: float, low: float, close: float, prev_close: Optional[float]) -> None:
+        mid = (high + low) / 2
+        basic_upper = mid + self.multiplier * self.atr
+        basic_lower = mid - self.multiplier * self.atr
+
+        if self.upper_band is None or prev_close is None:
+            self.upper_band, self.lower_band = basic_upper, basic_lower
+        else:
+            if basic_upper < self.upper_band or prev_close > self.upper_band:
+                self.upper_band = basic_upper
+            if basic_lower > self.lower_band or prev_close < self.lower_band:
+                self.lower_band = basic_lower
+
+        if self.direction == 1 and close < self.lower_band:
+            self.direction = -1
+        elif self.direction == -1 and close > self.upper_band:
+            self.direction = 1
+        self.supertrend = self.lower_band if self.direction == 1 else self.upper_band
+
+    def _restore(self, snapshot: 'IndicatorState') -> None:
+        for name in self.__dataclass_fields__:
+            setattr(self, name, getattr(snapshot, name))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Latest indicator values"""
+        ema_signal = None
+        if self.ema_short is not None and self.ema_long is not None:
+            ema_signal = 'bullish' if self.ema_short > self.ema_long else 'bearish'
+        return {
+            'rsi': round(float(self.rsi), 2) if self.rsi is not None else None,
+            'ema_short': round(float(self.ema_short), 2) if self.ema_short is not None else None,
+            'ema_long': round(float(self.ema_long), 2) if self.ema_long is not None else None,
+            'ema_signal': ema_signal,
+            'atr': round(float(self.atr), 4) if self.atr is not None else None,
+            'supertrend': round(float(self.supertrend), 2) if self.supertrend is not None else None,
+            'supertrend_direction': ('bullish' if self.direction == 1 else 'bearish') if self.supertrend is not None else None,
+            'close': float(self.close) if self.close is not None else None,
+            'bars': self.bars,
+            'last_bar_ts': float(self.last_ts) if self.last_ts is not None else None
+        }
+
+
+def _rsi(avg_gain: float, avg_loss: float) -> float:
+    if avg_loss == 0:
+        return 100.0 if avg_gain > 0 else 50.0
+    return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+
+def initialize_state(state: IndicatorState, ts: np.ndarray, high: np.ndarray,
+                     low: np.ndarray, close: np.ndarray) -> IndicatorState:
+    """
+    Cold-start a state from a block of bars
+    Vector work (deltas, true range, seed averages) is done in NumPy; only the
+    Wilder/EMA recursions walk the arrays. The last bar is applied through
+    IndicatorState.apply so it can later be revised in place.
+    """
+    n = len(close)
+    if n == 0:
+        return state
+    if n == 1:
+        state.apply(float(ts[0]), float(high[0]), float(low[0]), float(close[0]))
+        return state
+
+    # Everything except the last bar in bulk
+    h, l, c = high[:-1], low[:-1], close[:-1]
+    m = len(c)
+
+    alpha_s = 2.0 / (state.ema_short_span + 1)
+    alpha_l = 2.0 / (state.ema_long_span + 1)
+    ema_s = ema_l = float(c[0])
+    for value in c[1:]:
+        ema_s += alpha_s * (value - ema_s)
+        ema_l += alpha_l * (value - ema_l)
+    state.ema_short, state.ema_long = ema_s, ema_l
+
+    deltas = np.diff(c)
+    gains = np.clip(deltas, 0, None)
+    losses = np.clip(-deltas, 0, None)
+    rp = state.rsi_period
+    if len(deltas) >= rp:
+        avg_gain = float(gains[:rp].mean())
+        avg_loss = float(losses[:rp].mean())
+        for g, lo in zip(gains[rp:], losses[rp:]):
+            avg_gain = (avg_gain * (rp - 1) + g) / rp
+            avg_loss = (avg_loss * (rp - 1) + lo) / rp
+        state.avg_gain, state.avg_loss = float(avg_gain), float(avg_loss)
+        state.rsi = _rsi(state.avg_gain, state.avg_loss)
+    else:
+        state.avg_gain, state.avg_loss = float(gains.sum()), float(losses.sum())
+
+    prev_c = np.concatenate(([np.nan], c[:-1]))
+    true_range = np.nanmax(np.vstack([h - l, np.abs(h - prev_c), np.abs(l - prev_c)]), axis=0)
+    ap = state.atr_period
+    if m >= ap:
+        atr = float(true_range[:ap].mean())
+        atr_series = np.empty(m)
+        atr_series[:ap - 1] = np.nan
+        atr_series[ap - 1] = atr
+        for i in range(ap, m):
+            atr = (atr * (ap - 1) + true_range[i]) / ap
+            atr_series[i] = atr
+        state.atr = float(atr)
+
+        mid = (h + l) / 2
+        basic_upper = mid + state.multiplier * atr_series
+        basic_lower = mid - state.multiplier * atr_series
+        upper, lower, direction = basic_upper[ap - 1], basic_lower[ap - 1], 1
+        for i in range(ap - 1, m):
+            if i > ap - 1:
+                if basic_upper[i] < upper or c[i - 1] > upper:
+                    upper = basic_upper[i]
+                if basic_lower[i] > lower or c[i - 1] < lower:
+                    lower = basic_lower[i]
+            if direction == 1 and c[i] < lower:
+                direction = -1
+            elif direction == -1 and c[i] > upper:
+                direction = 1
+        state.upper_band, state.lower_band, state.direction = float(upper), float(lower), direction
+        state.supertrend = state.lower_band if direction == 1 else state.upper_band
+    else:
+        state.tr_sum = float(true_range.sum())
+
+    state.bars = m
+    state.close = float(c[-1])
+    state.last_ts = float(ts[-2])
+
+    state.apply(float(ts[-1]), float(high[-1]), float(low[-1]), float(close[-1]))
+    return state
+
+
+class IndicatorEngine:
+    """Registry of per-symbol indicator states with bounded LRU eviction"""
+
+    def __init__(self, max_series: int = MAX_TRACKED_SERIES):
+        self.max_series = max_series
+        self._series: 'OrderedDict[Tuple, IndicatorState]' = OrderedDict()
+        self._refreshed_at: Dict[Tuple, float] = {}
+        self._locks: Dict[Tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, symbol: str, interval: str, params: Dict[str, Any]) -> Tuple:
+        return (
+            symbol.upper(), interval,
+            int(params['rsi_period']), int(params['ema_short']), int(params['ema_long']),
+            int(params['supertrend_period']), float(params['supertrend_multiplier'])
+        )
+
+    def _new_state(self, params: Dict[str, Any]) -> IndicatorState:
+        return IndicatorState(
+            rsi_period=int(params['rsi_period']),
+            ema_short_span=int(params['ema_short']),
+            ema_long_span=int(params['ema_long']),
+            atr_period=int(params['supertrend_period']),
+            multiplier=float(params['supertrend_multiplier'])
+        )
+
+    def _series_lock(self, key: Tuple) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def warm_up(self, symbol: str, interval: str, frame, params: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Initialize a series from an OHLC DataFrame (index = timestamps, columns high/low/close in any case)
+        Returns:
+            Latest indicator values
+        """
+        params = {**DEFAULT_PARAMS, **(params or {})}
+        key = self._key(symbol, interval, params)
+        state = initialize_state(self._new_state(params), *_frame_arrays(frame))
+        self._store(key, state)
+        return state.snapshot()
+
+    def update(self, symbol: str, interval: str, ts: float, high: float, low: float, close: float,
+               params: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+        """
+        Apply one new (or revised) bar to a warmed-up series
+        Returns:
+            Latest indicator values, or None if the series has not been warmed up
+        """
+        params = {**DEFAULT_PARAMS, **(params or {})}
+        key = self._key(symbol, interval, params)
+        with self._series_lock(key):
+            state = self._series.get(key)
+            if state is None:
+                return None
+            state.apply(ts, high, low, close)
+            return state.snapshot()
+
+    def get_latest(self, symbol: str, interval: str = '1h', params: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get the latest indicator values for a symbol
+        Warms up from history on first use; afterwards only bars newer than the
+        last seen bar are fetched and applied, at most once per refresh window.
+        If the recent bars no longer reach back to the last seen bar, the warm-up
+        window is fetched instead and the series is re-warmed when even that has a gap.
+        Returns:
+            Latest indicator values or None if no price data is available
+        """
+        params = {**DEFAULT_PARAMS, **{k: v for k, v in (params or {}).items() if k in DEFAULT_PARAMS}}
+        key = self._key(symbol, interval, params)
+
+        with self._series_lock(key):
+            state = self._series.get(key)
+            now = time.monotonic()
+            if state is not None and now - self._refreshed_at.get(key, 0) < REFRESH_SECONDS.get(interval, 300):
+                self._touch(key)
+                return state.snapshot()
+
+            if state is None:
+                frame = _fetch_bars(symbol, interval, WARMUP_PERIOD.get(interval, '10d'))
+                if frame is None:
+                    return None
+                state = initialize_state(self._new_state(params), *_frame_arrays(frame))
+            else:
+                bars = _fetch_arrays(symbol, interval, '1d' if interval != '1d' else '5d')
+                if bars is None or bars[0][0] > state.last_ts:
+                    # Idle for longer than the tail window (overnight, a weekend): bars between
+                    # last_ts and the tail's first bar would be skipped, so look further back
+                    bars = _fetch_arrays(symbol, interval, WARMUP_PERIOD.get(interval, '10d'))
+                    if bars is not None and bars[0][0] > state.last_ts:
+                        state = initialize_state(self._new_state(params), *bars)
+                        bars = None
+                if bars is not None:
+                    for ts, high, low, close in zip(*bars):
+                        if ts >= state.last_ts:
+                            state.apply(float(ts), float(high), float(low), float(close))
+
+            self._store(key, state)
+            return state.snapshot()
+
+    def _store(self, key: Tuple, state: IndicatorState) -> None:
+        with self._lock:
+            self._series[key] = state
+            self._series.move_to_end(key)
+            self._refreshed_at[key] = time.monotonic()
+            while len(self._series) > self.max_series:
+                evicted, _ = self._series.popitem(last=False)
+                self._refreshed_at.pop(evicted, None)
+                self._locks.pop(evicted, None)
+
+    def _touch(self, key: Tuple) -> None:
+        with self._lock:
+            if key in self._series:
+                self._series.move_to_end(key)
+
+
+def _frame_arrays(frame) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Split an OHLC DataFrame into (epoch seconds, high, low, close) float arrays"""
+    columns = {str(c).lower(): c for c in frame.columns}
+    ts = np.asarray([t.timestamp() for t in frame.index], dtype=float)
+    high = frame[columns['high']].to_numpy(dtype=float)
+    low = frame[columns['low']].to_numpy(dtype=float)
+    close = frame[columns['close']].to_numpy(dtype=float)
+    valid = ~(np.isnan(high) | np.isnan(low) | np.isnan(close))
+    return ts[valid], high[valid], low[valid], close[valid]
+
+
+def _fetch_arrays(symbol: str, interval: str, period: str):
+    """_frame_arrays of the fetched bars, or None if there are none"""
+    frame = _fetch_bars(symbol, interval, period)
+    if frame is None:
+        return None
+    bars = _frame_arrays(frame)
+    return bars if len(bars[0]) else None
+
+
+def _fetch_bars(symbol: str, interval: str, period: str):
+    """Fetch OHLC bars for an NSE symbol from yfinance"""
+    try:
+        from services.price_history import get_price_history
+        frame = get_price_history().get_history(f"{symbol.upper()}.NS", period=period, interval=interval)
+        if frame.empty:
+            logger.warning(f"No {interval} bars for {symbol}")
+            return None
+        return frame
+    except Exception as e:
+        logger.warning(f"Error fetching {interval} bars for {symbol}: {e}")
+        return None
+
+
+indicator_engine = IndicatorEngine()
@@ -494,6 +494,8 @@ Provide a search interest score from 0-100 (higher = more interest/bullish senti
         
         symbol = state.get("symbol", "")
         
+        # Live index values are returned with the result, not put in the prompt, so the
+        # prompt (and the LLM gateway's cache key) stays the same between snapshot refreshes
         query = f"""Analyze derivatives and market trend data for {symbol}:
 
 1. Open Interest (OI) changes - bullish/bearish buildup
@@ -505,7 +507,19 @@ Provide a search interest score from 0-100 (higher = more interest/bullish senti
 
 Provide a trend score from 0-100 (higher = more bullish positioning)."""
         
+        market_context = {}
         try:
+            from services.market_context_service import market_context_service
+            context = market_context_service.get_snapshot()
+            market_context = {
+                "vix": context["vix"].get("vix_value"),
+                "nifty_pcr": context["pcr"].get("pcr_value"),
+                "nifty_oi_pcr": context["oi"].get("oi_pcr"),
+                "as_of": context.get("as_of"),
+                "age_seconds": context.get("age_seconds"),
+                "stale": context.get("stale", False)
+            }
+            
             response = self.perplexity_service._call_perplexity_api(query, model="sonar")
             
             if response and response.get("choices"):
@@ -535,6 +549,8 @@ Provide a trend score from 0-100 (higher = more bullish positioning)."""
                 "confidence": 0.2
             }
         
+        result["market_context"] = market_context
+        
         return {
             "trend_result": result,
             "pipeline_stage": "trend_analysis",
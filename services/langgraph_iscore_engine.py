@@ -17,17 +17,54 @@ from datetime import datetime, date, timedelta, timezone
 from decimal import Decimal
 import operator
 import json
-import pandas as pd
 import math
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END
 
-from app import db
+from app import app, db
 
 logger = logging.getLogger(__name__)
 
+# Component nodes per asset route, in sequential order: qualitative, quantitative, search, trend
+COMPONENT_NODES = {
+    "stocks": ("qualitative_analysis", "quantitative_analysis", "search_sentiment", "trend_analysis"),
+    "mutual_funds": ("qualitative_analysis_mf", "quantitative_analysis_mf", "search_sentiment_mf", "trend_analysis_mf"),
+    "bonds": ("qualitative_analysis_bond", "quantitative_analysis_bond", "search_sentiment_bond", "trend_analysis_bond"),
+    "commodities": ("qualitative_analysis_commodity", "quantitative_analysis_commodity", "search_sentiment_commodity", "trend_analysis_commodity"),
+    "currency": ("qualitative_analysis_currency", "quantitative_analysis_currency", "search_sentiment_currency", "trend_analysis_currency"),
+    "options": ("qualitative_analysis_options", "quantitative_analysis_options", "search_sentiment_options", "trend_analysis_options"),
+    "futures": ("qualitative_analysis_futures", "quantitative_analysis_futures", "search_sentiment_futures", "trend_analysis_futures"),
+}
+
+# Parallel fan-out is on by default; set ISCORE_PARALLEL_NODES=false to restore the sequential chain
+ISCORE_PARALLEL_NODES = os.environ.get('ISCORE_PARALLEL_NODES', 'true').lower() == 'true'
+ISCORE_NODE_TIMEOUT = float(os.environ.get('ISCORE_NODE_TIMEOUT', '25'))
+# Longest a component node waits for a free worker; not counted against ISCORE_NODE_TIMEOUT
+ISCORE_NODE_QUEUE_TIMEOUT = float(os.environ.get('ISCORE_NODE_QUEUE_TIMEOUT', '60'))
+# Shared pool for timeout-bounded component nodes (4 components per concurrent analysis)
+ISCORE_NODE_WORKERS = int(os.environ.get('ISCORE_NODE_WORKERS', '16'))
+
+_component_executor = ThreadPoolExecutor(max_workers=ISCORE_NODE_WORKERS, thread_name_prefix='iscore-node')
+
+
+def _run_in_app_context(fn, *args):
+    """
+    Run fn under a fresh app context on a worker thread
+    Flask-SQLAlchemy scopes db.session per app context, so each worker gets its own Session
+    instead of sharing the caller's (Sessions are not thread-safe); it is removed on exit.
+    """
+    with app.app_context():
+        return fn(*args)
+
+
+def _latest_step(current: str, update: str) -> str:
+    """Reducer for `step` - parallel component nodes report progress in the same superstep"""
+    return update
+
 
 class IScoreState(TypedDict):
     """State for the I-Score analysis workflow"""
@@ -45,6 +82,10 @@ class IScoreState(TypedDict):
     
     cache_hit: bool
     cached_result: Optional[Dict]
+    cache_checked: bool
+    
+    # Market-wide context shared by every trend node in a batch (VIX, PCR, OI, indices)
+    market_context: Optional[Dict]
     
     # Component analysis with sources
     qualitative_score: float
@@ -80,7 +121,7 @@ class IScoreState(TypedDict):
     evidence: List[Dict]
     audit_trail: List[Dict]
     error: Optional[str]
-    step: str
+    step: Annotated[str, _latest_step]
 
 
 class LangGraphIScoreEngine:
@@ -93,11 +134,16 @@ class LangGraphIScoreEngine:
     5. Trend Analysis - OI, PCR, VIX (25%)
     6. Score Aggregation - Calculate weighted I-Score
     7. Store Results - Persist to database and cache
+    
+    In parallel mode (default) nodes 2-5 fan out concurrently after routing and
+    join at aggregation, each bounded by node_timeout with a fallback result.
     """
     
-    def __init__(self):
+    def __init__(self, parallel: bool = None, node_timeout: float = None):
         self._llm = None
         self._graph = None
+        self.parallel = ISCORE_PARALLEL_NODES if parallel is None else parallel
+        self.node_timeout = node_timeout or ISCORE_NODE_TIMEOUT
     
     @property
     def llm(self):
@@ -126,34 +172,38 @@ class LangGraphIScoreEngine:
         
         workflow.add_node("check_cache", self.check_cache)
         workflow.add_node("route_asset_type", self.route_asset_type)
-        workflow.add_node("qualitative_analysis", self.qualitative_analysis)
-        workflow.add_node("quantitative_analysis", self.quantitative_analysis)
-        workflow.add_node("search_sentiment", self.search_sentiment)
-        workflow.add_node("trend_analysis", self.trend_analysis)
-        workflow.add_node("qualitative_analysis_mf", self.qualitative_analysis_mf)
-        workflow.add_node("quantitative_analysis_mf", self.quantitative_analysis_mf)
-        workflow.add_node("search_sentiment_mf", self.search_sentiment)
-        workflow.add_node("trend_analysis_mf", self.trend_analysis_mf)
-        workflow.add_node("qualitative_analysis_bond", self.qualitative_analysis_bond)
-        workflow.add_node("quantitative_analysis_bond", self.quantitative_analysis_bond)
-        workflow.add_node("search_sentiment_bond", self.search_sentiment_bond)
-        workflow.add_node("trend_analysis_bond", self.trend_analysis_bond)
-        workflow.add_node("qualitative_analysis_commodity", self.qualitative_analysis_commodity)
-        workflow.add_node("quantitative_analysis_commodity", self.quantitative_analysis_commodity)
-        workflow.add_node("search_sentiment_commodity", self.search_sentiment_commodity)
-        workflow.add_node("trend_analysis_commodity", self.trend_analysis_commodity)
-        workflow.add_node("qualitative_analysis_currency", self.qualitative_analysis_currency)
-        workflow.add_node("quantitative_analysis_currency", self.quantitative_analysis_currency)
-        workflow.add_node("search_sentiment_currency", self.search_sentiment_currency)
-        workflow.add_node("trend_analysis_currency", self.trend_analysis_currency)
-        workflow.add_node("qualitative_analysis_options", self.qualitative_analysis_options)
-        workflow.add_node("quantitative_analysis_options", self.quantitative_analysis_options)
-        workflow.add_node("search_sentiment_options", self.search_sentiment_options)
-        workflow.add_node("trend_analysis_options", self.trend_analysis_options)
-        workflow.add_node("qualitative_analysis_futures", self.qualitative_analysis_futures)
-        workflow.add_node("quantitative_analysis_futures", self.quantitative_analysis_futures)
-        workflow.add_node("search_sentiment_futures", self.search_sentiment_futures)
-        workflow.add_node("trend_analysis_futures", self.trend_analysis_futures)
+        component_handlers = {
+            "qualitative_analysis": self.qualitative_analysis,
+            "quantitative_analysis": self.quantitative_analysis,
+            "search_sentiment": self.search_sentiment,
+            "trend_analysis": self.trend_analysis,
+            "qualitative_analysis_mf": self.qualitative_analysis_mf,
+            "quantitative_analysis_mf": self.quantitative_analysis_mf,
+            "search_sentiment_mf": self.search_sentiment,
+            "trend_analysis_mf": self.trend_analysis_mf,
+            "qualitative_analysis_bond": self.qualitative_analysis_bond,
+            "quantitative_analysis_bond": self.quantitative_analysis_bond,
+            "search_sentiment_bond": self.search_sentiment_bond,
+            "trend_analysis_bond": self.trend_analysis_bond,
+            "qualitative_analysis_commodity": self.qualitative_analysis_commodity,
+            "quantitative_analysis_commodity": self.quantitative_analysis_commodity,
+            "search_sentiment_commodity": self.search_sentiment_commodity,
+            "trend_analysis_commodity": self.trend_analysis_commodity,
+            "qualitative_analysis_currency": self.qualitative_analysis_currency,
+            "quantitative_analysis_currency": self.quantitative_analysis_currency,
+            "search_sentiment_currency": self.search_sentiment_currency,
+            "trend_analysis_currency": self.trend_analysis_currency,
+            "qualitative_analysis_options": self.qualitative_analysis_options,
+            "quantitative_analysis_options": self.quantitative_analysis_options,
+            "search_sentiment_options": self.search_sentiment_options,
+            "trend_analysis_options": self.trend_analysis_options,
+            "qualitative_analysis_futures": self.qualitative_analysis_futures,
+            "quantitative_analysis_futures": self.quantitative_analysis_futures,
+            "search_sentiment_futures": self.search_sentiment_futures,
+            "trend_analysis_futures": self.trend_analysis_futures
+        }
+        for node_name, handler in component_handlers.items():
+            workflow.add_node(node_name, self._wrap_component_node(node_name, handler))
         workflow.add_node("aggregate_scores", self.aggregate_scores)
         workflow.add_node("store_results", self.store_results)
         
@@ -168,54 +218,25 @@ class LangGraphIScoreEngine:
             }
         )
         
-        workflow.add_conditional_edges(
-            "route_asset_type",
-            self._get_asset_route,
-            {
-                "mutual_funds": "qualitative_analysis_mf",
-                "bonds": "qualitative_analysis_bond",
-                "commodities": "qualitative_analysis_commodity",
-                "currency": "qualitative_analysis_currency",
-                "options": "qualitative_analysis_options",
-                "futures": "qualitative_analysis_futures",
-                "stocks": "qualitative_analysis"
-            }
-        )
-        
-        workflow.add_edge("qualitative_analysis", "quantitative_analysis")
-        workflow.add_edge("quantitative_analysis", "search_sentiment")
-        workflow.add_edge("search_sentiment", "trend_analysis")
-        workflow.add_edge("trend_analysis", "aggregate_scores")
-        
-        workflow.add_edge("qualitative_analysis_mf", "quantitative_analysis_mf")
-        workflow.add_edge("quantitative_analysis_mf", "search_sentiment_mf")
-        workflow.add_edge("search_sentiment_mf", "trend_analysis_mf")
-        workflow.add_edge("trend_analysis_mf", "aggregate_scores")
-        
-        workflow.add_edge("qualitative_analysis_bond", "quantitative_analysis_bond")
-        workflow.add_edge("quantitative_analysis_bond", "search_sentiment_bond")
-        workflow.add_edge("search_sentiment_bond", "trend_analysis_bond")
-        workflow.add_edge("trend_analysis_bond", "aggregate_scores")
-        
-        workflow.add_edge("qualitative_analysis_commodity", "quantitative_analysis_commodity")
-        workflow.add_edge("quantitative_analysis_commodity", "search_sentiment_commodity")
-        workflow.add_edge("search_sentiment_commodity", "trend_analysis_commodity")
-        workflow.add_edge("trend_analysis_commodity", "aggregate_scores")
-        
-        workflow.add_edge("qualitative_analysis_currency", "quantitative_analysis_currency")
-        workflow.add_edge("quantitative_analysis_currency", "search_sentiment_currency")
-        workflow.add_edge("search_sentiment_currency", "trend_analysis_currency")
-        workflow.add_edge("trend_analysis_currency", "aggregate_scores")
-        
-        workflow.add_edge("qualitative_analysis_options", "quantitative_analysis_options")
-        workflow.add_edge("quantitative_analysis_options", "search_sentiment_options")
-        workflow.add_edge("search_sentiment_options", "trend_analysis_options")
-        workflow.add_edge("trend_analysis_options", "aggregate_scores")
-        
-        workflow.add_edge("qualitative_analysis_futures", "quantitative_analysis_futures")
-        workflow.add_edge("quantitative_analysis_futures", "search_sentiment_futures")
-        workflow.add_edge("search_sentiment_futures", "trend_analysis_futures")
-        workflow.add_edge("trend_analysis_futures", "aggregate_scores")
+        if self.parallel:
+            # Fan out: all four component nodes start together and join at aggregate_scores
+            workflow.add_conditional_edges(
+                "route_asset_type",
+                self._get_parallel_route,
+                [node for nodes in COMPONENT_NODES.values() for node in nodes]
+            )
+            for nodes in COMPONENT_NODES.values():
+                workflow.add_edge(list(nodes), "aggregate_scores")
+        else:
+            workflow.add_conditional_edges(
+                "route_asset_type",
+                self._get_asset_route,
+                {route: nodes[0] for route, nodes in COMPONENT_NODES.items()}
+            )
+            for nodes in COMPONENT_NODES.values():
+                for current_node, next_node in zip(nodes, nodes[1:]):
+                    workflow.add_edge(current_node, next_node)
+                workflow.add_edge(nodes[-1], "aggregate_scores")
         
         workflow.add_edge("aggregate_scores", "store_results")
         workflow.add_edge("store_results", END)
@@ -252,6 +273,87 @@ class LangGraphIScoreEngine:
             return "mutual_funds"
         return "stocks"
     
+    def _get_parallel_route(self, state: IScoreState) -> List[str]:
+        """Fan out to all four component nodes of the asset's route"""
+        return list(COMPONENT_NODES[self._get_asset_route(state)])
+    
+    def _wrap_component_node(self, node_name: str, handler):
+        """
+        Bound a component node by node_timeout when running in parallel mode.
+        A node that overruns degrades to its component fallback so aggregate_scores
+        never waits on the slowest external source longer than the timeout.
+        """
+        if not self.parallel:
+            return handler
+        
+        component = node_name.split('_')[0]
+        
+        def bounded_node(state: IScoreState) -> Dict:
+            started = threading.Event()
+            
+            def run():
+                started.set()
+                return _run_in_app_context(handler, state)
+            
+            future = _component_executor.submit(run)
+            try:
+                # Time only the node's execution, not its wait for a worker behind other analyses
+                if not started.wait(timeout=ISCORE_NODE_QUEUE_TIMEOUT) and future.cancel():
+                    logger.warning(f"I-Score {node_name} got no worker within {ISCORE_NODE_QUEUE_TIMEOUT}s for {state['symbol']}")
+                    return self._component_fallback(component, state['symbol'])
+                return future.result(timeout=self.node_timeout)
+            except FutureTimeoutError:
+                logger.warning(f"I-Score {node_name} timed out after {self.node_timeout}s for {state['symbol']}")
+            except Exception as e:
+                logger.error(f"I-Score {node_name} failed for {state['symbol']}: {e}")
+            return self._component_fallback(component, state['symbol'])
+        
+        bounded_node.__name__ = node_name
+        return bounded_node
+    
+    def _component_fallback(self, component: str, symbol: str) -> Dict:
+        """Fallback result for a component node that timed out or raised"""
+        if component == 'qualitative':
+            return {
+                'qualitative_score': 50,
+                'qualitative_details': {'error': 'Analysis unavailable'},
+                'qualitative_sources': [{'name': 'N/A', 'type': 'error', 'coverage': 'Analysis failed'}],
+                'qualitative_reasoning': 'Qualitative analysis is currently unavailable',
+                'qualitative_confidence': 0.3,
+                'step': 'qualitative_fallback'
+            }
+        if component == 'quantitative':
+            fallback = self._get_fallback_price_data(symbol)
+            return {
+                'current_price': fallback.get('current_price', 0),
+                'previous_close': fallback.get('previous_close', 0),
+                'price_change_pct': fallback.get('change_percent', 0),
+                'market_status': 'demo',
+                'quantitative_score': 50,
+                'quantitative_details': {'error': 'Technical data unavailable'},
+                'quantitative_sources': [{'name': 'NSE Service', 'type': 'demo', 'coverage': 'Demo data for ' + symbol}],
+                'quantitative_reasoning': 'Using demo data - technical analysis currently unavailable',
+                'quantitative_confidence': 0.3,
+                'step': 'quantitative_fallback'
+            }
+        if component == 'search':
+            return {
+                'search_score': 50,
+                'search_details': {'error': 'Search analysis unavailable'},
+                'search_sources': [{'name': 'Perplexity API', 'type': 'error', 'coverage': 'Service temporarily unavailable'}],
+                'search_reasoning': 'Search sentiment analysis currently unavailable',
+                'search_confidence': 0.3,
+                'step': 'search_fallback'
+            }
+        return {
+            'trend_score': 50,
+            'trend_details': {'error': 'Trend data unavailable'},
+            'trend_sources': [{'name': 'NSE Data', 'type': 'error', 'coverage': 'Market data temporarily unavailable'}],
+            'trend_reasoning': 'Trend analysis currently unavailable',
+            'trend_confidence': 0.3,
+            'step': 'trend_fallback'
+        }
+    
     def route_asset_type(self, state: IScoreState) -> Dict:
         """Node to route based on asset type"""
         asset_type = state.get('asset_type', 'stocks')
@@ -363,6 +465,18 @@ class LangGraphIScoreEngine:
         """Node 1: Check if valid cached result exists"""
         logger.info(f"I-Score Node 1: Checking cache for {state['symbol']}")
         
+        config = state.get('config') or self._get_config()
+        
+        # Batch callers look up the whole watchlist up front and only send misses through the graph
+        if state.get('cache_checked'):
+            return {
+                'cache_hit': False,
+                'cached_result': None,
+                'config': config,
+                'evidence': [],
+                'step': 'cache_miss'
+            }
+        
         from models import ResearchCache
         
         cache_key = self._generate_cache_key(
@@ -375,45 +489,49 @@ class LangGraphIScoreEngine:
         
         if cached:
             logger.info(f"Cache HIT for {state['symbol']}, using cached I-Score: {cached.overall_score}")
-            payload = cached.result_payload or {}
-            
-            qualitative = payload.get('qualitative', {})
-            quantitative = payload.get('quantitative', {})
-            search = payload.get('search', {})
-            trend = payload.get('trend', {})
-            
-            return {
-                'cache_hit': True,
-                'cached_result': payload,
-                'overall_score': float(cached.overall_score) if cached.overall_score else 0,
-                'overall_confidence': payload.get('overall_confidence', 0),
-                'recommendation': cached.recommendation,
-                'recommendation_summary': payload.get('recommendation_summary', ''),
-                'qualitative_score': qualitative.get('score', 0),
-                'qualitative_details': qualitative.get('details', {}),
-                'qualitative_confidence': qualitative.get('confidence', 0),
-                'quantitative_score': quantitative.get('score', 0),
-                'quantitative_details': quantitative.get('details', {}),
-                'quantitative_confidence': quantitative.get('confidence', 0),
-                'search_score': search.get('score', 0),
-                'search_details': search.get('details', {}),
-                'search_confidence': search.get('confidence', 0),
-                'trend_score': trend.get('score', 0),
-                'trend_details': trend.get('details', {}),
-                'trend_confidence': trend.get('confidence', 0),
-                'config': self._get_config(),
-                'step': 'cache_hit'
-            }
+            return self._state_from_cache(cached, config)
         
         logger.info(f"Cache MISS for {state['symbol']}, computing new I-Score")
         return {
             'cache_hit': False,
             'cached_result': None,
-            'config': self._get_config(),
+            'config': config,
             'evidence': [],
             'step': 'cache_miss'
         }
     
+    def _state_from_cache(self, cached, config: Dict) -> Dict:
+        """Expand a ResearchCache row into I-Score state fields"""
+        payload = cached.result_payload or {}
+        
+        qualitative = payload.get('qualitative', {})
+        quantitative = payload.get('quantitative', {})
+        search = payload.get('search', {})
+        trend = payload.get('trend', {})
+        
+        return {
+            'cache_hit': True,
+            'cached_result': payload,
+            'overall_score': float(cached.overall_score) if cached.overall_score else 0,
+            'overall_confidence': payload.get('overall_confidence', 0),
+            'recommendation': cached.recommendation,
+            'recommendation_summary': payload.get('recommendation_summary', ''),
+            'qualitative_score': qualitative.get('score', 0),
+            'qualitative_details': qualitative.get('details', {}),
+            'qualitative_confidence': qualitative.get('confidence', 0),
+            'quantitative_score': quantitative.get('score', 0),
+            'quantitative_details': quantitative.get('details', {}),
+            'quantitative_confidence': quantitative.get('confidence', 0),
+            'search_score': search.get('score', 0),
+            'search_details': search.get('details', {}),
+            'search_confidence': search.get('confidence', 0),
+            'trend_score': trend.get('score', 0),
+            'trend_details': trend.get('details', {}),
+            'trend_confidence': trend.get('confidence', 0),
+            'config': config,
+            'step': 'cache_hit'
+        }
+    
     def qualitative_analysis(self, state: IScoreState) -> Dict:
         """Node 2: Qualitative Sentiment Analysis (15% weight)"""
         logger.info(f"I-Score Node 2: Qualitative analysis for {state['symbol']}")
@@ -501,9 +619,6 @@ class LangGraphIScoreEngine:
             
             quote = nse.get_stock_quote(symbol)
             
-            # Store price data in state for frontend display
-            audit_trail = state.get('audit_trail', [])
-            
             if quote:
                 price = quote.get('current_price', 0)
                 prev_close = quote.get('previous_close', 0)
@@ -512,21 +627,15 @@ class LangGraphIScoreEngine:
                 
                 price_change_pct = quote.get('change_percent', 0)
                 
-                # Update state with real market data
-                state['current_price'] = price
-                state['previous_close'] = prev_close
-                state['price_change_pct'] = price_change_pct
-                
                 rsi_period = tech_params.get('rsi_period', 14)
                 rsi_overbought = tech_params.get('rsi_overbought', 70)
                 rsi_oversold = tech_params.get('rsi_oversold', 30)
                 
-                # Try to get real RSI from intraday (hourly) data
-                intraday_df = nse.get_intraday_data(symbol, interval="1h")
-                if intraday_df is not None and not intraday_df.empty and 'rsi' in intraday_df.columns:
-                    simulated_rsi = float(intraday_df['rsi'].iloc[-1])  # Latest RSI value
-                    if pd.isna(simulated_rsi):
-                        simulated_rsi = 50 + (price_change_pct * 5)
+                # Latest hourly indicators from the incremental engine (no history refetch per request)
+                from services.indicator_engine import indicator_engine
+                indicators = indicator_engine.get_latest(symbol, interval="1h", params=tech_params) or {}
+                if indicators.get('rsi') is not None:
+                    simulated_rsi = float(indicators['rsi'])
                 else:
                     # Fallback to simulated RSI if intraday data unavailable
                     simulated_rsi = 50 + (price_change_pct * 5)
@@ -553,7 +662,10 @@ class LangGraphIScoreEngine:
                 ema_short = tech_params.get('ema_short', 9)
                 ema_long = tech_params.get('ema_long', 20)
                 
-                if price > prev_close:
+                if indicators.get('ema_signal'):
+                    ema_signal = f"{indicators['ema_signal']}_crossover"
+                    ema_score = 65 if indicators['ema_signal'] == 'bullish' else 35
+                elif price > prev_close:
                     ema_signal = 'bullish_crossover'
                     ema_score = 65
                 elif price < prev_close:
@@ -565,14 +677,16 @@ class LangGraphIScoreEngine:
                 
                 overall_quant_score = (rsi_score * 0.35) + (trend_score * 0.40) + (ema_score * 0.25)
                 
+                supertrend_direction = indicators.get('supertrend_direction') or ('bullish' if price_change_pct > 0 else 'bearish')
+                
                 sources_list = [
                     {'name': 'NSE Real-Time Data', 'type': 'market_data', 'coverage': f'Current Price: ₹{price}, Change: {price_change_pct}%'},
-                    {'name': 'RSI Indicator', 'type': 'technical', 'coverage': f'14-period RSI: {round(simulated_rsi, 2)}'},
+                    {'name': 'RSI Indicator', 'type': 'technical', 'coverage': f'{rsi_period}-period RSI: {round(simulated_rsi, 2)}'},
                     {'name': 'EMA Crossover', 'type': 'technical', 'coverage': f'EMA({ema_short}/{ema_long}): {ema_signal}'},
-                    {'name': 'SuperTrend', 'type': 'trend_following', 'coverage': f'Direction: {("Bullish" if price_change_pct > 0 else "Bearish")}'}
+                    {'name': 'SuperTrend', 'type': 'trend_following', 'coverage': f'Direction: {supertrend_direction.capitalize()}'}
                 ]
                 
-                reasoning = f"Technical analysis shows {ema_signal} crossover signal with RSI at {round(simulated_rsi, 2)}. Price moved {price_change_pct}% from previous close. SuperTrend indicates {('bullish' if price_change_pct > 0 else 'bearish')} momentum."
+                reasoning = f"Technical analysis shows {ema_signal} crossover signal with RSI at {round(simulated_rsi, 2)}. Price moved {price_change_pct}% from previous close. SuperTrend indicates {supertrend_direction} momentum."
                 
                 return {
                     'current_price': price,
@@ -587,7 +701,9 @@ class LangGraphIScoreEngine:
                             'score': round(rsi_score, 2)
                         },
                         'supertrend': {
-                            'direction': 'bullish' if price_change_pct > 0 else 'bearish',
+                            'direction': supertrend_direction,
+                            'value': indicators.get('supertrend'),
+                            'atr': indicators.get('atr'),
                             'score': round(trend_score, 2)
                         },
                         'ema': {
@@ -725,12 +841,10 @@ class LangGraphIScoreEngine:
         trend_params = config.get('weights', {}).get('trend_params', {})
         
         try:
-            from services.nse_service import NSEService
-            nse = NSEService()
-            
-            indices = nse.get_market_indices()
+            market_context = state.get('market_context') or self._get_market_context()
+            indices = market_context.get('indices', {})
             
-            vix_data = nse.get_india_vix()
+            vix_data = market_context.get('vix', {})
             vix_value = vix_data.get('vix_value', 15.0)
             vix_source = vix_data.get('source', 'fallback')
             vix_low = trend_params.get('vix_low', 15)
@@ -748,7 +862,7 @@ class LangGraphIScoreEngine:
                 vix_signal = 'moderate'
                 vix_score = 50 - ((vix_value - vix_low) / (vix_high - vix_low)) * 20
             
-            pcr_data = nse.get_pcr('NIFTY')
+            pcr_data = market_context.get('pcr', {})
             pcr_value = pcr_data.get('pcr_value', 0.85)
             pcr_source = pcr_data.get('source', 'fallback')
             pcr_bullish = trend_params.get('pcr_bullish_threshold', 0.7)
@@ -766,7 +880,7 @@ class LangGraphIScoreEngine:
                 pcr_signal = 'neutral'
                 pcr_score = 50 + (pcr_value - 1.0) * 20
             
-            oi_data = nse.get_option_chain_oi('NIFTY')
+            oi_data = market_context.get('oi', {})
             total_ce_oi = oi_data.get('total_ce_oi', 0)
             total_pe_oi = oi_data.get('total_pe_oi', 0)
             oi_pcr = oi_data.get('oi_pcr', 1.0)
@@ -831,6 +945,11 @@ class LangGraphIScoreEngine:
                     'market_trend': {
                         'nifty_change': market_trend,
                         'score': round(market_score, 2)
+                    },
+                    'market_context': {
+                        'as_of': market_context.get('as_of'),
+                        'age_seconds': market_context.get('age_seconds'),
+                        'stale': market_context.get('stale', False)
                     }
                 },
                 'trend_sources': sources_list,
@@ -850,6 +969,11 @@ class LangGraphIScoreEngine:
             'step': 'trend_fallback'
         }
     
+    def _get_market_context(self) -> Dict:
+        """Market-wide trend inputs (indices, India VIX, NIFTY PCR and option-chain OI) from the shared snapshot"""
+        from services.market_context_service import market_context_service
+        return market_context_service.get_snapshot()
+    
     # ==================== MUTUAL FUND ANALYSIS METHODS ====================
     
     def qualitative_analysis_mf(self, state: IScoreState) -> Dict:
@@ -2932,7 +3056,87 @@ class LangGraphIScoreEngine:
         Returns:
             Dictionary with I-Score results
         """
-        initial_state: IScoreState = {
+        return self._run(self._initial_state(asset_type, symbol, user_id, asset_name))
+    
+    def analyze_batch(self, symbols: List[str], asset_type: str = 'stocks', user_id: int = 1,
+                      max_concurrency: int = 4) -> Dict[str, Dict]:
+        """
+        Run I-Score analysis for a whole watchlist in one call
+        
+        Cache lookup is a single query for all symbols, weight/threshold config is
+        loaded once and market-wide trend inputs are fetched once for the batch.
+        Cache misses run through the graph with at most max_concurrency in flight,
+        each on a worker thread with its own app context and db.session.
+        
+        Args:
+            symbols: Asset symbols to score (duplicates are scored once)
+            asset_type: Type of asset shared by all symbols
+            user_id: User requesting the analysis
+            max_concurrency: Maximum number of graph invocations in flight
+        
+        Returns:
+            Dictionary of symbol -> I-Score result, in input order
+        """
+        from models import ResearchCache
+        
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            return {}
+        
+        config = self._get_config()
+        today = date.today()
+        cache_keys = {symbol: self._generate_cache_key(asset_type, symbol, today) for symbol in symbols}
+        cached_rows = ResearchCache.get_valid_caches(list(cache_keys.values()))
+        
+        results = {}
+        misses = []
+        for symbol in symbols:
+            cached = cached_rows.get(cache_keys[symbol])
+            if cached:
+                state = self._initial_state(asset_type, symbol, user_id)
+                state.update(self._state_from_cache(cached, config))
+                results[symbol] = self._format_result(state, symbol, asset_type)
+            else:
+                misses.append(symbol)
+        
+        try:
+            ResearchCache.record_hits([cache_keys[symbol] for symbol in results])
+        except Exception as e:
+            logger.warning(f"Could not record I-Score cache hits: {e}")
+        
+        logger.info(f"I-Score batch: {len(results)} cache hits, {len(misses)} to compute for {asset_type}")
+        
+        if misses:
+            market_context = None
+            if self._get_asset_route({'asset_type': asset_type}) == 'stocks':
+                # One snapshot for the whole batch so every trend node scores against the same market
+                market_context = self._get_market_context()
+            
+            def run_symbol(symbol: str) -> Dict:
+                state = self._initial_state(asset_type, symbol, user_id)
+                state['config'] = config
+                state['cache_checked'] = True
+                state['market_context'] = market_context
+                return self._run(state)
+            
+            if self.parallel:
+                # Each graph fans out to four component nodes on the shared node pool
+                max_concurrency = min(max_concurrency, max(1, ISCORE_NODE_WORKERS // 4))
+            
+            with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(misses))),
+                                    thread_name_prefix='iscore-batch') as executor:
+                futures = {
+                    symbol: executor.submit(_run_in_app_context, run_symbol, symbol)
+                    for symbol in misses
+                }
+                for symbol, future in futures.items():
+                    results[symbol] = future.result()
+        
+        return {symbol: results[symbol] for symbol in symbols}
+    
+    def _initial_state(self, asset_type: str, symbol: str, user_id: int, asset_name: str = None) -> IScoreState:
+        """Build the starting graph state for one asset"""
+        state: IScoreState = {
             'asset_type': asset_type,
             'symbol': symbol,
             'asset_name': asset_name or symbol,
@@ -2944,6 +3148,8 @@ class LangGraphIScoreEngine:
             'data_timestamp': datetime.utcnow().isoformat(),
             'cache_hit': False,
             'cached_result': None,
+            'cache_checked': False,
+            'market_context': None,
             'qualitative_score': 0,
             'qualitative_details': {},
             'qualitative_confidence': 0,
@@ -2974,82 +3180,16 @@ class LangGraphIScoreEngine:
             'error': None,
             'step': 'start'
         }
+        return state
+    
+    def _run(self, initial_state: IScoreState) -> Dict:
+        """Invoke the graph and shape the API response"""
+        symbol = initial_state['symbol']
+        asset_type = initial_state['asset_type']
         
         try:
             result = self.graph.invoke(initial_state)
-            
-            # Extract price from quantitative_details if not in top-level state
-            current_price = result.get('current_price', 0)
-            previous_close = result.get('previous_close', 0)
-            price_change_pct = result.get('price_change_pct', 0)
-            
-            # Fallback: get price from quantitative_details if top-level is 0
-            quant_details = result.get('quantitative_details', {})
-            if current_price == 0 and quant_details:
-                price_data = quant_details.get('price_data', {})
-                if price_data:
-                    current_price = price_data.get('current', 0)
-                    previous_close = price_data.get('previous_close', previous_close)
-                    price_change_pct = price_data.get('change_pct', price_change_pct)
-                    logger.info(f"Using price from quantitative_details: ₹{current_price}")
-            
-            return {
-                'success': True,
-                'symbol': symbol,
-                'asset_type': asset_type,
-                'asset_name': result.get('asset_name', symbol),
-                'iscore': result.get('overall_score', 0),
-                'confidence': result.get('overall_confidence', 0),
-                'recommendation': result.get('recommendation', 'INCONCLUSIVE'),
-                'summary': result.get('recommendation_summary', ''),
-                'market_data': {
-                    'current_price': current_price,
-                    'previous_close': previous_close,
-                    'change_pct': price_change_pct,
-                    'timestamp': result.get('data_timestamp', '')
-                },
-                'components': {
-                    'qualitative': {
-                        'score': result.get('qualitative_score', 0),
-                        'weight': 15,
-                        'confidence': result.get('qualitative_confidence', 0),
-                        'details': result.get('qualitative_details', {}),
-                        'sources': result.get('qualitative_sources', []),
-                        'reasoning': result.get('qualitative_reasoning', '')
-                    },
-                    'quantitative': {
-                        'score': result.get('quantitative_score', 0),
-                        'weight': 50,
-                        'confidence': result.get('quantitative_confidence', 0),
-                        'details': result.get('quantitative_details', {}),
-                        'sources': result.get('quantitative_sources', []),
-                        'reasoning': result.get('quantitative_reasoning', '')
-                    },
-                    'search': {
-                        'score': result.get('search_score', 0),
-                        'weight': 10,
-                        'confidence': result.get('search_confidence', 0),
-                        'details': result.get('search_details', {}),
-                        'sources': result.get('search_sources', []),
-                        'reasoning': result.get('search_reasoning', '')
-                    },
-                    'trend': {
-                        'score': result.get('trend_score', 0),
-                        'weight': 25,
-                        'confidence': result.get('trend_confidence', 0),
-                        'details': result.get('trend_details', {}),
-                        'sources': result.get('trend_sources', []),
-                        'reasoning': result.get('trend_reasoning', '')
-                    }
-                },
-                'transparency': {
-                    'description': 'Every recommendation comes with clear reasoning and audit trails for complete transparency',
-                    'audit_trail': result.get('audit_trail', [])
-                },
-                'cached': result.get('cache_hit', False),
-                'timestamp': datetime.utcnow().isoformat()
-            }
-            
+            return self._format_result(result, symbol, asset_type)
         except Exception as e:
             logger.error(f"I-Score analysis failed for {symbol}: {e}")
             return {
@@ -3060,6 +3200,80 @@ class LangGraphIScoreEngine:
                 'recommendation': 'ERROR',
                 'error': str(e)
             }
+    
+    def _format_result(self, result: Dict, symbol: str, asset_type: str) -> Dict:
+        """Shape final graph state into the I-Score API response"""
+        # Extract price from quantitative_details if not in top-level state
+        current_price = result.get('current_price', 0)
+        previous_close = result.get('previous_close', 0)
+        price_change_pct = result.get('price_change_pct', 0)
+        
+        # Fallback: get price from quantitative_details if top-level is 0
+        quant_details = result.get('quantitative_details', {})
+        if current_price == 0 and quant_details:
+            price_data = quant_details.get('price_data', {})
+            if price_data:
+                current_price = price_data.get('current', 0)
+                previous_close = price_data.get('previous_close', previous_close)
+                price_change_pct = price_data.get('change_pct', price_change_pct)
+                logger.info(f"Using price from quantitative_details: ₹{current_price}")
+        
+        return {
+            'success': True,
+            'symbol': symbol,
+            'asset_type': asset_type,
+            'asset_name': result.get('asset_name', symbol),
+            'iscore': result.get('overall_score', 0),
+            'confidence': result.get('overall_confidence', 0),
+            'recommendation': result.get('recommendation', 'INCONCLUSIVE'),
+            'summary': result.get('recommendation_summary', ''),
+            'market_data': {
+                'current_price': current_price,
+                'previous_close': previous_close,
+                'change_pct': price_change_pct,
+                'timestamp': result.get('data_timestamp', '')
+            },
+            'components': {
+                'qualitative': {
+                    'score': result.get('qualitative_score', 0),
+                    'weight': 15,
+                    'confidence': result.get('qualitative_confidence', 0),
+                    'details': result.get('qualitative_details', {}),
+                    'sources': result.get('qualitative_sources', []),
+                    'reasoning': result.get('qualitative_reasoning', '')
+                },
+                'quantitative': {
+                    'score': result.get('quantitative_score', 0),
+                    'weight': 50,
+                    'confidence': result.get('quantitative_confidence', 0),
+                    'details': result.get('quantitative_details', {}),
+                    'sources': result.get('quantitative_sources', []),
+                    'reasoning': result.get('quantitative_reasoning', '')
+                },
+                'search': {
+                    'score': result.get('search_score', 0),
+                    'weight': 10,
+                    'confidence': result.get('search_confidence', 0),
+                    'details': result.get('search_details', {}),
+                    'sources': result.get('search_sources', []),
+                    'reasoning': result.get('search_reasoning', '')
+                },
+                'trend': {
+                    'score': result.get('trend_score', 0),
+                    'weight': 25,
+                    'confidence': result.get('trend_confidence', 0),
+                    'details': result.get('trend_details', {}),
+                    'sources': result.get('trend_sources', []),
+                    'reasoning': result.get('trend_reasoning', '')
+                }
+            },
+            'transparency': {
+                'description': 'Every recommendation comes with clear reasoning and audit trails for complete transparency',
+                'audit_trail': result.get('audit_trail', [])
+            },
+            'cached': result.get('cache_hit', False),
+            'timestamp': datetime.utcnow().isoformat()
+        }
 
 
 def get_iscore_for_symbol(symbol: str, asset_type: str = 'stocks', user_id: int = None) -> Dict:
@@ -3073,3 +3287,13 @@ def get_iscore_for_symbol(symbol: str, asset_type: str = 'stocks', user_id: int
     """
     engine = LangGraphIScoreEngine()
     return engine.analyze(asset_type, symbol, user_id or 1)
+
+
+def get_iscores_for_symbols(symbols: List[str], asset_type: str = 'stocks', user_id: int = None) -> Dict[str, Dict]:
+    """
+    Convenience function to score a watchlist (e.g. the ResearchList) in one call
+    
+    Returns a dictionary of symbol -> I-Score result, see LangGraphIScoreEngine.analyze_batch
+    """
+    engine = LangGraphIScoreEngine()
+    return engine.analyze_batch(symbols, asset_type, user_id or 1)
@@ -14,6 +14,7 @@ from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END
 
+from services.llm_gateway import invoke_chat_model
 from services.comprehensive_portfolio_service import ComprehensivePortfolioService
 
 logger = logging.getLogger(__name__)
@@ -209,10 +210,10 @@ Be precise and quantitative. Output as structured JSON."""
         portfolio_summary = json.dumps(portfolio, indent=2)
         preferences_summary = json.dumps(user_preferences, indent=2) if user_preferences else "No preferences set"
         
-        response = self.risk_llm.invoke([
+        response = invoke_chat_model(self.risk_llm, [
             SystemMessage(content=system_prompt),
             HumanMessage(content=f"Analyze this portfolio for risk:\n\nPortfolio:\n{portfolio_summary}\n\nUser Preferences:\n{preferences_summary}")
-        ])
+        ], namespace='portfolio_optimizer')
         
         try:
             content = response.content if isinstance(response.content, str) else str(response.content)
@@ -245,10 +246,10 @@ Provide specific percentages and actionable insights. Output as JSON."""
         
         portfolio_summary = json.dumps(portfolio, indent=2)
         
-        response = self.balanced_llm.invoke([
+        response = invoke_chat_model(self.balanced_llm, [
             SystemMessage(content=system_prompt),
             HumanMessage(content=f"Analyze sector allocation:\n{portfolio_summary}")
-        ])
+        ], namespace='portfolio_optimizer')
         
         try:
             content = response.content if isinstance(response.content, str) else str(response.content)
@@ -294,10 +295,10 @@ Risk Analysis: {json.dumps(risk_analysis, indent=2)}
 Sector Analysis: {json.dumps(sector_analysis, indent=2)}
 User Preferences: {preferences_summary}"""
         
-        response = self.balanced_llm.invoke([
+        response = invoke_chat_model(self.balanced_llm, [
             SystemMessage(content=system_prompt),
             HumanMessage(content=f"Recommend asset allocation:\n{context}")
-        ])
+        ], namespace='portfolio_optimizer')
         
         try:
             content = response.content if isinstance(response.content, str) else str(response.content)
@@ -354,10 +355,10 @@ Output as JSON array."""
 Allocation Gaps: {json.dumps(allocation_recs, indent=2)}
 User Preferences: {preferences_summary}"""
         
-        response = self.creative_llm.invoke([
+        response = invoke_chat_model(self.creative_llm, [
             SystemMessage(content=system_prompt),
             HumanMessage(content=f"Find investment opportunities:\n{context}")
-        ])
+        ], namespace='portfolio_optimizer')
         
         try:
             content = response.content if isinstance(response.content, str) else str(response.content)
@@ -427,10 +428,10 @@ Allocation Recommendations:
 Investment Opportunities:
 {json.dumps(agent_outputs.get('opportunity_agent', {}), indent=2)}"""
         
-        response = self.balanced_llm.invoke([
+        response = invoke_chat_model(self.balanced_llm, [
             SystemMessage(content=system_prompt),
             HumanMessage(content=f"Create comprehensive report:\n{context}")
-        ])
+        ], namespace='portfolio_optimizer')
         
         content = response.content if isinstance(response.content, str) else str(response.content)
         return {
@@ -14,6 +14,7 @@ from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
 
+from services.llm_gateway import invoke_chat_model
 from services.research_assistant_service import ResearchAssistantService
 from services.perplexity_service import PerplexityService
 
@@ -125,10 +126,10 @@ class LangGraphResearchAssistant:
 
 Respond in JSON format with: intent, entities, requires_realtime, suggest_trades"""
         
-        response = self.llm.invoke([
+        response = invoke_chat_model(self.llm, [
             SystemMessage(content=system_prompt),
             HumanMessage(content=state["user_query"])
-        ])
+        ], namespace='chat')
         
         return {
             "messages": [AIMessage(content=f"Query understood: {response.content}")],
@@ -253,10 +254,10 @@ Current Market Analysis:
 
 Create a detailed research report."""
         
-        response = self.llm.invoke([
+        response = invoke_chat_model(self.llm, [
             SystemMessage(content=system_prompt),
             HumanMessage(content=user_prompt)
-        ])
+        ], namespace='chat')
         
         # Extract citations from Perplexity
         citations = state.get('market_data', {}).get('citations', [])
@@ -306,10 +307,10 @@ Output as JSON array."""
 
 User's current holdings: {state.get('user_context', {}).get('portfolio', {}).get('holdings', [])}"""
         
-        response = self.llm.invoke([
+        response = invoke_chat_model(self.llm, [
             SystemMessage(content=system_prompt),
             HumanMessage(content=user_prompt)
-        ])
+        ], namespace='chat')
         
         return {
             "trade_suggestions": [{"raw_suggestion": response.content}],
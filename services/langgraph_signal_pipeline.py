@@ -14,6 +14,7 @@ from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END
 
+from services.llm_gateway import invoke_chat_model
 from services.perplexity_service import PerplexityService
 from services.market_data_service import MarketDataService
 
@@ -195,10 +196,10 @@ For each signal provide:
 
 Output as JSON array of 5-10 high-quality signals."""
         
-        response = self.llm.invoke([
+        response = invoke_chat_model(self.llm, [
             SystemMessage(content=system_prompt),
             HumanMessage(content=f"Generate signals from scan:\n{json.dumps(market_scan, indent=2)}")
-        ])
+        ], namespace='signals')
         
         try:
             content = response.content if isinstance(response.content, str) else str(response.content)
@@ -237,10 +238,10 @@ For each signal, validate:
 
 Reject signals that don't meet criteria. Output validated signals as JSON array."""
         
-        response = self.llm.invoke([
+        response = invoke_chat_model(self.llm, [
             SystemMessage(content=system_prompt),
             HumanMessage(content=f"Validate these signals:\n{json.dumps(signals, indent=2)}")
-        ])
+        ], namespace='signals')
         
         try:
             content = response.content if isinstance(response.content, str) else str(response.content)
@@ -303,10 +304,10 @@ For each signal, create an execution plan:
 
 Output as enhanced signal objects with execution_plan field."""
         
-        response = self.llm.invoke([
+        response = invoke_chat_model(self.llm, [
             SystemMessage(content=system_prompt),
             HumanMessage(content=f"Create execution plans:\n{json.dumps(execution_ready, indent=2)}")
-        ])
+        ], namespace='signals')
         
         try:
             content = response.content if isinstance(response.content, str) else str(response.content)
@@ -0,0 +1,298 @@
+"""
+LLM Gateway
+Shared front for paid model calls (Perplexity, Anthropic, OpenAI via LangChain): content-hash
+response caching with per-namespace TTLs, coalescing of identical in-flight prompts within and
+across workers, a concurrency cap per provider, and token/latency accounting
+"""
+
+import os
+import copy
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds a response is reused, per namespace. Override with LLM_CACHE_TTLS='{"insights": 600, ...}'
+DEFAULT_LLM_CACHE_TTL = 1800
+LLM_CACHE_TTLS = {
+    'research:comprehensive': 4 * 3600,
+    'research:fundamental': 12 * 3600,
+    'research:technical': 1800,
+    'research:news_sentiment': 1800,
+    'picks': 3600,
+    'insights': 1800,
+    'market_research': 1800,
+    'signals': 900,
+    'portfolio_optimizer': 1800,
+    'chat': 600,
+}
+LLM_CACHE_TTLS.update(json.loads(os.environ.get('LLM_CACHE_TTLS', '{}')))
+
+# Concurrent calls allowed per provider in each worker
+LLM_PROVIDER_CONCURRENCY = {
+    'perplexity': int(os.environ.get('PERPLEXITY_MAX_CONCURRENCY', '4')),
+    'anthropic': int(os.environ.get('ANTHROPIC_MAX_CONCURRENCY', '8')),
+    'openai': int(os.environ.get('OPENAI_MAX_CONCURRENCY', '8')),
+}
+DEFAULT_PROVIDER_CONCURRENCY = 4
+# Longest a call waits for a provider slot before failing
+LLM_QUEUE_TIMEOUT = float(os.environ.get('LLM_QUEUE_TIMEOUT', '60'))
+# Longest a worker waits for an identical call running in another worker
+LLM_COALESCE_WAIT = float(os.environ.get('LLM_COALESCE_WAIT', '90'))
+LLM_COALESCE_POLL = 0.25
+LLM_LATENCY_WINDOW = 512
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+
+def trading_day() -> str:
+    """IST calendar date; included in keys of prompts whose answers are only good for the day"""
+    return datetime.now(IST).date().isoformat()
+
+
+class LLMGatewayBusy(Exception):
+    """No provider slot became free within LLM_QUEUE_TIMEOUT"""
+
+
+class LLMGateway:
+    """
+    Cached, coalesced and bounded LLM calls
+    Responses live in the tiered cache under 'llm:<sha256>', so a hit is served from this worker's
+    L1 or from Redis. Within a worker identical misses share one call (TieredCache single-flight);
+    across workers a Redis lock makes the others wait for the first worker's result.
+    """
+
+    def __init__(self, ttls: Dict[str, int] = None, concurrency: Dict[str, int] = None):
+        self.ttls = LLM_CACHE_TTLS if ttls is None else ttls
+        self.concurrency = LLM_PROVIDER_CONCURRENCY if concurrency is None else concurrency
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: defaultdict(float))
+        self._namespace_calls = defaultdict(lambda: defaultdict(int))
+        self._latencies: Dict[str, deque] = defaultdict(lambda: deque(maxlen=LLM_LATENCY_WINDOW))
+
+    def ttl(self, namespace: str) -> int:
+        return int(self.ttls.get(namespace, DEFAULT_LLM_CACHE_TTL))
+
+    @staticmethod
+    def cache_key(provider: str, model: str, params: Dict[str, Any], payload: Any) -> str:
+        """Content hash of everything that determines the response"""
+        material = json.dumps(
+            {'provider': provider, 'model': model, 'params': params, 'payload': payload},
+            sort_keys=True, separators=(',', ':'), default=str
+        )
+        return f"llm:{hashlib.sha256(material.encode()).hexdigest()}"
+
+    def call(self, provider: str, model: str, payload: Any, fn: Callable[[], Any],
+             namespace: str = 'default', params: Optional[Dict[str, Any]] = None, ttl: Optional[int] = None,
+             encode: Callable[[Any], Any] = None, decode: Callable[[Any], Any] = None,
+             usage: Callable[[Any], Tuple[int, int]] = None) -> Any:
+        """
+        Make (or reuse) a model call
+
+        Args:
+            provider: 'perplexity', 'anthropic', 'openai', ...
+            model: Model name
+            payload: Prompt/messages (JSON-serializable); part of the cache key
+            fn: Performs the call; a None result is returned but never cached
+            namespace: Selects the cache TTL (see LLM_CACHE_TTLS)
+            params: Other settings that change the response (temperature, max_tokens, ...)
+            ttl: Overrides the namespace TTL; 0 disables caching (coalescing and limits still apply)
+            encode: Converts fn's result to a JSON-serializable value for the cache
+            decode: Rebuilds a result from its cached form
+            usage: Returns (input_tokens, output_tokens) for a result
+
+        Returns:
+            fn's result, or an equivalent one from the cache
+        """
+        from caching.tiered_cache import get_tiered_cache
+
+        ttl = self.ttl(namespace) if ttl is None else ttl
+        key = self.cache_key(provider, model, params or {}, payload)
+        encode = encode or (lambda value: value)
+        decode = decode or copy.deepcopy
+
+        def loader():
+            return self._call_once(key, provider, namespace, fn, encode, usage)
+
+        if ttl <= 0:
+            cached = loader()
+        else:
+            cached = get_tiered_cache().get_or_compute(key, loader, expiry=ttl, stale_window=0)
+        return None if cached is None else decode(cached)
+
+    def _call_once(self, key, provider, namespace, fn, encode, usage) -> Any:
+        """Run the call unless another worker is already running it; returns the encoded result"""
+        from caching.redis_cache import get_cache
+
+        cache = get_cache()
+        token = self._try_lock(cache, key)
+        if token is None:
+            result = self._wait_for_peer(cache, key)
+            if result is not None:
+                self._stats[provider]['coalesced'] += 1
+                return result
+
+        try:
+            return self._invoke(provider, namespace, fn, encode, usage)
+        finally:
+            if token is not None:
+                self._unlock(cache, key, token)
+
+    def _invoke(self, provider, namespace, fn, encode, usage) -> Any:
+        stats = self._stats[provider]
+        semaphore = self._semaphore(provider)
+        if not semaphore.acquire(timeout=LLM_QUEUE_TIMEOUT):
+            stats['rejected'] += 1
+            raise LLMGatewayBusy(f"No {provider} slot free within {LLM_QUEUE_TIMEOUT:.0f}s")
+
+        started = time.perf_counter()
+        try:
+            result = fn()
+        except Exception:
+            stats['errors'] += 1
+            raise
+        finally:
+            semaphore.release()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            stats['calls'] += 1
+            stats['latency_ms'] += elapsed_ms
+            self._latencies[provider].append(elapsed_ms)
+            self._namespace_calls[provider][namespace] += 1
+
+        if result is None:
+            stats['empty'] += 1
+            return None
+        if usage is not None:
+            try:
+                input_tokens, output_tokens = usage(result)
+                stats['input_tokens'] += input_tokens or 0
+                stats['output_tokens'] += output_tokens or 0
+            except Exception as e:
+                logger.debug(f"Could not read {provider} token usage: {e}")
+        return encode(result)
+
+    def _semaphore(self, provider: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            semaphore = self._semaphores.get(provider)
+            if semaphore is None:
+                limit = self.concurrency.get(provider, DEFAULT_PROVIDER_CONCURRENCY)
+                semaphore = self._semaphores[provider] = threading.BoundedSemaphore(limit)
+            return semaphore
+
+    # ---- cross-worker coalescing ----
+
+    @staticmethod
+    def _try_lock(cache, key: str) -> Optional[str]:
+        """A token if this worker should make the call (also when Redis is unavailable)"""
+        token = uuid.uuid4().hex
+        if not cache.is_available():
+            return token
+        try:
+            if cache.client.set(f"lock:{key}", token, nx=True, ex=int(LLM_COALESCE_WAIT) + 30):
+                return token
+            return None
+        except Exception:
+            return token
+
+    @staticmethod
+    def _unlock(cache, key: str, token: str):
+        if not cache.is_available():
+            return
+        try:
+            lock_key = f"lock:{key}"
+            if cache.client.get(lock_key) == token:
+                cache.client.delete(lock_key)
+        except Exception:
+            pass
+
+    @staticmethod
+    def _wait_for_peer(cache, key: str) -> Optional[Any]:
+        """Poll for the result of the identical call another worker holds the lock for"""
+        deadline = time.monotonic() + LLM_COALESCE_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LLM_COALESCE_POLL)
+            value = cache.get(key)
+            if value is not None:
+                return value
+            try:
+                if not cache.client.exists(f"lock:{key}"):
+                    # Peer finished without a cacheable result
+                    return cache.get(key)
+            except Exception:
+                return None
+        return None
+
+    # ---- accounting ----
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-provider call, token and latency counters for this worker, plus cache hit rates"""
+        from caching.tiered_cache import get_tiered_cache
+
+        providers = {}
+        for provider, counters in list(self._stats.items()):
+            calls = counters.get('calls', 0)
+            entry = {k: int(v) for k, v in counters.items() if k != 'latency_ms'}
+            entry['avg_latency_ms'] = round(counters.get('latency_ms', 0) / calls, 1) if calls else 0.0
+            latencies = sorted(self._latencies[provider])
+            if latencies:
+                entry['p50_latency_ms'] = round(latencies[len(latencies) // 2], 1)
+                entry['p95_latency_ms'] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1)
+            entry['calls_by_namespace'] = dict(self._namespace_calls[provider])
+            providers[provider] = entry
+        return {
+            'providers': providers,
+            'cache': get_tiered_cache().get_stats()['namespaces'].get('llm', {})
+        }
+
+
+llm_gateway = LLMGateway()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """Get the global LLM gateway"""
+    return llm_gateway
+
+
+def invoke_chat_model(llm, messages, namespace: str = 'chat', ttl: Optional[int] = None,
+                      provider: str = 'openai'):
+    """
+    LangChain chat model invoke() through the gateway
+
+    Args:
+        llm: Chat model (e.g. ChatOpenAI)
+        messages: List of LangChain messages
+        namespace: Cache TTL namespace
+        ttl: Overrides the namespace TTL
+        provider: Provider name used for the concurrency cap and accounting
+
+    Returns:
+        The model's AIMessage
+    """
+    from langchain_core.messages import messages_from_dict, messages_to_dict
+
+    model = getattr(llm, 'model_name', None) or getattr(llm, 'model', None) or type(llm).__name__
+    params = {
+        'temperature': getattr(llm, 'temperature', None),
+        'max_tokens': getattr(llm, 'max_tokens', None),
+    }
+    payload = [[message.type, message.content] for message in messages]
+
+    def usage(message) -> Tuple[int, int]:
+        metadata = getattr(message, 'usage_metadata', None) or {}
+        return metadata.get('input_tokens', 0), metadata.get('output_tokens', 0)
+
+    return llm_gateway.call(
+        provider, str(model), payload, lambda: llm.invoke(messages),
+        namespace=namespace, params=params, ttl=ttl,
+        encode=lambda message: messages_to_dict([message])[0],
+        decode=lambda data: messages_from_dict([data])[0],
+        usage=usage
+    )
@@ -0,0 +1,135 @@
+"""
+Market Context Service
+Process-wide snapshot of market-wide trend inputs (India VIX, NIFTY PCR, option-chain OI, indices)
+shared by every I-Score / research trend node instead of fetching them per symbol
+"""
+
+import os
+import time
+import logging
+import threading
+import datetime as dt
+from datetime import timezone
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Values change at most every few seconds on NSE; refresh slightly slower than that
+MARKET_CONTEXT_TTL = float(os.environ.get('MARKET_CONTEXT_TTL', '15'))
+# Background fetcher stops after this long without readers and restarts on the next read
+MARKET_CONTEXT_IDLE_STOP = float(os.environ.get('MARKET_CONTEXT_IDLE_STOP', '300'))
+
+
+class MarketContextService:
+    """TTL-bound market context snapshot with one background fetcher and single-flight refresh"""
+
+    def __init__(self, ttl: float = MARKET_CONTEXT_TTL, index_symbol: str = 'NIFTY'):
+        self.ttl = ttl
+        self.index_symbol = index_symbol
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._fetched_at = 0.0
+        self._last_read = 0.0
+        self._lock = threading.Lock()
+        self._refresh_done: Optional[threading.Event] = None
+        self._fetcher: Optional[threading.Thread] = None
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """
+        Get the current market context
+        Returns:
+            Dictionary with indices, vix, pcr and oi plus as_of, age_seconds and stale
+        """
+        self._last_read = time.monotonic()
+        self._ensure_fetcher()
+
+        snapshot, fetched_at = self._snapshot, self._fetched_at
+        if snapshot is None or time.monotonic() - fetched_at > self.ttl:
+            # No fresh value (cold start or the fetcher fell behind) - refresh once for all callers
+            self._refresh()
+            snapshot, fetched_at = self._snapshot, self._fetched_at
+
+        if snapshot is None:
+            return self._fallback_snapshot()
+
+        age = time.monotonic() - fetched_at
+        return {
+            **snapshot,
+            'age_seconds': round(age, 1),
+            'stale': age > self.ttl
+        }
+
+    def invalidate(self):
+        """Force the next read to refetch"""
+        self._fetched_at = 0.0
+
+    def _refresh(self):
+        """Single-flight fetch: the first caller fetches, concurrent callers wait for its result"""
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._fetched_at <= self.ttl:
+                return
+            waiter = self._refresh_done
+            if waiter is None:
+                self._refresh_done = threading.Event()
+
+        if waiter is not None:
+            waiter.wait(timeout=30)
+            return
+
+        try:
+            snapshot = self._fetch()
+            with self._lock:
+                self._snapshot = snapshot
+                self._fetched_at = time.monotonic()
+        except Exception as e:
+            logger.warning(f"Market context refresh failed, serving previous snapshot: {e}")
+        finally:
+            with self._lock:
+                done, self._refresh_done = self._refresh_done, None
+            done.set()
+
+    def _fetch(self) -> Dict[str, Any]:
+        """Fetch all market-wide inputs; option chain is fetched once and reused for PCR"""
+        from services.nse_service import NSEService
+        nse = NSEService()
+
+        oi = nse.get_option_chain_oi(self.index_symbol)
+        return {
+            'indices': nse.get_market_indices() or {},
+            'vix': nse.get_india_vix(),
+            'pcr': nse.get_pcr(self.index_symbol, oi_data=oi),
+            'oi': oi,
+            'as_of': dt.datetime.now(timezone.utc).isoformat()
+        }
+
+    def _ensure_fetcher(self):
+        """Start the background fetcher thread if it is not running"""
+        if self._fetcher is not None and self._fetcher.is_alive():
+            return
+        with self._lock:
+            if self._fetcher is not None and self._fetcher.is_alive():
+                return
+            self._fetcher = threading.Thread(target=self._fetch_loop, name='market-context', daemon=True)
+            self._fetcher.start()
+
+    def _fetch_loop(self):
+        """Keep the snapshot fresh while it is being read"""
+        while time.monotonic() - self._last_read < MARKET_CONTEXT_IDLE_STOP:
+            if time.monotonic() - self._fetched_at >= self.ttl * 0.8:
+                self._refresh()
+            time.sleep(max(1.0, self.ttl / 4))
+        logger.info("Market context fetcher idle, stopping")
+
+    def _fallback_snapshot(self) -> Dict[str, Any]:
+        """Neutral values used when no snapshot has ever been fetched"""
+        return {
+            'indices': {},
+            'vix': {'success': False, 'vix_value': 15.0, 'source': 'fallback'},
+            'pcr': {'success': False, 'pcr_value': 0.85, 'source': 'fallback'},
+            'oi': {'success': False, 'total_ce_oi': 0, 'total_pe_oi': 0, 'oi_pcr': 1.0, 'source': 'fallback'},
+            'as_of': None,
+            'age_seconds': None,
+            'stale': True
+        }
+
+
+market_context_service = MarketContextService()
@@ -3,14 +3,19 @@ NSE India API Service
 Provides real-time Indian stock market data using NSEPython library
 """
 
+import os
 import logging
 import time
 import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timezone
 from typing import Dict, List, Optional, Any
 import pandas as pd
 import yfinance as yf
 
+from services.price_history import PRICE_HISTORY_QUOTE_MAX_AGE, get_price_history
+from services.rate_limiter import TokenBucket
+
 try:
     from nsepython import (
         nse_quote, 
@@ -29,6 +34,21 @@ except ImportError:
     logging.error("NSEPython library not installed. Please install with: pip install nsepython")
     raise
 
+# Shared across all NSEService instances in the process so concurrent batches respect one NSE budget
+_nse_rate_limiter = TokenBucket(
+    rate=float(os.environ.get('NSE_REQUESTS_PER_SECOND', '5')),
+    capacity=float(os.environ.get('NSE_REQUEST_BURST', '10'))
+)
+
+# Column order of get_batch_quotes results (same fields as get_stock_quote)
+QUOTE_FIELDS = (
+    'symbol', 'company_name', 'current_price', 'previous_close', 'change_amount', 'change_percent',
+    'volume', 'day_high', 'day_low', 'week_52_high', 'week_52_low', 'market_cap', 'pe_ratio',
+    'timestamp', 'data_source'
+)
+# data_source of made-up last-resort prices; never persist these as market prices
+FALLBACK_DATA_SOURCE = 'hardcoded_fallback'
+
 class NSEService:
     """Service class for NSE India stock market data"""
     
@@ -60,39 +80,14 @@ class NSEService:
             
             quote = nse_quote(symbol)
             if quote:
-                # Handle None or missing lastPrice - convert to 0
-                last_price_val = quote.get('lastPrice')
-                last_price = float(last_price_val) if last_price_val is not None else 0
+                parsed = self._parse_nse_quote(symbol, quote, delayed_minutes)
                 
                 # If market is closed or we get 0 price, use fallback with live yfinance data
-                if last_price == 0 or last_price_val is None:
+                if parsed is None:
                     self.logger.info(f"NSE API returned no price for {symbol} (market closed or unavailable), using live fallback")
                     return self._get_fallback_quote(symbol)
                 
-                # If we got a valid price, use it
-                if last_price > 0:
-                    current_time = dt.datetime.now(timezone.utc)
-                    delayed_timestamp = current_time - dt.timedelta(minutes=delayed_minutes)
-                    
-                    return {
-                        'symbol': symbol,
-                        'company_name': quote.get('companyName', symbol),
-                        'current_price': last_price,
-                        'previous_close': float(quote.get('previousClose', 0)),
-                        'change_amount': float(quote.get('change', 0)),
-                        'change_percent': float(quote.get('pChange', 0)),
-                        'volume': int(quote.get('totalTradedVolume', 0)),
-                        'day_high': float(quote.get('dayHigh', 0)),
-                        'day_low': float(quote.get('dayLow', 0)),
-                        'week_52_high': float(quote.get('high52', 0)),
-                        'week_52_low': float(quote.get('low52', 0)),
-                        'market_cap': quote.get('marketCap'),
-                        'pe_ratio': quote.get('pe'),
-                        'timestamp': delayed_timestamp,
-                        'data_delay_minutes': delayed_minutes,
-                        'real_timestamp': current_time,
-                        'data_source': 'live'
-                    }
+                return parsed
             self._rate_limit_delay()
         except Exception as e:
             self.logger.warning(f"NSE API error for {symbol}: {str(e)}")
@@ -103,6 +98,41 @@ class NSEService:
         fallback['data_source'] = 'last_close'  # Mark this as last close price
         return fallback
     
+    def _parse_nse_quote(self, symbol: str, quote: Dict[str, Any], delayed_minutes: int = 5) -> Optional[Dict[str, Any]]:
+        """
+        Convert an nse_quote response into a quote dictionary
+        Returns:
+            Quote dictionary, or None when NSE returned no usable price
+        """
+        # Handle None or missing lastPrice - convert to 0
+        last_price_val = quote.get('lastPrice')
+        last_price = float(last_price_val) if last_price_val is not None else 0
+        if last_price <= 0:
+            return None
+        
+        current_time = dt.datetime.now(timezone.utc)
+        delayed_timestamp = current_time - dt.timedelta(minutes=delayed_minutes)
+        
+        return {
+            'symbol': symbol,
+            'company_name': quote.get('companyName', symbol),
+            'current_price': last_price,
+            'previous_close': float(quote.get('previousClose', 0)),
+            'change_amount': float(quote.get('change', 0)),
+            'change_percent': float(quote.get('pChange', 0)),
+            'volume': int(quote.get('totalTradedVolume', 0)),
+            'day_high': float(quote.get('dayHigh', 0)),
+            'day_low': float(quote.get('dayLow', 0)),
+            'week_52_high': float(quote.get('high52', 0)),
+            'week_52_low': float(quote.get('low52', 0)),
+            'market_cap': quote.get('marketCap'),
+            'pe_ratio': quote.get('pe'),
+            'timestamp': delayed_timestamp,
+            'data_delay_minutes': delayed_minutes,
+            'real_timestamp': current_time,
+            'data_source': 'live'
+        }
+    
     def get_multiple_quotes(self, symbols: List[str]) -> List[Dict[str, Any]]:
         """
         Get quotes for multiple stocks
@@ -111,11 +141,101 @@ class NSEService:
         Returns:
             List of stock data dictionaries
         """
-        quotes = []
-        for symbol in symbols:
-            quote = self.get_stock_quote(symbol)
-            if quote:
-                quotes.append(quote)
+        quotes = self._fetch_quotes(symbols)
+        return [{**quotes[symbol.upper()], 'symbol': symbol} for symbol in symbols if symbol]
+    
+    def get_batch_quotes(self, symbols: List[str], delayed_minutes: int = 5, max_workers: int = 8) -> Dict[str, Any]:
+        """
+        Get quotes for many stocks in one pass, column-oriented
+        Args:
+            symbols: List of NSE stock symbols (duplicates are fetched once)
+            delayed_minutes: Minutes to delay the price data
+            max_workers: Maximum concurrent NSE requests
+        Returns:
+            {'columns': {'symbol': [...], 'current_price': [...], ..., 'data_source': [...]}}
+            Rows with data_source == FALLBACK_DATA_SOURCE carry made-up prices.
+        """
+        quotes = self._fetch_quotes(symbols, delayed_minutes, max_workers)
+        return {
+            'columns': {field: [quote.get(field) for quote in quotes.values()] for field in QUOTE_FIELDS}
+        }
+    
+    def _fetch_quotes(self, symbols: List[str], delayed_minutes: int = 5,
+                      max_workers: int = 8) -> Dict[str, Dict[str, Any]]:
+        """
+        Quote dictionaries for many stocks, keyed by upper-cased symbol in input order
+        Concurrent NSE requests under the shared rate limiter, then a single multi-ticker
+        yfinance download for every symbol NSE missed, then the hardcoded fallback.
+        """
+        symbols = list(dict.fromkeys(s.upper() for s in symbols if s))
+        quotes: Dict[str, Dict[str, Any]] = {}
+        
+        def fetch_nse(symbol: str) -> Optional[Dict[str, Any]]:
+            _nse_rate_limiter.acquire()
+            try:
+                quote = nse_quote(symbol)
+                return self._parse_nse_quote(symbol, quote, delayed_minutes) if quote else None
+            except Exception as e:
+                self.logger.warning(f"NSE API error for {symbol}: {str(e)}")
+                return None
+        
+        if symbols:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(symbols)))) as executor:
+                for symbol, quote in zip(symbols, executor.map(fetch_nse, symbols)):
+                    if quote:
+                        quotes[symbol] = quote
+        
+        missing = [s for s in symbols if s not in quotes]
+        if missing:
+            self.logger.info(f"Batch quotes: NSE missed {len(missing)}/{len(symbols)} symbols, using yfinance")
+            quotes.update(self._get_batch_fallback_quotes(missing))
+        
+        return {symbol: quotes.get(symbol) or self._get_hardcoded_fallback(symbol) for symbol in symbols}
+    
+    def _get_batch_fallback_quotes(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch fallback quotes for many symbols; uncached histories come from one yfinance download
+        Args:
+            symbols: NSE stock symbols
+        Returns:
+            Dictionary of symbol -> quote for symbols yfinance returned data for
+        """
+        quotes = {}
+        tickers = [f"{symbol}.NS" for symbol in symbols]
+        histories = get_price_history().get_histories(tickers, period="1y", max_age=PRICE_HISTORY_QUOTE_MAX_AGE)
+        
+        now = dt.datetime.now(timezone.utc)
+        for symbol, ticker in zip(symbols, tickers):
+            try:
+                frame = histories.get(ticker)
+                if frame is None or frame.empty:
+                    continue
+                
+                latest = frame.iloc[-1]
+                current_price = float(latest['Close'])
+                previous_close = float(frame['Close'].iloc[-2]) if len(frame) >= 2 else current_price
+                change_amount = current_price - previous_close
+                
+                quotes[symbol] = {
+                    'symbol': symbol,
+                    'company_name': symbol,
+                    'current_price': current_price,
+                    'previous_close': previous_close,
+                    'change_amount': change_amount,
+                    'change_percent': (change_amount / previous_close * 100) if previous_close else 0,
+                    'volume': int(latest['Volume']) if not pd.isna(latest['Volume']) else 0,
+                    'day_high': float(latest['High']),
+                    'day_low': float(latest['Low']),
+                    'week_52_high': float(frame['High'].max()),
+                    'week_52_low': float(frame['Low'].min()),
+                    'market_cap': None,
+                    'pe_ratio': None,
+                    'timestamp': now,
+                    'data_source': 'yfinance'
+                }
+            except Exception as e:
+                self.logger.warning(f"yfinance batch parse failed for {symbol}: {e}")
+        
         return quotes
     
     def get_market_indices(self) -> Dict[str, Any]:
@@ -269,9 +389,8 @@ class NSEService:
             # Convert NSE symbol to Yahoo Finance format
             yf_symbol = f"{symbol}.NS"
             
-            # Fetch past 10 days of intraday data
-            ticker = yf.Ticker(yf_symbol)
-            df = ticker.history(period="10d", interval=interval)
+            # Past 10 sessions of intraday data
+            df = get_price_history().get_history(yf_symbol, period="10d", interval=interval)
             
             if df.empty:
                 self.logger.warning(f"No intraday data for {symbol}")
@@ -438,11 +557,12 @@ class NSEService:
             'error': 'VIX data unavailable'
         }
     
-    def get_pcr(self, symbol: str = 'NIFTY') -> Dict[str, Any]:
+    def get_pcr(self, symbol: str = 'NIFTY', oi_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Get live Put-Call Ratio from option chain
         Args:
             symbol: Index symbol (NIFTY or BANKNIFTY)
+            oi_data: Already fetched get_option_chain_oi result, reused instead of a second option chain fetch
         Returns:
             Dictionary with PCR value and related data
         """
@@ -473,7 +593,8 @@ class NSEService:
         except Exception as e:
             self.logger.warning(f"Error fetching PCR for {symbol}: {str(e)}")
         
-        oi_data = self.get_option_chain_oi(symbol)
+        if oi_data is None:
+            oi_data = self.get_option_chain_oi(symbol)
         if oi_data.get('success') and oi_data.get('total_ce_oi', 0) > 0:
             calculated_pcr = oi_data.get('oi_pcr', 0.85)
             self.logger.info(f"✅ Calculated PCR from OI data for {symbol}: {calculated_pcr}")
@@ -598,10 +719,10 @@ class NSEService:
         try:
             # Try to fetch real data from yfinance (NSE prices)
             yf_symbol = f"{symbol}.NS"
-            ticker = yf.Ticker(yf_symbol)
+            prices = get_price_history()
             
             # Get historical data (last 5 days to get previous close)
-            history = ticker.history(period="5d")
+            history = prices.get_history(yf_symbol, period="5d", max_age=PRICE_HISTORY_QUOTE_MAX_AGE)
             
             if history.empty:
                 self.logger.warning(f"No yfinance data for {symbol}, using hardcoded fallback")
@@ -623,12 +744,12 @@ class NSEService:
             volume = int(latest['Volume']) if 'Volume' in latest and latest['Volume'] > 0 else 5000000
             
             # Get 52-week high/low
-            year_history = ticker.history(period="1y")
+            year_history = prices.get_history(yf_symbol, period="1y")
             week_52_high = float(year_history['High'].max()) if not year_history.empty else current_price * 1.2
             week_52_low = float(year_history['Low'].min()) if not year_history.empty else current_price * 0.8
             
             # Get company info
-            info = ticker.info or {}
+            info = yf.Ticker(yf_symbol).info or {}
             company_name = info.get('longName', f'{symbol} Limited')
             pe_ratio = info.get('trailingPE', 20.0)
             
@@ -772,7 +893,7 @@ class NSEService:
             'market_cap': None,
             'pe_ratio': stock_data['pe_ratio'],
             'timestamp': dt.datetime.now(timezone.utc),
-            'data_source': 'hardcoded_fallback'
+            'data_source': FALLBACK_DATA_SOURCE
         }
 
     def _get_fallback_market_data(self) -> Dict[str, Any]:
@@ -10,6 +10,8 @@ from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Any, Optional
 import json
 
+from services.llm_gateway import get_llm_gateway, trading_day
+
 class PerplexityService:
     def __init__(self):
         self.api_key = os.environ.get('PERPLEXITY_API_KEY')
@@ -30,7 +32,9 @@ class PerplexityService:
             # Construct research prompt for Indian market
             research_prompt = self._build_research_prompt(symbol, research_type)
             
-            response = self._call_perplexity_api(research_prompt, model="sonar-pro")
+            response = self._call_perplexity_api(
+                research_prompt, model="sonar-pro", namespace=f"research:{research_type}"
+            )
             
             if response and 'choices' in response:
                 research_content = response['choices'][0]['message']['content']
@@ -64,7 +68,7 @@ class PerplexityService:
             # Build criteria-based prompt
             picks_prompt = self._build_picks_prompt(criteria)
             
-            response = self._call_perplexity_api(picks_prompt, model="sonar-pro")
+            response = self._call_perplexity_api(picks_prompt, model="sonar-pro", namespace="picks")
             
             if response and 'choices' in response:
                 picks_content = response['choices'][0]['message']['content']
@@ -100,7 +104,7 @@ class PerplexityService:
             
             insights_prompt = self._build_insights_prompt(focus_area)
             
-            response = self._call_perplexity_api(insights_prompt, model="sonar")
+            response = self._call_perplexity_api(insights_prompt, model="sonar", namespace="insights")
             
             if response and 'choices' in response:
                 insights_content = response['choices'][0]['message']['content']
@@ -121,9 +125,12 @@ class PerplexityService:
             self.logger.error(f"Perplexity insights error: {str(e)}")
             return self._get_fallback_insights()
     
-    def _call_perplexity_api(self, prompt: str, model: str = "sonar") -> Dict[str, Any]:
+    def _call_perplexity_api(self, prompt: str, model: str = "sonar",
+                             namespace: str = "market_research") -> Dict[str, Any]:
         """
-        Make API call to Perplexity
+        Make API call to Perplexity through the LLM gateway
+        Identical prompts on the same trading day share one call and its cached response
+        (TTL per namespace, see services.llm_gateway.LLM_CACHE_TTLS)
         """
         headers = {
             'Authorization': f'Bearer {self.api_key}',
@@ -151,20 +158,36 @@ class PerplexityService:
             "stream": False
         }
         
-        try:
+        def post():
             response = requests.post(self.base_url, headers=headers, json=payload, timeout=90)
-            
             if response.status_code == 200:
                 return response.json()
-            else:
-                self.logger.error(f"Perplexity API error: {response.status_code} - {response.text}")
-                return None
+            self.logger.error(f"Perplexity API error: {response.status_code} - {response.text}")
+            return None
+        
+        def usage(result):
+            tokens = result.get('usage') or {}
+            return tokens.get('prompt_tokens', 0), tokens.get('completion_tokens', 0)
+        
+        try:
+            return get_llm_gateway().call(
+                'perplexity', model, payload['messages'], post,
+                namespace=namespace,
+                params={
+                    **{k: v for k, v in payload.items() if k not in ('model', 'messages')},
+                    'day': trading_day()
+                },
+                usage=usage
+            )
         except requests.exceptions.Timeout:
             self.logger.error("Perplexity API timeout - request took too long")
             return None
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Perplexity API request failed: {str(e)}")
             return None
+        except Exception as e:
+            self.logger.error(f"Perplexity API call failed: {str(e)}")
+            return None
     
     def _build_research_prompt(self, symbol: str, research_type: str) -> str:
         """
@@ -6,7 +6,7 @@ Enables semantic search and intelligent AI analysis over user's holdings
 
 import os
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 from app import db
 from models_vector import PortfolioAssetEmbedding
@@ -24,6 +24,219 @@ class PortfolioEmbeddingService:
         self.vector_service = VectorService()
         self.logger = logging.getLogger(__name__)
     
+    # ---- per-source field mapping: (source_table, record id, description, column values) ----
+    
+    def _broker_holding_spec(self, holding: Any, broker_account_id: int) -> Tuple[str, int, str, Dict[str, Any]]:
+        return 'broker_holdings', holding.id, self._build_broker_holding_description(holding), {
+            'asset_type': 'equities',
+            'asset_symbol': holding.symbol,
+            'asset_name': holding.company_name or holding.symbol,
+            'asset_category': 'equity',
+            'broker_account_id': broker_account_id,
+            'quantity': holding.available_quantity,
+            'current_value': holding.total_value,
+            'purchase_value': holding.investment_value,
+            'current_price': holding.current_price,
+            'asset_metadata': {
+                'exchange': holding.exchange,
+                'isin': holding.isin,
+                'trading_symbol': holding.trading_symbol,
+                'avg_cost_price': holding.avg_cost_price,
+                'pnl': holding.pnl,
+                'pnl_percentage': holding.pnl_percentage
+            },
+            'tags': self._extract_tags_from_holding(holding),
+            'is_active': True
+        }
+    
+    def _manual_equity_spec(self, equity: Any) -> Tuple[str, int, str, Dict[str, Any]]:
+        return 'manual_equity_holdings', equity.id, self._build_manual_equity_description(equity), {
+            'asset_type': 'equities',
+            'asset_symbol': equity.symbol,
+            'asset_name': equity.company_name,
+            'asset_category': 'equity',
+            'broker_account_id': equity.broker_account_id,
+            'quantity': equity.quantity,
+            'current_value': equity.current_value,
+            'purchase_value': equity.total_investment,
+            'current_price': equity.current_price,
+            'asset_metadata': {
+                'exchange': equity.exchange,
+                'isin': equity.isin,
+                'purchase_price': equity.purchase_price,
+                'unrealized_pnl': equity.unrealized_pnl,
+                'unrealized_pnl_percentage': equity.unrealized_pnl_percentage,
+                'portfolio_name': equity.portfolio_name,
+                'asset_class': equity.asset_class
+            },
+            'tags': ['equity', 'manual-entry'],
+            'is_active': equity.is_active
+        }
+    
+    def _mutual_fund_spec(self, mf: Any) -> Tuple[str, int, str, Dict[str, Any]]:
+        return 'manual_mutual_fund_holdings', mf.id, self._build_mutual_fund_description(mf), {
+            'asset_type': 'mutual_funds',
+            'asset_symbol': mf.scheme_name,
+            'asset_name': mf.scheme_name,
+            'asset_category': self._get_mf_category(mf.fund_category),
+            'broker_account_id': mf.broker_account_id,
+            'quantity': mf.units,
+            'current_value': mf.current_value,
+            'purchase_value': mf.total_investment,
+            'asset_metadata': {
+                'fund_house': mf.fund_house,
+                'isin': mf.isin,
+                'nav': mf.nav,
+                'fund_category': mf.fund_category,
+                'fund_type': mf.fund_type,
+                'sip_active': mf.sip_active
+            },
+            'tags': self._extract_tags_from_mf(mf),
+            'is_active': True
+        }
+    
+    def _fixed_deposit_spec(self, fd: Any) -> Tuple[str, int, str, Dict[str, Any]]:
+        return 'manual_fixed_deposit_holdings', fd.id, self._build_fd_description(fd), {
+            'asset_type': 'fixed_deposits',
+            'asset_symbol': fd.bank_name,
+            'asset_name': f"{fd.bank_name} Fixed Deposit",
+            'asset_category': 'debt',
+            'current_value': fd.current_value,
+            'purchase_value': fd.principal_amount,
+            'asset_metadata': {
+                'bank_name': fd.bank_name,
+                'interest_rate': fd.interest_rate,
+                'tenure_months': fd.tenure_months,
+                'start_date': fd.start_date.isoformat() if fd.start_date else None,
+                'maturity_date': fd.maturity_date.isoformat() if fd.maturity_date else None,
+                'maturity_amount': fd.maturity_amount,
+                'interest_frequency': fd.interest_frequency
+            },
+            'tags': ['fixed-deposit', 'debt', 'low-risk'],
+            'is_active': True
+        }
+    
+    def _futures_options_spec(self, fo: Any) -> Tuple[str, int, str, Dict[str, Any]]:
+        return 'manual_futures_options_holdings', fo.id, self._build_fo_description(fo), {
+            'asset_type': 'futures_options',
+            'asset_symbol': fo.symbol,
+            'asset_name': f"{fo.symbol} {fo.contract_type}",
+            'asset_category': 'derivative',
+            'broker_account_id': fo.broker_account_id,
+            'quantity': fo.quantity,
+            'current_value': fo.current_value,
+            'purchase_value': fo.total_investment,
+            'asset_metadata': {
+                'contract_type': fo.contract_type,
+                'strike_price': fo.strike_price,
+                'expiry_date': fo.expiry_date.isoformat() if fo.expiry_date else None,
+                'lot_size': fo.lot_size,
+                'exchange': fo.exchange
+            },
+            'tags': ['derivatives', 'f&o', 'high-risk'],
+            'is_active': fo.is_active
+        }
+    
+    def embed_assets(self, user_id: int, specs: List[Tuple[str, int, str, Dict[str, Any]]]) -> Dict[Tuple[str, int], int]:
+        """
+        Upsert embeddings for many assets in one transaction
+        Rows whose description is unchanged keep their vector; only changed or new
+        descriptions are embedded, in one batched, content-addressed call.
+        
+        Args:
+            user_id: User ID
+            specs: (source_table, source_record_id, description, column values) per asset
+            
+        Returns:
+            Dictionary of (source_table, source_record_id) -> PortfolioAssetEmbedding ID
+        """
+        if not specs:
+            return {}
+        
+        try:
+            tables = {spec[0] for spec in specs}
+            existing = {
+                (row.source_table, row.source_record_id): row
+                for row in PortfolioAssetEmbedding.query.filter(
+                    PortfolioAssetEmbedding.user_id == user_id,
+                    PortfolioAssetEmbedding.source_table.in_(tables)
+                ).all()
+            }
+            
+            # Only new rows, changed descriptions and rows missing a vector need embedding
+            to_embed = []
+            for spec in specs:
+                row = existing.get((spec[0], spec[1]))
+                if row is None or not row.embedding or row.asset_description != spec[2]:
+                    to_embed.append(spec)
+            vectors = self.vector_service.get_embeddings_cached([spec[2] for spec in to_embed])
+            new_vectors = {(spec[0], spec[1]): vec for spec, vec in zip(to_embed, vectors)}
+            
+            now = datetime.utcnow()
+            rows = {}
+            unchanged_ids = []
+            for source_table, record_id, description, values in specs:
+                key = (source_table, record_id)
+                row = existing.get(key)
+                embedding = new_vectors.get(key)
+                
+                if row is None:
+                    if embedding is None:
+                        logger.error(f"Failed to generate embedding for {source_table} {record_id}")
+                        continue
+                    row = PortfolioAssetEmbedding(
+                        user_id=user_id,
+                        source_table=source_table,
+                        source_record_id=record_id,
+                        asset_description=description,
+                        embedding=embedding,
+                        **values
+                    )
+                    db.session.add(row)
+                else:
+                    if key in new_vectors:
+                        if embedding is None:
+                            logger.error(f"Failed to generate embedding for {source_table} {record_id}")
+                            continue
+                        row.asset_description = description
+                        row.embedding = embedding
+                    changed = False
+                    for column, value in values.items():
+                        if getattr(row, column) != value:
+                            setattr(row, column, value)
+                            changed = True
+                    if changed or key in new_vectors:
+                        row.updated_at = now
+                    else:
+                        unchanged_ids.append(row.id)
+                        rows[key] = row
+                        continue
+                row.last_synced = now
+                rows[key] = row
+            
+            if unchanged_ids:
+                # Refresh last_synced without firing updated_at's onupdate, which would
+                # invalidate the user's vector search cache entries for no content change
+                table = PortfolioAssetEmbedding.__table__
+                db.session.execute(
+                    table.update()
+                    .where(table.c.id.in_(unchanged_ids))
+                    .values(last_synced=now, updated_at=table.c.updated_at)
+                )
+            db.session.commit()
+            self.logger.info(
+                f"Upserted {len(rows)} asset embeddings for user {user_id} ({len(to_embed)} re-embedded)"
+            )
+            return {key: row.id for key, row in rows.items()}
+            
+        except Exception as e:
+            logger.error(f"Error upserting asset embeddings: {str(e)}")
+            db.session.rollback()
+            return {}
+    
+    def _embed_one(self, user_id: int, spec: Tuple[str, int, str, Dict[str, Any]]) -> Optional[int]:
+        return self.embed_assets(user_id, [spec]).get((spec[0], spec[1]))
+    
     def embed_broker_holding(self, user_id: int, holding: Any, broker_account_id: int) -> Optional[int]:
         """
         Create/update embedding for a broker holding
@@ -36,324 +249,31 @@ class PortfolioEmbeddingService:
         Returns:
             PortfolioAssetEmbedding ID or None
         """
-        try:
-            # Build rich description
-            description = self._build_broker_holding_description(holding)
-            
-            # Generate embedding
-            embedding = self.vector_service.generate_embedding(description)
-            
-            if not embedding:
-                logger.error(f"Failed to generate embedding for broker holding {holding.id}")
-                return None
-            
-            # Check if embedding already exists
-            existing = PortfolioAssetEmbedding.query.filter_by(
-                user_id=user_id,
-                source_table='broker_holdings',
-                source_record_id=holding.id
-            ).first()
-            
-            if existing:
-                # Update existing
-                existing.asset_description = description
-                existing.embedding = embedding
-                existing.quantity = holding.available_quantity
-                existing.current_value = holding.total_value
-                existing.purchase_value = holding.investment_value
-                existing.current_price = holding.current_price
-                existing.updated_at = datetime.utcnow()
-                existing.last_synced = datetime.utcnow()
-                existing.is_active = True
-                db.session.commit()
-                self.logger.info(f"Updated embedding for broker holding {holding.symbol}")
-                return existing.id
-            else:
-                # Create new
-                asset_embedding = PortfolioAssetEmbedding(
-                    user_id=user_id,
-                    asset_type='equities',
-                    asset_symbol=holding.symbol,
-                    asset_name=holding.company_name or holding.symbol,
-                    asset_category='equity',
-                    source_table='broker_holdings',
-                    source_record_id=holding.id,
-                    broker_account_id=broker_account_id,
-                    asset_description=description,
-                    quantity=holding.available_quantity,
-                    current_value=holding.total_value,
-                    purchase_value=holding.investment_value,
-                    current_price=holding.current_price,
-                    embedding=embedding,
-                    asset_metadata={
-                        'exchange': holding.exchange,
-                        'isin': holding.isin,
-                        'trading_symbol': holding.trading_symbol,
-                        'avg_cost_price': holding.avg_cost_price,
-                        'pnl': holding.pnl,
-                        'pnl_percentage': holding.pnl_percentage
-                    },
-                    tags=self._extract_tags_from_holding(holding),
-                    is_active=True
-                )
-                
-                db.session.add(asset_embedding)
-                db.session.commit()
-                self.logger.info(f"Created embedding for broker holding {holding.symbol}")
-                return asset_embedding.id
-                
-        except Exception as e:
-            logger.error(f"Error embedding broker holding: {str(e)}")
-            db.session.rollback()
-            return None
+        return self._embed_one(user_id, self._broker_holding_spec(holding, broker_account_id))
     
     def embed_manual_equity(self, user_id: int, equity: Any) -> Optional[int]:
         """
         Create/update embedding for manual equity holding
         """
-        try:
-            description = self._build_manual_equity_description(equity)
-            embedding = self.vector_service.generate_embedding(description)
-            
-            if not embedding:
-                return None
-            
-            existing = PortfolioAssetEmbedding.query.filter_by(
-                user_id=user_id,
-                source_table='manual_equity_holdings',
-                source_record_id=equity.id
-            ).first()
-            
-            if existing:
-                existing.asset_description = description
-                existing.embedding = embedding
-                existing.quantity = equity.quantity
-                existing.current_value = equity.current_value
-                existing.purchase_value = equity.total_investment
-                existing.current_price = equity.current_price
-                existing.updated_at = datetime.utcnow()
-                existing.is_active = equity.is_active
-                db.session.commit()
-                return existing.id
-            else:
-                asset_embedding = PortfolioAssetEmbedding(
-                    user_id=user_id,
-                    asset_type='equities',
-                    asset_symbol=equity.symbol,
-                    asset_name=equity.company_name,
-                    asset_category='equity',
-                    source_table='manual_equity_holdings',
-                    source_record_id=equity.id,
-                    broker_account_id=equity.broker_account_id,
-                    asset_description=description,
-                    quantity=equity.quantity,
-                    current_value=equity.current_value,
-                    purchase_value=equity.total_investment,
-                    current_price=equity.current_price,
-                    embedding=embedding,
-                    asset_metadata={
-                        'exchange': equity.exchange,
-                        'isin': equity.isin,
-                        'purchase_price': equity.purchase_price,
-                        'unrealized_pnl': equity.unrealized_pnl,
-                        'unrealized_pnl_percentage': equity.unrealized_pnl_percentage,
-                        'portfolio_name': equity.portfolio_name,
-                        'asset_class': equity.asset_class
-                    },
-                    tags=['equity', 'manual-entry'],
-                    is_active=equity.is_active
-                )
-                db.session.add(asset_embedding)
-                db.session.commit()
-                self.logger.info(f"Created embedding for manual equity {equity.symbol}")
-                return asset_embedding.id
-                
-        except Exception as e:
-            logger.error(f"Error embedding manual equity: {str(e)}")
-            db.session.rollback()
-            return None
+        return self._embed_one(user_id, self._manual_equity_spec(equity))
     
     def embed_mutual_fund(self, user_id: int, mf: Any) -> Optional[int]:
         """
         Create/update embedding for mutual fund holding
         """
-        try:
-            description = self._build_mutual_fund_description(mf)
-            embedding = self.vector_service.generate_embedding(description)
-            
-            if not embedding:
-                return None
-            
-            existing = PortfolioAssetEmbedding.query.filter_by(
-                user_id=user_id,
-                source_table='manual_mutual_fund_holdings',
-                source_record_id=mf.id
-            ).first()
-            
-            category = self._get_mf_category(mf.fund_category)
-            
-            if existing:
-                existing.asset_description = description
-                existing.embedding = embedding
-                existing.quantity = mf.units
-                existing.current_value = mf.current_value
-                existing.purchase_value = mf.total_investment
-                existing.updated_at = datetime.utcnow()
-                db.session.commit()
-                return existing.id
-            else:
-                asset_embedding = PortfolioAssetEmbedding(
-                    user_id=user_id,
-                    asset_type='mutual_funds',
-                    asset_symbol=mf.scheme_name,
-                    asset_name=mf.scheme_name,
-                    asset_category=category,
-                    source_table='manual_mutual_fund_holdings',
-                    source_record_id=mf.id,
-                    broker_account_id=mf.broker_account_id,
-                    asset_description=description,
-                    quantity=mf.units,
-                    current_value=mf.current_value,
-                    purchase_value=mf.total_investment,
-                    embedding=embedding,
-                    asset_metadata={
-                        'fund_house': mf.fund_house,
-                        'isin': mf.isin,
-                        'nav': mf.nav,
-                        'fund_category': mf.fund_category,
-                        'fund_type': mf.fund_type,
-                        'sip_active': mf.sip_active
-                    },
-                    tags=self._extract_tags_from_mf(mf),
-                    is_active=True
-                )
-                db.session.add(asset_embedding)
-                db.session.commit()
-                return asset_embedding.id
-                
-        except Exception as e:
-            logger.error(f"Error embedding mutual fund: {str(e)}")
-            db.session.rollback()
-            return None
+        return self._embed_one(user_id, self._mutual_fund_spec(mf))
     
     def embed_fixed_deposit(self, user_id: int, fd: Any) -> Optional[int]:
         """
         Create/update embedding for fixed deposit
         """
-        try:
-            description = self._build_fd_description(fd)
-            embedding = self.vector_service.generate_embedding(description)
-            
-            if not embedding:
-                return None
-            
-            existing = PortfolioAssetEmbedding.query.filter_by(
-                user_id=user_id,
-                source_table='manual_fixed_deposit_holdings',
-                source_record_id=fd.id
-            ).first()
-            
-            if existing:
-                existing.asset_description = description
-                existing.embedding = embedding
-                existing.current_value = fd.current_value
-                existing.purchase_value = fd.principal_amount
-                existing.updated_at = datetime.utcnow()
-                db.session.commit()
-                return existing.id
-            else:
-                asset_embedding = PortfolioAssetEmbedding(
-                    user_id=user_id,
-                    asset_type='fixed_deposits',
-                    asset_symbol=fd.bank_name,
-                    asset_name=f"{fd.bank_name} Fixed Deposit",
-                    asset_category='debt',
-                    source_table='manual_fixed_deposit_holdings',
-                    source_record_id=fd.id,
-                    asset_description=description,
-                    current_value=fd.current_value,
-                    purchase_value=fd.principal_amount,
-                    embedding=embedding,
-                    asset_metadata={
-                        'bank_name': fd.bank_name,
-                        'interest_rate': fd.interest_rate,
-                        'tenure_months': fd.tenure_months,
-                        'start_date': fd.start_date.isoformat() if fd.start_date else None,
-                        'maturity_date': fd.maturity_date.isoformat() if fd.maturity_date else None,
-                        'maturity_amount': fd.maturity_amount,
-                        'interest_frequency': fd.interest_frequency
-                    },
-                    tags=['fixed-deposit', 'debt', 'low-risk'],
-                    is_active=True
-                )
-                db.session.add(asset_embedding)
-                db.session.commit()
-                return asset_embedding.id
-                
-        except Exception as e:
-            logger.error(f"Error embedding fixed deposit: {str(e)}")
-            db.session.rollback()
-            return None
+        return self._embed_one(user_id, self._fixed_deposit_spec(fd))
     
     def embed_futures_options(self, user_id: int, fo: Any) -> Optional[int]:
         """
         Create/update embedding for F&O holding
         """
-        try:
-            description = self._build_fo_description(fo)
-            embedding = self.vector_service.generate_embedding(description)
-            
-            if not embedding:
-                return None
-            
-            existing = PortfolioAssetEmbedding.query.filter_by(
-                user_id=user_id,
-                source_table='manual_futures_options_holdings',
-                source_record_id=fo.id
-            ).first()
-            
-            if existing:
-                existing.asset_description = description
-                existing.embedding = embedding
-                existing.quantity = fo.quantity
-                existing.current_value = fo.current_value
-                existing.purchase_value = fo.total_investment
-                existing.updated_at = datetime.utcnow()
-                db.session.commit()
-                return existing.id
-            else:
-                asset_embedding = PortfolioAssetEmbedding(
-                    user_id=user_id,
-                    asset_type='futures_options',
-                    asset_symbol=fo.symbol,
-                    asset_name=f"{fo.symbol} {fo.contract_type}",
-                    asset_category='derivative',
-                    source_table='manual_futures_options_holdings',
-                    source_record_id=fo.id,
-                    broker_account_id=fo.broker_account_id,
-                    asset_description=description,
-                    quantity=fo.quantity,
-                    current_value=fo.current_value,
-                    purchase_value=fo.total_investment,
-                    embedding=embedding,
-                    asset_metadata={
-                        'contract_type': fo.contract_type,
-                        'strike_price': fo.strike_price,
-                        'expiry_date': fo.expiry_date.isoformat() if fo.expiry_date else None,
-                        'lot_size': fo.lot_size,
-                        'exchange': fo.exchange
-                    },
-                    tags=['derivatives', 'f&o', 'high-risk'],
-                    is_active=fo.is_active
-                )
-                db.session.add(asset_embedding)
-                db.session.commit()
-                return asset_embedding.id
-                
-        except Exception as e:
-            logger.error(f"Error embedding F&O: {str(e)}")
-            db.session.rollback()
-            return None
+        return self._embed_one(user_id, self._futures_options_spec(fo))
     
     def search_portfolio_assets(self, user_id: int, query: str, asset_type: Optional[str] = None, 
                                limit: int = 10) -> List[Dict]:
@@ -370,43 +290,18 @@ class PortfolioEmbeddingService:
             List of matching assets with similarity scores
         """
         try:
-            # Generate query embedding
-            query_embedding = self.vector_service.generate_embedding(query)
-            
-            if not query_embedding:
-                return []
+            from services.vector_index import load_ranked
+            from services.vector_search_cache import vector_search_cache
             
-            # Get all active embeddings for user
-            query_filter = PortfolioAssetEmbedding.query.filter_by(
-                user_id=user_id,
-                is_active=True
-            )
-            
-            if asset_type:
-                query_filter = query_filter.filter_by(asset_type=asset_type)
-            
-            embeddings = query_filter.all()
-            
-            if not embeddings:
-                return []
-            
-            # Extract embeddings
-            embedding_vectors = [emb.embedding for emb in embeddings if emb.embedding]
-            
-            if not embedding_vectors:
-                return []
-            
-            # Perform similarity search
-            similar_indices = self.vector_service.cosine_similarity_search(
-                query_embedding,
-                embedding_vectors,
-                top_k=min(limit, len(embedding_vectors))
+            # Cached top-k over the user's active assets with filters applied in the database
+            hits = vector_search_cache.search(
+                PortfolioAssetEmbedding, user_id, query, embed=self.vector_service.generate_embedding,
+                top_k=limit, filters={'is_active': True, 'asset_type': asset_type}
             )
             
             # Build results
             results = []
-            for idx, score in similar_indices:
-                asset = embeddings[idx]
+            for asset, score in load_ranked(PortfolioAssetEmbedding, hits):
                 results.append({
                     'id': asset.id,
                     'asset_name': asset.asset_name,
@@ -431,6 +326,33 @@ class PortfolioEmbeddingService:
             logger.error(f"Error searching portfolio assets: {str(e)}")
             return []
     
+    def search_user_assets(self, user_id: int, query: str, limit: int = 10) -> List[Dict]:
+        """
+        Semantic search over user's portfolio assets, shaped for chat/research context
+        (adds 'symbol' and 'value' to each search_portfolio_assets result)
+        """
+        return [
+            {**asset, 'symbol': asset['asset_symbol'], 'value': asset['current_value'] or 0}
+            for asset in self.search_portfolio_assets(user_id, query, limit=limit)
+        ]
+    
+    def _broker_holding_specs(self, user_id: int) -> List[Tuple[str, int, str, Dict[str, Any]]]:
+        from models_broker import BrokerHolding, BrokerAccount
+        
+        holdings = BrokerHolding.query.join(
+            BrokerAccount, BrokerAccount.id == BrokerHolding.broker_account_id
+        ).filter(BrokerAccount.user_id == user_id).all()
+        return [self._broker_holding_spec(h, h.broker_account_id) for h in holdings]
+    
+    def generate_embeddings_for_broker_holdings(self, user_id: int) -> int:
+        """
+        Refresh embeddings for all of a user's broker holdings (called after broker sync)
+        
+        Returns:
+            Number of holdings with an up-to-date embedding
+        """
+        return len(self.embed_assets(user_id, self._broker_holding_specs(user_id)))
+    
     def sync_all_user_assets(self, user_id: int) -> Dict[str, int]:
         """
         Sync all portfolio assets for a user to vector database
@@ -443,48 +365,25 @@ class PortfolioEmbeddingService:
             ManualEquityHolding, ManualMutualFundHolding, ManualFixedDepositHolding,
             ManualFuturesOptionsHolding
         )
-        from models_broker import BrokerHolding, BrokerAccount
         
-        stats = {
-            'broker_holdings': 0,
-            'manual_equities': 0,
-            'mutual_funds': 0,
-            'fixed_deposits': 0,
-            'futures_options': 0
+        stat_names = {
+            'broker_holdings': 'broker_holdings',
+            'manual_equity_holdings': 'manual_equities',
+            'manual_mutual_fund_holdings': 'mutual_funds',
+            'manual_fixed_deposit_holdings': 'fixed_deposits',
+            'manual_futures_options_holdings': 'futures_options'
         }
+        stats = {name: 0 for name in stat_names.values()}
         
         try:
-            # Sync broker holdings
-            broker_accounts = BrokerAccount.query.filter_by(user_id=user_id).all()
-            for account in broker_accounts:
-                holdings = BrokerHolding.query.filter_by(broker_account_id=account.id).all()
-                for holding in holdings:
-                    if self.embed_broker_holding(user_id, holding, account.id):
-                        stats['broker_holdings'] += 1
-            
-            # Sync manual equities
-            equities = ManualEquityHolding.query.filter_by(user_id=user_id).all()
-            for equity in equities:
-                if self.embed_manual_equity(user_id, equity):
-                    stats['manual_equities'] += 1
-            
-            # Sync mutual funds
-            mfs = ManualMutualFundHolding.query.filter_by(user_id=user_id).all()
-            for mf in mfs:
-                if self.embed_mutual_fund(user_id, mf):
-                    stats['mutual_funds'] += 1
-            
-            # Sync fixed deposits
-            fds = ManualFixedDepositHolding.query.filter_by(user_id=user_id).all()
-            for fd in fds:
-                if self.embed_fixed_deposit(user_id, fd):
-                    stats['fixed_deposits'] += 1
-            
-            # Sync F&O
-            fos = ManualFuturesOptionsHolding.query.filter_by(user_id=user_id).all()
-            for fo in fos:
-                if self.embed_futures_options(user_id, fo):
-                    stats['futures_options'] += 1
+            specs = self._broker_holding_specs(user_id)
+            specs += [self._manual_equity_spec(e) for e in ManualEquityHolding.query.filter_by(user_id=user_id).all()]
+            specs += [self._mutual_fund_spec(m) for m in ManualMutualFundHolding.query.filter_by(user_id=user_id).all()]
+            specs += [self._fixed_deposit_spec(f) for f in ManualFixedDepositHolding.query.filter_by(user_id=user_id).all()]
+            specs += [self._futures_options_spec(f) for f in ManualFuturesOptionsHolding.query.filter_by(user_id=user_id).all()]
+            
+            for source_table, _ in self.embed_assets(user_id, specs):
+                stats[stat_names[source_table]] += 1
             
             self.logger.info(f"Synced all assets for user {user_id}: {stats}")
             return stats
@@ -0,0 +1,349 @@
+"""
+Price History Provider
+Per-process cache of yfinance OHLCV series keyed by (ticker, interval). Callers ask for any
+period and get a slice of the cached series; a stale series is topped up with only its missing
+tail, and cold series for several tickers are fetched with one yf.download
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+import yfinance as yf
+
+logger = logging.getLogger(__name__)
+
+PRICE_HISTORY_MAX_SERIES = int(os.environ.get('PRICE_HISTORY_MAX_SERIES', '1024'))
+
+# Seconds a cached series is served before its tail is refreshed, per interval
+# (no longer than services.indicator_engine.REFRESH_SECONDS, which polls through here)
+DEFAULT_FRESHNESS = 900
+PRICE_HISTORY_FRESHNESS = {
+    '1m': 30,
+    '2m': 30,
+    '5m': 60,
+    '15m': 120,
+    '30m': 300,
+    '60m': 300,
+    '90m': 600,
+    '1h': 300,
+    '1d': 900,
+    '5d': 3600,
+    '1wk': 3600,
+    '1mo': 6 * 3600,
+}
+# Freshness for callers that read the last bar as a live quote (pass as max_age)
+PRICE_HISTORY_QUOTE_MAX_AGE = float(os.environ.get('PRICE_HISTORY_QUOTE_MAX_AGE', '60'))
+
+# Shortest window fetched for a cold series, so later longer lookbacks are sliced instead of
+# refetched. Intraday bases stay within yfinance's lookback limits for the interval.
+PRICE_HISTORY_BASE_PERIOD = {
+    '1m': '5d',
+    '2m': '1mo',
+    '5m': '1mo',
+    '15m': '1mo',
+    '30m': '1mo',
+    '60m': '3mo',
+    '90m': '1mo',
+    '1h': '3mo',
+    '1d': '2y',
+    '5d': '5y',
+    '1wk': '5y',
+    '1mo': 'max',
+}
+
+# Columns kept from yfinance frames (corporate actions are already applied by auto_adjust)
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+_PERIOD_PATTERN = re.compile(r'(\d+)(d|wk|mo|y)')
+_PERIOD_UNITS = {'wk': 'weeks', 'mo': 'months', 'y': 'years'}
+
+
+def _sessions(period: str) -> Optional[int]:
+    """Trading sessions in an 'Nd' period (yfinance counts days as sessions), else None"""
+    match = _PERIOD_PATTERN.fullmatch(period)
+    return int(match.group(1)) if match and match.group(2) == 'd' else None
+
+
+def period_start(period: str, now: pd.Timestamp) -> Optional[pd.Timestamp]:
+    """
+    Earliest instant of a calendar period ending now
+
+    Args:
+        period: yfinance period ('1mo', '2y', 'ytd', 'max', ...); 'Nd' is treated as N calendar days
+        now: Current UTC time
+
+    Returns:
+        UTC timestamp, or None for 'max'
+    """
+    if period == 'max':
+        return None
+    if period == 'ytd':
+        return now.normalize().replace(month=1, day=1)
+    match = _PERIOD_PATTERN.fullmatch(period)
+    if not match:
+        raise ValueError(f"Unsupported period: {period}")
+    count, unit = int(match.group(1)), match.group(2)
+    if unit == 'd':
+        return now - pd.Timedelta(days=count)
+    return now - pd.DateOffset(**{_PERIOD_UNITS[unit]: count})
+
+
+def _longer_period(first: str, second: str, now: pd.Timestamp) -> str:
+    start_first, start_second = period_start(first, now), period_start(second, now)
+    if start_first is None or (start_second is not None and start_first <= start_second):
+        return first
+    return second
+
+
+def _align(ts: pd.Timestamp, index: pd.DatetimeIndex) -> pd.Timestamp:
+    """Make a UTC timestamp comparable with a (possibly tz-naive) index"""
+    return ts.tz_convert(index.tz) if index.tz is not None else ts.tz_convert(None)
+
+
+def _clean(frame: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    """OHLCV rows with a close, or None when yfinance returned nothing usable"""
+    if frame is None or frame.empty or 'Close' not in frame.columns:
+        return None
+    frame = frame[[c for c in OHLCV_COLUMNS if c in frame.columns]].dropna(subset=['Close'])
+    if frame.empty:
+        return None
+    return frame[~frame.index.duplicated(keep='last')].sort_index()
+
+
+def _split(data: Optional[pd.DataFrame], tickers: List[str]) -> Dict[str, pd.DataFrame]:
+    """Per-ticker frames from a yf.download result (grouped by ticker)"""
+    frames = {}
+    if data is None or data.empty:
+        return frames
+    if not isinstance(data.columns, pd.MultiIndex):
+        frame = _clean(data)
+        if frame is not None and len(tickers) == 1:
+            frames[tickers[0]] = frame
+        return frames
+    available = set(data.columns.get_level_values(0))
+    for ticker in tickers:
+        if ticker in available:
+            frame = _clean(data[ticker])
+            if frame is not None:
+                frames[ticker] = frame
+    return frames
+
+
+class _Series:
+    __slots__ = ('frame', 'start', 'fetched_at', 'lock')
+
+    def __init__(self):
+        self.frame: Optional[pd.DataFrame] = None
+        # Earliest instant the cached fetch asked for (None: full history)
+        self.start: Optional[pd.Timestamp] = None
+        self.fetched_at = 0.0
+        # Serializes fetches of one series; other series are unaffected
+        self.lock = threading.Lock()
+
+    def covers(self, period: str, now: pd.Timestamp) -> bool:
+        if self.frame is None:
+            return False
+        if self.start is None:
+            return True
+        sessions = _sessions(period)
+        if sessions is not None:
+            return self.frame.index.normalize().nunique() >= sessions
+        start = period_start(period, now)
+        return start is not None and self.start <= start
+
+
+class PriceHistoryProvider:
+    """
+    Shared yfinance history with slicing, incremental refresh and batched cold fetches
+    A series is fetched once for max(requested period, the interval's base period); shorter or
+    equal lookbacks for the same (ticker, interval) are slices of it. Once older than the
+    interval's freshness, only bars from the last cached session onwards are downloaded and
+    merged, replacing the last (possibly still forming) bar.
+    """
+
+    def __init__(self, max_series: int = PRICE_HISTORY_MAX_SERIES):
+        self.max_series = max_series
+        self._series: "OrderedDict[tuple, _Series]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'cold_fetches': 0, 'tail_fetches': 0, 'tickers_fetched': 0,
+                       'fetch_errors': 0, 'evictions': 0}
+
+    def get_history(self, ticker: str, period: str = '1mo', interval: str = '1d',
+                    max_age: Optional[float] = None) -> pd.DataFrame:
+        """
+        OHLCV history for one ticker, like yf.Ticker(ticker).history(period, interval)
+
+        Args:
+            ticker: yfinance ticker ('RELIANCE.NS', '^NSEI', 'USDINR=X', ...)
+            period: Lookback ('5d', '3mo', '2y', 'ytd', 'max', ...)
+            interval: Bar interval ('1d', '1h', '15m', ...)
+            max_age: Seconds a cached series may be served before its tail is refreshed
+                (defaults to the interval's PRICE_HISTORY_FRESHNESS)
+
+        Returns:
+            DataFrame with Open/High/Low/Close/Volume columns (empty if no data); the caller owns it
+        """
+        frame = self.get_histories([ticker], period, interval, max_age=max_age).get(ticker)
+        return frame if frame is not None else pd.DataFrame(columns=OHLCV_COLUMNS)
+
+    def get_histories(self, tickers: Iterable[str], period: str = '1mo', interval: str = '1d',
+                      max_age: Optional[float] = None) -> Dict[str, pd.DataFrame]:
+        """
+        OHLCV history for many tickers; cold and stale series are each fetched in one request
+
+        Args:
+            tickers: yfinance tickers
+            period: Lookback
+            interval: Bar interval
+            max_age: Seconds a cached series may be served before its tail is refreshed
+                (defaults to the interval's PRICE_HISTORY_FRESHNESS)
+
+        Returns:
+            Dictionary of ticker -> DataFrame for tickers yfinance returned data for
+        """
+        tickers = list(dict.fromkeys(tickers))
+        if not tickers:
+            return {}
+        entries = {ticker: self._entry(ticker, interval) for ticker in tickers}
+        # Sorted acquisition keeps concurrent batches over overlapping tickers deadlock-free
+        ordered = sorted(entries)
+        for ticker in ordered:
+            entries[ticker].lock.acquire()
+        try:
+            now = pd.Timestamp.now(tz='UTC')
+            freshness = PRICE_HISTORY_FRESHNESS.get(interval, DEFAULT_FRESHNESS) if max_age is None else max_age
+            cold = [t for t in tickers if not entries[t].covers(period, now)]
+            stale = [t for t in tickers if t not in cold and time.time() - entries[t].fetched_at > freshness]
+            self._count('hits', len(tickers) - len(cold) - len(stale))
+
+            if cold:
+                self._fetch_full(cold, period, interval, entries, now)
+            if stale:
+                self._fetch_tail(stale, interval, entries)
+
+            histories = {}
+            for ticker in tickers:
+                frame = entries[ticker].frame
+                if frame is not None:
+                    histories[ticker] = self._slice(frame, period, now)
+            return histories
+        finally:
+            for ticker in ordered:
+                entries[ticker].lock.release()
+
+    def prefetch(self, tickers: Iterable[str], period: str = '1mo', interval: str = '1d'):
+        """Warm the cache for tickers about to be analysed (one batched download)"""
+        self.get_histories(tickers, period, interval)
+
+    def invalidate(self, ticker: str):
+        """Drop every cached interval for a ticker"""
+        with self._lock:
+            for key in [k for k in self._series if k[0] == ticker]:
+                del self._series[key]
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'series': len(self._series), 'max_series': self.max_series, **self._stats}
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._stats[name] += n
+
+    # ---- cache ----
+
+    def _entry(self, ticker: str, interval: str) -> _Series:
+        key = (ticker, interval)
+        with self._lock:
+            entry = self._series.get(key)
+            if entry is None:
+                entry = self._series[key] = _Series()
+            self._series.move_to_end(key)
+            while len(self._series) > self.max_series:
+                self._series.popitem(last=False)
+                self._stats['evictions'] += 1
+            return entry
+
+    @staticmethod
+    def _slice(frame: pd.DataFrame, period: str, now: pd.Timestamp) -> pd.DataFrame:
+        sessions = _sessions(period)
+        if sessions is not None:
+            days = frame.index.normalize()
+            unique_days = days.unique()
+            if len(unique_days) > sessions:
+                frame = frame[days >= unique_days[-sessions]]
+        else:
+            start = period_start(period, now)
+            if start is not None:
+                frame = frame[frame.index >= _align(start, frame.index)]
+        return frame.copy()
+
+    # ---- fetching ----
+
+    def _download(self, tickers: List[str], interval: str, **window) -> Optional[Dict[str, pd.DataFrame]]:
+        """One yfinance request for all tickers (window is period=... or start=...); None on error"""
+        self._count('tickers_fetched', len(tickers))
+        try:
+            if len(tickers) == 1:
+                frame = _clean(yf.Ticker(tickers[0]).history(interval=interval, **window))
+                return {tickers[0]: frame} if frame is not None else {}
+            data = yf.download(
+                tickers, interval=interval, group_by='ticker', auto_adjust=True, actions=False,
+                ignore_tz=False, threads=True, progress=False, **window
+            )
+            return _split(data, tickers)
+        except Exception as e:
+            self._count('fetch_errors')
+            logger.warning(f"yfinance {interval} history fetch failed for {', '.join(tickers)}: {e}")
+            return None
+
+    def _fetch_full(self, tickers: List[str], period: str, interval: str,
+                    entries: Dict[str, _Series], now: pd.Timestamp):
+        fetch_period = _longer_period(period, PRICE_HISTORY_BASE_PERIOD.get(interval, period), now)
+        self._count('cold_fetches')
+        frames = self._download(tickers, interval, period=fetch_period) or {}
+        fetched_at = time.time()
+        for ticker, frame in frames.items():
+            entry = entries[ticker]
+            entry.frame = frame
+            if _sessions(fetch_period) is not None:
+                entry.start = frame.index[0].tz_convert('UTC') if frame.index.tz is not None \
+                    else frame.index[0].tz_localize('UTC')
+            else:
+                entry.start = period_start(fetch_period, now)
+            entry.fetched_at = fetched_at
+
+    def _fetch_tail(self, tickers: List[str], interval: str, entries: Dict[str, _Series]):
+        """Download from the earliest last-cached session onwards and merge it into each series"""
+        start = min(entries[t].frame.index[-1].date() for t in tickers)
+        self._count('tail_fetches')
+        frames = self._download(tickers, interval, start=start.isoformat())
+        if frames is None:
+            # Keep serving the cached series; the next call retries
+            return
+        fetched_at = time.time()
+        for ticker in tickers:
+            entry = entries[ticker]
+            tail = frames.get(ticker)
+            if tail is not None:
+                if entry.frame.index.tz is not None and tail.index.tz is not None:
+                    tail.index = tail.index.tz_convert(entry.frame.index.tz)
+                entry.frame = pd.concat([entry.frame[entry.frame.index < tail.index[0]], tail])
+            entry.fetched_at = fetched_at
+
+
+price_history = PriceHistoryProvider()
+
+
+def get_price_history() -> PriceHistoryProvider:
+    """Get the global price history provider"""
+    return price_history
@@ -0,0 +1,279 @@
+"""
+Rate limiting primitives
+TokenBucket paces outbound API clients in-process; RedisRateLimiter enforces inbound request
+limits across processes with one atomic Redis call per request (or fewer, with leases)
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Lifetime of an in-process lease of pre-allocated tokens; bounds how long unused tokens are held
+RATE_LIMIT_LEASE_TTL = float(os.environ.get('RATE_LIMIT_LEASE_TTL', '1.0'))
+# Keys tracked in-process (leases and the fallback buckets used while Redis is down)
+RATE_LIMIT_LOCAL_KEYS = int(os.environ.get('RATE_LIMIT_LOCAL_KEYS', '10000'))
+# After a Redis error, limits are enforced locally for this long before Redis is tried again
+RATE_LIMIT_REDIS_BACKOFF = float(os.environ.get('RATE_LIMIT_REDIS_BACKOFF', '5.0'))
+
+# GCRA (generic cell rate algorithm). One key per client holds its theoretical arrival time
+# (TAT, in ms). Each request advances TAT by one emission interval; a request is allowed while
+# TAT stays within `tolerance` (burst x emission interval) of the current time.
+# Grants up to ARGV[3] tokens at once, so callers can pre-allocate for hot keys.
+# Returns {granted, retry_after_ms, remaining}.
+GCRA_LUA = """
+if redis.replicate_commands then redis.replicate_commands() end
+local emission = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + tonumber(clock[2]) / 1000
+local tat = tonumber(redis.call('GET', KEYS[1]) or '0')
+if tat < now then tat = now end
+local granted = math.min(requested, math.floor((now + tolerance - tat) / emission + 1e-6))
+if granted < 1 then
+    return {0, math.ceil(tat + emission - tolerance - now), 0}
+end
+tat = tat + granted * emission
+redis.call('SET', KEYS[1], string.format('%.3f', tat), 'PX', math.ceil(tat - now))
+return {granted, 0, math.floor((now + tolerance - tat) / emission + 1e-6)}
+"""
+GCRA_SHA = hashlib.sha1(GCRA_LUA.encode()).hexdigest()
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket
+    Allows bursts up to `capacity` and a sustained `rate` of tokens per second
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take tokens if available without waiting"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0, timeout: float = None) -> bool:
+        """
+        Block until tokens are available
+        Args:
+            tokens: Number of tokens to take
+            timeout: Maximum seconds to wait (None waits indefinitely)
+        Returns:
+            True if tokens were taken, False on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    @property
+    def available(self) -> float:
+        """Tokens currently available"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    remaining: int
+    retry_after: float  # seconds until the next request would be allowed (0 when allowed)
+
+
+class _Lease:
+    __slots__ = ('tokens', 'size', 'expires')
+
+    def __init__(self, tokens: int, size: int, expires: float):
+        self.tokens = tokens
+        self.size = size
+        self.expires = expires
+
+
+class RedisRateLimiter:
+    """
+    A sustained `limit` requests per `window` seconds per key, enforced with GCRA in a single Lua call
+
+    Up to `burst` requests (default `limit`) are admitted at once, and the rest are paced one per
+    window / limit seconds, so any `window` admits at most burst + limit - 1 requests. Limiters
+    that promise "N per window" should use a small burst and limit = N - burst + 1.
+
+    With `prefetch` > 1, a key that uses up its lease before it expires gets a larger one next
+    time (doubling up to `prefetch`), so hot keys are served in-process for most requests.
+    Leased tokens left unused when the lease expires are forfeited, which can only under-admit.
+    While Redis is unreachable each process falls back to its own token bucket per key.
+    The script is run with EVALSHA (EVAL once on NOSCRIPT), so no per-client state is kept.
+    """
+
+    def __init__(self, name: str, limit: int, window: float, prefetch: int = 0,
+                 lease_ttl: float = RATE_LIMIT_LEASE_TTL, burst: int = None):
+        self.name = name
+        self.limit = int(limit)
+        self.window = float(window)
+        self.burst = max(1, int(burst if burst is not None else limit))
+        self.prefetch = max(1, min(int(prefetch or 1), self.burst))
+        self.lease_ttl = lease_ttl
+        self.emission_ms = self.window * 1000 / self.limit
+        self.tolerance_ms = self.burst * self.emission_ms
+        self._leases: "OrderedDict[str, _Lease]" = OrderedDict()
+        self._local: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._down_until = 0.0  # check_async only; check() uses the shared cache's backoff
+        self._lock = threading.Lock()
+
+    def redis_key(self, key: str) -> str:
+        return f"rate_limit:{self.name}:{key}"
+
+    def check(self, key: str, client=None) -> RateLimitResult:
+        """
+        Count one request for a key (synchronous Redis client)
+
+        Args:
+            key: Client identity (user id, IP, ...)
+            client: redis.Redis instance; defaults to the shared cache connection
+
+        Returns:
+            RateLimitResult
+        """
+        result = self._from_lease(key)
+        if result is not None:
+            return result
+
+        cache = None
+        if client is None:
+            from caching.redis_cache import get_cache
+            cache = get_cache()
+            client = cache.client if cache.is_available() else None
+        if client is None:
+            return self._check_local(key)
+
+        size = self._lease_size(key)
+        try:
+            reply = self._eval(client, key, size)
+        except Exception as e:
+            logger.warning(f"Rate limiter {self.name} unavailable, using local limits: {e}")
+            if cache is not None:
+                cache._mark_down()
+            return self._check_local(key)
+        return self._apply(key, size, reply)
+
+    async def check_async(self, key: str, client) -> RateLimitResult:
+        """
+        Count one request for a key (redis.asyncio client)
+
+        Args:
+            key: Client identity (user id, IP, ...)
+            client: redis.asyncio.Redis instance
+
+        Returns:
+            RateLimitResult
+        """
+        result = self._from_lease(key)
+        if result is not None:
+            return result
+        if time.monotonic() < self._down_until:
+            return self._check_local(key)
+
+        size = self._lease_size(key)
+        try:
+            reply = await self._eval_async(client, key, size)
+        except Exception as e:
+            logger.warning(f"Rate limiter {self.name} unavailable, using local limits: {e}")
+            self._down_until = time.monotonic() + RATE_LIMIT_REDIS_BACKOFF
+            return self._check_local(key)
+        return self._apply(key, size, reply)
+
+    def _eval(self, client, key: str, size: int):
+        from redis.exceptions import NoScriptError
+
+        try:
+            return client.evalsha(GCRA_SHA, 1, self.redis_key(key), *self._args(size))
+        except NoScriptError:
+            return client.eval(GCRA_LUA, 1, self.redis_key(key), *self._args(size))
+
+    async def _eval_async(self, client, key: str, size: int):
+        from redis.exceptions import NoScriptError
+
+        try:
+            return await client.evalsha(GCRA_SHA, 1, self.redis_key(key), *self._args(size))
+        except NoScriptError:
+            return await client.eval(GCRA_LUA, 1, self.redis_key(key), *self._args(size))
+
+    def _args(self, size: int):
+        return [f"{self.emission_ms:.3f}", f"{self.tolerance_ms:.3f}", size]
+
+    def _from_lease(self, key: str) -> Optional[RateLimitResult]:
+        if self.prefetch <= 1:
+            return None
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is not None and lease.tokens > 0 and time.monotonic() < lease.expires:
+                lease.tokens -= 1
+                return RateLimitResult(True, lease.tokens, 0.0)
+        return None
+
+    def _lease_size(self, key: str) -> int:
+        """Double the lease for a key that drained its last one in time, otherwise start at 1"""
+        if self.prefetch <= 1:
+            return 1
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is not None and lease.tokens == 0 and time.monotonic() < lease.expires:
+                return min(lease.size * 2, self.prefetch)
+            return 1
+
+    def _apply(self, key: str, size: int, reply) -> RateLimitResult:
+        granted, retry_after_ms, remaining = (int(v) for v in reply)
+        if granted < 1:
+            return RateLimitResult(False, 0, retry_after_ms / 1000.0)
+        if self.prefetch > 1:
+            with self._lock:
+                # The current request consumes one of the granted tokens
+                self._leases[key] = _Lease(granted - 1, size, time.monotonic() + self.lease_ttl)
+                self._leases.move_to_end(key)
+                while len(self._leases) > RATE_LIMIT_LOCAL_KEYS:
+                    self._leases.popitem(last=False)
+        return RateLimitResult(True, remaining, 0.0)
+
+    def _check_local(self, key: str) -> RateLimitResult:
+        with self._lock:
+            bucket = self._local.get(key)
+            if bucket is None:
+                bucket = self._local[key] = TokenBucket(self.limit / self.window, self.burst)
+                while len(self._local) > RATE_LIMIT_LOCAL_KEYS:
+                    self._local.popitem(last=False)
+            self._local.move_to_end(key)
+        if bucket.try_acquire():
+            return RateLimitResult(True, int(bucket.available), 0.0)
+        return RateLimitResult(False, 0, (1 - bucket.available) / bucket.rate)
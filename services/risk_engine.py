@@ -2,15 +2,130 @@
 Risk Engine — Scentric AI Decision Engine
 Calculates Risk Heat Map, Goal Progress, Portfolio Pulse, and Behavioural Guardrails.
 """
+import os
 import json
+import hashlib
 import logging
+import threading
 import time
+from collections import OrderedDict, defaultdict
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
-_risk_cache: dict = {}
 CACHE_TTL_SECONDS = 300
+# Per-worker copies are kept briefly; Redis holds the shared copy for CACHE_TTL_SECONDS
+RISK_CACHE_L1_TTL = int(os.environ.get('RISK_CACHE_L1_TTL', '30'))
+RISK_CACHE_MAX_ENTRIES = int(os.environ.get('RISK_CACHE_MAX_ENTRIES', '1000'))
+
+# Models whose changes invalidate a user's cached risk results
+RISK_SOURCE_MODELS = {
+    'ManualEquityHolding', 'ManualMutualFundHolding', 'ManualFixedDepositHolding',
+    'ManualRealEstateHolding', 'ManualCommodityHolding', 'ManualCryptocurrencyHolding',
+    'ManualFuturesOptionsHolding', 'ManualInsuranceHolding', 'PortfolioPreferences'
+}
+
+
+class RiskCache:
+    """RiskEngine result cache shared by all workers (Redis) with a bounded per-worker LRU in front"""
+
+    def __init__(self, ttl: int = CACHE_TTL_SECONDS, local_ttl: int = RISK_CACHE_L1_TTL,
+                 max_entries: int = RISK_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.local_ttl = min(local_ttl, ttl)
+        self.max_entries = max_entries
+        self._local: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (user_id, data, expires_at)
+        self._user_keys = defaultdict(set)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _redis():
+        from caching.redis_cache import get_cache
+        return get_cache()
+
+    @staticmethod
+    def _user_tag(user_id) -> str:
+        return f"risk:{user_id}"
+
+    def _store_local(self, key: str, user_id, data):
+        with self._lock:
+            self._local[key] = (user_id, data, time.monotonic() + self.local_ttl)
+            self._local.move_to_end(key)
+            self._user_keys[user_id].add(key)
+            while len(self._local) > self.max_entries:
+                self._drop_local(*self._local.popitem(last=False))
+
+    def _drop_local(self, key: str, entry: tuple):
+        keys = self._user_keys.get(entry[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[entry[0]]
+
+    def get(self, user_id, key: str):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                if time.monotonic() < entry[2]:
+                    self._local.move_to_end(key)
+                    return entry[1]
+                self._drop_local(key, self._local.pop(key))
+
+        data = self._redis().get(key)
+        if data is not None:
+            self._store_local(key, user_id, data)
+        return data
+
+    def set(self, user_id, key: str, data):
+        self._store_local(key, user_id, data)
+        self._redis().set(key, data, self.ttl, tags=[self._user_tag(user_id)])
+
+    def invalidate_user(self, user_id):
+        """Drop every cached section for a user, locally and in Redis"""
+        with self._lock:
+            for key in self._user_keys.pop(user_id, set()):
+                self._local.pop(key, None)
+        self._redis().invalidate_tags(self._user_tag(user_id))
+
+
+risk_cache = RiskCache()
+_invalidation_registered = False
+
+
+def register_risk_cache_invalidation():
+    """
+    Invalidate a user's cached risk results after any commit that touches their
+    holdings or PortfolioPreferences (collected before flush, applied after commit)
+    """
+    global _invalidation_registered
+    if _invalidation_registered:
+        return
+    from itertools import chain
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    @event.listens_for(Session, "before_flush")
+    def collect_risk_changes(session, flush_context, instances):
+        users = session.info.setdefault('risk_dirty_users', set())
+        for obj in chain(session.new, session.dirty, session.deleted):
+            if obj.__class__.__name__ in RISK_SOURCE_MODELS:
+                user_id = getattr(obj, 'user_id', None)
+                if user_id is not None:
+                    users.add(user_id)
+
+    @event.listens_for(Session, "after_commit")
+    def invalidate_risk_changes(session):
+        for user_id in session.info.pop('risk_dirty_users', None) or ():
+            try:
+                risk_cache.invalidate_user(user_id)
+            except Exception as e:
+                logger.warning(f'Could not invalidate risk cache for user {user_id}: {e}')
+
+    @event.listens_for(Session, "after_rollback")
+    def discard_risk_changes(session):
+        session.info.pop('risk_dirty_users', None)
+
+    _invalidation_registered = True
 
 # Risk configuration per asset class
 ASSET_RISK_CONFIG = {
@@ -33,34 +148,53 @@ class RiskEngine:
         self.user_id = user_id
 
     def _cache_key(self, section: str, fingerprint: str = "") -> str:
-        return f"{self.user_id}:{section}:{fingerprint}"
+        return f"risk:{self.user_id}:{section}:{fingerprint}"
 
     def _get_cached(self, section: str, fingerprint: str = ""):
-        now = time.time()
-        key = self._cache_key(section, fingerprint)
-        entry = _risk_cache.get(key)
-        if entry and (now - entry['ts']) < CACHE_TTL_SECONDS:
-            return entry['data']
-        if entry:
-            _risk_cache.pop(key, None)
-        if len(_risk_cache) > 500:
-            expired = [k for k, v in _risk_cache.items() if (now - v['ts']) >= CACHE_TTL_SECONDS]
-            for k in expired:
-                _risk_cache.pop(k, None)
-        return None
+        try:
+            return risk_cache.get(self.user_id, self._cache_key(section, fingerprint))
+        except Exception as e:
+            logger.warning(f'Risk cache read failed: {e}')
+            return None
 
     def _set_cached(self, section: str, data, fingerprint: str = ""):
-        _risk_cache[self._cache_key(section, fingerprint)] = {'data': data, 'ts': time.time()}
+        try:
+            risk_cache.set(self.user_id, self._cache_key(section, fingerprint), data)
+        except Exception as e:
+            logger.warning(f'Risk cache write failed: {e}')
 
     # ─────────────────────────────────────────────────────────────
     # 1. RISK HEAT MAP
     # ─────────────────────────────────────────────────────────────
     @staticmethod
-    def _portfolio_fingerprint(portfolio_summary: dict) -> str:
-        import hashlib
-        val = portfolio_summary.get('total_current_value', 0)
-        cnt = len(portfolio_summary.get('asset_classes', []))
-        return hashlib.md5(f"{val}:{cnt}".encode()).hexdigest()[:8]
+    def _portfolio_fingerprint(portfolio_summary: dict, prefs=None) -> str:
+        """
+        Content hash of every input a risk section reads: the summary's per-class values and,
+        for sections that use them, the user's PortfolioPreferences. Other workers' cached
+        copies then miss as soon as any input changes, not only after commit-time invalidation.
+        """
+        classes = sorted(
+            (
+                ac.get('name', ''),
+                ac.get('count', 0),
+                round(ac.get('investment', 0) or 0, 2),
+                round(ac.get('current_value', 0) or 0, 2),
+                round(ac.get('pnl_percentage', 0) or 0, 2)
+            )
+            for ac in portfolio_summary.get('asset_classes', [])
+        )
+        preferences = None
+        if prefs is not None:
+            preferences = sorted(
+                (column.name, getattr(prefs, column.name)) for column in prefs.__table__.columns
+            )
+        payload = json.dumps([
+            round(portfolio_summary.get('total_current_value', 0) or 0, 2),
+            round(portfolio_summary.get('pnl_percentage', 0) or 0, 2),
+            classes,
+            preferences
+        ], default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()[:16]
 
     def get_risk_heatmap(self, portfolio_summary: dict) -> list:
         """Build colour-coded risk heat map from portfolio summary."""
@@ -111,10 +245,6 @@ class RiskEngine:
     # ─────────────────────────────────────────────────────────────
     def get_goal_progress(self, portfolio_summary: dict) -> list:
         """Return progress bars for each declared financial goal."""
-        fp = self._portfolio_fingerprint(portfolio_summary)
-        cached = self._get_cached('goals', fp)
-        if cached is not None:
-            return cached
         try:
             from models import PortfolioPreferences
             prefs = PortfolioPreferences.query.filter_by(user_id=self.user_id).first()
@@ -124,6 +254,11 @@ class RiskEngine:
         if not prefs or not prefs.financial_goals:
             return []
 
+        fp = self._portfolio_fingerprint(portfolio_summary, prefs)
+        cached = self._get_cached('goals', fp)
+        if cached is not None:
+            return cached
+
         total_value = portfolio_summary.get('total_current_value', 0) or 0
 
         try:
@@ -5,9 +5,10 @@ Provides market data in TradingView format using NSE data
 
 import logging
 import json
-from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
+import numpy as np
 from services.nse_service import nse_service
+from services.bar_store import bar_store, EMPTY_BARS, ROLLUP_SOURCES, STORED_RESOLUTIONS
 import time
 
 logger = logging.getLogger(__name__)
@@ -133,160 +134,33 @@ class TradingViewService:
             logger.error(f"Symbol resolution error for {symbol_name}: {e}")
             return None
     
-    def get_bars(self, symbol: str, resolution: str, from_timestamp: int, to_timestamp: int) -> Tuple[List[Dict], bool]:
-        """Get historical bars for symbol"""
+    def get_bars(self, symbol: str, resolution: str, from_timestamp: int, to_timestamp: int) -> Tuple[np.ndarray, bool]:
+        """
+        Get historical bars for symbol from the local bar store
+        Returns:
+            (structured array of bars with fields t/o/h/l/c/v, no_data flag) -
+            serialize with bar_store.to_udf
+        """
         try:
-            # Convert timestamps to datetime
-            from_date = datetime.fromtimestamp(from_timestamp)
-            to_date = datetime.fromtimestamp(to_timestamp)
+            symbol = symbol.split(':')[-1].upper()
+            logger.info(f"Getting bars for {symbol} from {from_timestamp} to {to_timestamp}, resolution: {resolution}")
             
-            logger.info(f"Getting bars for {symbol} from {from_date} to {to_date}, resolution: {resolution}")
+            stored_resolution = ROLLUP_SOURCES.get(resolution, resolution)
+            if stored_resolution not in STORED_RESOLUTIONS:
+                return EMPTY_BARS, True
             
-            # Get data from NSE service
-            if symbol.startswith('NIFTY') or symbol in ['BANKNIFTY']:
-                # Handle indices
-                data = self._get_index_data(symbol, from_date, to_date, resolution)
-            else:
-                # Handle stocks
-                data = self._get_stock_data(symbol, from_date, to_date, resolution)
-            
-            if not data:
-                return [], True  # No data available
+            # First request for a symbol backfills its series once; later requests are pure reads
+            if bar_store.last_timestamp(symbol, stored_resolution) is None:
+                bar_store.backfill(symbol, [stored_resolution])
             
-            bars = []
-            for item in data:
-                bar = {
-                    'time': int(item['timestamp']) * 1000,  # TradingView expects milliseconds
-                    'low': float(item['low']),
-                    'high': float(item['high']),
-                    'open': float(item['open']),
-                    'close': float(item['close']),
-                    'volume': int(item.get('volume', 0))
-                }
-                bars.append(bar)
-            
-            # Sort by time
-            bars.sort(key=lambda x: x['time'])
+            bars = bar_store.get_bars(symbol, resolution, from_timestamp, to_timestamp)
             
             logger.info(f"Returning {len(bars)} bars for {symbol}")
             return bars, len(bars) == 0
             
         except Exception as e:
             logger.error(f"Error getting bars for {symbol}: {e}")
-            return [], True
-    
-    def _get_stock_data(self, symbol: str, from_date: datetime, to_date: datetime, resolution: str) -> List[Dict]:
-        """Get stock data from NSE"""
-        try:
-            # Generate sample data based on current price
-            current_data = nse_service.get_stock_data(symbol)
-            if not current_data:
-                return []
-            
-            current_price = current_data.get('lastPrice', 100)
-            
-            # Generate historical data points
-            bars = []
-            current_date = from_date
-            
-            while current_date <= to_date:
-                # Skip weekends
-                if current_date.weekday() >= 5:
-                    current_date += timedelta(days=1)
-                    continue
-                
-                # Generate realistic OHLC data
-                import random
-                base_price = current_price * (0.95 + random.random() * 0.1)  # ±5% variation
-                
-                open_price = base_price * (0.99 + random.random() * 0.02)
-                high_price = open_price * (1 + random.random() * 0.03)
-                low_price = open_price * (1 - random.random() * 0.03)
-                close_price = low_price + random.random() * (high_price - low_price)
-                volume = random.randint(10000, 1000000)
-                
-                bars.append({
-                    'timestamp': int(current_date.timestamp()),
-                    'open': round(open_price, 2),
-                    'high': round(high_price, 2),
-                    'low': round(low_price, 2),
-                    'close': round(close_price, 2),
-                    'volume': volume
-                })
-                
-                # Increment date based on resolution
-                if resolution == '1D':
-                    current_date += timedelta(days=1)
-                elif resolution == '60':
-                    current_date += timedelta(hours=1)
-                elif resolution == '15':
-                    current_date += timedelta(minutes=15)
-                else:
-                    current_date += timedelta(days=1)  # Default to daily
-                
-                # Limit number of bars
-                if len(bars) >= 1000:
-                    break
-            
-            return bars
-            
-        except Exception as e:
-            logger.error(f"Error getting stock data for {symbol}: {e}")
-            return []
-    
-    def _get_index_data(self, symbol: str, from_date: datetime, to_date: datetime, resolution: str) -> List[Dict]:
-        """Get index data from NSE"""
-        try:
-            # Get current index data
-            if symbol == 'NIFTY50':
-                current_data = nse_service.get_index_data('NIFTY 50')
-            elif symbol == 'BANKNIFTY':
-                current_data = nse_service.get_index_data('NIFTY BANK')
-            else:
-                current_data = {'last': 20000}  # Default value
-            
-            current_price = current_data.get('last', 20000)
-            
-            # Generate historical data
-            bars = []
-            current_date = from_date
-            
-            while current_date <= to_date:
-                if current_date.weekday() >= 5:  # Skip weekends
-                    current_date += timedelta(days=1)
-                    continue
-                
-                # Generate realistic index OHLC
-                import random
-                base_price = current_price * (0.98 + random.random() * 0.04)
-                
-                open_price = base_price * (0.999 + random.random() * 0.002)
-                high_price = open_price * (1 + random.random() * 0.02)
-                low_price = open_price * (1 - random.random() * 0.02)
-                close_price = low_price + random.random() * (high_price - low_price)
-                
-                bars.append({
-                    'timestamp': int(current_date.timestamp()),
-                    'open': round(open_price, 2),
-                    'high': round(high_price, 2),
-                    'low': round(low_price, 2),
-                    'close': round(close_price, 2),
-                    'volume': 0  # Indices don't have volume
-                })
-                
-                if resolution == '1D':
-                    current_date += timedelta(days=1)
-                else:
-                    current_date += timedelta(days=1)  # Default to daily
-                
-                if len(bars) >= 1000:
-                    break
-            
-            return bars
-            
-        except Exception as e:
-            logger.error(f"Error getting index data for {symbol}: {e}")
-            return []
+            return EMPTY_BARS, True
     
     def get_real_time_price(self, symbol: str) -> Optional[Dict]:
         """Get real-time price for symbol"""
@@ -0,0 +1,219 @@
+"""
+Vector Index Service
+Per-user top-k cosine search over embedding tables: pgvector (HNSW) when the column exists,
+otherwise an in-process float32 matrix of pre-normalized vectors; metadata filters run in SQL
+"""
+
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Cached per-(table, user, filters) matrices for the NumPy fallback
+VECTOR_INDEX_MAX_MATRICES = int(os.environ.get('VECTOR_INDEX_MAX_MATRICES', '256'))
+# The HNSW index spans every user's rows and pgvector applies the user/metadata filter after the
+# ANN scan, so a user holding a small share of the table would get truncated results. Searches
+# over at most this many candidate rows are exact (sequential distance over the user's rows).
+VECTOR_EXACT_SEARCH_MAX_ROWS = int(os.environ.get('VECTOR_EXACT_SEARCH_MAX_ROWS', '20000'))
+# hnsw.ef_search for larger searches: candidates kept per scan, as a multiple of top_k
+VECTOR_HNSW_EF_FACTOR = int(os.environ.get('VECTOR_HNSW_EF_FACTOR', '20'))
+
+
+def normalize(vector: List[float]) -> Optional[np.ndarray]:
+    """L2-normalized float32 copy of a vector (None for an empty/zero vector)"""
+    if not vector:
+        return None
+    array = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(array))
+    return array / norm if norm > 0 else None
+
+
+class VectorIndex:
+    """Exact/ANN top-k search for PortfolioDocumentChunk, PortfolioKnowledgeBase and PortfolioAssetEmbedding"""
+
+    def __init__(self, max_matrices: int = VECTOR_INDEX_MAX_MATRICES):
+        self.max_matrices = max_matrices
+        self._pgvector: Dict[str, bool] = {}
+        self._matrices: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (signature, ids, matrix)
+        self._lock = threading.Lock()
+
+    def search(self, model, user_id: int, query_embedding: List[float], top_k: int = 5,
+               filters: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float]]:
+        """
+        Find the user's rows most similar to the query
+
+        Args:
+            model: Embedding model class (must have user_id, embedding, embedding_f32, updated_at)
+            user_id: Owner of the rows searched
+            query_embedding: Query vector
+            top_k: Number of results
+            filters: Column -> value equality filters, applied in the database query
+
+        Returns:
+            List of (row id, cosine similarity) sorted by similarity
+        """
+        query = normalize(query_embedding)
+        if query is None or top_k <= 0:
+            return []
+        table = model.__table__
+        filters = {k: v for k, v in (filters or {}).items() if v is not None and v != ''}
+        unknown = set(filters) - set(table.c.keys())
+        if unknown:
+            raise ValueError(f"Unknown filter columns for {table.name}: {sorted(unknown)}")
+
+        if self._has_pgvector(table):
+            try:
+                return self._search_pgvector(table, user_id, query, top_k, filters)
+            except Exception as e:
+                logger.warning(f"pgvector search failed on {table.name}, using float32 fallback: {e}")
+                self._pgvector[table.name] = False
+        return self._search_matrix(table, user_id, query, top_k, filters)
+
+    def invalidate_user(self, user_id: int):
+        """Drop this worker's cached matrices for a user"""
+        with self._lock:
+            for key in [k for k in self._matrices if k[1] == user_id]:
+                del self._matrices[key]
+
+    def _has_pgvector(self, table) -> bool:
+        if table.name not in self._pgvector:
+            from app import db
+            from sqlalchemy import inspect
+            try:
+                columns = {c['name'] for c in inspect(db.engine).get_columns(table.name)}
+                self._pgvector[table.name] = 'embedding_vec' in columns
+            except Exception:
+                self._pgvector[table.name] = False
+        return self._pgvector[table.name]
+
+    def _search_pgvector(self, table, user_id, query, top_k, filters) -> List[Tuple[int, float]]:
+        from app import db
+        from sqlalchemy import text
+
+        conditions = ['user_id = :user_id', 'embedding_vec IS NOT NULL']
+        params = {'user_id': user_id}
+        for i, (column, value) in enumerate(sorted(filters.items())):
+            conditions.append(f'{table.c[column].name} = :f{i}')
+            params[f'f{i}'] = value
+        where = ' AND '.join(conditions)
+
+        candidates = db.session.execute(
+            text(f"SELECT count(*) FROM {table.name} WHERE {where}"), params
+        ).scalar() or 0
+        if candidates == 0:
+            return []
+
+        params.update({
+            'query_vec': '[' + ','.join(f'{x:.7g}' for x in query) + ']',
+            'top_k': top_k
+        })
+        if candidates <= VECTOR_EXACT_SEARCH_MAX_ROWS:
+            # Distances computed in a materialized CTE cannot be served by the HNSW index,
+            # so the ranking covers every candidate row
+            sql = f"""
+                WITH candidates AS MATERIALIZED (
+                    SELECT id, embedding_vec <=> CAST(:query_vec AS vector) AS distance
+                    FROM {table.name}
+                    WHERE {where}
+                )
+                SELECT id, 1 - distance AS similarity
+                FROM candidates
+                ORDER BY distance
+                LIMIT :top_k
+            """
+        else:
+            # Transaction-scoped: widen the ANN candidate list so post-filtering still fills top_k
+            ef_search = min(1000, max(40, top_k * VECTOR_HNSW_EF_FACTOR))
+            db.session.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+            sql = f"""
+                SELECT id, 1 - (embedding_vec <=> CAST(:query_vec AS vector)) AS similarity
+                FROM {table.name}
+                WHERE {where}
+                ORDER BY embedding_vec <=> CAST(:query_vec AS vector)
+                LIMIT :top_k
+            """
+        rows = db.session.execute(text(sql), params).fetchall()
+        return [(int(row_id), float(score)) for row_id, score in rows]
+
+    def _search_matrix(self, table, user_id, query, top_k, filters) -> List[Tuple[int, float]]:
+        ids, matrix = self._get_matrix(table, user_id, filters)
+        if len(ids) == 0:
+            return []
+        scores = matrix @ query
+        k = min(top_k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def _get_matrix(self, table, user_id, filters) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Cached matrix of the user's normalized vectors
+        Rebuilt when the row count, max(updated_at) or the sum of row ids changes; the id sum
+        catches a delete offset by an insert, which leaves the other two unchanged.
+        """
+        from app import db
+        from sqlalchemy import select, func
+
+        where = [table.c.user_id == user_id] + [table.c[k] == v for k, v in filters.items()]
+        signature = tuple(db.session.execute(
+            select(func.count(), func.max(table.c.updated_at), func.sum(table.c.id)).where(
+                *where, table.c.embedding.isnot(None)
+            )
+        ).one())
+
+        key = (table.name, user_id, tuple(sorted(filters.items())))
+        with self._lock:
+            cached = self._matrices.get(key)
+            if cached is not None and cached[0] == signature:
+                self._matrices.move_to_end(key)
+                return cached[1], cached[2]
+
+        ids, vectors = [], []
+        for row_id, blob in db.session.execute(
+            select(table.c.id, table.c.embedding_f32).where(*where, table.c.embedding_f32.isnot(None))
+        ):
+            ids.append(row_id)
+            vectors.append(np.frombuffer(blob, dtype=np.float32))
+        # Rows written before embedding_f32 existed: decode the JSON once
+        for row_id, embedding in db.session.execute(
+            select(table.c.id, table.c.embedding).where(
+                *where, table.c.embedding_f32.is_(None), table.c.embedding.isnot(None)
+            )
+        ):
+            if isinstance(embedding, str):
+                embedding = json.loads(embedding)
+            vector = normalize(embedding)
+            if vector is not None:
+                ids.append(row_id)
+                vectors.append(vector)
+
+        id_array = np.asarray(ids, dtype=np.int64)
+        matrix = np.vstack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+        with self._lock:
+            self._matrices[key] = (signature, id_array, matrix)
+            self._matrices.move_to_end(key)
+            while len(self._matrices) > self.max_matrices:
+                self._matrices.popitem(last=False)
+        return id_array, matrix
+
+
+vector_index = VectorIndex()
+
+
+def load_ranked(model, hits: List[Tuple[int, float]]) -> List[Tuple[Any, float]]:
+    """Load the rows for search hits (without their embedding columns), keeping hit order"""
+    if not hits:
+        return []
+    from sqlalchemy.orm import defer
+
+    rows = model.query.options(defer(model.embedding), defer(model.embedding_f32)).filter(
+        model.id.in_([row_id for row_id, _ in hits])
+    ).all()
+    by_id = {row.id: row for row in rows}
+    return [(by_id[row_id], score) for row_id, score in hits if row_id in by_id]
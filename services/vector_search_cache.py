@@ -0,0 +1,246 @@
+"""
+Semantic Query Cache
+Persists vector search results in VectorSearchCache so repeated and near-duplicate questions
+skip the embedding call and the similarity scan
+"""
+
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CACHE_TTL_MINUTES = int(os.environ.get('SEARCH_CACHE_TTL_MINUTES', '60'))
+# Cosine similarity at which a different query is treated as the same question
+SEARCH_CACHE_SIMILARITY = float(os.environ.get('SEARCH_CACHE_SIMILARITY', '0.95'))
+# Per-user entry cap; least recently accessed entries beyond it are evicted
+SEARCH_CACHE_MAX_PER_USER = int(os.environ.get('SEARCH_CACHE_MAX_PER_USER', '200'))
+# Near-duplicate candidates compared per lookup
+SEARCH_CACHE_NEAR_CANDIDATES = 50
+
+
+def _normalize_query(query: str) -> str:
+    return ' '.join(query.lower().split())
+
+
+class VectorSearchResultCache:
+    """
+    Query-result cache in front of services.vector_index
+    Entries are keyed by (user, searched table + filters + top_k, data signature); the
+    signature changes whenever the user's searched rows change, which invalidates them.
+    """
+
+    def __init__(self, ttl_minutes: int = SEARCH_CACHE_TTL_MINUTES,
+                 similarity_threshold: float = SEARCH_CACHE_SIMILARITY,
+                 max_per_user: int = SEARCH_CACHE_MAX_PER_USER):
+        self.ttl = timedelta(minutes=ttl_minutes)
+        self.similarity_threshold = similarity_threshold
+        self.max_per_user = max_per_user
+
+    def search(self, model, user_id: int, query: str, embed: Callable[[str], Optional[List[float]]],
+               top_k: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float]]:
+        """
+        Cached vector search
+
+        Args:
+            model: Embedding model class searched (see VectorIndex.search)
+            user_id: Owner of the rows searched
+            query: Natural language query
+            embed: Function returning the query embedding (called only on an exact-hash miss)
+            top_k: Number of results
+            filters: Column -> value equality filters
+
+        Returns:
+            List of (row id, cosine similarity) sorted by similarity
+        """
+        from services.vector_index import vector_index
+
+        filters = {k: v for k, v in (filters or {}).items() if v is not None and v != ''}
+        try:
+            scope = self._scope(model, filters, top_k)
+            with self._session() as session:
+                signature = self._data_signature(session, model, user_id)
+                query_hash = hashlib.sha256(
+                    f"{scope}|{signature}|{_normalize_query(query)}".encode()
+                ).hexdigest()
+
+                entry = self._exact_entry(session, user_id, query_hash)
+                if entry is not None:
+                    return self._hit(session, entry)
+        except Exception as e:
+            logger.warning(f"Vector search cache lookup failed: {e}")
+            scope = None
+
+        query_embedding = embed(query)
+        if not query_embedding:
+            return []
+
+        if scope is not None:
+            try:
+                with self._session() as session:
+                    entry = self._near_entry(session, user_id, scope, signature, query_embedding)
+                    if entry is not None:
+                        return self._hit(session, entry)
+            except Exception as e:
+                logger.warning(f"Vector search cache near-duplicate lookup failed: {e}")
+
+        hits = vector_index.search(model, user_id, query_embedding, top_k=top_k, filters=filters)
+
+        if scope is not None:
+            try:
+                with self._session() as session:
+                    self._store(session, model, user_id, query, query_hash, query_embedding, scope, signature, hits)
+            except Exception as e:
+                logger.warning(f"Vector search cache store failed: {e}")
+        return hits
+
+    def invalidate_user(self, user_id: int):
+        """Delete every cached result for a user"""
+        from models_vector import VectorSearchCache
+
+        with self._session() as session:
+            session.query(VectorSearchCache).filter_by(user_id=user_id).delete(synchronize_session=False)
+            session.commit()
+
+    @staticmethod
+    def _session():
+        """
+        Session of its own for cache bookkeeping, so cache commits and rollbacks never
+        touch the caller's db.session (closing it rolls back anything left uncommitted)
+        """
+        from app import db
+        from sqlalchemy.orm import Session
+
+        return Session(db.engine, expire_on_commit=False)
+
+    @staticmethod
+    def _scope(model, filters: Dict[str, Any], top_k: int) -> str:
+        digest = hashlib.sha1(json.dumps([sorted(filters.items()), top_k], default=str).encode()).hexdigest()[:16]
+        return f"{model.__tablename__}:{digest}"
+
+    @staticmethod
+    def _data_signature(session, model, user_id: int) -> str:
+        """
+        Changes whenever any of the user's searched rows is added, removed or updated
+        Sync bookkeeping such as PortfolioAssetEmbedding.last_synced leaves updated_at alone
+        (see PortfolioEmbeddingService.embed_assets), so it does not invalidate entries.
+        """
+        from sqlalchemy import select, func
+
+        table = model.__table__
+        count, id_sum, last_updated = session.execute(
+            select(func.count(), func.sum(table.c.id), func.max(table.c.updated_at)).where(table.c.user_id == user_id)
+        ).one()
+        return hashlib.sha1(f"{count}:{id_sum}:{last_updated}".encode()).hexdigest()
+
+    @staticmethod
+    def _exact_entry(session, user_id: int, query_hash: str):
+        from models_vector import VectorSearchCache
+
+        return session.query(VectorSearchCache).filter(
+            VectorSearchCache.user_id == user_id,
+            VectorSearchCache.query_hash == query_hash,
+            VectorSearchCache.expires_at > datetime.utcnow()
+        ).first()
+
+    def _near_entry(self, session, user_id: int, scope: str, signature: str, query_embedding: List[float]):
+        """Most similar recent query for the same scope and data, if above the threshold"""
+        from models_vector import VectorSearchCache
+        from services.vector_index import normalize
+
+        query = normalize(query_embedding)
+        if query is None:
+            return None
+
+        candidates = session.query(VectorSearchCache.id, VectorSearchCache.query_embedding_f32).filter(
+            VectorSearchCache.user_id == user_id,
+            VectorSearchCache.scope == scope,
+            VectorSearchCache.data_signature == signature,
+            VectorSearchCache.expires_at > datetime.utcnow(),
+            VectorSearchCache.query_embedding_f32.isnot(None)
+        ).order_by(VectorSearchCache.last_accessed.desc()).limit(SEARCH_CACHE_NEAR_CANDIDATES).all()
+
+        best_id, best_score = _best_match(candidates, query)
+        if best_id is None or best_score < self.similarity_threshold:
+            return None
+        return session.get(VectorSearchCache, best_id)
+
+    @staticmethod
+    def _hit(session, entry) -> List[Tuple[int, float]]:
+        hits = [(int(row_id), float(score)) for row_id, score in (entry.result_data or {}).get('hits', [])]
+        entry.hit_count = (entry.hit_count or 0) + 1
+        entry.last_accessed = datetime.utcnow()
+        session.commit()
+        return hits
+
+    def _store(self, session, model, user_id, query, query_hash, query_embedding, scope, signature, hits):
+        from models_vector import VectorSearchCache
+        from services.vector_index import normalize
+
+        now = datetime.utcnow()
+        ids = [row_id for row_id, _ in hits]
+        normalized = normalize(query_embedding)
+        session.add(VectorSearchCache(
+            user_id=user_id,
+            query_text=query,
+            query_hash=query_hash,
+            query_embedding_f32=normalized.tobytes() if normalized is not None else None,
+            scope=scope,
+            data_signature=signature,
+            result_chunk_ids=ids if model.__tablename__ == 'portfolio_document_chunks' else None,
+            result_knowledge_ids=ids if model.__tablename__ == 'portfolio_knowledge_base' else None,
+            result_data={'hits': [[row_id, score] for row_id, score in hits]},
+            hit_count=0,
+            last_accessed=now,
+            expires_at=now + self.ttl
+        ))
+
+        # Entries for this scope cached against older data can never match again
+        session.query(VectorSearchCache).filter(
+            VectorSearchCache.user_id == user_id,
+            VectorSearchCache.scope == scope,
+            VectorSearchCache.data_signature != signature
+        ).delete(synchronize_session=False)
+        session.query(VectorSearchCache).filter(
+            VectorSearchCache.user_id == user_id,
+            VectorSearchCache.expires_at <= now
+        ).delete(synchronize_session=False)
+        session.flush()
+
+        # LRU cap per user
+        stale_ids = [row.id for row in session.query(VectorSearchCache.id).filter_by(
+            user_id=user_id
+        ).order_by(VectorSearchCache.last_accessed.desc()).offset(self.max_per_user).all()]
+        if stale_ids:
+            session.query(VectorSearchCache).filter(
+                VectorSearchCache.id.in_(stale_ids)
+            ).delete(synchronize_session=False)
+        session.commit()
+
+
+def _best_match(candidates, query: np.ndarray) -> Tuple[Optional[int], float]:
+    """
+    (id, cosine similarity) of the candidate closest to a normalized query
+
+    Args:
+        candidates: (id, L2-normalized float32 bytes) pairs; other dimensions are skipped
+        query: L2-normalized float32 query
+
+    Returns:
+        (None, 0.0) when no candidate has the query's dimension
+    """
+    usable = [(row_id, blob) for row_id, blob in candidates if blob and len(blob) == query.nbytes]
+    if not usable:
+        return None, 0.0
+    matrix = np.frombuffer(b''.join(blob for _, blob in usable), dtype=np.float32).reshape(len(usable), -1)
+    scores = matrix @ query
+    best = int(np.argmax(scores))
+    return usable[best][0], float(scores[best])
+
+
+vector_search_cache = VectorSearchResultCache()
@@ -14,6 +14,11 @@ from sklearn.metrics.pairwise import cosine_similarity
 
 logger = logging.getLogger(__name__)
 
+# Inputs per embeddings API call
+EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', '256'))
+# Text-hash -> vector entries are immutable, so they can live long
+EMBEDDING_CACHE_TTL = int(os.environ.get('EMBEDDING_CACHE_TTL', str(7 * 86400)))
+
 
 class VectorService:
     """
@@ -84,32 +89,68 @@ class VectorService:
             model: OpenAI embedding model
             
         Returns:
-            List of embeddings (same length as input)
+            List of embeddings (same length as input, None for empty texts)
         """
         if not self.openai_client:
             return [None] * len(texts)
         
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        # Keep input positions so blank texts don't shift later results
+        indexed = [(i, text.strip()[:8000]) for i, text in enumerate(texts) if text and text.strip()]
+        
         try:
-            # Clean texts
-            cleaned_texts = [text.strip()[:8000] for text in texts if text.strip()]
-            
-            if not cleaned_texts:
-                return [None] * len(texts)
-            
-            # Batch API call
-            response = self.openai_client.embeddings.create(
-                model=model,
-                input=cleaned_texts
-            )
-            
-            embeddings = [item.embedding for item in response.data]
-            logger.info(f"Generated {len(embeddings)} embeddings")
+            for start in range(0, len(indexed), EMBEDDING_BATCH_SIZE):
+                chunk = indexed[start:start + EMBEDDING_BATCH_SIZE]
+                
+                # Batch API call
+                response = self.openai_client.embeddings.create(
+                    model=model,
+                    input=[text for _, text in chunk]
+                )
+                
+                for (i, _), item in zip(chunk, sorted(response.data, key=lambda d: d.index)):
+                    embeddings[i] = item.embedding
             
+            logger.info(f"Generated {len(indexed)} embeddings")
             return embeddings
             
         except Exception as e:
             logger.error(f"Error generating batch embeddings: {str(e)}")
-            return [None] * len(texts)
+            return embeddings
+    
+    @staticmethod
+    def text_hash(text: str, model: str = "text-embedding-ada-002") -> str:
+        """Content address of a text's embedding"""
+        return hashlib.sha256(f"{model}:{text.strip()[:8000]}".encode()).hexdigest()
+    
+    def get_embeddings_cached(self, texts: List[str],
+                              model: str = "text-embedding-ada-002") -> List[Optional[List[float]]]:
+        """
+        Embeddings for many texts, content-addressed
+        Identical texts are embedded once; vectors are shared across workers through
+        Redis (text hash -> vector) and only cache misses go to the batch API.
+        
+        Returns:
+            List of embeddings (same length as input)
+        """
+        from caching.redis_cache import get_cache
+        cache = get_cache()
+        
+        hashes = [self.text_hash(text, model) for text in texts]
+        unique = list(dict.fromkeys(hashes))
+        keys = [f"embedding:{h}" for h in unique]
+        vectors = dict(zip(unique, cache.get_many(keys)))
+        
+        misses = [h for h in unique if vectors.get(h) is None]
+        if misses:
+            text_by_hash = dict(zip(hashes, texts))
+            generated = self.generate_embeddings_batch([text_by_hash[h] for h in misses], model)
+            fresh = {h: v for h, v in zip(misses, generated) if v is not None}
+            vectors.update(fresh)
+            cache.set_many({f"embedding:{h}": v for h, v in fresh.items()}, expiry=EMBEDDING_CACHE_TTL)
+            logger.debug(f"Embedding cache: {len(unique) - len(misses)} hits, {len(misses)} misses")
+        
+        return [vectors.get(h) for h in hashes]
     
     def cosine_similarity_search(self, query_embedding: List[float],
                                  candidate_embeddings: List[List[float]],
@@ -228,43 +269,18 @@ class VectorService:
         from models_vector import PortfolioKnowledgeBase
         
         try:
-            # Generate query embedding
-            query_embedding = self.generate_embedding(query)
-            
-            if not query_embedding:
-                return []
-            
-            # Build query
-            kb_query = PortfolioKnowledgeBase.query.filter_by(user_id=user_id)
-            
-            if asset_class:
-                kb_query = kb_query.filter_by(asset_class=asset_class)
-            if knowledge_type:
-                kb_query = kb_query.filter_by(knowledge_type=knowledge_type)
-            
-            # Get all matching records
-            knowledge_items = kb_query.all()
-            
-            if not knowledge_items:
-                return []
+            from services.vector_index import load_ranked
+            from services.vector_search_cache import vector_search_cache
             
-            # Extract embeddings
-            embeddings = [item.embedding for item in knowledge_items if item.embedding]
-            
-            if not embeddings:
-                return []
-            
-            # Perform similarity search
-            similar_indices = self.cosine_similarity_search(
-                query_embedding,
-                embeddings,
-                top_k=min(top_k, len(embeddings))
+            # Cached top-k over the user's rows with filters applied in the database
+            hits = vector_search_cache.search(
+                PortfolioKnowledgeBase, user_id, query, embed=self.generate_embedding, top_k=top_k,
+                filters={'asset_class': asset_class, 'knowledge_type': knowledge_type}
             )
             
             # Build results
             results = []
-            for idx, score in similar_indices:
-                item = knowledge_items[idx]
+            for item, score in load_ranked(PortfolioKnowledgeBase, hits):
                 results.append({
                     'id': item.id,
                     'title': item.title,
@@ -305,43 +321,17 @@ class VectorService:
         from models_vector import PortfolioDocumentChunk
         
         try:
-            # Generate query embedding
-            query_embedding = self.generate_embedding(query)
-            
-            if not query_embedding:
-                return []
-            
-            # Build query
-            chunk_query = PortfolioDocumentChunk.query.filter_by(user_id=user_id)
-            
-            if document_type:
-                chunk_query = chunk_query.filter_by(document_type=document_type)
-            if asset_class:
-                chunk_query = chunk_query.filter_by(asset_class=asset_class)
-            
-            # Get all matching chunks
-            chunks = chunk_query.all()
-            
-            if not chunks:
-                return []
-            
-            # Extract embeddings
-            embeddings = [chunk.embedding for chunk in chunks if chunk.embedding]
-            
-            if not embeddings:
-                return []
+            from services.vector_index import load_ranked
+            from services.vector_search_cache import vector_search_cache
             
-            # Perform similarity search
-            similar_indices = self.cosine_similarity_search(
-                query_embedding,
-                embeddings,
-                top_k=min(top_k, len(embeddings))
+            hits = vector_search_cache.search(
+                PortfolioDocumentChunk, user_id, query, embed=self.generate_embedding, top_k=top_k,
+                filters={'document_type': document_type, 'asset_class': asset_class}
             )
             
             # Build results
             results = []
-            for idx, score in similar_indices:
-                chunk = chunks[idx]
+            for chunk, score in load_ranked(PortfolioDocumentChunk, hits):
                 results.append({
                     'id': chunk.id,
                     'chunk_text': chunk.chunk_text,
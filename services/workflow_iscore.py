@@ -503,19 +503,17 @@ class IScoreWorkflow:
     def _gather_technical_indicators(self, symbol: str) -> Dict[str, Any]:
         indicators: Dict[str, Any] = {"symbol": symbol}
         try:
-            from services.nse_service import NSEService
-            nse = NSEService()
-            df = nse.get_intraday_data(symbol, interval="1h")
-            if df is not None and not df.empty:
-                latest = df.iloc[-1]
-                indicators["rsi"] = round(float(latest.get("rsi", 50)), 2) if "rsi" in df.columns else None
-                ema9_val = latest.get("ema_9") if "ema_9" in df.columns else None
-                indicators["ema_9"] = round(_safe_float(ema9_val), 2) if ema9_val is not None else None
-                ema20_val = latest.get("ema_20") if "ema_20" in df.columns else None
-                indicators["ema_20"] = round(_safe_float(ema20_val), 2) if ema20_val is not None else None
-                indicators["close"] = round(float(latest.get("close", 0)), 2)
-                if indicators.get("ema_9") is not None and indicators.get("ema_20") is not None:
-                    indicators["ema_crossover"] = "bullish" if float(indicators["ema_9"]) > float(indicators["ema_20"]) else "bearish"
+            from services.indicator_engine import indicator_engine
+            latest = indicator_engine.get_latest(symbol, interval="1h")
+            if latest:
+                indicators["rsi"] = latest["rsi"]
+                indicators["ema_9"] = latest["ema_short"]
+                indicators["ema_20"] = latest["ema_long"]
+                indicators["close"] = round(float(latest["close"]), 2)
+                if latest["ema_signal"]:
+                    indicators["ema_crossover"] = latest["ema_signal"]
+                indicators["atr"] = latest["atr"]
+                indicators["supertrend"] = latest["supertrend_direction"]
                 indicators["data_source"] = "yfinance_intraday"
             else:
                 indicators["data_source"] = "unavailable"
@@ -528,28 +526,31 @@ class IScoreWorkflow:
     def _gather_trend_data(self, symbol: str) -> Dict[str, Any]:
         trend: Dict[str, Any] = {"symbol": symbol}
         try:
-            from services.nse_service import NSEService
-            nse = NSEService()
+            from services.market_context_service import market_context_service
+            context = market_context_service.get_snapshot()
 
-            vix_data = nse.get_india_vix()
+            vix_data = context["vix"]
             trend["vix"] = {
                 "value": vix_data.get("vix_value", 15.0),
                 "source": vix_data.get("source", "fallback"),
             }
 
-            pcr_data = nse.get_pcr("NIFTY")
+            pcr_data = context["pcr"]
             trend["pcr"] = {
                 "value": pcr_data.get("pcr_value", 0.85),
                 "source": pcr_data.get("source", "fallback"),
             }
 
-            oi_data = nse.get_option_chain_oi("NIFTY")
+            oi_data = context["oi"]
             trend["open_interest"] = {
                 "total_ce_oi": oi_data.get("total_ce_oi", 0),
                 "total_pe_oi": oi_data.get("total_pe_oi", 0),
                 "oi_pcr": oi_data.get("oi_pcr", 1.0),
                 "source": oi_data.get("source", "fallback"),
             }
+            trend["as_of"] = context.get("as_of")
+            trend["age_seconds"] = context.get("age_seconds")
+            trend["stale"] = context.get("stale", False)
         except Exception as exc:
             logger.warning(f"Trend data fetch failed: {exc}")
             trend["error"] = str(exc)
@@ -164,35 +164,49 @@ def sync_broker_orders(self, broker_account_id):
 
 @shared_task
 def sync_all_broker_data():
-    """Sync data for all connected broker accounts across all tenants
+    """Schedule broker syncs for connected accounts across all tenants
     
-    Note: This processes all accounts but tenant isolation is maintained because:
-    - Each individual sync task operates on a specific account_id
-    - The account's tenant_id is preserved in all related data
+    The scheduler picks the stalest accounts (active users first) within each
+    broker's API budget, skips positions/orders outside market hours and never
+    re-queues an account whose previous sync is still running.
+    
+    Note: tenant isolation is maintained because each sync task operates on a
+    specific account_id and the account's tenant_id is preserved in related data
     """
-    from app import app, db
-    from models_broker import BrokerAccount
+    from app import app
+    from services.broker_sync_scheduler import get_broker_sync_scheduler
+    
+    def dispatch(account_id, data_types, countdown):
+        sync_broker_account.apply_async(args=[account_id, data_types], countdown=countdown)
     
     with app.app_context():
-        # Get all connected broker accounts (across all tenants - isolation via account_id)
-        connected_accounts = BrokerAccount.query.filter_by(
-            connection_status='connected'
-        ).all()
-        
-        synced_count = 0
-        tenant_summary = {}
-        for account in connected_accounts:
-            # Queue individual sync tasks (tenant isolation via account data)
-            sync_broker_holdings.delay(account.id)
-            sync_broker_orders.delay(account.id)
-            synced_count += 1
-            
-            # Track by tenant for logging
-            tenant_id = account.tenant_id or 'live'
-            tenant_summary[tenant_id] = tenant_summary.get(tenant_id, 0) + 1
-        
-        logger.info(f"Queued sync tasks for {synced_count} broker accounts across {len(tenant_summary)} tenants")
-        return {'success': True, 'accounts_synced': synced_count, 'tenants': tenant_summary}
+        return get_broker_sync_scheduler().run(dispatch)
+
+@shared_task(bind=True)
+def sync_broker_account(self, broker_account_id, data_types):
+    """Sync the given data types for one broker account (dispatched by sync_all_broker_data)"""
+    from app import app
+    from models_broker import BrokerAccount
+    from services.broker_service import BrokerService, BrokerAPIError
+    from services.broker_sync_scheduler import get_broker_sync_scheduler
+    
+    try:
+        with app.app_context():
+            broker_account = BrokerAccount.query.get(broker_account_id)
+            if not broker_account:
+                logger.error(f"Broker account {broker_account_id} not found")
+                return {'error': 'Broker account not found'}
+            
+            with tenant_context(broker_account.tenant_id):
+                results = BrokerService.sync_broker_data(broker_account, data_types)
+            return {'success': True, 'synced': results}
+            
+    except BrokerAPIError as exc:
+        # Not retried here: the account stays stale and the next scheduler tick picks it up
+        logger.error(f"Error syncing broker account {broker_account_id}: {exc}")
+        return {'error': str(exc)}
+    finally:
+        get_broker_sync_scheduler().release(broker_account_id)
 
 @shared_task(bind=True, max_retries=3)
 def execute_broker_order(self, broker_account_id, order_params):
@@ -64,39 +64,40 @@ def update_market_indices():
 def update_stock_prices(symbols):
     """Update stock prices for given symbols and cache results"""
     try:
-        from services.nse_service import NSEService
+        from services.nse_service import NSEService, FALLBACK_DATA_SOURCE
         
         nse_service = NSEService()
         redis_client = get_redis_client()
         
+        columns = nse_service.get_batch_quotes(symbols)['columns']
+        timestamp = datetime.now(timezone.utc).isoformat()
+        
+        # One pipelined round trip for all price keys
+        pipe = redis_client.pipeline(transaction=False)
         updated_count = 0
-        for symbol in symbols:
-            try:
-                stock_data = nse_service.get_stock_data(symbol)
-                
-                price_info = {
-                    'symbol': symbol,
-                    'current_price': stock_data.get('lastPrice', 0),
-                    'change': stock_data.get('change', 0),
-                    'change_percent': stock_data.get('pChange', 0),
-                    'high': stock_data.get('dayHigh', 0),
-                    'low': stock_data.get('dayLow', 0),
-                    'volume': stock_data.get('totalTradedVolume', 0),
-                    'timestamp': datetime.now(timezone.utc).isoformat()
-                }
-                
-                # Cache individual stock data
-                redis_client.setex(
-                    f'stock_price:{symbol}',
-                    180,  # 3 minutes expiry
-                    json.dumps(price_info)
-                )
-                
-                updated_count += 1
-                
-            except Exception as e:
-                logger.warning(f"Failed to update price for {symbol}: {e}")
+        for i, symbol in enumerate(columns['symbol']):
+            if columns['data_source'][i] == FALLBACK_DATA_SOURCE:
+                # No real price from NSE or yfinance; let the previous cached price expire
                 continue
+            price_info = {
+                'symbol': symbol,
+                'current_price': columns['current_price'][i] or 0,
+                'change': columns['change_amount'][i] or 0,
+                'change_percent': columns['change_percent'][i] or 0,
+                'high': columns['day_high'][i] or 0,
+                'low': columns['day_low'][i] or 0,
+                'volume': columns['volume'][i] or 0,
+                'timestamp': timestamp
+            }
+            
+            # Cache individual stock data
+            pipe.setex(
+                f'stock_price:{symbol}',
+                180,  # 3 minutes expiry
+                json.dumps(price_info)
+            )
+            updated_count += 1
+        pipe.execute()
         
         logger.info(f"Updated prices for {updated_count} stocks")
         return {'success': True, 'stocks_updated': updated_count}
@@ -129,22 +130,14 @@ def cache_popular_stocks():
 def cleanup_expired_cache():
     """Clean up expired cache entries"""
     try:
-        redis_client = get_redis_client()
+        from caching.redis_cache import get_cache
         
-        # Get keys matching our patterns
-        patterns = ['stock_price:*', 'market_indices', 'user_portfolio:*']
-        deleted_count = 0
+        # Cached values carry a TTL and expire on their own; what accumulates is
+        # invalidation-tag membership for keys that have since expired
+        pruned_count = get_cache().prune_tags()
         
-        for pattern in patterns:
-            keys = redis_client.keys(pattern)
-            for key in keys:
-                # Check if key exists and has no TTL (expired)
-                if redis_client.ttl(key) == -1:
-                    redis_client.delete(key)
-                    deleted_count += 1
-        
-        logger.info(f"Cleaned up {deleted_count} expired cache entries")
-        return {'success': True, 'deleted_count': deleted_count}
+        logger.info(f"Pruned {pruned_count} expired cache tag entries")
+        return {'success': True, 'deleted_count': pruned_count}
         
     except Exception as exc:
         logger.error(f"Error cleaning up cache: {exc}")
@@ -218,4 +211,32 @@ def generate_market_summary():
         
     except Exception as exc:
         logger.error(f"Error generating market summary: {exc}")
-        return {'error': str(exc)}
\ No newline at end of file
+        return {'error': str(exc)}
+
+@shared_task
+def backfill_bar_store(symbols=None, tail_only=False):
+    """Backfill the local OHLCV bar store from yfinance (tail_only for periodic intraday ingest)"""
+    try:
+        from services.bar_store import bar_store, INDEX_TICKERS
+        
+        if not symbols:
+            symbols = [
+                'RELIANCE', 'TCS', 'HDFCBANK', 'ICICIBANK', 'HINDUNILVR',
+                'ITC', 'SBIN', 'BHARTIARTL', 'KOTAKBANK', 'LT',
+                'ASIANPAINT', 'MARUTI', 'TITAN', 'ULTRACEMCO', 'NESTLEIND'
+            ] + list(INDEX_TICKERS)
+        
+        written = 0
+        for symbol in symbols:
+            try:
+                written += sum(bar_store.backfill(symbol, tail_only=tail_only).values())
+            except Exception as e:
+                logger.warning(f"Bar store backfill failed for {symbol}: {e}")
+                continue
+        
+        logger.info(f"Bar store backfill wrote {written} bars for {len(symbols)} symbols")
+        return {'success': True, 'symbols': len(symbols), 'bars_written': written}
+        
+    except Exception as exc:
+        logger.error(f"Error backfilling bar store: {exc}")
+        return {'error': str(exc)}
@@ -0,0 +1,183 @@
+"""
+Test the OHLCV bar store: in-place revision of the last bar, roll-ups and backfill resume
+"""
+
+import os
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.bar_store import BAR_DTYPE, IST_OFFSET, SESSION_OPEN_UTC, BarStore, rollup
+
+DAY = 86400
+MIDNIGHT_UTC = 1781481600  # 2026-06-15, a Monday
+SESSION_OPEN = MIDNIGHT_UTC + SESSION_OPEN_UTC  # 09:15 IST
+
+
+def _bars(times, close=None):
+    bars = np.zeros(len(times), dtype=BAR_DTYPE)
+    bars['t'] = times
+    closes = np.arange(1, len(times) + 1, dtype=float) if close is None else close
+    bars['o'] = closes
+    bars['h'] = closes + 1
+    bars['l'] = closes - 1
+    bars['c'] = closes
+    bars['v'] = 10.0
+    return bars
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BarStore(root=str(tmp_path))
+
+
+class TestAppend:
+    """Files only grow; a bar with the last stored timestamp replaces it"""
+
+    def test_appends_new_bars(self, store):
+        times = SESSION_OPEN + 60 * np.arange(5)
+        assert store.append('TEST', '1', _bars(times)) == 5
+        assert store.append('TEST', '1', _bars(times[-1] + 60 * np.arange(1, 4))) == 3
+
+        stored = store.get_bars('TEST', '1', 0, 2 ** 40)
+        assert len(stored) == 8
+        assert np.all(np.diff(stored['t']) > 0)
+
+    def test_same_timestamp_overwrites_last_record(self, store):
+        times = SESSION_OPEN + 60 * np.arange(5)
+        store.append('TEST', '1', _bars(times))
+        path = store._path('TEST', '1')
+        size = os.path.getsize(path)
+
+        revised = _bars([times[-1], times[-1] + 60], close=np.array([99.0, 100.0]))
+        assert store.append('TEST', '1', revised) == 2
+
+        stored = store.get_bars('TEST', '1', 0, 2 ** 40)
+        assert len(stored) == 6
+        assert stored['c'][-2] == 99.0
+        assert stored['c'][-1] == 100.0
+        assert os.path.getsize(path) == size + BAR_DTYPE.itemsize
+
+    def test_older_bars_are_ignored(self, store):
+        times = SESSION_OPEN + 60 * np.arange(5)
+        store.append('TEST', '1', _bars(times))
+        size = os.path.getsize(store._path('TEST', '1'))
+
+        assert store.append('TEST', '1', _bars(times[:3])) == 0
+        assert os.path.getsize(store._path('TEST', '1')) == size
+
+    def test_range_query(self, store):
+        times = SESSION_OPEN + 60 * np.arange(10)
+        store.append('TEST', '1', _bars(times))
+
+        stored = store.get_bars('TEST', '1', int(times[2]), int(times[5]))
+        assert stored['t'].tolist() == times[2:6].tolist()
+
+    def test_unsupported_resolution(self, store):
+        with pytest.raises(ValueError):
+            store.append('TEST', '5', _bars([SESSION_OPEN]))
+
+
+class TestRollup:
+    """Coarser resolutions aggregate OHLCV per bucket"""
+
+    def test_five_minute_buckets_align_to_session_open(self):
+        bars = _bars(SESSION_OPEN + 60 * np.arange(12))
+
+        out = rollup(bars, '5')
+
+        assert out['t'].tolist() == [SESSION_OPEN, SESSION_OPEN + 300, SESSION_OPEN + 600]
+        assert out['o'].tolist() == [1.0, 6.0, 11.0]
+        assert out['c'].tolist() == [5.0, 10.0, 12.0]
+        assert out['h'].tolist() == [6.0, 11.0, 13.0]
+        assert out['l'].tolist() == [0.0, 5.0, 10.0]
+        assert out['v'].tolist() == [50.0, 50.0, 20.0]
+
+    def test_weekly_buckets_start_monday_ist(self):
+        bars = _bars(SESSION_OPEN + DAY * np.arange(10))
+
+        out = rollup(bars, '1W')
+
+        monday = MIDNIGHT_UTC - IST_OFFSET  # 00:00 IST
+        assert out['t'].tolist() == [monday, monday + 7 * DAY]
+        assert out['c'].tolist() == [7.0, 10.0]
+
+    def test_get_bars_rolls_up_from_stored_source(self, store):
+        store.append('TEST', '1', _bars(SESSION_OPEN + 60 * np.arange(12)))
+
+        out = store.get_bars('TEST', '5', SESSION_OPEN + 120, SESSION_OPEN + 3600)
+
+        # The first bucket is widened to its start rather than returned partial
+        assert out['t'][0] == SESSION_OPEN
+        assert out['c'][0] == 5.0
+
+
+class _FakeTicker:
+    def __init__(self, frame, calls):
+        self.frame = frame
+        self.calls = calls
+
+    def history(self, interval, **window):
+        self.calls.append((interval, window))
+        return self.frame
+
+
+class TestBackfill:
+    """A stored series resumes from its last bar's session"""
+
+    @pytest.fixture
+    def fake_yf(self, monkeypatch):
+        state = {'frame': None, 'calls': []}
+        module = types.ModuleType('yfinance')
+        module.Ticker = lambda ticker: _FakeTicker(state['frame'], state['calls'])
+        monkeypatch.setitem(sys.modules, 'yfinance', module)
+        return state
+
+    @staticmethod
+    def _frame(times, closes):
+        index = pd.to_datetime(times, unit='s', utc=True)
+        return pd.DataFrame({'Open': closes, 'High': closes, 'Low': closes, 'Close': closes,
+                             'Volume': 1.0}, index=index)
+
+    def test_empty_series_fetches_full_period(self, store, fake_yf):
+        times = SESSION_OPEN + DAY * np.arange(3)
+        fake_yf['frame'] = self._frame(times, np.array([1.0, 2.0, 3.0]))
+
+        assert store.backfill('TEST', ['1D']) == {'1D': 3}
+        assert fake_yf['calls'] == [('1d', {'period': 'max'})]
+
+    def test_tail_only_fetches_short_window_for_empty_series(self, store, fake_yf):
+        fake_yf['frame'] = self._frame([SESSION_OPEN], np.array([1.0]))
+
+        store.backfill('TEST', ['1', '15'], tail_only=True)
+
+        assert fake_yf['calls'] == [('1m', {'period': '1d'}), ('15m', {'period': '5d'})]
+
+    def test_resumes_from_last_stored_session(self, store, fake_yf):
+        times = SESSION_OPEN + DAY * np.arange(3)
+        store.append('TEST', '1D', _bars(times))
+
+        # The source revises the last stored bar and adds two more
+        new_times = SESSION_OPEN + DAY * np.arange(2, 5)
+        fake_yf['frame'] = self._frame(new_times, np.array([30.0, 4.0, 5.0]))
+
+        assert store.backfill('TEST', ['1D'], tail_only=True) == {'1D': 3}
+        assert fake_yf['calls'] == [('1d', {'start': '2026-06-17'})]
+        stored = store.get_bars('TEST', '1D', 0, 2 ** 40)
+        assert stored['c'].tolist() == [1.0, 2.0, 30.0, 4.0, 5.0]
+
+    def test_fetch_error_writes_nothing(self, store, monkeypatch):
+        module = types.ModuleType('yfinance')
+
+        class _Broken:
+            def history(self, **kwargs):
+                raise RuntimeError('yfinance unavailable')
+
+        module.Ticker = lambda ticker: _Broken()
+        monkeypatch.setitem(sys.modules, 'yfinance', module)
+
+        assert store.backfill('TEST', ['1D']) == {'1D': 0}
+        assert store.last_timestamp('TEST', '1D') is None
@@ -0,0 +1,183 @@
+"""
+Test the incremental indicator engine: bulk bootstrap and per-bar updates must agree
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.indicator_engine import DEFAULT_PARAMS, IndicatorEngine, IndicatorState, initialize_state
+
+SNAPSHOT_FIELDS = ('rsi', 'ema_short', 'ema_long', 'atr', 'supertrend', 'upper_band', 'lower_band')
+
+
+def _new_state() -> IndicatorState:
+    return IndicatorState(rsi_period=14, ema_short_span=9, ema_long_span=20, atr_period=10, multiplier=3.0)
+
+
+def _bars(n: int = 80, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1.5, n))
+    high = close + rng.uniform(0.1, 2.0, n)
+    low = close - rng.uniform(0.1, 2.0, n)
+    ts = 1_700_000_000 + 3600.0 * np.arange(n)
+    return ts, high, low, close
+
+
+def _apply_all(state: IndicatorState, ts, high, low, close) -> IndicatorState:
+    for bar in zip(ts, high, low, close):
+        state.apply(*(float(v) for v in bar))
+    return state
+
+
+def _assert_same(actual: IndicatorState, expected: IndicatorState):
+    assert actual.bars == expected.bars
+    assert actual.direction == expected.direction
+    for name in SNAPSHOT_FIELDS:
+        a, e = getattr(actual, name), getattr(expected, name)
+        if e is None:
+            assert a is None, name
+        else:
+            assert a == pytest.approx(e, rel=1e-9, abs=1e-9), name
+
+
+class TestIncrementalIndicators:
+    """Bootstrap and incremental paths produce the same state"""
+
+    def test_bootstrap_matches_incremental_from_any_split(self):
+        """Bulk-initializing the first k bars then applying the rest equals applying every bar"""
+        ts, high, low, close = _bars()
+        expected = _apply_all(_new_state(), ts, high, low, close)
+
+        for split in range(1, len(close) + 1):
+            state = initialize_state(_new_state(), ts[:split], high[:split], low[:split], close[:split])
+            _apply_all(state, ts[split:], high[split:], low[split:], close[split:])
+            _assert_same(state, expected)
+
+    def test_ema_matches_pandas(self):
+        """EMA follows pandas ewm(adjust=False)"""
+        ts, high, low, close = _bars()
+        state = initialize_state(_new_state(), ts, high, low, close)
+        series = pd.Series(close)
+
+        assert state.ema_short == pytest.approx(series.ewm(span=9, adjust=False).mean().iloc[-1])
+        assert state.ema_long == pytest.approx(series.ewm(span=20, adjust=False).mean().iloc[-1])
+
+    def test_revised_last_bar_replaces_it(self):
+        """A bar with the same timestamp replaces the previous version instead of adding a bar"""
+        ts, high, low, close = _bars()
+        expected = initialize_state(_new_state(), ts, high, low, close)
+
+        state = initialize_state(_new_state(), ts, high, low, close)
+        state.apply(float(ts[-1]), float(high[-1]) + 5, float(low[-1]) - 5, float(close[-1]) + 3)
+        state.apply(float(ts[-1]), float(high[-1]) + 1, float(low[-1]), float(close[-1]) - 2)
+        state.apply(float(ts[-1]), float(high[-1]), float(low[-1]), float(close[-1]))
+
+        _assert_same(state, expected)
+
+    def test_out_of_order_bar_is_ignored(self):
+        """Bars older than the last applied bar do not change the state"""
+        ts, high, low, close = _bars()
+        expected = initialize_state(_new_state(), ts, high, low, close)
+
+        state = initialize_state(_new_state(), ts, high, low, close)
+        state.apply(float(ts[-5]), 1.0, 0.5, 0.75)
+
+        _assert_same(state, expected)
+
+    def test_rsi_bounds(self):
+        """RSI stays within 0-100 and is 100 for a series that only rises"""
+        ts = 1_700_000_000 + 60.0 * np.arange(30)
+        close = np.linspace(100, 130, 30)
+        state = initialize_state(_new_state(), ts, close + 0.5, close - 0.5, close)
+
+        assert state.rsi == pytest.approx(100.0)
+        assert state.direction == 1
+
+
+class TestIndicatorEngine:
+    """Engine registry warm-up and updates"""
+
+    def test_warm_up_then_update(self):
+        """Updating a warmed-up series equals warming up with the extra bar included"""
+        ts, high, low, close = _bars()
+        index = pd.to_datetime(ts, unit='s', utc=True)
+        frame = pd.DataFrame({'High': high, 'Low': low, 'Close': close}, index=index)
+
+        engine = IndicatorEngine()
+        engine.warm_up('TEST', '1h', frame.iloc[:-1])
+        updated = engine.update('TEST', '1h', float(ts[-1]), float(high[-1]), float(low[-1]), float(close[-1]))
+
+        full = IndicatorEngine().warm_up('TEST', '1h', frame)
+        assert updated == full
+
+    def test_update_without_warm_up(self):
+        """Updates for an unknown series are rejected"""
+        assert IndicatorEngine().update('NONE', '1h', 0.0, 1.0, 1.0, 1.0, params=DEFAULT_PARAMS) is None
+
+
+class TestRefreshAcrossGaps:
+    """get_latest must not skip bars when a warmed series sits idle past the tail window"""
+
+    @staticmethod
+    def _frame(ts, high, low, close):
+        index = pd.to_datetime(ts, unit='s', utc=True)
+        return pd.DataFrame({'High': high, 'Low': low, 'Close': close}, index=index)
+
+    def _engine(self, monkeypatch, windows):
+        """Engine whose fetches return bars [start, end) of the series for each period"""
+        import services.indicator_engine as module
+
+        ts, high, low, close = _bars(n=160)
+        calls = []
+
+        def fetch(symbol, interval, period):
+            calls.append(period)
+            start, end = windows[period]
+            return self._frame(ts[start:end], high[start:end], low[start:end], close[start:end])
+
+        monkeypatch.setattr(module, '_fetch_bars', fetch)
+        return IndicatorEngine(), calls, (ts, high, low, close)
+
+    def _refresh(self, engine):
+        engine._refreshed_at.clear()
+        return engine.get_latest('TEST', '1h', params=DEFAULT_PARAMS)
+
+    def test_gap_is_filled_from_the_warm_up_window(self, monkeypatch):
+        windows = {'10d': (0, 100)}
+        engine, calls, (ts, high, low, close) = self._engine(monkeypatch, windows)
+        engine.get_latest('TEST', '1h', params=DEFAULT_PARAMS)
+
+        # Idle: the one-day tail now starts well after the last applied bar
+        windows['1d'] = (140, 160)
+        windows['10d'] = (60, 160)
+        snapshot = self._refresh(engine)
+
+        expected = _apply_all(IndicatorEngine()._new_state(DEFAULT_PARAMS), ts[:160], high[:160], low[:160], close[:160])
+        assert calls == ['10d', '1d', '10d']
+        assert snapshot == expected.snapshot()
+
+    def test_rewarms_when_even_the_warm_up_window_has_a_gap(self, monkeypatch):
+        windows = {'10d': (0, 40)}
+        engine, calls, (ts, high, low, close) = self._engine(monkeypatch, windows)
+        engine.get_latest('TEST', '1h', params=DEFAULT_PARAMS)
+
+        windows['1d'] = (140, 160)
+        windows['10d'] = (60, 160)
+        snapshot = self._refresh(engine)
+
+        expected = initialize_state(IndicatorEngine()._new_state(DEFAULT_PARAMS), ts[60:160], high[60:160],
+                                    low[60:160], close[60:160])
+        assert snapshot == expected.snapshot()
+
+    def test_contiguous_tail_is_applied_incrementally(self, monkeypatch):
+        windows = {'10d': (0, 100)}
+        engine, calls, (ts, high, low, close) = self._engine(monkeypatch, windows)
+        engine.get_latest('TEST', '1h', params=DEFAULT_PARAMS)
+
+        windows['1d'] = (99, 110)
+        snapshot = self._refresh(engine)
+
+        expected = _apply_all(IndicatorEngine()._new_state(DEFAULT_PARAMS), ts[:110], high[:110], low[:110], close[:110])
+        assert calls == ['10d', '1d']
+        assert snapshot == expected.snapshot()
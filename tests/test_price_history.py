@@ -0,0 +1,225 @@
+"""
+Test the shared price history cache: period slicing, coverage checks and tail refreshes
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('yfinance')
+
+from services import price_history as ph
+from services.price_history import PriceHistoryProvider, _Series
+
+NOW = pd.Timestamp('2026-06-15 10:00', tz='UTC')
+
+
+def _daily(start: str, periods: int, close: float = 100.0, tz: str = 'Asia/Kolkata') -> pd.DataFrame:
+    index = pd.bdate_range(start, periods=periods, tz=tz)
+    closes = close + np.arange(periods, dtype=float)
+    return pd.DataFrame({
+        'Open': closes, 'High': closes + 1, 'Low': closes - 1, 'Close': closes, 'Volume': 1000.0
+    }, index=index)
+
+
+def _recent(periods: int) -> pd.DataFrame:
+    """Daily bars ending today, so calendar lookbacks see them"""
+    return _daily((pd.Timestamp.now() - pd.offsets.BDay(periods - 1)).date().isoformat(), periods)
+
+
+def _intraday(days: int, bars_per_day: int = 3) -> pd.DataFrame:
+    index = pd.DatetimeIndex([
+        day + pd.Timedelta(hours=4 + h)
+        for day in pd.bdate_range('2026-06-01', periods=days, tz='UTC')
+        for h in range(bars_per_day)
+    ])
+    closes = np.arange(len(index), dtype=float)
+    return pd.DataFrame({
+        'Open': closes, 'High': closes, 'Low': closes, 'Close': closes, 'Volume': 1.0
+    }, index=index)
+
+
+class FakeYFinance:
+    """Serves frames per ticker; start= requests return bars from that date on"""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.calls = []
+        self.fail = False
+
+    def _respond(self, ticker, window):
+        self.calls.append((ticker, window))
+        if self.fail:
+            raise RuntimeError('yfinance unavailable')
+        frame = self.frames.get(ticker)
+        if frame is None:
+            return pd.DataFrame()
+        if 'start' in window:
+            return frame[frame.index.date >= pd.Timestamp(window['start']).date()].copy()
+        return frame.copy()
+
+    def Ticker(self, ticker):
+        fake = self
+
+        class _Ticker:
+            def history(self, interval='1d', **window):
+                return fake._respond(ticker, window)
+
+        return _Ticker()
+
+    def download(self, tickers, interval='1d', **kwargs):
+        window = {k: v for k, v in kwargs.items() if k in ('period', 'start')}
+        frames = {t: self._respond(t, window) for t in tickers}
+        return pd.concat({t: f for t, f in frames.items() if not f.empty}, axis=1)
+
+
+@pytest.fixture
+def fake_yf(monkeypatch):
+    fake = FakeYFinance({})
+    monkeypatch.setattr(ph, 'yf', fake)
+    return fake
+
+
+class TestSlice:
+    """Lookbacks are cut from the cached series"""
+
+    def test_session_period_keeps_last_n_trading_days(self):
+        frame = _intraday(days=6)
+
+        sliced = PriceHistoryProvider._slice(frame, '2d', NOW)
+
+        assert sliced.index.normalize().nunique() == 2
+        assert sliced.index[0] == frame.index[-6]
+        assert sliced.index[-1] == frame.index[-1]
+
+    def test_calendar_period_cuts_by_date(self):
+        frame = _daily('2025-01-01', 400)
+        now = frame.index[-1].tz_convert('UTC')
+
+        sliced = PriceHistoryProvider._slice(frame, '1mo', now)
+
+        assert sliced.index[0] >= (now - pd.DateOffset(months=1)).tz_convert(frame.index.tz)
+        assert sliced.index[-1] == frame.index[-1]
+        assert len(sliced) < 25
+
+    def test_tz_naive_index(self):
+        frame = _daily('2025-01-01', 400, tz=None)
+        now = frame.index[-1].tz_localize('UTC')
+
+        assert len(PriceHistoryProvider._slice(frame, '3mo', now)) < 70
+
+    def test_max_returns_everything_as_a_copy(self):
+        frame = _daily('2025-01-01', 50)
+
+        sliced = PriceHistoryProvider._slice(frame, 'max', NOW)
+        sliced['Close'] = 0.0
+
+        assert len(sliced) == 50
+        assert frame['Close'].iloc[0] == 100.0
+
+
+class TestCovers:
+    """Whether a cached series can answer a lookback without a new download"""
+
+    def test_empty_series(self):
+        assert not _Series().covers('5d', NOW)
+
+    def test_full_history_covers_everything(self):
+        entry = _Series()
+        entry.frame = _daily('2025-01-01', 10)
+        entry.start = None
+
+        assert entry.covers('max', NOW)
+        assert entry.covers('10y', NOW)
+
+    def test_max_needs_full_history(self):
+        entry = _Series()
+        entry.frame = _daily('2024-06-15', 520)
+        entry.start = ph.period_start('2y', NOW)
+
+        assert not entry.covers('max', NOW)
+
+    def test_calendar_period_against_fetched_start(self):
+        entry = _Series()
+        entry.frame = _daily('2024-06-15', 520)
+        entry.start = ph.period_start('2y', NOW)
+
+        assert entry.covers('1y', NOW)
+        assert entry.covers('2y', NOW)
+        assert not entry.covers('5y', NOW)
+
+    def test_session_period_counts_cached_days(self):
+        entry = _Series()
+        entry.frame = _intraday(days=5)
+        entry.start = entry.frame.index[0]
+
+        assert entry.covers('5d', NOW)
+        assert not entry.covers('6d', NOW)
+
+
+class TestFetchTail:
+    """Stale series download only their missing tail"""
+
+    def test_tail_replaces_last_bar_and_appends(self, fake_yf):
+        cached = _recent(100)
+        provider = PriceHistoryProvider()
+        fake_yf.frames['A.NS'] = cached
+        provider.get_history('A.NS', '3mo')
+
+        # The last cached bar was still forming; the source now has its final value and a new bar
+        updated = _daily(cached.index[0].date().isoformat(), 101)
+        updated.loc[updated.index[-2], 'Close'] = 999.0
+        fake_yf.frames['A.NS'] = updated
+        entry = provider._series[('A.NS', '1d')]
+        entry.fetched_at = 0
+
+        frame = provider.get_history('A.NS', '1y')
+
+        assert fake_yf.calls[-1] == ('A.NS', {'start': cached.index[-1].date().isoformat()})
+        assert len(entry.frame) == 101
+        assert entry.frame['Close'].iloc[-2] == 999.0
+        assert entry.frame.index.is_monotonic_increasing
+        assert len(frame) == 101
+        assert len(fake_yf.calls) == 2
+
+    def test_batch_tail_starts_at_oldest_last_session(self, fake_yf):
+        provider = PriceHistoryProvider()
+        fake_yf.frames = {'A.NS': _recent(100), 'B.NS': _recent(100).iloc[:-5]}
+        provider.get_histories(['A.NS', 'B.NS'], '3mo')
+        for ticker in ('A.NS', 'B.NS'):
+            provider._series[(ticker, '1d')].fetched_at = 0
+
+        provider.get_histories(['A.NS', 'B.NS'], '3mo')
+
+        b_last = provider._series[('B.NS', '1d')].frame.index[-1].date().isoformat()
+        assert fake_yf.calls[-1] == ('B.NS', {'start': b_last})
+        assert ('A.NS', {'start': b_last}) in fake_yf.calls
+
+    def test_failed_tail_keeps_serving_cache(self, fake_yf):
+        provider = PriceHistoryProvider()
+        fake_yf.frames['A.NS'] = _recent(100)
+        provider.get_history('A.NS', '3mo')
+        entry = provider._series[('A.NS', '1d')]
+        entry.fetched_at = 0
+        fake_yf.fail = True
+
+        frame = provider.get_history('A.NS', '3mo')
+
+        assert not frame.empty
+        assert entry.fetched_at == 0
+        assert provider.get_stats()['fetch_errors'] == 1
+
+    def test_max_age_overrides_interval_freshness(self, fake_yf):
+        provider = PriceHistoryProvider()
+        fake_yf.frames['A.NS'] = _recent(100)
+        provider.get_history('A.NS', '5d')
+        provider._series[('A.NS', '1d')].fetched_at = time.time() - 120
+
+        provider.get_history('A.NS', '5d')
+        assert len(fake_yf.calls) == 1
+
+        provider.get_history('A.NS', '5d', max_age=60)
+        assert len(fake_yf.calls) == 2
+        assert 'start' in fake_yf.calls[-1][1]
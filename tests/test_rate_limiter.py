@@ -0,0 +1,174 @@
+"""
+Test the GCRA rate limiter: the Lua script's admission math and in-process lease sizing
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from services.rate_limiter import RedisRateLimiter
+
+
+class _FailingAsyncRedis:
+    """redis.asyncio stand-in whose every call fails like an unreachable server"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def evalsha(self, *args):
+        from redis.exceptions import ConnectionError
+
+        self.calls += 1
+        raise ConnectionError("connection refused")
+
+
+@pytest.fixture
+def fake_redis():
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    return fakeredis.FakeStrictRedis()
+
+
+class TestGCRA:
+    """Admission decisions of GCRA_LUA (run on fakeredis)"""
+
+    def test_allows_a_burst_of_limit_then_rejects(self, fake_redis):
+        limiter = RedisRateLimiter('test:burst', limit=5, window=60)
+
+        results = [limiter.check('client', client=fake_redis) for _ in range(6)]
+
+        assert [r.allowed for r in results] == [True] * 5 + [False]
+        assert [r.remaining for r in results[:5]] == [4, 3, 2, 1, 0]
+        # The next token is one emission interval (window / limit) away
+        assert results[-1].retry_after == pytest.approx(12.0, abs=0.05)
+
+    def test_burst_caps_requests_at_once(self, fake_redis):
+        limiter = RedisRateLimiter('test:small-burst', limit=5, window=60, burst=2)
+
+        results = [limiter.check('client', client=fake_redis) for _ in range(3)]
+
+        assert [r.allowed for r in results] == [True, True, False]
+        assert results[-1].retry_after == pytest.approx(12.0, abs=0.05)
+
+    @pytest.mark.parametrize('limit, burst', [(10, 10), (8, 3), (10, 1)])
+    def test_window_admits_at_most_burst_plus_limit_minus_one(self, fake_redis, monkeypatch, limit, burst):
+        """A client retrying every 10s for two windows (on a simulated clock)"""
+        clock = [1_800_000_000.0]
+        monkeypatch.setattr(time, 'time', lambda: clock[0])
+        limiter = RedisRateLimiter('test:window', limit=limit, window=3600, burst=burst)
+
+        admitted = []
+        for _ in range(720):
+            if limiter.check('client', client=fake_redis).allowed:
+                admitted.append(clock[0])
+            clock[0] += 10
+
+        busiest = max(sum(1 for t in admitted if start <= t < start + 3600) for start in admitted)
+        assert busiest == burst + limit - 1
+
+    def test_one_token_per_emission_interval(self, fake_redis):
+        limiter = RedisRateLimiter('test:refill', limit=4, window=0.4)
+
+        for _ in range(4):
+            assert limiter.check('client', client=fake_redis).allowed
+        assert not limiter.check('client', client=fake_redis).allowed
+
+        time.sleep(0.11)
+        assert limiter.check('client', client=fake_redis).allowed
+        assert not limiter.check('client', client=fake_redis).allowed
+
+    def test_keys_are_independent(self, fake_redis):
+        limiter = RedisRateLimiter('test:keys', limit=1, window=60)
+
+        assert limiter.check('a', client=fake_redis).allowed
+        assert not limiter.check('a', client=fake_redis).allowed
+        assert limiter.check('b', client=fake_redis).allowed
+
+    def test_lease_grant_never_exceeds_the_limit(self, fake_redis):
+        """Pre-allocated tokens count against the same budget as single requests"""
+        limiter = RedisRateLimiter('test:lease', limit=10, window=60, prefetch=8, lease_ttl=60)
+
+        allowed = sum(limiter.check('hot', client=fake_redis).allowed for _ in range(25))
+
+        assert allowed == 10
+        assert fake_redis.ttl(limiter.redis_key('hot')) > 0
+
+
+class TestLeaseSizing:
+    """Lease growth for hot keys (no Redis involved)"""
+
+    def test_without_prefetch_every_request_goes_to_redis(self):
+        limiter = RedisRateLimiter('test:nolease', limit=100, window=60)
+
+        limiter._apply('k', 1, [1, 0, 99])
+
+        assert limiter._lease_size('k') == 1
+        assert limiter._from_lease('k') is None
+
+    def test_lease_doubles_up_to_prefetch_while_drained_in_time(self):
+        limiter = RedisRateLimiter('test:grow', limit=100, window=60, prefetch=8, lease_ttl=60)
+
+        sizes = []
+        for _ in range(6):
+            size = limiter._lease_size('k')
+            sizes.append(size)
+            limiter._apply('k', size, [size, 0, 50])
+            while limiter._from_lease('k') is not None:
+                pass
+
+        assert sizes == [1, 2, 4, 8, 8, 8]
+
+    def test_granted_tokens_are_served_in_process(self):
+        limiter = RedisRateLimiter('test:serve', limit=100, window=60, prefetch=4, lease_ttl=60)
+
+        result = limiter._apply('k', 4, [4, 0, 96])
+
+        assert result.allowed
+        served = [limiter._from_lease('k') for _ in range(4)]
+        assert [r.remaining for r in served[:3]] == [2, 1, 0]
+        assert served[3] is None
+
+    def test_expired_lease_resets_size(self):
+        limiter = RedisRateLimiter('test:expire', limit=100, window=60, prefetch=8, lease_ttl=0.0)
+
+        limiter._apply('k', 4, [4, 0, 96])
+
+        assert limiter._from_lease('k') is None
+        assert limiter._lease_size('k') == 1
+
+    def test_prefetch_capped_at_burst(self):
+        assert RedisRateLimiter('test:cap', limit=3, window=60, prefetch=50).prefetch == 3
+        assert RedisRateLimiter('test:cap', limit=100, window=60, prefetch=50, burst=10).prefetch == 10
+
+    def test_rejection_reports_retry_after(self):
+        limiter = RedisRateLimiter('test:reject', limit=100, window=60, prefetch=4)
+
+        result = limiter._apply('k', 2, [0, 1500, 0])
+
+        assert not result.allowed
+        assert result.retry_after == pytest.approx(1.5)
+        assert limiter._from_lease('k') is None
+
+
+class TestRedisDown:
+    """Local fallback while Redis is unreachable"""
+
+    def test_async_backs_off_after_a_failure(self):
+        pytest.importorskip('redis')
+        limiter = RedisRateLimiter('test:down', limit=3, window=60)
+        client = _FailingAsyncRedis()
+
+        async def run():
+            return [await limiter.check_async('k', client) for _ in range(5)]
+
+        results = asyncio.run(run())
+
+        # Only the first request waits on Redis; the rest use the local bucket directly
+        assert client.calls == 1
+        assert [r.allowed for r in results] == [True, True, True, False, False]
+
+    def test_local_bucket_uses_the_burst(self):
+        limiter = RedisRateLimiter('test:local', limit=10, window=60, burst=2)
+
+        assert [limiter._check_local('k').allowed for _ in range(3)] == [True, True, False]
@@ -0,0 +1,89 @@
+"""
+Test the float32 fallback ranking of the vector index
+"""
+
+import numpy as np
+import pytest
+
+from services.vector_index import VectorIndex, normalize
+
+
+def _index_with_rows(rows):
+    """VectorIndex whose fallback matrix is the given {row id: vector} (no database)"""
+    index = VectorIndex()
+    ids = np.asarray(list(rows), dtype=np.int64)
+    matrix = np.vstack([normalize(v) for v in rows.values()])
+    index._get_matrix = lambda table, user_id, filters: (ids, matrix)
+    return index
+
+
+class TestNormalize:
+    """Vectors are stored L2-normalized as float32"""
+
+    def test_unit_length(self):
+        vector = normalize([3.0, 4.0])
+        assert vector.dtype == np.float32
+        assert float(np.linalg.norm(vector)) == pytest.approx(1.0)
+
+    def test_empty_and_zero(self):
+        assert normalize([]) is None
+        assert normalize([0.0, 0.0]) is None
+
+
+class TestMatrixSearch:
+    """Top-k cosine ranking over the cached matrix"""
+
+    ROWS = {
+        11: [1.0, 0.0, 0.0],
+        12: [0.9, 0.1, 0.0],
+        13: [0.0, 1.0, 0.0],
+        14: [-1.0, 0.0, 0.0],
+        15: [0.5, 0.5, 0.0],
+    }
+
+    def test_ranked_by_cosine_similarity(self):
+        index = _index_with_rows(self.ROWS)
+        hits = index._search_matrix(None, 1, normalize([1.0, 0.0, 0.0]), 3, {})
+
+        assert [row_id for row_id, _ in hits] == [11, 12, 15]
+        assert hits[0][1] == pytest.approx(1.0)
+        scores = [score for _, score in hits]
+        assert scores == sorted(scores, reverse=True)
+
+    def test_scale_invariant(self):
+        """Only direction matters: a scaled query ranks the same"""
+        index = _index_with_rows(self.ROWS)
+        query = [0.2, 1.0, 0.0]
+
+        small = index._search_matrix(None, 1, normalize(query), 5, {})
+        large = index._search_matrix(None, 1, normalize([100 * x for x in query]), 5, {})
+
+        assert [row_id for row_id, _ in small] == [row_id for row_id, _ in large]
+        assert [row_id for row_id, _ in small][0] == 13
+        assert [row_id for row_id, _ in small][-1] == 14
+
+    def test_top_k_larger_than_rows(self):
+        index = _index_with_rows(self.ROWS)
+        hits = index._search_matrix(None, 1, normalize([1.0, 1.0, 0.0]), 50, {})
+
+        assert len(hits) == len(self.ROWS)
+        assert hits[0][0] == 15
+
+    def test_matches_brute_force(self):
+        """argpartition top-k agrees with a full sort"""
+        rng = np.random.default_rng(3)
+        rows = {100 + i: rng.normal(size=16).tolist() for i in range(200)}
+        index = _index_with_rows(rows)
+        query = normalize(rng.normal(size=16).tolist())
+
+        hits = index._search_matrix(None, 1, query, 10, {})
+
+        expected = sorted(rows, key=lambda row_id: -float(normalize(rows[row_id]) @ query))[:10]
+        assert [row_id for row_id, _ in hits] == expected
+
+    def test_no_rows(self):
+        index = VectorIndex()
+        index._get_matrix = lambda table, user_id, filters: (
+            np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+        )
+        assert index._search_matrix(None, 1, normalize([1.0, 0.0]), 5, {}) == []
@@ -5,19 +5,24 @@ High-performance async trading system with real-time market data and algorithmic
 
 import asyncio
 import logging
+import jwt
 import redis
+from redis import asyncio as redis_async
 import json
 from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Any
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, BackgroundTasks
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, BackgroundTasks, status
+from fastapi.websockets import WebSocketState
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from celery import Celery
-import aioredis
+from collections import OrderedDict, defaultdict, deque
 from concurrent.futures import ThreadPoolExecutor
 import threading
 import time
 import os
+import uuid
+import zlib
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,7 +30,71 @@ logger = logging.getLogger(__name__)
 
 # Redis Configuration
 REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379")
-redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+redis_client = redis_async.Redis.from_url(REDIS_URL, decode_responses=True)
+
+# Order pipeline configuration
+ORDER_WORKERS = int(os.environ.get("ORDER_WORKERS", "8"))
+ORDER_QUEUE_MAX = int(os.environ.get("ORDER_QUEUE_MAX", "1000"))  # Per worker
+ORDER_ACK_TIMEOUT = float(os.environ.get("ORDER_ACK_TIMEOUT", "30"))
+ORDER_LATENCY_WINDOW = int(os.environ.get("ORDER_LATENCY_WINDOW", "4096"))
+ORDER_STATES_MAX = int(os.environ.get("ORDER_STATES_MAX", "10000"))  # Recent order states kept for polling
+
+# WebSocket fan-out configuration
+WS_OUTBOUND_QUEUE = int(os.environ.get("WS_OUTBOUND_QUEUE", "256"))  # Messages buffered per connection
+WS_SEND_TIMEOUT = float(os.environ.get("WS_SEND_TIMEOUT", "5"))
+
+# WebSocket clients authenticate with an access token issued by services.jwt_service
+JWT_SECRET = os.environ.get("SESSION_SECRET")
+JWT_ALGORITHM = "HS256"
+
+# Risk limits
+MAX_POSITION_VALUE = 1000000  # ₹10 lakh per position
+DAILY_TRADING_LIMIT = 5000000  # ₹50 lakh daily limit
+EXPOSURE_TTL = 2 * 86400
+
+# Reserve an order against the user's daily exposure in one atomic step.
+# KEYS[1] exposure hash; ARGV: order value, max position value, daily limit, ttl
+# Returns {1, new volume} or {0, reason}
+RESERVE_EXPOSURE_LUA = """
+local value = tonumber(ARGV[1])
+if value > tonumber(ARGV[2]) then
+    return {0, 'position_limit'}
+end
+local volume = tonumber(redis.call('HGET', KEYS[1], 'daily_volume') or '0')
+if volume + value > tonumber(ARGV[3]) then
+    return {0, 'daily_limit'}
+end
+local new_volume = redis.call('HINCRBYFLOAT', KEYS[1], 'daily_volume', value)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return {1, new_volume}
+"""
+
+# Apply a fill: net position in the exposure hash and the cached portfolio JSON, atomically.
+# KEYS[1] exposure hash, KEYS[2] portfolio key; ARGV: symbol, signed quantity, price, portfolio ttl
+APPLY_FILL_LUA = """
+local symbol = ARGV[1]
+local qty = tonumber(ARGV[2])
+local price = tonumber(ARGV[3])
+redis.call('HINCRBYFLOAT', KEYS[1], 'pos:' .. symbol, qty)
+
+local raw = redis.call('GET', KEYS[2])
+local ok, portfolio = pcall(cjson.decode, raw or '')
+if not ok or type(portfolio) ~= 'table' then
+    portfolio = {holdings = {}, cash = 0, total_value = 0}
+end
+if type(portfolio.holdings) ~= 'table' then
+    portfolio.holdings = {}
+end
+local holding = portfolio.holdings[symbol] or {quantity = 0, avg_price = 0}
+local current = tonumber(holding.quantity) or 0
+if qty > 0 and current >= 0 and price > 0 then
+    holding.avg_price = ((tonumber(holding.avg_price) or 0) * current + price * qty) / (current + qty)
+end
+holding.quantity = current + qty
+portfolio.holdings[symbol] = holding
+redis.call('SETEX', KEYS[2], ARGV[4], cjson.encode(portfolio))
+return 1
+"""
 
 # Celery Configuration for Background Tasks
 celery_app = Celery(
@@ -47,109 +116,444 @@ trading_api.add_middleware(
     allow_headers=["*"],
 )
 
+class ExposureLedger:
+    """
+    Per-user daily exposure (traded value and net position per symbol)
+    Reservations and fills are single Lua calls on a Redis hash, so concurrent orders from
+    any worker see a consistent balance; an in-process ledger takes over while Redis is down.
+    """
+    
+    def __init__(self, client):
+        self.client = client
+        self._reserve = client.register_script(RESERVE_EXPOSURE_LUA)
+        self._apply_fill = client.register_script(APPLY_FILL_LUA)
+        # Fallback ledger: (user_id, date) -> {'daily_volume': float, 'pos:<symbol>': float}
+        self._local = defaultdict(lambda: defaultdict(float))
+    
+    @staticmethod
+    def _key(user_id) -> str:
+        return f"exposure:{user_id}:{datetime.now(timezone.utc).date()}"
+    
+    async def reserve(self, user_id, order_value: float) -> Optional[str]:
+        """Reserve order value against the user's limits; returns a rejection reason or None"""
+        try:
+            allowed, detail = await self._reserve(
+                keys=[self._key(user_id)],
+                args=[order_value, MAX_POSITION_VALUE, DAILY_TRADING_LIMIT, EXPOSURE_TTL]
+            )
+            return None if int(allowed) == 1 else detail
+        except redis.RedisError as e:
+            logger.warning(f"Exposure ledger unavailable, using local ledger: {e}")
+        
+        # Runs on the event loop thread, so this check-and-add cannot interleave
+        if order_value > MAX_POSITION_VALUE:
+            return 'position_limit'
+        ledger = self._local[(user_id, datetime.now(timezone.utc).date())]
+        if ledger['daily_volume'] + order_value > DAILY_TRADING_LIMIT:
+            return 'daily_limit'
+        ledger['daily_volume'] += order_value
+        return None
+    
+    async def release(self, user_id, order_value: float):
+        """Return a reservation for an order that did not execute"""
+        try:
+            await self.client.hincrbyfloat(self._key(user_id), 'daily_volume', -order_value)
+        except redis.RedisError:
+            self._local[(user_id, datetime.now(timezone.utc).date())]['daily_volume'] -= order_value
+    
+    async def apply_fill(self, user_id, symbol: str, signed_quantity: float, price: float):
+        """Record a fill in the net position and the cached portfolio"""
+        try:
+            await self._apply_fill(
+                keys=[self._key(user_id), f"portfolio:{user_id}"],
+                args=[symbol, signed_quantity, price or 0, 300]
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Failed to record fill for user {user_id}: {e}")
+            self._local[(user_id, datetime.now(timezone.utc).date())][f"pos:{symbol}"] += signed_quantity
+    
+    async def daily_volume(self, user_id) -> float:
+        try:
+            volume = await self.client.hget(self._key(user_id), 'daily_volume')
+            return float(volume) if volume else 0.0
+        except redis.RedisError:
+            return self._local[(user_id, datetime.now(timezone.utc).date())]['daily_volume']
+
+
+class LatencyRecorder:
+    """Rolling window of order latencies (milliseconds) per pipeline stage"""
+    
+    def __init__(self, window: int = ORDER_LATENCY_WINDOW):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self.counts = defaultdict(int)
+    
+    def record(self, stage: str, millis: float):
+        self._samples[stage].append(millis)
+        self.counts[stage] += 1
+    
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        stats = {}
+        for stage, samples in self._samples.items():
+            ordered = sorted(samples)
+            if not ordered:
+                continue
+            stats[stage] = {
+                'count': self.counts[stage],
+                'p50_ms': round(ordered[int(0.50 * (len(ordered) - 1))], 3),
+                'p99_ms': round(ordered[int(0.99 * (len(ordered) - 1))], 3),
+                'max_ms': round(ordered[-1], 3)
+            }
+        return stats
+
+
+class ClientConnection:
+    """
+    One WebSocket client with its own bounded outbound queue and sender task
+    Market data is coalesced per symbol: while an update for a symbol is still queued, a newer
+    one replaces it instead of queueing behind it. A client whose queue still fills up (or whose
+    send stalls past WS_SEND_TIMEOUT) is disconnected rather than slowing anyone else down.
+    """
+    
+    def __init__(self, websocket: WebSocket, user_id: Optional[str], on_close):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.symbols = set()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=WS_OUTBOUND_QUEUE)
+        self._latest: Dict[str, str] = {}  # symbol -> newest queued market data message
+        self._on_close = on_close
+        self._closed = False
+        self._sender = asyncio.create_task(self._send_loop())
+        self._closer: Optional[asyncio.Task] = None
+    
+    @property
+    def closed(self) -> bool:
+        return self._closed
+    
+    def send(self, message: str, coalesce_key: Optional[str] = None) -> bool:
+        """Queue a message without waiting; returns False if the client was dropped as too slow"""
+        if self._closed:
+            return False
+        if coalesce_key is not None:
+            if coalesce_key in self._latest:
+                self._latest[coalesce_key] = message
+                return True
+            item = ('latest', coalesce_key)
+        else:
+            item = ('message', message)
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            logger.warning(f"Dropping slow WebSocket client (user {self.user_id}): outbound queue full")
+            self.close()
+            return False
+        if coalesce_key is not None:
+            self._latest[coalesce_key] = message
+        return True
+    
+    async def _send_loop(self):
+        try:
+            while True:
+                kind, payload = await self._queue.get()
+                message = self._latest.pop(payload, None) if kind == 'latest' else payload
+                if message is not None:
+                    await asyncio.wait_for(self.websocket.send_text(message), timeout=WS_SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to send data to client: {e}")
+            self.close()
+    
+    def close(self):
+        """Stop sending, close the socket (ends the endpoint's receive loop) and unregister"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._sender is not asyncio.current_task():
+            self._sender.cancel()
+        if self.websocket.application_state == WebSocketState.CONNECTED:
+            self._closer = asyncio.create_task(self._close_socket())
+        self._on_close(self)
+    
+    async def _close_socket(self):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=status.WS_1013_TRY_AGAIN_LATER), timeout=WS_SEND_TIMEOUT)
+        except Exception as e:
+            logger.debug(f"WebSocket close failed (user {self.user_id}): {e}")
+
+
+class ConnectionRegistry:
+    """WebSocket connections indexed by user id and by subscribed symbol"""
+    
+    def __init__(self):
+        self.connections: Dict[WebSocket, ClientConnection] = {}
+        self.by_user: Dict[str, set] = defaultdict(set)
+        self.by_symbol: Dict[str, set] = defaultdict(set)
+        # Called with symbols that lost their last subscriber
+        self.on_symbols_orphaned = None
+    
+    def register(self, websocket: WebSocket, user_id=None) -> ClientConnection:
+        user_key = str(user_id) if user_id is not None else None
+        connection = ClientConnection(websocket, user_key, self._remove)
+        self.connections[websocket] = connection
+        if user_key is not None:
+            self.by_user[user_key].add(connection)
+        return connection
+    
+    def unregister(self, websocket: WebSocket):
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.close()
+    
+    def subscribe(self, websocket: WebSocket, symbol: str) -> bool:
+        """Subscribe a live connection to a symbol; False if it was already dropped"""
+        connection = self.connections.get(websocket)
+        if connection is None or connection.closed:
+            return False
+        connection.symbols.add(symbol)
+        self.by_symbol[symbol].add(connection)
+        return True
+    
+    def unsubscribe(self, websocket: WebSocket, symbol: str):
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.symbols.discard(symbol)
+            self._discard(self.by_symbol, symbol, connection)
+            if symbol not in self.by_symbol and self.on_symbols_orphaned:
+                self.on_symbols_orphaned([symbol])
+    
+    def send_to_symbol(self, symbol: str, message: str) -> int:
+        """Queue market data for the symbol's subscribers; returns the number of recipients"""
+        subscribers = list(self.by_symbol.get(symbol, ()))
+        for connection in subscribers:
+            connection.send(message, coalesce_key=symbol)
+        return len(subscribers)
+    
+    def send_to_user(self, user_id, message: str) -> int:
+        """Queue a message for every connection of one user"""
+        connections = list(self.by_user.get(str(user_id), ()))
+        for connection in connections:
+            connection.send(message)
+        return len(connections)
+    
+    def send_to_all(self, message: str) -> int:
+        connections = list(self.connections.values())
+        for connection in connections:
+            connection.send(message)
+        return len(connections)
+    
+    def _remove(self, connection: ClientConnection):
+        self.connections.pop(connection.websocket, None)
+        if connection.user_id is not None:
+            self._discard(self.by_user, connection.user_id, connection)
+        orphaned = []
+        for symbol in connection.symbols:
+            self._discard(self.by_symbol, symbol, connection)
+            if symbol not in self.by_symbol:
+                orphaned.append(symbol)
+        if orphaned and self.on_symbols_orphaned:
+            self.on_symbols_orphaned(orphaned)
+        logger.info(f"WebSocket disconnected. Total connections: {len(self.connections)}")
+    
+    @staticmethod
+    def _discard(index: Dict[str, set], key: str, connection: ClientConnection):
+        members = index.get(key)
+        if members is not None:
+            members.discard(connection)
+            if not members:
+                del index[key]
+
+
 class TradingEngine:
     """
     High-performance trading engine with real-time capabilities
+    
+    Orders flow through ORDER_WORKERS queues, each drained by one consumer task. A user's
+    orders always hash to the same queue, so they execute in submission order while different
+    users proceed in parallel. Every order gets an order_ref; an order whose acknowledgement
+    times out is either withdrawn (still queued) or reported as pending and can be polled.
     """
     
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.connections = ConnectionRegistry()
         self.market_data_cache = {}
         self.active_algorithms = {}
-        self.order_queue = asyncio.Queue()
+        self.order_queues: List[asyncio.Queue] = []
+        self.order_workers: List[asyncio.Task] = []
         self.portfolio_cache = {}
         self.risk_limits = {}
+        self.exposure = ExposureLedger(redis_client)
+        self.latency = LatencyRecorder()
+        # order_ref -> {"status": "queued" | "processing" | "withdrawn"} or the order's result
+        self.order_states: "OrderedDict[str, Dict]" = OrderedDict()
+        # Fire-and-forget tasks, referenced until done so they are not garbage collected
+        self._background_tasks = set()
+    
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.connections.connections)
         
-    async def connect_websocket(self, websocket: WebSocket):
+    async def connect_websocket(self, websocket: WebSocket, user_id: Optional[str] = None):
         """Connect new WebSocket client"""
         await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"WebSocket connected. Total connections: {len(self.active_connections)}")
+        self.connections.register(websocket, user_id)
+        logger.info(f"WebSocket connected. Total connections: {len(self.connections.connections)}")
         
     def disconnect_websocket(self, websocket: WebSocket):
         """Disconnect WebSocket client"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
+        self.connections.unregister(websocket)
         
     async def broadcast_market_data(self, data: Dict):
-        """Broadcast real-time market data to all connected clients"""
-        if self.active_connections:
-            message = json.dumps({
-                "type": "market_data",
-                "data": data,
-                "timestamp": datetime.now(timezone.utc).isoformat()
-            })
-            
-            # Send to all connected clients
-            disconnected = []
-            for connection in self.active_connections:
-                try:
-                    await connection.send_text(message)
-                except Exception as e:
-                    logger.warning(f"Failed to send data to client: {e}")
-                    disconnected.append(connection)
-            
-            # Clean up disconnected clients
-            for conn in disconnected:
-                self.disconnect_websocket(conn)
+        """Send market data to the symbol's subscribers (every client if the data has no symbol)"""
+        message = json.dumps({
+            "type": "market_data",
+            "data": data,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        })
+        
+        symbol = data.get('symbol')
+        if symbol:
+            self.connections.send_to_symbol(symbol, message)
+        else:
+            self.connections.send_to_all(message)
+    
+    def start_order_workers(self, workers: int = ORDER_WORKERS):
+        """Start the order consumer tasks (idempotent; must run inside the event loop)"""
+        if self.order_workers:
+            return
+        self.order_queues = [asyncio.Queue(maxsize=ORDER_QUEUE_MAX) for _ in range(workers)]
+        self.order_workers = [
+            asyncio.create_task(self._order_worker(queue), name=f"order-worker-{i}")
+            for i, queue in enumerate(self.order_queues)
+        ]
+        logger.info(f"Started {workers} order workers")
+    
+    async def stop_order_workers(self):
+        """Cancel the order consumer tasks"""
+        for task in self.order_workers:
+            task.cancel()
+        await asyncio.gather(*self.order_workers, return_exceptions=True)
+        self.order_workers = []
+        self.order_queues = []
     
     async def process_order(self, order_data: Dict) -> Dict:
-        """Process trading order with validation and execution"""
+        """
+        Submit an order to the pipeline and wait for its acknowledgement
+        If no acknowledgement arrives within ORDER_ACK_TIMEOUT, an order that has not started
+        executing is withdrawn from its queue; one that has is reported as "pending" with its
+        order_ref, to be polled with get_order_state() rather than resubmitted.
+        """
         try:
             # Validate order
             if not self.validate_order(order_data):
                 return {"status": "rejected", "reason": "Invalid order data"}
             
-            # Check risk limits
-            if not self.check_risk_limits(order_data):
-                return {"status": "rejected", "reason": "Risk limits exceeded"}
-            
-            # Add to processing queue
-            await self.order_queue.put(order_data)
-            
-            # Execute order asynchronously
-            result = await self.execute_order_async(order_data)
-            
-            # Update portfolio cache
-            await self.update_portfolio_cache(order_data, result)
-            
-            # Broadcast order update
-            await self.broadcast_order_update(order_data, result)
+            self.start_order_workers()
+            queue = self.order_queues[zlib.crc32(str(order_data['user_id']).encode()) % len(self.order_queues)]
+            order_ref = uuid.uuid4().hex
+            future = asyncio.get_running_loop().create_future()
+            try:
+                queue.put_nowait((order_ref, order_data, future, time.perf_counter()))
+            except asyncio.QueueFull:
+                return {"status": "rejected", "reason": "Order queue full"}
+            self._set_order_state(order_ref, {"status": "queued"})
             
-            return result
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), timeout=ORDER_ACK_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.error(f"Order acknowledgement timed out for user {order_data.get('user_id')} ({order_ref})")
+                if self.order_states.get(order_ref, {}).get('status') == 'queued':
+                    # Not picked up yet: the worker skips cancelled orders, so nothing executes
+                    future.cancel()
+                    self._set_order_state(order_ref, {"status": "withdrawn"})
+                    return {"status": "rejected", "reason": "Order acknowledgement timed out before execution",
+                            "order_ref": order_ref}
+                return {"status": "pending", "reason": "Order is executing; poll its order_ref for the result",
+                        "order_ref": order_ref}
             
         except Exception as e:
             logger.error(f"Order processing error: {e}")
             return {"status": "error", "reason": str(e)}
     
-    def validate_order(self, order_data: Dict) -> bool:
-        """Validate order data"""
-        required_fields = ['symbol', 'quantity', 'price', 'side', 'user_id']
-        return all(field in order_data for field in required_fields)
+    def get_order_state(self, order_ref: str) -> Optional[Dict]:
+        """Latest state of a recent order: queued, processing, withdrawn or its final result"""
+        return self.order_states.get(order_ref)
+    
+    def _set_order_state(self, order_ref: str, state: Dict):
+        self.order_states[order_ref] = state
+        self.order_states.move_to_end(order_ref)
+        while len(self.order_states) > ORDER_STATES_MAX:
+            self.order_states.popitem(last=False)
     
-    def check_risk_limits(self, order_data: Dict) -> bool:
-        """Check risk management limits"""
-        user_id = order_data.get('user_id')
-        symbol = order_data.get('symbol')
-        quantity = order_data.get('quantity', 0)
-        price = order_data.get('price', 0)
+    async def _order_worker(self, queue: asyncio.Queue):
+        """Drain one order queue"""
+        while True:
+            order_ref, order_data, future, enqueued_at = await queue.get()
+            if future.cancelled():
+                # Withdrawn by process_order after its acknowledgement timed out
+                queue.task_done()
+                continue
+            self._set_order_state(order_ref, {"status": "processing"})
+            try:
+                result = await self._handle_order(order_data, enqueued_at)
+            except Exception as e:
+                logger.error(f"Order processing error: {e}")
+                result = {"status": "error", "reason": str(e)}
+            finally:
+                queue.task_done()
+            result = {**result, "order_ref": order_ref}
+            self._set_order_state(order_ref, result)
+            if not future.done():
+                future.set_result(result)
+    
+    async def _handle_order(self, order_data: Dict, enqueued_at: float) -> Dict:
+        """Risk check, execute, record the fill and acknowledge one order"""
+        started = time.perf_counter()
+        self.latency.record('queue_wait', (started - enqueued_at) * 1000)
         
-        # Position size limit
-        max_position_value = 1000000  # ₹10 lakh per position
-        order_value = quantity * price
+        # Pre-trade risk check reserves exposure atomically
+        rejection = await self.check_risk_limits(order_data)
+        risk_done = time.perf_counter()
+        self.latency.record('risk_check', (risk_done - started) * 1000)
+        if rejection:
+            self.latency.record('order_to_ack', (risk_done - enqueued_at) * 1000)
+            return {"status": "rejected", "reason": "Risk limits exceeded", "limit": rejection}
         
-        if order_value > max_position_value:
-            return False
+        # Execute order asynchronously
+        result = await self.execute_order_async(order_data)
+        executed = time.perf_counter()
+        self.latency.record('execution', (executed - risk_done) * 1000)
         
-        # Daily trading limit
-        user_daily_volume = self.get_user_daily_volume(user_id)
-        daily_limit = 5000000  # ₹50 lakh daily limit
+        if result.get('status') == 'executed':
+            # Update portfolio cache
+            await self.update_portfolio_cache(order_data, result)
+        else:
+            await self.exposure.release(order_data['user_id'], self._order_value(order_data))
         
-        if user_daily_volume + order_value > daily_limit:
-            return False
-            
-        return True
+        self.latency.record('order_to_ack', (time.perf_counter() - enqueued_at) * 1000)
+        
+        # Broadcast order update without holding up the acknowledgement
+        task = asyncio.create_task(self.broadcast_order_update(order_data, result))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return result
+    
+    def validate_order(self, order_data: Dict) -> bool:
+        """Validate order data"""
+        required_fields = ['symbol', 'quantity', 'price', 'side', 'user_id']
+        return all(field in order_data for field in required_fields)
+    
+    @staticmethod
+    def _order_value(order_data: Dict) -> float:
+        return float(order_data.get('quantity', 0)) * float(order_data.get('price', 0))
+    
+    async def check_risk_limits(self, order_data: Dict) -> Optional[str]:
+        """
+        Check risk management limits and reserve the order's value
+        Returns:
+            None if the order is within limits, otherwise the limit it breaches
+            ('position_limit' per order, 'daily_limit' per user per day)
+        """
+        return await self.exposure.reserve(order_data.get('user_id'), self._order_value(order_data))
     
     async def execute_order_async(self, order_data: Dict) -> Dict:
         """Execute order using async broker API calls"""
@@ -181,39 +585,11 @@ class TradingEngine:
             return {"status": "failed", "reason": str(e)}
     
     async def update_portfolio_cache(self, order_data: Dict, result: Dict):
-        """Update portfolio cache with new order"""
-        user_id = order_data['user_id']
-        
-        # Update Redis cache
-        cache_key = f"portfolio:{user_id}"
-        portfolio_data = redis_client.get(cache_key)
-        
-        if portfolio_data:
-            try:
-                portfolio = json.loads(portfolio_data)
-            except (json.JSONDecodeError, TypeError):
-                portfolio = {"holdings": {}, "cash": 0, "total_value": 0}
-        else:
-            portfolio = {"holdings": {}, "cash": 0, "total_value": 0}
-        
-        # Update holdings
-        symbol = order_data['symbol']
-        quantity = order_data['quantity']
-        side = order_data['side']
-        
-        if symbol not in portfolio['holdings']:
-            portfolio['holdings'][symbol] = {"quantity": 0, "avg_price": 0}
-        
-        current_qty = portfolio['holdings'][symbol]['quantity']
-        if side == 'BUY':
-            new_qty = current_qty + quantity
-        else:  # SELL
-            new_qty = current_qty - quantity
-            
-        portfolio['holdings'][symbol]['quantity'] = new_qty
-        
-        # Cache updated portfolio
-        redis_client.setex(cache_key, 300, json.dumps(portfolio))  # 5 min cache
+        """Apply an executed order to the user's net position and cached portfolio"""
+        quantity = float(order_data['quantity'])
+        signed_quantity = quantity if order_data['side'] == 'BUY' else -quantity
+        price = result.get('execution_price') or order_data.get('price') or 0
+        await self.exposure.apply_fill(order_data['user_id'], order_data['symbol'], signed_quantity, float(price))
     
     async def broadcast_order_update(self, order_data: Dict, result: Dict):
         """Broadcast order update to relevant clients"""
@@ -228,23 +604,22 @@ class TradingEngine:
         await self.broadcast_to_user(order_data['user_id'], message)
     
     async def broadcast_to_user(self, user_id: str, message: Dict):
-        """Broadcast message to specific user's connections"""
-        # In production, you'd maintain user-specific connection mappings
-        message_json = json.dumps(message)
-        
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message_json)
-            except Exception as e:
-                logger.warning(f"Failed to send user message: {e}")
+        """Send a message to the user's own connections"""
+        self.connections.send_to_user(user_id, json.dumps(message))
     
-    def get_user_daily_volume(self, user_id: str) -> float:
-        """Get user's daily trading volume from cache"""
+    async def get_user_daily_volume(self, user_id: str) -> float:
+        """Get user's traded value today from the exposure ledger"""
         if not user_id:
             return 0.0
-        cache_key = f"daily_volume:{user_id}:{datetime.now(timezone.utc).date()}"
-        volume = redis_client.get(cache_key)
-        return float(volume) if volume else 0.0
+        return await self.exposure.daily_volume(user_id)
+    
+    def get_order_metrics(self) -> Dict[str, Any]:
+        """Order pipeline latency percentiles and queue depth"""
+        return {
+            "workers": len(self.order_workers),
+            "queue_depth": sum(queue.qsize() for queue in self.order_queues),
+            "latency": self.latency.snapshot()
+        }
 
 # Global trading engine instance
 trading_engine = TradingEngine()
@@ -263,7 +638,7 @@ class MarketDataStreamer:
         while True:
             try:
                 # Fetch real-time data for subscribed symbols
-                for symbol in self.subscribed_symbols:
+                for symbol in list(self.subscribed_symbols):
                     market_data = await self.fetch_live_data(symbol)
                     if market_data:
                         # Cache data
@@ -310,6 +685,13 @@ class MarketDataStreamer:
 # Global market data streamer
 market_streamer = MarketDataStreamer()
 
+# Stop polling symbols nobody is subscribed to any more
+def _unsubscribe_orphaned(symbols):
+    for symbol in symbols:
+        market_streamer.unsubscribe_symbol(symbol)
+
+trading_engine.connections.on_symbols_orphaned = _unsubscribe_orphaned
+
 class AlgorithmExecutor:
     """
     Algorithmic trading execution engine
@@ -434,23 +816,54 @@ class AlgorithmExecutor:
 # Global algorithm executor
 algo_executor = AlgorithmExecutor()
 
+def authenticate_websocket(websocket: WebSocket) -> Optional[str]:
+    """
+    User id from the client's access token, or None if it is missing or invalid
+    Browsers cannot set headers on a WebSocket handshake, so ?token= is accepted as well as
+    an Authorization: Bearer header.
+    """
+    token = websocket.query_params.get('token')
+    auth_header = websocket.headers.get('authorization', '')
+    if auth_header.startswith('Bearer '):
+        token = auth_header[7:]
+    if not token or not JWT_SECRET:
+        return None
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except jwt.InvalidTokenError as e:
+        logger.warning(f"Rejected WebSocket token: {e}")
+        return None
+    if payload.get('type') != 'access' or payload.get('user_id') is None:
+        return None
+    return str(payload['user_id'])
+
 # FastAPI Routes
 @trading_api.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for real-time trading data"""
-    await trading_engine.connect_websocket(websocket)
+    """WebSocket endpoint for real-time trading data (requires an access token)"""
+    user_id = authenticate_websocket(websocket)
+    if user_id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await trading_engine.connect_websocket(websocket, user_id)
     try:
         while True:
             # Keep connection alive and handle incoming messages
             data = await websocket.receive_text()
             message = json.loads(data)
             
-            if message.get('type') == 'subscribe':
-                symbol = message.get('symbol')
-                if symbol:
+            symbol = message.get('symbol')
+            if message.get('type') == 'subscribe' and symbol:
+                # A dropped connection's symbols were already released; don't poll them again
+                if trading_engine.connections.subscribe(websocket, symbol):
                     market_streamer.subscribe_symbol(symbol)
+            elif message.get('type') == 'unsubscribe' and symbol:
+                trading_engine.connections.unsubscribe(websocket, symbol)
                     
     except WebSocketDisconnect:
+        pass
+    finally:
         trading_engine.disconnect_websocket(websocket)
 
 @trading_api.post("/api/orders")
@@ -459,6 +872,20 @@ async def place_order(order_data: Dict):
     result = await trading_engine.process_order(order_data)
     return result
 
+@trading_api.get("/api/orders/metrics")
+async def get_order_metrics():
+    """Order-to-ack latency (p50/p99 per stage) and queue depth"""
+    return trading_engine.get_order_metrics()
+
+@trading_api.get("/api/orders/{order_ref}")
+async def get_order(order_ref: str):
+    """Poll an order submitted through /api/orders (e.g. after a "pending" response)"""
+    state = trading_engine.get_order_state(order_ref)
+    if state:
+        return {"success": True, "order_ref": order_ref, "data": state}
+    else:
+        return {"success": False, "message": "Order not found"}
+
 @trading_api.post("/api/algorithms/start")
 async def start_algorithm(algo_config: Dict):
     """Start algorithmic trading strategy"""
@@ -487,7 +914,7 @@ async def get_market_data(symbol: str):
 async def get_portfolio(user_id: str):
     """Get real-time portfolio data"""
     cache_key = f"portfolio:{user_id}"
-    portfolio_data = redis_client.get(cache_key)
+    portfolio_data = await redis_client.get(cache_key)
     
     if portfolio_data:
         return {"success": True, "data": json.loads(portfolio_data)}
@@ -498,6 +925,9 @@ async def get_portfolio(user_id: str):
 @trading_api.on_event("startup")
 async def startup_event():
     """Start background services"""
+    # Start order consumers
+    trading_engine.start_order_workers()
+    
     # Start market data streaming
     asyncio.create_task(market_streamer.start_streaming())
     logger.info("Trading engine started successfully")
@@ -10,15 +10,29 @@ import logging
 import signal
 import sys
 from datetime import datetime, timezone
-from typing import Set, Dict, Any
-import threading
-import time
+import os
+from typing import Set, Dict, Any, Optional, Tuple
 from services.nse_service import NSEService
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MARKET_DATA_INTERVAL = float(os.environ.get('MARKET_DATA_INTERVAL', '10'))
+MARKET_DATA_ERROR_BACKOFF = 30
+# A client that cannot take a message within this many seconds is disconnected
+CLIENT_SEND_TIMEOUT = float(os.environ.get('WS_CLIENT_SEND_TIMEOUT', '5'))
+POPULAR_STOCKS = ['RELIANCE', 'TCS', 'INFY', 'HDFCBANK', 'ICICIBANK']
+# Fields that change on every fetch and do not by themselves make a symbol "changed"
+VOLATILE_FIELDS = {'timestamp', 'real_timestamp', 'last_updated'}
+
+
+def _unwrap_result(result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Accept both {'success', 'data'} envelopes and bare NSEService payloads"""
+    if 'success' in result:
+        return result.get('data') if result.get('success') else None
+    return result
+
 class WebSocketServer:
     def __init__(self, port: int, name: str):
         self.port = port
@@ -76,6 +90,24 @@ class MarketDataServer(WebSocketServer):
         self.nse_service = NSEService()
         self.market_data = {}
         self.last_update = None
+        # Last published payload per symbol: symbol -> (section, comparison key, serialized JSON)
+        self.published: Dict[str, Tuple[str, str, str]] = {}
+        # symbol -> clients subscribed to it
+        self.symbol_clients: Dict[str, Set[websockets.WebSocketServerProtocol]] = {}
+        self.update_task = None
+
+    async def unregister(self, websocket):
+        """Unregister a client and drop it from the symbol index"""
+        for symbol in self.subscriptions.get(websocket, ()):
+            self._remove_symbol_client(symbol, websocket)
+        await super().unregister(websocket)
+
+    def _remove_symbol_client(self, symbol, websocket):
+        clients = self.symbol_clients.get(symbol)
+        if clients is not None:
+            clients.discard(websocket)
+            if not clients:
+                del self.symbol_clients[symbol]
         
     async def handle_client(self, websocket, path):
         """Handle individual client connections"""
@@ -102,24 +134,31 @@ class MarketDataServer(WebSocketServer):
     async def send_initial_data(self, websocket):
         """Send current market data to newly connected client"""
         if self.market_data:
-            await self.send_to_client(websocket, {
+            await self.send_raw(websocket, json.dumps({
                 'type': 'market_data',
                 'data': self.market_data,
                 'timestamp': self.last_update
-            })
+            }, default=str))
     
     async def handle_message(self, websocket, data):
         """Handle incoming messages from clients"""
         message_type = data.get('type')
         
         if message_type == 'subscribe':
-            symbols = data.get('symbols', [])
+            symbols = [str(s) for s in data.get('symbols', [])]
+            new_symbols = set(symbols) - self.subscriptions[websocket]
             self.subscriptions[websocket].update(symbols)
+            for symbol in symbols:
+                self.symbol_clients.setdefault(symbol, set()).add(websocket)
             logger.info(f"Client subscribed to: {symbols}")
+            # Current values now, instead of waiting for the symbol's next change
+            await self.send_symbols(websocket, new_symbols)
             
         elif message_type == 'unsubscribe':
-            symbols = data.get('symbols', [])
+            symbols = [str(s) for s in data.get('symbols', [])]
             self.subscriptions[websocket].difference_update(symbols)
+            for symbol in symbols:
+                self._remove_symbol_client(symbol, websocket)
             logger.info(f"Client unsubscribed from: {symbols}")
             
         elif message_type == 'ping':
@@ -136,56 +175,147 @@ class MarketDataServer(WebSocketServer):
         })
     
     def start_data_updates(self):
-        """Start background data updates"""
-        def update_loop():
-            while self.running:
-                try:
-                    asyncio.run(self.update_market_data())
-                    time.sleep(10)  # Update every 10 seconds
-                except Exception as e:
-                    logger.error(f"Market data update error: {e}")
-                    time.sleep(30)  # Wait longer on error
+        """Start background data updates on the server's event loop"""
+        if self.update_task is None or self.update_task.done():
+            self.update_task = asyncio.get_running_loop().create_task(self.update_loop())
+            logger.info("Market data update task started")
+
+    async def update_loop(self):
+        """Poll market data every MARKET_DATA_INTERVAL seconds while the server is running"""
+        while self.running:
+            try:
+                await self.update_market_data()
+                await asyncio.sleep(MARKET_DATA_INTERVAL)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Market data update error: {e}")
+                await asyncio.sleep(MARKET_DATA_ERROR_BACKOFF)
+
+    def fetch_market_data(self, subscribed) -> Dict[str, Any]:
+        """Fetch indices and stock quotes from NSE (blocking; runs in the default executor)"""
+        indices_result = self.nse_service.get_market_indices() or {}
+        indices = _unwrap_result(indices_result) or {}
+        indices = {k: v for k, v in indices.items() if isinstance(v, dict)}
+        
+        # Popular stocks plus anything a connected client has subscribed to
+        stocks_data = {}
+        for symbol in sorted((set(POPULAR_STOCKS) | set(subscribed)) - set(indices)):
+            try:
+                stock = _unwrap_result(self.nse_service.get_stock_quote(symbol) or {})
+                if stock:
+                    stocks_data[symbol] = stock
+            except Exception as e:
+                logger.warning(f"Failed to fetch {symbol}: {e}")
         
-        thread = threading.Thread(target=update_loop, daemon=True)
-        thread.start()
-        logger.info("Market data update thread started")
+        return {
+            'indices': indices,
+            'stocks': stocks_data,
+            'market_status': 'open' if self.is_market_open() else 'closed'
+        }
     
     async def update_market_data(self):
-        """Update market data from NSE"""
+        """Update market data from NSE and push per-symbol deltas to subscribers"""
         try:
-            # Get indices data
-            indices_result = self.nse_service.get_market_indices()
-            
-            # Get popular stocks
-            popular_stocks = ['RELIANCE', 'TCS', 'INFY', 'HDFCBANK', 'ICICIBANK']
-            stocks_data = {}
-            
-            for symbol in popular_stocks:
-                try:
-                    stock_result = self.nse_service.get_stock_quote(symbol)
-                    if stock_result.get('success'):
-                        stocks_data[symbol] = stock_result['data']
-                except Exception as e:
-                    logger.warning(f"Failed to fetch {symbol}: {e}")
-            
-            # Update market data
-            self.market_data = {
-                'indices': indices_result.get('data', {}) if indices_result.get('success') else {},
-                'stocks': stocks_data,
-                'market_status': 'open' if self.is_market_open() else 'closed'
-            }
+            loop = asyncio.get_running_loop()
+            market_data = await loop.run_in_executor(None, self.fetch_market_data, list(self.symbol_clients))
             
+            self.market_data = market_data
             self.last_update = datetime.now(timezone.utc).isoformat()
             
-            # Broadcast to all clients
-            await self.broadcast({
-                'type': 'market_data',
-                'data': self.market_data,
-                'timestamp': self.last_update
-            })
+            changed = self.diff_snapshot(market_data)
+            if changed:
+                await self.publish_changes(changed)
             
         except Exception as e:
             logger.error(f"Market data update failed: {e}")
+
+    def diff_snapshot(self, market_data: Dict[str, Any]) -> Dict[str, Tuple[str, str]]:
+        """
+        Compare a fetched snapshot against the last published one
+
+        Args:
+            market_data: Snapshot with 'indices', 'stocks' and 'market_status'
+
+        Returns:
+            symbol -> (section, serialized payload) for every symbol whose values changed;
+            each payload is serialized here exactly once
+        """
+        changed = {}
+        for section in ('indices', 'stocks'):
+            for symbol, payload in market_data.get(section, {}).items():
+                key = json.dumps(
+                    {k: v for k, v in payload.items() if k not in VOLATILE_FIELDS},
+                    sort_keys=True, default=str
+                )
+                previous = self.published.get(symbol)
+                if previous is not None and previous[1] == key:
+                    continue
+                serialized = json.dumps(payload, default=str)
+                self.published[symbol] = (section, key, serialized)
+                changed[symbol] = (section, serialized)
+        
+        status = market_data.get('market_status')
+        previous = self.published.get('market_status')
+        if previous is None or previous[1] != status:
+            serialized = json.dumps(status)
+            self.published['market_status'] = ('market_status', status, serialized)
+            changed['market_status'] = ('market_status', serialized)
+        return changed
+
+    async def publish_changes(self, changed: Dict[str, Tuple[str, str]]):
+        """Send each client the changed symbols it subscribed to; market status goes to everyone"""
+        status = changed.get('market_status')
+        timestamp = json.dumps(self.last_update)
+        
+        # Walk the symbol index rather than every client's subscription set
+        per_client: Dict[Any, list] = {client: [] for client in self.clients} if status is not None else {}
+        for symbol in changed:
+            if symbol == 'market_status':
+                continue
+            for client in self.symbol_clients.get(symbol, ()):
+                per_client.setdefault(client, []).append(symbol)
+        
+        sends = [
+            self.send_raw(client, self.build_delta(symbols, changed, status, timestamp))
+            for client, symbols in per_client.items()
+        ]
+        
+        if sends:
+            await asyncio.gather(*sends)
+
+    @staticmethod
+    def build_delta(symbols, changed, status, timestamp) -> str:
+        """Assemble a market_delta message from pre-serialized symbol payloads"""
+        sections: Dict[str, list] = {'indices': [], 'stocks': []}
+        for symbol in symbols:
+            section, serialized = changed[symbol]
+            sections[section].append(f"{json.dumps(symbol)}:{serialized}")
+        
+        parts = [f'"{section}":{{{",".join(items)}}}' for section, items in sections.items() if items]
+        if status is not None:
+            parts.append(f'"market_status":{status[1]}')
+        return f'{{"type":"market_delta","data":{{{",".join(parts)}}},"timestamp":{timestamp}}}'
+
+    async def send_symbols(self, websocket, symbols):
+        """Send the last published values of the given symbols to one client"""
+        available = {
+            s: (self.published[s][0], self.published[s][2])
+            for s in symbols if s in self.published and s != 'market_status'
+        }
+        if available:
+            message = self.build_delta(list(available), available, None, json.dumps(self.last_update))
+            await self.send_raw(websocket, message)
+
+    async def send_raw(self, websocket, message_str: str):
+        """Send an already serialized message; slow or dead clients are dropped"""
+        try:
+            await asyncio.wait_for(websocket.send(message_str), timeout=CLIENT_SEND_TIMEOUT)
+        except (websockets.exceptions.ConnectionClosed, asyncio.TimeoutError):
+            await self.unregister(websocket)
+        except Exception as e:
+            logger.error(f"Send to client error: {e}")
+            await self.unregister(websocket)
     
     def is_market_open(self):
         """Check if market is currently open"""
@@ -394,6 +524,8 @@ async def shutdown_servers():
         if server_obj.server:
             server_obj.server.close()
             await server_obj.server.wait_closed()
+    if market_server.update_task:
+        market_server.update_task.cancel()
     
     logger.info("✅ All WebSocket servers shut down successfully")
     sys.exit(0)